@@ -38,6 +38,7 @@ import folium
 
 # Database for submissions tracking
 from database import SubmissionsDB
+import submissions_export
 
 # Repository layer for reference/config tables
 import repo
@@ -48,6 +49,28 @@ import metric_reader
 # Surplus Uplift Offset (SUO)
 import suo
 
+# Concurrent postcode -> LPA/NCA/neighbours/catchments resolution
+from site_resolver import resolve_site_sync
+
+# Persistent response cache for static ArcGIS name/list/geometry queries
+from optimizer_core import cached_get_json, cached_post_json
+
+# Pricing normalisation shared with the promoter apps
+from optimizer_core import normalise_pricing as optimizer_core_normalise_pricing
+
+# Geometry conversion and WFS catchment lookups shared with site_resolver
+from optimizer_core import esri_polygon_to_geojson, get_watercourse_catchments_for_point
+
+# Catchment-proximity SRM shared with the promoter apps
+from optimizer_core import calculate_watercourse_srm
+
+# Boundary simplification for map rendering
+from map_geometry import simplify_for_map
+
+# Far-tier bank shortlist (nearest + cheapest per demand)
+from bank_shortlist import (BankLocator, far_bank_k_from_env, prove_shortlist_from_env,
+                            shortlist_is_proven, shortlist_options)
+
 # ================= Config / constants =================
 ADMIN_FEE_GBP = 500.0  # Standard admin fee
 ADMIN_FEE_FRACTIONAL_GBP = 300.0  # Admin fee for fractional quotes
@@ -193,6 +216,7 @@ def reset_quote():
         st.session_state["removed_allocation_rows"] = []
         st.session_state["email_client_name"] = "INSERT NAME"
         # email_ref_number is now auto-generated, remove from reset
+        st.session_state.pop("provisional_ref_number", None)
         st.session_state["email_location"] = "INSERT LOCATION"
         st.session_state["map_version"] = st.session_state.get("map_version", 0) + 1
         # Clear felled woodland pricing state
@@ -405,6 +429,11 @@ if st.session_state.app_mode == "Admin Dashboard":
     
     # Check reference tables status
     st.markdown("#### 📋 Reference Tables Status")
+    if st.button("🔄 Refresh reference data now", key="admin_refresh_reference",
+                 help="Use after editing banks, pricing or stock directly in the database. "
+                      "All running apps and workers pick up the change at their next check."):
+        repo.mark_reference_tables_changed()
+        st.success("✅ Reference data will be reloaded.")
     try:
         tables_status = repo.check_required_tables_not_empty()
         all_ok = all(tables_status.values())
@@ -418,6 +447,18 @@ if st.session_state.app_mode == "Admin Dashboard":
                     st.error(f"  • {table_name} table is empty or missing")
             st.info("💡 Please populate these tables in your Supabase database to enable the optimizer.")
         
+        integrity_warnings = repo.validate_reference_data().warnings
+        if integrity_warnings:
+            st.warning("⚠️ Some reference rows point at unknown banks or habitats "
+                       "(they are never offered by the optimizer):")
+            for warning in integrity_warnings:
+                st.warning(f"  • {warning}")
+        
+        quotes_fallback = repo.quotes_policy_fallback()
+        if quotes_fallback:
+            st.warning("⚠️ Stock sanity: the quotes policy is not being applied - the optimiser uses "
+                       f"quantity_available as stored. {quotes_fallback}")
+        
         # Show table counts
         with st.expander("📊 Reference Table Details", expanded=False):
             col1, col2, col3 = st.columns(3)
@@ -461,6 +502,36 @@ if st.session_state.app_mode == "Admin Dashboard":
             st.metric("Total Revenue", f"£{stats['total_revenue']:,.0f}")
         with col3:
             st.metric("Top LPA", stats["top_lpas"][0][0] if stats["top_lpas"] else "N/A")
+        
+        with st.expander("📈 Submission Trends", expanded=False):
+            trend_df = db.get_submission_timeseries(period="month")
+            if not trend_df.empty:
+                st.bar_chart(trend_df.set_index("period")[["submissions"]])
+            trend_col1, trend_col2 = st.columns(2)
+            with trend_col1:
+                st.markdown("**Top LPAs**")
+                for lpa_name, count in stats["top_lpas"]:
+                    st.write(f"{lpa_name}: {count}")
+            with trend_col2:
+                st.markdown("**Top Clients**")
+                for client, count in stats["top_clients"]:
+                    st.write(f"{client}: {count}")
+        
+        with st.expander("🏦 Allocation Analytics", expanded=False):
+            alloc_group = st.selectbox("Group by", ["Bank", "Habitat", "Tier"], key="alloc_summary_group")
+            alloc_monthly = st.checkbox("Per month", value=False, key="alloc_summary_monthly")
+            alloc_summary = db.get_allocation_summary(
+                period="month" if alloc_monthly else None,
+                group_by=(alloc_group.lower(),)
+            )
+            if alloc_summary.empty:
+                st.info("No allocations recorded yet.")
+            else:
+                st.dataframe(alloc_summary.rename(columns={
+                    "period": "Month", "bank_key": "Bank", "supply_habitat": "Habitat", "tier": "Tier",
+                    "quotes": "Quotes", "units": "Units Sold", "revenue": "Revenue (£)",
+                    "avg_unit_price": "Avg Price per Unit (£)"
+                }).round(2), use_container_width=True, hide_index=True)
     except Exception as e:
         st.warning(f"Could not load summary stats: {e}")
     
@@ -580,6 +651,8 @@ if st.session_state.app_mode == "Admin Dashboard":
     # Filters
     st.markdown("#### 🔍 Filter Submissions")
     with st.expander("Filter Options", expanded=False):
+        filter_search = st.text_input("Search (client, reference, location, LPA, NCA)", key="filter_search",
+                                      help="Ranked, typo-tolerant search; overrides the filters below")
         col1, col2 = st.columns(2)
         with col1:
             filter_start_date = st.date_input("Start Date", value=None, key="filter_start_date")
@@ -592,23 +665,37 @@ if st.session_state.app_mode == "Admin Dashboard":
         
         apply_filters = st.button("Apply Filters", key="apply_filters_btn")
     
-    # Load submissions
+    # Load submissions (one page of summary rows; details are fetched per submission)
     try:
-        if apply_filters or any([filter_start_date, filter_end_date, filter_client, filter_lpa, filter_nca, filter_ref]):
-            # Apply filters
-            df = db.filter_submissions(
-                start_date=filter_start_date.isoformat() if filter_start_date else None,
-                end_date=filter_end_date.isoformat() if filter_end_date else None,
-                client_name=filter_client if filter_client else None,
-                lpa=filter_lpa if filter_lpa else None,
-                nca=filter_nca if filter_nca else None,
-                reference_number=filter_ref if filter_ref else None
-            )
+        submission_filters = {
+            "start_date": filter_start_date.isoformat() if filter_start_date else None,
+            "end_date": filter_end_date.isoformat() if filter_end_date else None,
+            "client_name": filter_client if filter_client else None,
+            "lpa": filter_lpa if filter_lpa else None,
+            "nca": filter_nca if filter_nca else None,
+            "reference_number": filter_ref if filter_ref else None,
+        }
+        # Cursor of each page shown so far; reset when the filters change
+        if st.session_state.get("admin_submissions_filters") != submission_filters:
+            st.session_state.admin_submissions_filters = submission_filters
+            st.session_state.admin_submissions_cursors = [None]
+        page_cursors = st.session_state.admin_submissions_cursors
+        if filter_search.strip():
+            df, next_cursor = db.search_submissions(filter_search, limit=100), None
+            st.markdown(f"#### 📋 Submissions matching \"{filter_search.strip()}\" ({len(df)} records)")
         else:
-            # Show all submissions (limited to last 100)
-            df = db.get_all_submissions(limit=100)
-        
-        st.markdown(f"#### 📋 Submissions ({len(df)} records)")
+            df, next_cursor = db.list_submissions(limit=100, after=page_cursors[-1], **submission_filters)
+            st.markdown(f"#### 📋 Submissions (page {len(page_cursors)}, {len(df)} records)")
+        page_col1, page_col2, _ = st.columns([1, 1, 4])
+        with page_col1:
+            if st.button("← Newer", key="admin_submissions_prev",
+                         disabled=len(page_cursors) == 1 or bool(filter_search.strip())):
+                page_cursors.pop()
+                st.rerun()
+        with page_col2:
+            if st.button("Older →", key="admin_submissions_next", disabled=next_cursor is None):
+                page_cursors.append(next_cursor)
+                st.rerun()
         
         if df.empty:
             st.info("No submissions found.")
@@ -637,14 +724,28 @@ if st.session_state.app_mode == "Admin Dashboard":
             st.markdown("#### 📥 Export Data")
             col1, col2 = st.columns(2)
             with col1:
-                # Export displayed submissions
-                csv_bytes = db.export_to_csv(df)
+                # Export displayed submissions (full rows; the page only holds summary columns)
+                csv_bytes = b"".join(submissions_export.iter_csv(submissions_export.iter_submission_chunks(
+                    db._get_connection(), ids=df["id"].tolist())))
                 st.download_button(
                     "📥 Download Submissions CSV",
                     data=csv_bytes,
                     file_name=f"submissions_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
                     mime="text/csv"
                 )
+            with col2:
+                # Full history, streamed from the database in chunks (built only on request)
+                if st.button("📦 Prepare Full History CSV", key="prepare_full_export"):
+                    with st.spinner("Exporting all submissions..."):
+                        export_file = submissions_export.export_csv_file(db._get_connection())
+                    # Streamlit reads the file into its media store; the app keeps no copy
+                    with export_file:
+                        st.download_button(
+                            "📥 Download Full History CSV",
+                            data=export_file,
+                            file_name=f"submissions_full_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                            mime="text/csv"
+                        )
             
             # View details of a specific submission
             st.markdown("#### 🔎 View Submission Details")
@@ -743,45 +844,15 @@ if st.session_state.app_mode == "Quote Management":
         # Perform search
         if search_btn or any([search_client, search_ref, search_location, search_lpa, search_start_date, search_end_date]):
             try:
-                # Build custom query for location search
-                if search_location:
-                    query = "SELECT * FROM submissions WHERE 1=1"
-                    params = {}
-                    
-                    if search_start_date:
-                        query += " AND submission_date >= %(start_date)s"
-                        params["start_date"] = search_start_date.isoformat()
-                    if search_end_date:
-                        query += " AND submission_date <= %(end_date)s"
-                        params["end_date"] = search_end_date.isoformat()
-                    if search_client:
-                        query += " AND client_name ILIKE %(client_name)s"
-                        params["client_name"] = f"%{search_client}%"
-                    if search_ref:
-                        query += " AND reference_number ILIKE %(reference_number)s"
-                        params["reference_number"] = f"%{search_ref}%"
-                    if search_lpa:
-                        query += " AND target_lpa ILIKE %(lpa)s"
-                        params["lpa"] = f"%{search_lpa}%"
-                    if search_location:
-                        query += " AND site_location ILIKE %(location)s"
-                        params["location"] = f"%{search_location}%"
-                    
-                    query += " ORDER BY submission_date DESC LIMIT 100"
-                    
-                    # Use pd.read_sql_query without text() wrapper - it handles parameters correctly
-                    engine = db._get_connection()
-                    with engine.connect() as conn:
-                        results_df = pd.read_sql_query(query, conn, params=params)
-                else:
-                    # Use standard filter
-                    results_df = db.filter_submissions(
-                        start_date=search_start_date.isoformat() if search_start_date else None,
-                        end_date=search_end_date.isoformat() if search_end_date else None,
-                        client_name=search_client if search_client else None,
-                        lpa=search_lpa if search_lpa else None,
-                        reference_number=search_ref if search_ref else None
-                    )
+                results_df, _ = db.list_submissions(
+                    limit=100,
+                    start_date=search_start_date.isoformat() if search_start_date else None,
+                    end_date=search_end_date.isoformat() if search_end_date else None,
+                    client_name=search_client if search_client else None,
+                    lpa=search_lpa if search_lpa else None,
+                    reference_number=search_ref if search_ref else None,
+                    site_location=search_location if search_location else None
+                )
                 
                 st.markdown(f"#### 📋 Search Results ({len(results_df)} quotes found)")
                 
@@ -1259,7 +1330,7 @@ if st.session_state.app_mode == "Quote Management":
         # Select quote to requote
         try:
             # Get recent submissions
-            recent_quotes_df = db.get_all_submissions(limit=50)
+            recent_quotes_df, _ = db.list_submissions(limit=50)
             
             if not recent_quotes_df.empty:
                 # Display selection interface
@@ -1300,7 +1371,7 @@ if st.session_state.app_mode == "Quote Management":
                             st.write(f"**Date:** {original_quote['submission_date']}")
                         
                         # Show what the new reference will be
-                        new_ref = db.get_next_revision_number(original_quote['reference_number'])
+                        new_ref = db.get_next_revision_number(original_quote['reference_number'], reserve=False)
                         st.info(f"📝 New requote will have reference: **{new_ref}**")
                         
                         # Create requote button
@@ -1371,22 +1442,12 @@ def safe_json(r: requests.Response) -> Dict[str, Any]:
         raise RuntimeError(f"Invalid JSON from {r.url} (status {r.status_code}). Starts: {preview}")
 
 # ================= Geo helpers =================
-def esri_polygon_to_geojson(geom: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    if not geom or "rings" not in geom:
-        return None
-    rings = geom.get("rings") or []
-    if not rings:
-        return None
-    if len(rings) == 1:
-        return {"type": "Polygon", "coordinates": [rings[0]]}
-    return {"type": "MultiPolygon", "coordinates": [[ring] for ring in rings]}
-
 def add_geojson_layer(fmap, geojson: Dict[str, Any], name: str, color: str, weight: int, fill_opacity: float = 0.05, show=True):
     if not geojson:
         return
     try:
         folium.GeoJson(
-            geojson,
+            simplify_for_map(geojson),
             name=name,
             show=show,
             style_function=lambda x: {"color": color, "fillOpacity": fill_opacity, "weight": weight},
@@ -1464,8 +1525,7 @@ def layer_intersect_names(layer_url: str, polygon_geom: Dict[str, Any], name_fie
         "outFields": name_field, "returnGeometry": "false", "outSR": 4326,
         "geometryPrecision": 5,
     }
-    r = http_post(f"{layer_url}/query", data=data)
-    js = safe_json(r)
+    js = cached_post_json(f"{layer_url}/query", data=data)
     names = [sstr((f.get("attributes") or {}).get(name_field)) for f in js.get("features", [])]
     return sorted({n for n in names if n})
 
@@ -1482,8 +1542,7 @@ def fetch_all_lpas_from_arcgis() -> List[str]:
             "returnGeometry": "false",
             "returnDistinctValues": "true"
         }
-        r = http_get(f"{LPA_URL}/query", params=params)
-        js = safe_json(r)
+        js = cached_get_json(f"{LPA_URL}/query", params=params)
         features = js.get("features", [])
         lpas = [sstr((f.get("attributes") or {}).get("LAD24NM")) for f in features]
         return sorted({lpa for lpa in lpas if lpa})
@@ -1504,8 +1563,7 @@ def fetch_all_ncas_from_arcgis() -> List[str]:
             "returnGeometry": "false",
             "returnDistinctValues": "true"
         }
-        r = http_get(f"{NCA_URL}/query", params=params)
-        js = safe_json(r)
+        js = cached_get_json(f"{NCA_URL}/query", params=params)
         features = js.get("features", [])
         ncas = [sstr((f.get("attributes") or {}).get("NCA_Name")) for f in features]
         return sorted({nca for nca in ncas if nca})
@@ -1527,8 +1585,7 @@ def query_lpa_by_name(lpa_name: str) -> Dict[str, Any]:
             "returnGeometry": "true",
             "outSR": 4326
         }
-        r = http_get(f"{LPA_URL}/query", params=params)
-        js = safe_json(r)
+        js = cached_get_json(f"{LPA_URL}/query", params=params)
         features = js.get("features", [])
         
         if not features:
@@ -1566,8 +1623,7 @@ def query_nca_by_name(nca_name: str) -> Dict[str, Any]:
             "returnGeometry": "true",
             "outSR": 4326
         }
-        r = http_get(f"{NCA_URL}/query", params=params)
-        js = safe_json(r)
+        js = cached_get_json(f"{NCA_URL}/query", params=params)
         features = js.get("features", [])
         
         if not features:
@@ -1605,114 +1661,6 @@ def get_catchment_geo_for_point(lat: float, lon: float) -> Tuple[str, Optional[D
     nca_gj = esri_polygon_to_geojson(nca_feat.get("geometry"))
     return lpa_name, lpa_gj, nca_name, nca_gj
 
-# ================= Watercourse Catchments =================
-def wfs_point_query(wfs_url: str, lat: float, lon: float) -> Dict[str, Any]:
-    """
-    Query WFS service for features containing a point.
-    Returns the first matching feature or empty dict.
-    """
-    try:
-        # WFS GetFeature request with point geometry filter
-        params = {
-            "service": "WFS",
-            "version": "2.0.0",
-            "request": "GetFeature",
-            "typeName": "ms:Water_Framework_Directive_River_Waterbody_Catchments_Cycle_2",  # Will be overridden
-            "outputFormat": "application/json",
-            "srsName": "EPSG:4326",
-            # CQL filter for point intersection
-            "CQL_FILTER": f"INTERSECTS(geom, POINT({lon} {lat}))"
-        }
-        
-        r = http_get(wfs_url, params=params, timeout=10)
-        if r.status_code != 200:
-            return {}
-        
-        js = safe_json(r)
-        features = js.get("features", [])
-        return features[0] if features else {}
-    except Exception:
-        return {}
-
-def get_watercourse_catchments_for_point(lat: float, lon: float) -> Tuple[str, str]:
-    """
-    Get waterbody and operational catchment names for a point.
-    Returns (waterbody_name, operational_catchment_name)
-    """
-    waterbody_name = ""
-    operational_name = ""
-    
-    try:
-        # Query waterbody catchment
-        wb_feat = wfs_point_query(WATERBODY_CATCHMENT_URL, lat, lon)
-        if wb_feat and "properties" in wb_feat:
-            # Try common field names for waterbody name
-            props = wb_feat["properties"]
-            waterbody_name = sstr(
-                props.get("name") or 
-                props.get("NAME") or 
-                props.get("wb_name") or 
-                props.get("WB_NAME") or 
-                props.get("waterbody_name") or
-                ""
-            )
-    except Exception:
-        pass
-    
-    try:
-        # Query operational catchment
-        op_feat = wfs_point_query(OPERATIONAL_CATCHMENT_URL, lat, lon)
-        if op_feat and "properties" in op_feat:
-            # Try common field names for operational catchment name
-            props = op_feat["properties"]
-            operational_name = sstr(
-                props.get("name") or 
-                props.get("NAME") or 
-                props.get("oc_name") or 
-                props.get("OC_NAME") or 
-                props.get("operational_catchment_name") or
-                ""
-            )
-    except Exception:
-        pass
-    
-    return waterbody_name, operational_name
-
-def calculate_watercourse_srm(site_waterbody: str, site_operational: str,
-                               bank_waterbody: str, bank_operational: str) -> float:
-    """
-    Calculate Spatial Risk Multiplier (SRM) for watercourse habitats based on catchment proximity.
-    
-    SRM Rules:
-    - Same waterbody catchment: SRM = 1.0 (no uplift)
-    - Same operational catchment (different waterbody): SRM = 0.75 (buyer needs 4/3× units)
-    - Outside operational catchment: SRM = 0.5 (buyer needs 2× units)
-    
-    Returns SRM multiplier (1.0, 0.75, or 0.5)
-    """
-    # Normalize for comparison
-    site_wb = norm_name(site_waterbody)
-    site_op = norm_name(site_operational)
-    bank_wb = norm_name(bank_waterbody)
-    bank_op = norm_name(bank_operational)
-    
-    # If catchment data is missing, default to far (0.5)
-    if not site_wb and not site_op:
-        return 0.5
-    if not bank_wb and not bank_op:
-        return 0.5
-    
-    # Same waterbody catchment
-    if site_wb and bank_wb and site_wb == bank_wb:
-        return 1.0
-    
-    # Same operational catchment (different waterbody)
-    if site_op and bank_op and site_op == bank_op:
-        return 0.75
-    
-    # Outside operational catchment
-    return 0.5
-
 # ================= Tiering =================
 def tier_for_bank(bank_lpa: str, bank_nca: str,
                   t_lpa: str, t_nca: str,
@@ -1763,21 +1711,36 @@ def get_admin_fee_for_contract_size(contract_size: str) -> float:
     return ADMIN_FEE_GBP
 
 # ================= Load Reference Tables from Supabase =================
-@st.cache_data(ttl=600)
-def load_backend() -> Dict[str, pd.DataFrame]:
+# Configure quotes policy for stock availability
+with st.sidebar:
+    st.subheader("Stock Policy")
+    quotes_hold_policy = st.selectbox(
+        "Quotes policy for stock availability",
+        list(repo.QUOTES_HOLD_POLICIES),
+        index=0,
+        help="How to treat 'quoted' units when computing quantity_available."
+    )
+
+
+def load_backend(quotes_hold_policy: str = repo.DEFAULT_QUOTES_HOLD_POLICY) -> Dict[str, pd.DataFrame]:
     """
     Load all reference/config tables from Supabase Postgres.
-    Tables are cached for 10 minutes (600 seconds) to reduce database queries.
+    Stock is the available stock under the quotes policy, computed in the
+    database (positive rows and optimiser columns only).
+    Tables are cached once per process by repo, shared by every session; each
+    call gets its own copies. Edits from any replica invalidate them via the
+    change listener.
     """
     try:
-        return repo.fetch_all_reference_tables()
+        repo.start_change_listener()
+        return repo.fetch_all_reference_tables(quotes_hold_policy=quotes_hold_policy)
     except Exception as e:
         st.error(f"Failed to load reference tables from database: {e}")
         st.stop()
 
 # Load backend tables from Supabase
 try:
-    backend = load_backend()
+    backend = load_backend(quotes_hold_policy)
 except Exception as e:
     st.error(f"❌ Cannot connect to database. Please check your database configuration.")
     st.error(f"Error: {e}")
@@ -1794,16 +1757,6 @@ if st.session_state.app_mode == "Optimiser":
         st.info("💡 Please contact your administrator to populate the database tables.")
         st.stop()
 
-# Configure quotes policy for stock availability
-with st.sidebar:
-    st.subheader("Stock Policy")
-    quotes_hold_policy = st.selectbox(
-        "Quotes policy for stock availability",
-        ["Ignore quotes (default)", "Quotes hold 100%", "Quotes hold 50%"],
-        index=0,
-        help="How to treat 'quoted' units when computing quantity_available."
-    )
-
 # ================= BANK_KEY normalisation =================
 def make_bank_key_col(df: pd.DataFrame, banks_df: pd.DataFrame) -> pd.DataFrame:
     out = df.copy()
@@ -1819,21 +1772,6 @@ def make_bank_key_col(df: pd.DataFrame, banks_df: pd.DataFrame) -> pd.DataFrame:
     out["BANK_KEY"] = out["BANK_KEY"].map(sstr)
     return out
 
-# Apply quotes policy if present
-if {"available_excl_quotes", "quoted"}.issubset(backend["Stock"].columns):
-    s = backend["Stock"].copy()
-    s["available_excl_quotes"] = pd.to_numeric(s["available_excl_quotes"], errors="coerce").fillna(0)
-    s["quoted"] = pd.to_numeric(s["quoted"], errors="coerce").fillna(0)
-
-    if quotes_hold_policy == "Ignore quotes (default)":
-        s["quantity_available"] = s["available_excl_quotes"]
-    elif quotes_hold_policy == "Quotes hold 100%":
-        s["quantity_available"] = (s["available_excl_quotes"] - s["quoted"]).clip(lower=0)
-    else:
-        s["quantity_available"] = (s["available_excl_quotes"] - 0.5 * s["quoted"]).clip(lower=0)
-
-    backend["Stock"] = s
-
 # Enrich Banks geography
 def bank_row_to_latlon(row: pd.Series) -> Optional[Tuple[float,float,str]]:
     if "lat" in row and "lon" in row:
@@ -1921,7 +1859,8 @@ def enrich_banks_geography(banks_df: pd.DataFrame, force_refresh: bool = False)
         if updated:
             st.sidebar.success(f"Updated {updated} bank(s) with LPA/NCA")
     
-    enriched_df = pd.DataFrame(rows)
+    # Rows come back as object Series; keep the typed (categorical/float) columns
+    enriched_df = pd.DataFrame(rows, columns=df.columns).astype(df.dtypes.to_dict())
     
     # Store in cache with timestamp
     try:
@@ -1936,6 +1875,19 @@ def enrich_banks_geography(banks_df: pd.DataFrame, force_refresh: bool = False)
 backend["Banks"] = enrich_banks_geography(backend["Banks"], force_refresh=False)
 backend["Banks"] = make_bank_key_col(backend["Banks"], backend["Banks"])
 
+# Seed bank watercourse catchments from the precomputed BankCatchments table
+# so watercourse SRM doesn't depend on per-bank WFS calls
+_bank_catchments = backend.get("BankCatchments")
+if _bank_catchments is not None and not _bank_catchments.empty:
+    _bank_keys = dict(zip(backend["Banks"]["bank_id"].map(sstr), backend["Banks"]["BANK_KEY"].map(sstr)))
+    for _r in _bank_catchments.to_dict("records"):
+        _bkey = _bank_keys.get(sstr(_r.get("bank_id")))
+        if _bkey and _bkey not in st.session_state["bank_watercourse_catchments"]:
+            st.session_state["bank_watercourse_catchments"][_bkey] = {
+                "waterbody": sstr(_r.get("waterbody")),
+                "operational_catchment": sstr(_r.get("operational_catchment")),
+            }
+
 # Validate minimal columns
 for sheet, cols in {
     "Pricing": ["bank_id","habitat_name","contract_size","tier"],
@@ -1949,21 +1901,13 @@ for sheet, cols in {
 
 # Normalise Pricing; drop Hedgerow
 def normalise_pricing(pr_df: pd.DataFrame) -> pd.DataFrame:
-    df = pr_df.copy()
-    price_cols = [c for c in df.columns if c.strip().lower() in ("price","unit price","unit_price","unitprice")]
-    if not price_cols:
-        st.error("Pricing sheet must contain a 'Price' column (or 'Unit Price').")
-        st.stop()
-    df["price"] = pd.to_numeric(df[price_cols[0]], errors="coerce")
-    df["tier"] = df["tier"].astype(str).str.strip().str.lower()
-    df["contract_size"] = df["contract_size"].astype(str).str.strip().str.lower()
-    df["bank_id"] = df["bank_id"].astype(str).str.strip()
-    df = make_bank_key_col(df, backend["Banks"])
-    if "broader_type" not in df.columns: df["broader_type"] = ""
-    if "distinctiveness_name" not in df.columns: df["distinctiveness_name"] = ""
-    df["habitat_name"] = df["habitat_name"].astype(str).str.strip()
+    # Keys stay categorical (typed and lower-cased by reference_schema on load)
     # NOTE: Do NOT filter out hedgerows here! They need to be available for hedgerow optimization
-    return df
+    try:
+        return optimizer_core_normalise_pricing(pr_df, backend["Banks"])
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
 
 # NOTE: Do NOT filter hedgerows from backend globally - they're needed for hedgerow optimization
 backend["Pricing"] = normalise_pricing(backend["Pricing"])
@@ -2176,26 +2120,23 @@ with st.container():
 
 def find_site(postcode: str, address: str):
     if sstr(postcode):
-        lat, lon, _ = get_postcode_info(postcode)
+        site = resolve_site_sync(postcode, catchment_index=repo.get_catchment_index())
     elif sstr(address):
         lat, lon = geocode_address(address)
+        site = resolve_site_sync((lat, lon), catchment_index=repo.get_catchment_index())
     else:
         raise RuntimeError("Enter a postcode or an address.")
-    lpa_feat = arcgis_point_query(LPA_URL, lat, lon, "LAD24NM")
-    nca_feat = arcgis_point_query(NCA_URL, lat, lon, "NCA_Name")
-    t_lpa = sstr((lpa_feat.get("attributes") or {}).get("LAD24NM"))
-    t_nca = sstr((nca_feat.get("attributes") or {}).get("NCA_Name"))
-    lpa_geom_esri = lpa_feat.get("geometry")
-    nca_geom_esri = nca_feat.get("geometry")
-    lpa_gj = esri_polygon_to_geojson(lpa_geom_esri)
-    nca_gj = esri_polygon_to_geojson(nca_geom_esri)
-    lpa_nei = [n for n in layer_intersect_names(LPA_URL, lpa_geom_esri, "LAD24NM") if n != t_lpa]
-    nca_nei = [n for n in layer_intersect_names(NCA_URL, nca_geom_esri, "NCA_Name") if n != t_nca]
-    lpa_nei_norm = [norm_name(n) for n in lpa_nei]
-    nca_nei_norm = [norm_name(n) for n in nca_nei]
-    
-    # Get watercourse catchments for site
-    waterbody, operational = get_watercourse_catchments_for_point(lat, lon)
+    if not site.lpa_name and not site.nca_name and site.errors:
+        raise RuntimeError("; ".join(site.errors))
+    lat, lon = site.lat, site.lon
+    t_lpa, t_nca = site.lpa_name, site.nca_name
+    lpa_gj = site.lpa_geojson
+    nca_gj = site.nca_geojson
+    lpa_nei = site.lpa_neighbors
+    nca_nei = site.nca_neighbors
+    lpa_nei_norm = site.lpa_neighbors_norm
+    nca_nei_norm = site.nca_neighbors_norm
+    waterbody, operational = site.waterbody, site.operational_catchment
     
     # Update session state - FIXED VERSION
     st.session_state["target_lpa_name"] = t_lpa
@@ -2298,8 +2239,9 @@ st.markdown("---")
 def build_base_map():
     lat = st.session_state.get("target_lat", None)
     lon = st.session_state.get("target_lon", None)
-    lpa_gj = st.session_state.get("lpa_geojson", None)
-    nca_gj = st.session_state.get("nca_geojson", None)
+    # Full-resolution boundaries stay in session state; the map gets simplified copies
+    lpa_gj = simplify_for_map(st.session_state.get("lpa_geojson", None), zoom=10)
+    nca_gj = simplify_for_map(st.session_state.get("nca_geojson", None), zoom=10)
     t_lpa = st.session_state.get("target_lpa_name", "")
     t_nca = st.session_state.get("target_nca_name", "")
 
@@ -2393,7 +2335,7 @@ def build_results_map(alloc_df: pd.DataFrame):
             # First add the LPA
             if bgeo.get("lpa_gj"):
                 folium.GeoJson(
-                    bgeo["lpa_gj"],
+                    simplify_for_map(bgeo["lpa_gj"], zoom=10),
                     name=f"🏢 {bank_display_name} - Catchment Area",
                     style_function=lambda x: {
                         "fillColor": "green", 
@@ -2409,7 +2351,7 @@ def build_results_map(alloc_df: pd.DataFrame):
             # Then add the NCA with same styling to create unified appearance
             if bgeo.get("nca_gj"):
                 folium.GeoJson(
-                    bgeo["nca_gj"],
+                    simplify_for_map(bgeo["nca_gj"], zoom=10),
                     name=f"🌿 {bank_display_name} - Extended Catchment",
                     style_function=lambda x: {
                         "fillColor": "green", 
@@ -3729,8 +3671,15 @@ def prepare_watercourse_options(demand_df: pd.DataFrame,
 def optimise(demand_df: pd.DataFrame,
              target_lpa: str, target_nca: str,
              lpa_neigh: List[str], nca_neigh: List[str],
-             lpa_neigh_norm: List[str], nca_neigh_norm: List[str]
+             lpa_neigh_norm: List[str], nca_neigh_norm: List[str],
+             far_bank_k: Optional[int] = None,
+             prove_shortlist: Optional[bool] = None
              ) -> Tuple[pd.DataFrame, float, str]:
+    if far_bank_k is None:
+        far_bank_k = far_bank_k_from_env()
+    if prove_shortlist is None:
+        prove_shortlist = prove_shortlist_from_env()
+
     # Pick contract size from total demand (unchanged)
     chosen_size = select_size_for_demand(demand_df, backend["Pricing"])
 
@@ -3769,6 +3718,11 @@ def optimise(demand_df: pd.DataFrame,
     stock_bankkey.update(bk_hedge)
     stock_bankkey.update(bk_water)
 
+    # Keep local/adjacent options plus the nearest and cheapest far banks per demand
+    shortlist = shortlist_options(options, far_bank_k, BankLocator.from_banks(backend["Banks"]),
+                                  st.session_state.get("target_lat"), st.session_state.get("target_lon"))
+    options = shortlist.options
+
     if not options:
         raise RuntimeError("No feasible options. Check prices/stock/rules or location tiers.")
 
@@ -3864,9 +3818,23 @@ def optimise(demand_df: pd.DataFrame,
         probA.solve(pulp.PULP_CBC_CMD(msg=False))
         statusA = pulp.LpStatus[probA.status]
         if statusA not in ("Optimal", "Feasible"):
+            if shortlist.is_pruned:
+                # Shortlisted banks lack the capacity - retry with every bank
+                return optimise(demand_df, target_lpa, target_nca, lpa_neigh, nca_neigh,
+                                lpa_neigh_norm, nca_neigh_norm, far_bank_k=0, prove_shortlist=False)
             raise RuntimeError("Optimiser infeasible.")
         best_cost = pulp.value(pulp.lpSum([options[i]["unit_price"] * xA[i] for i in range(len(options))])) or 0.0
 
+        # Stage B accepts solutions up to best_cost + tight_threshold (see below)
+        tight_threshold = min(10.0, best_cost * 0.0001)  # £10 or 0.01% of cost
+
+        # Prove against that band: an excluded bank inside it could still win stage B on bank count
+        if prove_shortlist and shortlist.is_pruned and \
+                not shortlist_is_proven(shortlist, dem_need, best_cost, tol=tight_threshold + 1e-6):
+            # An excluded far bank might beat this - solve the full option set instead
+            return optimise(demand_df, target_lpa, target_nca, lpa_neigh, nca_neigh,
+                            lpa_neigh_norm, nca_neigh_norm, far_bank_k=0, prove_shortlist=False)
+
         def enforce_minimum_delivery(alloc_df):
             """
             Ensure total units_supplied >= 0.01 by padding the cheapest habitat.
@@ -3926,7 +3894,6 @@ def optimise(demand_df: pd.DataFrame,
         # Stage B: minimise #banks, but only if cost stays within numerical precision of Stage A
         # Use a very tight threshold (£10 or 0.01%, whichever is smaller) to ensure we prioritize
         # "always select cheapest" over bank minimization
-        tight_threshold = min(10.0, best_cost * 0.0001)  # £10 or 0.01% of cost
         probB, xB, zB, yB = build_problem(minimise_banks=True, cost_cap=best_cost + tight_threshold)
         probB.solve(pulp.PULP_CBC_CMD(msg=False))
         statusB = pulp.LpStatus[probB.status]
@@ -4120,6 +4087,9 @@ with st.expander("🔎 Diagnostics", expanded=False):
             st.write("**Stock sanity**")
             st.write(f"Non-zero stock rows: **{(s['quantity_available']>0).sum()}** | "
                      f"Total available units: **{s['quantity_available'].sum():.2f}**")
+            quotes_fallback = repo.quotes_policy_fallback()
+            if quotes_fallback:
+                st.warning(f"Quotes policy '{quotes_hold_policy}' not applied: {quotes_fallback}")
 
             options_preview, _, _ = prepare_options(
                 dd, chosen_size_d,
@@ -4477,12 +4447,13 @@ if run:
                             "nca_name": b_nca_name, "nca_gj": b_nca_gj,
                         }
                         
-                        # Also fetch watercourse catchments for this bank
-                        b_waterbody, b_operational = get_watercourse_catchments_for_point(lat_b, lon_b)
-                        st.session_state["bank_watercourse_catchments"][cache_key] = {
-                            "waterbody": b_waterbody,
-                            "operational_catchment": b_operational,
-                        }
+                        # Also fetch watercourse catchments for this bank (unless precomputed)
+                        if cache_key not in st.session_state["bank_watercourse_catchments"]:
+                            b_waterbody, b_operational = get_watercourse_catchments_for_point(lat_b, lon_b)
+                            st.session_state["bank_watercourse_catchments"][cache_key] = {
+                                "waterbody": b_waterbody,
+                                "operational_catchment": b_operational,
+                            }
                         
                         catchments_loaded.append(cache_key)
                         
@@ -4502,6 +4473,7 @@ if run:
         alloc_df_with_ids["_row_id"] = range(len(alloc_df_with_ids))
         st.session_state["last_alloc_df"] = alloc_df_with_ids
         st.session_state["optimization_complete"] = True
+        st.session_state.pop("provisional_ref_number", None)
         
         # Show what we loaded
         if catchments_loaded:
@@ -6176,20 +6148,11 @@ if has_optimizer_results or has_manual_entries:
             st.session_state.email_location = form_location
             st.success("Email details updated!")
             
-            # Auto-generate reference number from database
-            auto_ref_number = None
-            try:
-                auto_ref_number = db.get_next_bng_reference("BNG-A-")
-            except Exception as e:
-                st.error(f"❌ Failed to generate reference number: {e}")
-            
             # Save to database after updating email details
             if not db:
                 st.error("❌ Database is not available.")
             elif not form_client_name or form_client_name == "INSERT NAME":
                 st.warning("⚠️ Please enter a valid client name before saving.")
-            elif not auto_ref_number:
-                st.error("⚠️ Failed to generate reference number.")
             elif not form_location or form_location == "INSERT LOCATION":
                 st.warning("⚠️ Please enter a valid location before saving.")
             elif session_alloc_df.empty:
@@ -6234,6 +6197,13 @@ if has_optimizer_results or has_manual_entries:
                     # Calculate admin fee based on contract size
                     admin_fee_for_quote = get_admin_fee_for_contract_size(contract_size_val)
                     
+                    # Take the reference number only once the quote is being saved,
+                    # so rejected forms don't use numbers up
+                    try:
+                        auto_ref_number = db.get_next_bng_reference("BNG-A-")
+                    except Exception as e:
+                        raise RuntimeError(f"Failed to generate reference number: {e}") from e
+                    
                     submission_id = db.store_submission(
                         client_name=form_client_name,
                         reference_number=auto_ref_number,
@@ -6276,8 +6246,17 @@ if has_optimizer_results or has_manual_entries:
         
         # Use the session state values for generating the report
         client_name = st.session_state.email_client_name
-        # Get reference number from session state if it exists, otherwise show placeholder
-        ref_number = st.session_state.get("email_ref_number", "Will be auto-generated on save")
+        # Saved quotes show their reference; until then preview the next one (not reserved),
+        # looked up once per result set rather than on every rerun
+        ref_number = st.session_state.get("email_ref_number")
+        if not ref_number:
+            if not st.session_state.get("provisional_ref_number"):
+                try:
+                    st.session_state["provisional_ref_number"] = \
+                        f"{db.get_next_bng_reference('BNG-A-', reserve=False)} (provisional)"
+                except Exception:
+                    st.session_state["provisional_ref_number"] = "Will be auto-generated on save"
+            ref_number = st.session_state["provisional_ref_number"]
         location = st.session_state.email_location    
         
         # Calculate admin fee based on contract size
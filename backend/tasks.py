@@ -86,20 +86,23 @@ def run_optimization(params: Dict[str, Any]) -> Dict[str, Any]:
         }
 
 
-def load_backend_data() -> Dict[str, pd.DataFrame]:
+def load_backend_data(quotes_hold_policy: str = "Ignore quotes (default)") -> Dict[str, pd.DataFrame]:
     """
     Load backend reference data from database
     
-    This function should be cached and reused across multiple job executions
-    to avoid repeated database queries.
+    Tables are cached once per worker process by repo (TTL from
+    BNG_REFERENCE_CACHE_TTL_SECONDS), so consecutive jobs reuse them instead
+    of re-querying. Connection string comes from DATABASE_URL.
+    
+    Args:
+        quotes_hold_policy: Stock policy from the job params; Stock holds
+            only the available rows under it (computed in the database)
     
     Returns:
         Dictionary of DataFrames with reference data
     """
-    # TODO: Implement database loading
-    # This should use the same database connection as the main app
-    # but be worker-safe (no session state dependencies)
-    pass
+    from optimizer_core import load_backend
+    return load_backend(quotes_hold_policy)
 
 
 def validate_demand(demand_df: pd.DataFrame, catalog_df: pd.DataFrame) -> bool:
@@ -5,13 +5,17 @@ Processes optimization tasks from the Redis queue
 
 import os
 import redis
-from rq import Worker, Queue
+from rq import Worker, SimpleWorker, Queue
 
 # Redis connection configuration
 REDIS_HOST = os.getenv("REDIS_HOST", "redis")
 REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 REDIS_DB = int(os.getenv("REDIS_DB", "0"))
 
+# Run jobs in the worker process so the reference-data cache survives between
+# jobs. Set RQ_FORK_PER_JOB=1 to go back to a forked child per job.
+FORK_PER_JOB = os.getenv("RQ_FORK_PER_JOB", "0").strip().lower() in ("1", "true", "yes")
+
 def main():
     """Start the RQ worker"""
     redis_conn = redis.Redis(
@@ -29,8 +33,17 @@ def main():
         print(f"✗ Failed to connect to Redis: {e}")
         return
     
+    # Warm the reference-data cache once per process (forked jobs inherit it)
+    try:
+        from tasks import load_backend_data
+        backend = load_backend_data()
+        print(f"✓ Loaded {len(backend)} reference tables")
+    except Exception as e:
+        print(f"⚠️  Reference tables not preloaded (jobs will load on demand): {e}")
+    
     # Create worker for the 'jobs' queue
-    worker = Worker(['jobs'], connection=redis_conn)
+    worker_class = Worker if FORK_PER_JOB else SimpleWorker
+    worker = worker_class(['jobs'], connection=redis_conn)
     print(f"✓ Worker started, listening on queue 'jobs'")
     print("Waiting for jobs...")
     worker.work()
@@ -0,0 +1,235 @@
+"""
+bank_shortlist.py - Spatial shortlist of far-tier banks (NO Streamlit)
+
+Every quote used to generate options against every bank, so the MILP grew with
+the bank network even though a bank hundreds of miles away only ever appears
+as a "far" tier option. The shortlist keeps every local/adjacent option and,
+per demand row, the far options of the K nearest (great-circle distance via a
+KD-tree over bank lat/lon) and K cheapest far banks.
+
+The solver picks exactly one option per demand row, so after solving the
+shortlisted problem a lower bound on any solution that uses an excluded option
+is cheap to compute. If that bound is above the incumbent cost plus stage B's
+cost band, no excluded bank could have beaten or tied it (see
+lower_bound_with_excluded); a near tie is not enough, as stage B could then
+prefer fewer banks that include one.
+
+Configuration (environment variables):
+    BNG_FAR_BANK_SHORTLIST_K   far banks kept per demand by distance and by price
+                               (default 3; 0 disables the shortlist)
+    BNG_PROVE_BANK_SHORTLIST   set to 0 to skip the full re-solve when the
+                               bound cannot prove the shortlist optimal
+"""
+
+import math
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_KM = 6371.0088
+DEFAULT_FAR_BANK_K = 3
+
+
+def far_bank_k_from_env() -> int:
+    try:
+        return max(0, int(os.getenv("BNG_FAR_BANK_SHORTLIST_K", DEFAULT_FAR_BANK_K)))
+    except ValueError:
+        return DEFAULT_FAR_BANK_K
+
+
+def prove_shortlist_from_env() -> bool:
+    return os.getenv("BNG_PROVE_BANK_SHORTLIST", "1").strip().lower() not in ("0", "false", "no")
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _unit_vectors(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Points on the unit sphere; chord length is monotone in haversine distance"""
+    la, lo = np.radians(lat), np.radians(lon)
+    return np.column_stack([np.cos(la) * np.cos(lo), np.cos(la) * np.sin(lo), np.sin(la)])
+
+
+def _chord_to_km(chord: float) -> float:
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+class BankLocator:
+    """KD-tree over bank locations for nearest-bank queries"""
+
+    def __init__(self, keys: List[str], lats: Iterable[float], lons: Iterable[float]):
+        self.keys = list(keys)
+        self.lats = np.asarray(list(lats), dtype=float)
+        self.lons = np.asarray(list(lons), dtype=float)
+        self._pts = _unit_vectors(self.lats, self.lons) if self.keys else np.empty((0, 3))
+        # Nodes: (index, axis, left, right) with children as node ids (-1 = none)
+        self._nodes: List[Tuple[int, int, int, int]] = []
+        self._root = self._build(np.arange(len(self.keys)), 0)
+
+    @classmethod
+    def from_banks(cls, banks_df: pd.DataFrame) -> "BankLocator":
+        """Build from a Banks table; rows without numeric lat/lon are skipped"""
+        keys, lats, lons = [], [], []
+        if banks_df is not None and not banks_df.empty and {"lat", "lon"} <= set(banks_df.columns):
+            for _, b in banks_df.iterrows():
+                try:
+                    lat, lon = float(b.get("lat")), float(b.get("lon"))
+                except (TypeError, ValueError):
+                    continue
+                if not (np.isfinite(lat) and np.isfinite(lon)):
+                    continue
+                key = str(b.get("BANK_KEY") or b.get("bank_name") or b.get("bank_id") or "").strip()
+                if key:
+                    keys.append(key)
+                    lats.append(lat)
+                    lons.append(lon)
+        return cls(keys, lats, lons)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _build(self, idx: np.ndarray, depth: int) -> int:
+        if len(idx) == 0:
+            return -1
+        axis = depth % 3
+        order = idx[np.argsort(self._pts[idx, axis], kind="stable")]
+        mid = len(order) // 2
+        node_id = len(self._nodes)
+        self._nodes.append((int(order[mid]), axis, -1, -1))
+        left = self._build(order[:mid], depth + 1)
+        right = self._build(order[mid + 1:], depth + 1)
+        self._nodes[node_id] = (int(order[mid]), axis, left, right)
+        return node_id
+
+    def nearest(self, lat: float, lon: float, k: Optional[int] = None) -> List[Tuple[str, float]]:
+        """(bank_key, distance_km) for the k nearest banks, closest first (all if k is None)"""
+        if not self.keys:
+            return []
+        k = len(self.keys) if k is None else max(0, min(k, len(self.keys)))
+        if k == 0:
+            return []
+        q = _unit_vectors(np.array([lat]), np.array([lon]))[0]
+        best: List[Tuple[float, int]] = []  # sorted (chord, index), at most k
+
+        stack = [self._root]
+        while stack:
+            node_id = stack.pop()
+            if node_id < 0:
+                continue
+            i, axis, left, right = self._nodes[node_id]
+            d = float(np.linalg.norm(self._pts[i] - q))
+            if len(best) < k or d < best[-1][0]:
+                best.append((d, i))
+                best.sort()
+                del best[k:]
+            diff = q[axis] - self._pts[i][axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            # Visit the far side only if the splitting plane is within the current k-th distance
+            if len(best) < k or abs(diff) < best[-1][0]:
+                stack.append(far)
+            stack.append(near)
+        return [(self.keys[i], _chord_to_km(d)) for d, i in best]
+
+    def distances_km(self, lat: float, lon: float) -> Dict[str, float]:
+        return dict(self.nearest(lat, lon))
+
+
+@dataclass
+class Shortlist:
+    options: List[dict]
+    excluded: List[dict] = field(default_factory=list)
+    kept_far_banks: Dict[int, List[str]] = field(default_factory=dict)
+
+    @property
+    def is_pruned(self) -> bool:
+        return bool(self.excluded)
+
+    def summary(self) -> str:
+        banks_excluded = {o.get("BANK_KEY", "") for o in self.excluded} - {o.get("BANK_KEY", "") for o in self.options}
+        return (f"Bank shortlist: kept {len(self.options)} options, excluded {len(self.excluded)} far-tier "
+                f"options ({len(banks_excluded)} banks dropped entirely)")
+
+
+def shortlist_options(options: List[dict], k: int,
+                      locator: Optional[BankLocator] = None,
+                      site_lat: Optional[float] = None,
+                      site_lon: Optional[float] = None) -> Shortlist:
+    """
+    Keep all local/adjacent options plus, per demand row, the far options of
+    the k nearest far banks and the k cheapest far banks.
+
+    Without site coordinates (or a locator) only the price criterion applies.
+    k <= 0 returns the options unchanged.
+    """
+    if k <= 0 or not options:
+        return Shortlist(options=list(options))
+
+    distances: Dict[str, float] = {}
+    if locator is not None and len(locator) and site_lat is not None and site_lon is not None:
+        distances = locator.distances_km(float(site_lat), float(site_lon))
+
+    far_by_demand: Dict[int, Dict[str, float]] = {}
+    for opt in options:
+        if opt.get("tier") == "far":
+            banks = far_by_demand.setdefault(opt["demand_idx"], {})
+            bkey = opt.get("BANK_KEY", "")
+            banks[bkey] = min(banks.get(bkey, math.inf), float(opt["unit_price"]))
+
+    kept: Dict[int, List[str]] = {}
+    for di, banks in far_by_demand.items():
+        cheapest = sorted(banks, key=lambda b: (banks[b], b))[:k]
+        nearest = sorted((b for b in banks if b in distances), key=lambda b: (distances[b], b))[:k]
+        kept[di] = list(dict.fromkeys(cheapest + nearest))
+
+    result = Shortlist(options=[], kept_far_banks=kept)
+    for opt in options:
+        if opt.get("tier") != "far" or opt.get("BANK_KEY", "") in kept.get(opt["demand_idx"], ()):
+            result.options.append(opt)
+        else:
+            result.excluded.append(opt)
+    return result
+
+
+def lower_bound_with_excluded(shortlist: Shortlist, dem_need: Dict[int, float]) -> float:
+    """
+    Lower bound on the cost of any solution that uses at least one excluded option.
+
+    Each demand row takes exactly one option and pays need * unit_price for it,
+    so dropping stock caps and the bank limit, the cheapest such solution uses
+    the cheapest excluded option on one row and the cheapest option overall on
+    every other row. Returns inf when nothing was excluded.
+    """
+    if not shortlist.excluded:
+        return math.inf
+    min_all: Dict[int, float] = {}
+    min_excluded: Dict[int, float] = {}
+    for opt in shortlist.options:
+        di = opt["demand_idx"]
+        min_all[di] = min(min_all.get(di, math.inf), float(opt["unit_price"]))
+    for opt in shortlist.excluded:
+        di = opt["demand_idx"]
+        price = float(opt["unit_price"])
+        min_all[di] = min(min_all.get(di, math.inf), price)
+        min_excluded[di] = min(min_excluded.get(di, math.inf), price)
+
+    base = sum(dem_need.get(di, 0.0) * p for di, p in min_all.items())
+    return min(base + dem_need.get(di, 0.0) * (p - min_all[di]) for di, p in min_excluded.items())
+
+
+def shortlist_is_proven(shortlist: Shortlist, dem_need: Dict[int, float],
+                        incumbent_cost: float, tol: float = 1e-6) -> bool:
+    """
+    True if no excluded option could produce a solution within tol of the incumbent.
+
+    Ties count as unproven: stage B picks the fewest banks among every
+    solution up to incumbent_cost plus its tolerance band, which may include
+    an excluded bank, so callers pass that band as tol.
+    """
+    return lower_bound_with_excluded(shortlist, dem_need) > incumbent_cost + tol
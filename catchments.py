@@ -0,0 +1,224 @@
+"""
+catchments.py - Offline WFD catchment index (NO Streamlit)
+
+Point-in-polygon lookup of river waterbody and operational catchments from
+locally held polygons (the WaterCatchments reference table), replacing the
+per-point Environment Agency WFS calls used for watercourse SRM.
+
+Usage:
+    from catchments import CatchmentIndex
+
+    index = CatchmentIndex.from_frame(water_catchments_df)
+    waterbody, operational = index.catchments_for_point(51.06, -1.31)
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+CATCHMENT_TYPE_WATERBODY = "waterbody"
+CATCHMENT_TYPE_OPERATIONAL = "operational"
+
+# Columns of the WaterCatchments reference table
+WATER_CATCHMENT_COLUMNS = ["catchment_type", "catchment_name", "operational_catchment",
+                           "min_lon", "min_lat", "max_lon", "max_lat", "geometry"]
+
+# Columns of CatchmentIndex.to_index_frame() (the parsed index, as stored in snapshots)
+INDEX_FRAME_COLUMNS = ["catchment_type", "catchment_name", "operational_catchment",
+                       "min_lon", "min_lat", "max_lon", "max_lat", "ring_lengths", "coords"]
+
+
+def geometry_rings(geometry: Dict[str, Any]) -> List[np.ndarray]:
+    """
+    Flatten a GeoJSON Polygon/MultiPolygon (or ArcGIS rings) into a list of
+    (n, 2) lon/lat arrays. Holes are kept as ordinary rings: the even-odd
+    test in point_in_rings treats them correctly.
+    """
+    if not geometry:
+        return []
+    if "rings" in geometry:
+        polys = [geometry["rings"]]
+    elif geometry.get("type") == "Polygon":
+        polys = [geometry.get("coordinates") or []]
+    elif geometry.get("type") == "MultiPolygon":
+        polys = geometry.get("coordinates") or []
+    else:
+        return []
+    rings = []
+    for poly in polys:
+        for ring in poly:
+            arr = np.asarray(ring, dtype=float)
+            if arr.ndim == 2 and len(arr) >= 3:
+                rings.append(arr[:, :2])
+    return rings
+
+
+def point_in_rings(x: float, y: float, rings: List[np.ndarray]) -> bool:
+    """Even-odd ray casting over all rings of a feature"""
+    inside = False
+    for ring in rings:
+        xs, ys = ring[:, 0], ring[:, 1]
+        xs2, ys2 = np.roll(xs, -1), np.roll(ys, -1)
+        straddles = (ys > y) != (ys2 > y)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_cross = xs + (y - ys) * (xs2 - xs) / (ys2 - ys)
+        crossings = int(np.count_nonzero(straddles & (x < x_cross)))
+        if crossings % 2:
+            inside = not inside
+    return inside
+
+
+def feature_row(catchment_type: str, catchment_name: str, geometry: Dict[str, Any],
+                operational_catchment: str = "") -> Dict[str, Any]:
+    """Build one WaterCatchments table row (with bounding box) from a geometry"""
+    rings = geometry_rings(geometry)
+    if rings:
+        pts = np.vstack(rings)
+        min_lon, min_lat = pts.min(axis=0)
+        max_lon, max_lat = pts.max(axis=0)
+    else:
+        min_lon = min_lat = max_lon = max_lat = np.nan
+    return {
+        "catchment_type": catchment_type,
+        "catchment_name": catchment_name,
+        "operational_catchment": operational_catchment,
+        "min_lon": float(min_lon), "min_lat": float(min_lat),
+        "max_lon": float(max_lon), "max_lat": float(max_lat),
+        "geometry": json.dumps(geometry),
+    }
+
+
+class CatchmentIndex:
+    """Bounding-box prefiltered point-in-polygon index per catchment type"""
+
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self._layers: Dict[str, Dict[str, Any]] = {}
+        by_type: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_type.setdefault(str(row["catchment_type"]).strip().lower(), []).append(row)
+        for ctype, items in by_type.items():
+            geoms = []
+            for r in items:
+                g = r["geometry"]
+                geoms.append(geometry_rings(json.loads(g) if isinstance(g, str) else g))
+            bbox = np.array([[r["min_lon"], r["min_lat"], r["max_lon"], r["max_lat"]]
+                             for r in items], dtype=float)
+            area = (bbox[:, 2] - bbox[:, 0]) * (bbox[:, 3] - bbox[:, 1])
+            self._layers[ctype] = {
+                "names": [str(r["catchment_name"]) for r in items],
+                "parents": [str(r.get("operational_catchment") or "") for r in items],
+                "bbox": bbox,
+                "area": area,
+                "rings": geoms,
+            }
+
+    @classmethod
+    def from_frame(cls, df: Optional[pd.DataFrame]) -> "CatchmentIndex":
+        if df is None or df.empty:
+            return cls([])
+        return cls(df.to_dict("records"))
+
+    def to_index_frame(self) -> pd.DataFrame:
+        """
+        The parsed index as a flat table (one row per catchment, rings as
+        flattened lon/lat coordinates) for snapshots; from_index_frame
+        restores it without parsing any GeoJSON.
+        """
+        rows = []
+        for ctype, layer in self._layers.items():
+            for i, name in enumerate(layer["names"]):
+                rings = layer["rings"][i]
+                rows.append({
+                    "catchment_type": ctype,
+                    "catchment_name": name,
+                    "operational_catchment": layer["parents"][i],
+                    "min_lon": layer["bbox"][i, 0], "min_lat": layer["bbox"][i, 1],
+                    "max_lon": layer["bbox"][i, 2], "max_lat": layer["bbox"][i, 3],
+                    "ring_lengths": [len(ring) for ring in rings],
+                    "coords": np.concatenate(rings).ravel().tolist() if rings else [],
+                })
+        return pd.DataFrame(rows, columns=INDEX_FRAME_COLUMNS)
+
+    @classmethod
+    def from_index_frame(cls, df: Optional[pd.DataFrame]) -> "CatchmentIndex":
+        """Inverse of to_index_frame"""
+        index = cls([])
+        if df is None or df.empty:
+            return index
+        for ctype, items in df.groupby("catchment_type", sort=False):
+            bbox = items[["min_lon", "min_lat", "max_lon", "max_lat"]].to_numpy(dtype=float)
+            rings = []
+            for lengths, coords in zip(items["ring_lengths"], items["coords"]):
+                points = np.asarray(coords, dtype=float).reshape(-1, 2)
+                bounds = np.cumsum(np.asarray(lengths, dtype=int))[:-1]
+                rings.append(np.split(points, bounds) if len(points) else [])
+            index._layers[str(ctype)] = {
+                "names": [str(n) for n in items["catchment_name"]],
+                "parents": [str(p or "") for p in items["operational_catchment"]],
+                "bbox": bbox,
+                "area": (bbox[:, 2] - bbox[:, 0]) * (bbox[:, 3] - bbox[:, 1]),
+                "rings": rings,
+            }
+        return index
+
+    @property
+    def is_empty(self) -> bool:
+        return not self._layers
+
+    def __len__(self) -> int:
+        return sum(len(layer["names"]) for layer in self._layers.values())
+
+    def _locate(self, lat: float, lon: float, catchment_type: str) -> Optional[int]:
+        layer = self._layers.get(catchment_type)
+        if layer is None:
+            return None
+        bbox = layer["bbox"]
+        hits = np.flatnonzero((bbox[:, 0] <= lon) & (lon <= bbox[:, 2]) &
+                              (bbox[:, 1] <= lat) & (lat <= bbox[:, 3]))
+        # Smallest bounding box first - usually the right polygon on the first test
+        for i in hits[np.argsort(layer["area"][hits], kind="stable")]:
+            if point_in_rings(lon, lat, layer["rings"][i]):
+                return int(i)
+        return None
+
+    def lookup(self, lat: float, lon: float, catchment_type: str) -> str:
+        """Name of the catchment of the given type containing the point, or ''"""
+        i = self._locate(lat, lon, catchment_type)
+        return "" if i is None else self._layers[catchment_type]["names"][i]
+
+    def catchments_for_point(self, lat: float, lon: float) -> Tuple[str, str]:
+        """
+        Same contract as optimizer_core.get_watercourse_catchments_for_point:
+        returns (waterbody_name, operational_catchment_name).
+        """
+        waterbody = ""
+        operational = ""
+        i = self._locate(lat, lon, CATCHMENT_TYPE_WATERBODY)
+        if i is not None:
+            layer = self._layers[CATCHMENT_TYPE_WATERBODY]
+            waterbody = layer["names"][i]
+            operational = layer["parents"][i]
+        if not operational:
+            operational = self.lookup(lat, lon, CATCHMENT_TYPE_OPERATIONAL)
+        return waterbody, operational
+
+
+def build_bank_catchments(banks_df: pd.DataFrame, index: CatchmentIndex) -> pd.DataFrame:
+    """
+    Precompute the BankCatchments table (bank_id, waterbody, operational_catchment)
+    from bank lat/lon. Banks without usable coordinates are skipped.
+    """
+    rows = []
+    if banks_df is None or banks_df.empty or not {"lat", "lon"}.issubset(banks_df.columns):
+        return pd.DataFrame(columns=["bank_id", "waterbody", "operational_catchment"])
+    lats = pd.to_numeric(banks_df["lat"], errors="coerce")
+    lons = pd.to_numeric(banks_df["lon"], errors="coerce")
+    for bank_id, lat, lon in zip(banks_df["bank_id"], lats, lons):
+        if not (np.isfinite(lat) and np.isfinite(lon)):
+            continue
+        waterbody, operational = index.catchments_for_point(float(lat), float(lon))
+        rows.append({"bank_id": str(bank_id).strip(), "waterbody": waterbody,
+                     "operational_catchment": operational})
+    return pd.DataFrame(rows, columns=["bank_id", "waterbody", "operational_catchment"])
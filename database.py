@@ -6,6 +6,7 @@ Uses PostgreSQL via SQLAlchemy for persistent storage of all form submissions an
 import json
 import hashlib
 import secrets
+import time
 from datetime import datetime
 from typing import Dict, List, Optional, Any, Union, Tuple
 from decimal import Decimal
@@ -105,9 +106,111 @@ def sanitize_for_db(value: Any) -> Any:
     return value
 
 
+ALLOCATION_DETAIL_COLUMNS = [
+    "submission_id", "bank_key", "bank_name",
+    "demand_habitat", "supply_habitat", "allocation_type",
+    "tier", "units_supplied", "unit_price", "cost",
+]
+
+# Grouping keys for get_allocation_summary -> allocation_details column
+ALLOCATION_SUMMARY_GROUPS = {
+    "bank": "bank_key",
+    "habitat": "supply_habitat",
+    "tier": "tier",
+}
+
+# allocation_df column -> allocation_details column
+ALLOCATION_TEXT_SOURCES = {
+    "bank_key": "BANK_KEY",
+    "bank_name": "bank_name",
+    "demand_habitat": "demand_habitat",
+    "supply_habitat": "supply_habitat",
+    "allocation_type": "allocation_type",
+    "tier": "proximity",
+}
+ALLOCATION_NUMERIC_COLUMNS = ["units_supplied", "unit_price", "cost"]
+
+# Columns for submission lists (no JSONB payloads; fetch those per submission
+# with get_submission_by_id)
+SUBMISSION_SUMMARY_COLUMNS = [
+    "id", "submission_date", "client_name", "reference_number", "site_location",
+    "target_lpa", "target_nca", "contract_size", "total_cost", "admin_fee", "total_with_admin",
+    "num_banks_selected", "username", "promoter_name", "submitted_by_username", "customer_id",
+]
+
+# Advisory lock key serialising schema migrations across processes
+SCHEMA_LOCK_KEY = 0x424E4753  # "BNGS"
+
+# Reference numbers: prefix, number, optional revision ("BNG-A-02025.3")
+REFERENCE_PATTERN = r"^(\D*)(\d{1,15})(?:\.(\d{1,9}))?$"
+FIRST_REFERENCE_NUMBER = 2025
+
+# Text columns covered by search_submissions (each gets a trigram index)
+SUBMISSION_SEARCH_COLUMNS = ["client_name", "reference_number", "site_location", "target_lpa", "target_nca"]
+
+# Rows per INSERT statement (10 parameters per row, well under Postgres' 65535)
+ALLOCATION_INSERT_CHUNK = 1000
+
+
+def allocation_detail_rows(allocation_df: pd.DataFrame, submission_id: int) -> List[Dict[str, Any]]:
+    """
+    allocation_details rows for a submission, converted column-wise.
+    
+    Text columns are str() of the value ("" if the column is missing);
+    numeric columns are floats with missing/NaN/inf stored as 0.0.
+    """
+    if allocation_df is None or allocation_df.empty:
+        return []
+    n = len(allocation_df)
+    columns = {"submission_id": [int(submission_id)] * n}
+    for target, source in ALLOCATION_TEXT_SOURCES.items():
+        if source in allocation_df.columns:
+            columns[target] = allocation_df[source].astype(object).map(str).tolist()
+        else:
+            columns[target] = [""] * n
+    for target in ALLOCATION_NUMERIC_COLUMNS:
+        if target in allocation_df.columns:
+            values = pd.to_numeric(allocation_df[target], errors="coerce").astype("float64")
+            columns[target] = values.replace([np.inf, -np.inf], np.nan).fillna(0.0).tolist()
+        else:
+            columns[target] = [0.0] * n
+    return [dict(zip(ALLOCATION_DETAIL_COLUMNS, values))
+            for values in zip(*(columns[c] for c in ALLOCATION_DETAIL_COLUMNS))]
+
+
+def allocation_detail_inserts(rows: List[Dict[str, Any]],
+                              chunk_size: int = ALLOCATION_INSERT_CHUNK) -> List[Tuple[Any, Dict[str, Any]]]:
+    """Multi-row INSERT statements (with parameters) for allocation_details rows"""
+    statements = []
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        params, values = {}, []
+        for i, row in enumerate(chunk):
+            values.append("(" + ", ".join(f":{c}_{i}" for c in ALLOCATION_DETAIL_COLUMNS) + ")")
+            params.update({f"{c}_{i}": row[c] for c in ALLOCATION_DETAIL_COLUMNS})
+        statements.append((text(
+            f"INSERT INTO allocation_details ({', '.join(ALLOCATION_DETAIL_COLUMNS)}) VALUES "
+            + ", ".join(values)
+        ), params))
+    return statements
+
+
 class SubmissionsDB:
     """Handle all database operations for submissions tracking."""
     
+    # Ordered schema migrations: (version, description, method taking a connection).
+    # Append new ones with the next version; never change one that has shipped.
+    MIGRATIONS = [
+        (1, "baseline schema", "_migrate_baseline"),
+        (2, "submission analytics rollups", "_migrate_submission_rollups"),
+        (3, "reference number counters", "_migrate_reference_counters"),
+        (4, "submission idempotency keys", "_migrate_submission_idempotency"),
+        (5, "allocation detail query indexes", "_migrate_allocation_indexes"),
+    ]
+    
+    # Set once this process has seen an up-to-date schema
+    _schema_ready = False
+    
     def __init__(self, db_path: str = "submissions.db"):
         """
         Initialize database connection and create tables if needed.
@@ -117,6 +220,8 @@ class SubmissionsDB:
         """
         self.db_path = db_path  # Kept for backward compatibility
         self._conn = None
+        self.last_store_timing: Dict[str, float] = {}
+        self._trgm_available: Optional[bool] = None
         self._init_database()
     
     def _get_connection(self):
@@ -125,14 +230,60 @@ class SubmissionsDB:
         return DatabaseConnection.get_engine()
     
     def _init_database(self):
-        """Create tables if they don't exist (idempotent schema initialization)."""
-        engine = self._get_connection()
+        """
+        Bring the schema up to date.
         
-        # Use raw SQL for schema creation to ensure idempotency
-        # Each DDL operation in its own transaction to prevent cascading failures
+        Startup is one version query when nothing is pending (and nothing at
+        all once this process has checked). Pending MIGRATIONS are applied in
+        order, in one transaction holding an advisory lock, so concurrent app
+        starts don't run DDL twice or contend with each other.
+        """
+        if SubmissionsDB._schema_ready:
+            return
+        engine = self._get_connection()
+        latest = max(version for version, _, _ in self.MIGRATIONS)
+        if self._schema_version(engine) >= latest:
+            SubmissionsDB._schema_ready = True
+            return
         
-        # Main submissions table
+        # Transaction-scoped lock: safe behind transaction-mode poolers
         with engine.begin() as conn:
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+                )
+            """))
+            applied = {row[0] for row in conn.execute(text("SELECT version FROM schema_version"))}
+            for version, description, method in self.MIGRATIONS:
+                if version in applied:
+                    continue
+                getattr(self, method)(conn)
+                conn.execute(text(
+                    "INSERT INTO schema_version (version, description) VALUES (:version, :description)"
+                ), {"version": version, "description": description})
+        SubmissionsDB._schema_ready = True
+    
+    @staticmethod
+    def _schema_version(engine) -> int:
+        """Highest applied migration (0 if schema_version doesn't exist yet)"""
+        try:
+            with engine.connect() as conn:
+                version = conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+        except Exception:
+            return 0
+        return version if isinstance(version, int) else 0
+    
+    def _migrate_baseline(self, conn):
+        """
+        Version 1: the schema as created before schema_version existed.
+        Idempotent, so it also brings older databases up to this point.
+        Steps that may fail run in savepoints and are skipped.
+        """
+        # Main submissions table
+        with conn.begin_nested():
             conn.execute(text("""
                 CREATE TABLE IF NOT EXISTS submissions (
                     id SERIAL PRIMARY KEY,
@@ -188,11 +339,19 @@ class SubmissionsDB:
             """))
         
         # Create indexes for submissions table
-        with engine.begin() as conn:
+        with conn.begin_nested():
             conn.execute(text("""
                 CREATE INDEX IF NOT EXISTS idx_submissions_date 
                 ON submissions(submission_date DESC)
             """))
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_submissions_date_id 
+                ON submissions(submission_date DESC, id DESC)
+            """))
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_submissions_promoter_date 
+                ON submissions(promoter_name, submission_date DESC, id DESC)
+            """))
             conn.execute(text("""
                 CREATE INDEX IF NOT EXISTS idx_submissions_client 
                 ON submissions(client_name)
@@ -206,10 +365,23 @@ class SubmissionsDB:
                 ON submissions(target_nca)
             """))
         
+        # Trigram indexes so "contains"/fuzzy searches don't scan the table
+        # (skipped if pg_trgm can't be enabled; search_submissions falls back to ILIKE)
+        try:
+            with conn.begin_nested():
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                for column in SUBMISSION_SEARCH_COLUMNS:
+                    conn.execute(text(f"""
+                        CREATE INDEX IF NOT EXISTS idx_submissions_{column}_trgm
+                        ON submissions USING gin ({column} gin_trgm_ops)
+                    """))
+        except Exception:
+            pass
+        
         # Migrate submissions table to support 'no_discount' option
         # Drop and recreate the constraint if it exists with old values
         try:
-            with engine.begin() as conn:
+            with conn.begin_nested():
                 conn.execute(text("""
                     DO $$
                     BEGIN
@@ -236,7 +408,7 @@ class SubmissionsDB:
         
         # Add manual_area_habitat_entries column if it doesn't exist
         try:
-            with engine.begin() as conn:
+            with conn.begin_nested():
                 conn.execute(text("""
                     DO $$
                     BEGIN
@@ -255,7 +427,7 @@ class SubmissionsDB:
         
         # Add submitted_by_username column to track individual submitter (separate from promoter_name)
         try:
-            with engine.begin() as conn:
+            with conn.begin_nested():
                 conn.execute(text("""
                     DO $$
                     BEGIN
@@ -279,7 +451,7 @@ class SubmissionsDB:
         
         # Add contact_email and contact_number columns to submissions table
         try:
-            with engine.begin() as conn:
+            with conn.begin_nested():
                 conn.execute(text("""
                     DO $$
                     BEGIN
@@ -306,7 +478,7 @@ class SubmissionsDB:
         
         # Drop the old view if it exists (replaced with physical table)
         try:
-            with engine.begin() as conn:
+            with conn.begin_nested():
                 conn.execute(text("DROP VIEW IF EXISTS submissions_attio CASCADE;"))
         except Exception:
             pass
@@ -315,7 +487,7 @@ class SubmissionsDB:
         # Physical table is required for PostgreSQL logical replication (realtime sync)
         # Converts JSONB to TEXT and adjusts types to match Attio schema
         try:
-            with engine.begin() as conn:
+            with conn.begin_nested():
                 conn.execute(text("""
                     CREATE TABLE IF NOT EXISTS submissions_attio (
                         id INTEGER PRIMARY KEY,
@@ -348,7 +520,7 @@ class SubmissionsDB:
         
         # Add email and mobile_number columns to existing submissions_attio table if they don't exist
         try:
-            with engine.begin() as conn:
+            with conn.begin_nested():
                 conn.execute(text("""
                     DO $$
                     BEGIN
@@ -373,7 +545,7 @@ class SubmissionsDB:
         
         # Create trigger function to automatically sync submissions to submissions_attio
         try:
-            with engine.begin() as conn:
+            with conn.begin_nested():
                 conn.execute(text("""
                     CREATE OR REPLACE FUNCTION sync_to_attio() 
                     RETURNS TRIGGER AS $$
@@ -476,7 +648,7 @@ class SubmissionsDB:
         
         # Create trigger on submissions table to automatically sync to submissions_attio
         try:
-            with engine.begin() as conn:
+            with conn.begin_nested():
                 conn.execute(text("""
                     DROP TRIGGER IF EXISTS submissions_to_attio_trigger ON submissions;
                     CREATE TRIGGER submissions_to_attio_trigger
@@ -488,7 +660,7 @@ class SubmissionsDB:
         
         # Create trigger for delete operations
         try:
-            with engine.begin() as conn:
+            with conn.begin_nested():
                 conn.execute(text("""
                     CREATE OR REPLACE FUNCTION delete_from_attio() 
                     RETURNS TRIGGER AS $$
@@ -508,7 +680,7 @@ class SubmissionsDB:
         
         # Backfill existing submissions into submissions_attio table
         try:
-            with engine.begin() as conn:
+            with conn.begin_nested():
                 conn.execute(text("""
                     INSERT INTO submissions_attio (
                         id, submission_date, client_name, email, mobile_number, reference_number,
@@ -560,7 +732,7 @@ class SubmissionsDB:
             pass
         
         # Allocations detail table (normalized)
-        with engine.begin() as conn:
+        with conn.begin_nested():
             conn.execute(text("""
                 CREATE TABLE IF NOT EXISTS allocation_details (
                     id SERIAL PRIMARY KEY,
@@ -798,8 +970,182 @@ class SubmissionsDB:
                     END IF;
                 END $$;
             """))
+
+    
+    def _migrate_submission_rollups(self, conn):
+        """
+        Version 2: rollup tables for the admin dashboard, kept current by a
+        trigger on submissions (inserts, requotes, edits and deletes alike)
+        and backfilled from existing rows.
+        """
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS submission_daily_stats (
+                day DATE NOT NULL,
+                target_lpa TEXT NOT NULL,
+                promoter_name TEXT NOT NULL,
+                contract_size TEXT NOT NULL,
+                submissions INTEGER NOT NULL DEFAULT 0,
+                revenue FLOAT NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, target_lpa, promoter_name, contract_size)
+            )
+        """))
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS submission_client_stats (
+                client_name TEXT PRIMARY KEY,
+                submissions INTEGER NOT NULL DEFAULT 0,
+                revenue FLOAT NOT NULL DEFAULT 0
+            )
+        """))
+        conn.execute(text("""
+            CREATE OR REPLACE FUNCTION rollup_submission_stats()
+            RETURNS TRIGGER AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    UPDATE submission_daily_stats
+                    SET submissions = submissions - 1,
+                        revenue = revenue - COALESCE(OLD.total_with_admin, 0)
+                    WHERE day = DATE(OLD.submission_date)
+                      AND target_lpa = COALESCE(OLD.target_lpa, '')
+                      AND promoter_name = COALESCE(OLD.promoter_name, '')
+                      AND contract_size = COALESCE(OLD.contract_size, '');
+                    UPDATE submission_client_stats
+                    SET submissions = submissions - 1,
+                        revenue = revenue - COALESCE(OLD.total_with_admin, 0)
+                    WHERE client_name = COALESCE(OLD.client_name, '');
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    INSERT INTO submission_daily_stats AS s
+                        (day, target_lpa, promoter_name, contract_size, submissions, revenue)
+                    VALUES (DATE(NEW.submission_date), COALESCE(NEW.target_lpa, ''),
+                            COALESCE(NEW.promoter_name, ''), COALESCE(NEW.contract_size, ''),
+                            1, COALESCE(NEW.total_with_admin, 0))
+                    ON CONFLICT (day, target_lpa, promoter_name, contract_size) DO UPDATE
+                    SET submissions = s.submissions + 1, revenue = s.revenue + EXCLUDED.revenue;
+                    INSERT INTO submission_client_stats AS s (client_name, submissions, revenue)
+                    VALUES (COALESCE(NEW.client_name, ''), 1, COALESCE(NEW.total_with_admin, 0))
+                    ON CONFLICT (client_name) DO UPDATE
+                    SET submissions = s.submissions + 1, revenue = s.revenue + EXCLUDED.revenue;
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+        """))
+        conn.execute(text("""
+            DROP TRIGGER IF EXISTS submissions_rollup_trigger ON submissions;
+            CREATE TRIGGER submissions_rollup_trigger
+            AFTER INSERT OR DELETE ON submissions
+            FOR EACH ROW EXECUTE FUNCTION rollup_submission_stats();
             
-            conn.commit()
+            DROP TRIGGER IF EXISTS submissions_rollup_update_trigger ON submissions;
+            CREATE TRIGGER submissions_rollup_update_trigger
+            AFTER UPDATE OF submission_date, target_lpa, promoter_name, contract_size,
+                            client_name, total_with_admin ON submissions
+            FOR EACH ROW EXECUTE FUNCTION rollup_submission_stats();
+        """))
+        # Backfill (the triggers' lock holds off concurrent inserts until commit)
+        conn.execute(text("DELETE FROM submission_daily_stats"))
+        conn.execute(text("DELETE FROM submission_client_stats"))
+        conn.execute(text("""
+            INSERT INTO submission_daily_stats
+                (day, target_lpa, promoter_name, contract_size, submissions, revenue)
+            SELECT DATE(submission_date), COALESCE(target_lpa, ''), COALESCE(promoter_name, ''),
+                   COALESCE(contract_size, ''), COUNT(*), COALESCE(SUM(total_with_admin), 0)
+            FROM submissions
+            GROUP BY 1, 2, 3, 4
+        """))
+        conn.execute(text("""
+            INSERT INTO submission_client_stats (client_name, submissions, revenue)
+            SELECT COALESCE(client_name, ''), COUNT(*), COALESCE(SUM(total_with_admin), 0)
+            FROM submissions
+            GROUP BY 1
+        """))
+    
+    def _migrate_reference_counters(self, conn):
+        """
+        Version 3: per-prefix reference counters and per-reference revision
+        counters, so allocating a number is one upsert on a primary key.
+        Seeded from existing submissions; a trigger keeps them ahead of any
+        reference stored without being allocated (e.g. typed in by hand).
+        """
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS reference_counters (
+                prefix TEXT PRIMARY KEY,
+                last_value BIGINT NOT NULL
+            )
+        """))
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS reference_revisions (
+                base_ref TEXT PRIMARY KEY,
+                last_revision INTEGER NOT NULL
+            )
+        """))
+        conn.execute(text(f"""
+            INSERT INTO reference_counters AS c (prefix, last_value)
+            SELECT m[1], MAX(m[2]::bigint)
+            FROM (SELECT regexp_match(reference_number, '{REFERENCE_PATTERN}') AS m FROM submissions) refs
+            WHERE m IS NOT NULL
+            GROUP BY m[1]
+            ON CONFLICT (prefix) DO UPDATE SET last_value = GREATEST(c.last_value, EXCLUDED.last_value)
+        """))
+        conn.execute(text(f"""
+            INSERT INTO reference_revisions AS r (base_ref, last_revision)
+            SELECT m[1] || m[2], MAX(m[3]::integer)
+            FROM (SELECT regexp_match(reference_number, '{REFERENCE_PATTERN}') AS m FROM submissions) refs
+            WHERE m[3] IS NOT NULL
+            GROUP BY m[1] || m[2]
+            ON CONFLICT (base_ref) DO UPDATE SET last_revision = GREATEST(r.last_revision, EXCLUDED.last_revision)
+        """))
+        conn.execute(text(f"""
+            CREATE OR REPLACE FUNCTION track_reference_numbers()
+            RETURNS TRIGGER AS $$
+            DECLARE
+                m TEXT[] := regexp_match(NEW.reference_number, '{REFERENCE_PATTERN}');
+            BEGIN
+                IF m IS NOT NULL THEN
+                    INSERT INTO reference_counters AS c (prefix, last_value)
+                    VALUES (m[1], m[2]::bigint)
+                    ON CONFLICT (prefix) DO UPDATE SET last_value = EXCLUDED.last_value
+                    WHERE c.last_value < EXCLUDED.last_value;
+                    IF m[3] IS NOT NULL THEN
+                        INSERT INTO reference_revisions AS r (base_ref, last_revision)
+                        VALUES (m[1] || m[2], m[3]::integer)
+                        ON CONFLICT (base_ref) DO UPDATE SET last_revision = EXCLUDED.last_revision
+                        WHERE r.last_revision < EXCLUDED.last_revision;
+                    END IF;
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+        """))
+        conn.execute(text("""
+            DROP TRIGGER IF EXISTS submissions_reference_trigger ON submissions;
+            CREATE TRIGGER submissions_reference_trigger
+            AFTER INSERT OR UPDATE OF reference_number ON submissions
+            FOR EACH ROW EXECUTE FUNCTION track_reference_numbers();
+        """))
+    
+    def _migrate_submission_idempotency(self, conn):
+        """
+        Version 4: optional idempotency key per submission, so a queued
+        (write-behind) submission retried after a crash is stored once.
+        """
+        conn.execute(text("ALTER TABLE submissions ADD COLUMN IF NOT EXISTS idempotency_key TEXT"))
+        conn.execute(text("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_submissions_idempotency_key
+            ON submissions(idempotency_key) WHERE idempotency_key IS NOT NULL
+        """))
+    
+    def _migrate_allocation_indexes(self, conn):
+        """
+        Version 5: indexes behind query_allocations / get_allocation_summary
+        (bank, supply habitat and tier lookups, each carrying submission_id
+        for the join to submissions).
+        """
+        for column in ("bank_key", "supply_habitat", "tier"):
+            conn.execute(text(f"""
+                CREATE INDEX IF NOT EXISTS idx_allocation_details_{column}
+                ON allocation_details({column}, submission_id)
+            """))
     
     def close(self):
         """Close the database connection."""
@@ -843,7 +1189,9 @@ class SubmissionsDB:
                         suo_total_units: Optional[float] = None,
                         submitted_by_username: Optional[str] = None,
                         contact_email: Optional[str] = None,
-                        contact_number: Optional[str] = None) -> int:
+                        contact_number: Optional[str] = None,
+                        idempotency_key: Optional[str] = None,
+                        submission_date: Optional[datetime] = None) -> int:
         """
         Store a complete submission to the database.
         Returns the submission_id for reference.
@@ -854,13 +1202,20 @@ class SubmissionsDB:
                                    (may differ from promoter_name for child accounts)
             contact_email: Client's email address for contact
             contact_number: Client's phone number for contact
+            idempotency_key: If given and already stored, the existing submission's
+                             id is returned and nothing is written (write-behind retries)
+            submission_date: When the quote was submitted (default now); write-behind
+                             passes the enqueue time so delayed writes keep it
         
         Uses transactions and automatic retry on transient failures.
+        Allocation rows are written with one multi-row INSERT; timings of the
+        save are left in self.last_store_timing (milliseconds).
         """
+        started = time.perf_counter()
         engine = self._get_connection()
         
         # Prepare data
-        submission_date = datetime.now()
+        submission_date = submission_date or datetime.now()
         total_with_admin = float(total_cost) + float(admin_fee)
         
         # Banks used - ensure it's a proper list of strings
@@ -910,7 +1265,7 @@ class SubmissionsDB:
                         promoter_name, promoter_discount_type, promoter_discount_value,
                         customer_id,
                         suo_enabled, suo_discount_fraction, suo_eligible_surplus, suo_usable_surplus, suo_total_units,
-                        submitted_by_username, contact_email, contact_number
+                        submitted_by_username, contact_email, contact_number, idempotency_key
                     ) VALUES (
                         :submission_date, :client_name, :reference_number, :site_location,
                         :target_lpa, :target_nca, :target_lat, :target_lon,
@@ -922,8 +1277,10 @@ class SubmissionsDB:
                         :promoter_name, :promoter_discount_type, :promoter_discount_value,
                         :customer_id,
                         :suo_enabled, :suo_discount_fraction, :suo_eligible_surplus, :suo_usable_surplus, :suo_total_units,
-                        :submitted_by_username, :contact_email, :contact_number
-                    ) RETURNING id
+                        :submitted_by_username, :contact_email, :contact_number, :idempotency_key
+                    )
+                    ON CONFLICT (idempotency_key) WHERE idempotency_key IS NOT NULL DO NOTHING
+                    RETURNING id
                 """), {
                     "submission_date": submission_date,
                     "client_name": client_name,
@@ -958,42 +1315,36 @@ class SubmissionsDB:
                     "suo_total_units": float(suo_total_units) if suo_total_units is not None else None,
                     "submitted_by_username": submitted_by_username,
                     "contact_email": contact_email,
-                    "contact_number": contact_number
+                    "contact_number": contact_number,
+                    "idempotency_key": idempotency_key
                 })
                 
-                submission_id = result.fetchone()[0]
+                row = result.fetchone()
+                if row is None:
+                    # Already stored under this idempotency key
+                    trans.rollback()
+                    with engine.connect() as lookup:
+                        return lookup.execute(text(
+                            "SELECT id FROM submissions WHERE idempotency_key = :key"
+                        ), {"key": idempotency_key}).scalar()
+                submission_id = row[0]
+                
+                submission_done = time.perf_counter()
                 
-                # Insert allocation details
-                if not allocation_df.empty:
-                    for _, row in allocation_df.iterrows():
-                        # Sanitize row data
-                        row_dict = {
-                            "submission_id": submission_id,
-                            "bank_key": str(row.get("BANK_KEY", "")),
-                            "bank_name": str(row.get("bank_name", "")),
-                            "demand_habitat": str(row.get("demand_habitat", "")),
-                            "supply_habitat": str(row.get("supply_habitat", "")),
-                            "allocation_type": str(row.get("allocation_type", "")),
-                            "tier": str(row.get("proximity", "")),
-                            "units_supplied": float(sanitize_for_db(row.get("units_supplied", 0.0))),
-                            "unit_price": float(sanitize_for_db(row.get("unit_price", 0.0))),
-                            "cost": float(sanitize_for_db(row.get("cost", 0.0)))
-                        }
-                        
-                        conn.execute(text("""
-                            INSERT INTO allocation_details (
-                                submission_id, bank_key, bank_name,
-                                demand_habitat, supply_habitat, allocation_type,
-                                tier, units_supplied, unit_price, cost
-                            ) VALUES (
-                                :submission_id, :bank_key, :bank_name,
-                                :demand_habitat, :supply_habitat, :allocation_type,
-                                :tier, :units_supplied, :unit_price, :cost
-                            )
-                        """), row_dict)
+                # Insert allocation details (one multi-row INSERT per chunk)
+                detail_rows = allocation_detail_rows(allocation_df, submission_id)
+                for statement, params in allocation_detail_inserts(detail_rows):
+                    conn.execute(statement, params)
                 
                 # Commit transaction
                 trans.commit()
+                finished = time.perf_counter()
+                self.last_store_timing = {
+                    "submission_ms": (submission_done - started) * 1000,
+                    "allocation_rows": len(detail_rows),
+                    "allocation_ms": (finished - submission_done) * 1000,
+                    "total_ms": (finished - started) * 1000,
+                }
                 return submission_id
                 
             except Exception as e:
@@ -1012,6 +1363,127 @@ class SubmissionsDB:
             df = pd.read_sql_query(query, conn)
         return df
     
+    def list_submissions(self,
+                         limit: int = 50,
+                         after: Optional[Tuple[Any, int]] = None,
+                         start_date: Optional[str] = None,
+                         end_date: Optional[str] = None,
+                         client_name: Optional[str] = None,
+                         lpa: Optional[str] = None,
+                         nca: Optional[str] = None,
+                         reference_number: Optional[str] = None,
+                         site_location: Optional[str] = None,
+                         promoter_name: Optional[str] = None) -> Tuple[pd.DataFrame, Optional[Tuple[Any, int]]]:
+        """
+        One page of submissions, newest first, with summary columns only.
+        
+        Keyset pagination on (submission_date, id): each page is an index
+        range scan however deep it is, and rows saved meanwhile don't shift
+        later pages.
+        
+        Args:
+            limit: Page size
+            after: Cursor returned with the previous page (None for the first page)
+            start_date/end_date: submission_date bounds (inclusive)
+            client_name, lpa, nca, reference_number, site_location: "contains" filters
+            promoter_name: Exact promoter (promoter history pages)
+        
+        Returns:
+            Tuple of (page DataFrame with SUBMISSION_SUMMARY_COLUMNS, cursor for
+            the next page or None if this is the last page)
+        """
+        where, params = [], {"limit": int(limit) + 1}
+        if start_date:
+            where.append("submission_date >= :start_date")
+            params["start_date"] = start_date
+        if end_date:
+            where.append("submission_date <= :end_date")
+            params["end_date"] = end_date
+        for column, value in (("client_name", client_name), ("target_lpa", lpa), ("target_nca", nca),
+                              ("reference_number", reference_number), ("site_location", site_location)):
+            if value:
+                where.append(f"{column} ILIKE :{column}")
+                params[column] = f"%{value}%"
+        if promoter_name:
+            where.append("promoter_name = :promoter_name")
+            params["promoter_name"] = promoter_name
+        if after is not None:
+            where.append("(submission_date, id) < (:after_date, :after_id)")
+            params["after_date"], params["after_id"] = after[0], int(after[1])
+        
+        query = f"SELECT {', '.join(SUBMISSION_SUMMARY_COLUMNS)} FROM submissions"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY submission_date DESC, id DESC LIMIT :limit"
+        
+        engine = self._get_connection()
+        with engine.connect() as conn:
+            df = pd.read_sql_query(text(query), conn, params=params)
+        
+        next_cursor = None
+        if len(df) > limit:
+            df = df.iloc[:limit]
+            last = df.iloc[-1]
+            next_cursor = (last["submission_date"], int(last["id"]))
+        return df, next_cursor
+    
+    def _has_trigram_search(self) -> bool:
+        """Whether pg_trgm is installed (checked once per instance)"""
+        if self._trgm_available is None:
+            try:
+                engine = self._get_connection()
+                with engine.connect() as conn:
+                    row = conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).fetchone()
+                self._trgm_available = row is not None
+            except Exception:
+                self._trgm_available = False
+        return self._trgm_available
+    
+    def search_submissions(self, term: str, limit: int = 50,
+                           promoter_name: Optional[str] = None) -> pd.DataFrame:
+        """
+        Ranked search over client, reference, location, LPA and NCA.
+        
+        With pg_trgm, rows match on "contains" or trigram similarity (so
+        typos still match) via the GIN trigram indexes, ranked by the best
+        similarity across the columns. Without it, "contains" matches are
+        ranked exact reference > reference prefix > other matches.
+        Ties are broken by newest first.
+        
+        Args:
+            term: Search text
+            limit: Maximum rows returned
+            promoter_name: Restrict to one promoter's submissions
+        
+        Returns:
+            DataFrame with SUBMISSION_SUMMARY_COLUMNS plus "score" (best first)
+        """
+        term = (term or "").strip()
+        if not term:
+            return pd.DataFrame(columns=SUBMISSION_SUMMARY_COLUMNS + ["score"])
+        params = {"term": term, "pattern": f"%{term}%", "prefix": f"{term}%", "limit": int(limit)}
+        
+        if self._has_trigram_search():
+            match = " OR ".join(f"{c} ILIKE :pattern OR {c} % :term" for c in SUBMISSION_SEARCH_COLUMNS)
+            score = "GREATEST(" + ", ".join(
+                f"COALESCE(similarity({c}, :term), 0)" for c in SUBMISSION_SEARCH_COLUMNS) + ")"
+            score = f"CASE WHEN reference_number ILIKE :term THEN 2.0 ELSE {score} END"
+        else:
+            match = " OR ".join(f"{c} ILIKE :pattern" for c in SUBMISSION_SEARCH_COLUMNS)
+            score = ("CASE WHEN reference_number ILIKE :term THEN 2.0 "
+                     "WHEN reference_number ILIKE :prefix THEN 1.0 ELSE 0.5 END")
+        
+        query = (f"SELECT {', '.join(SUBMISSION_SUMMARY_COLUMNS)}, {score} AS score "
+                 f"FROM submissions WHERE ({match})")
+        if promoter_name:
+            query += " AND promoter_name = :promoter_name"
+            params["promoter_name"] = promoter_name
+        query += " ORDER BY score DESC, submission_date DESC, id DESC LIMIT :limit"
+        
+        engine = self._get_connection()
+        with engine.connect() as conn:
+            return pd.read_sql_query(text(query), conn, params=params)
+    
     def get_submission_by_id(self, submission_id: int) -> Optional[Dict[str, Any]]:
         """Get a specific submission by ID."""
         engine = self._get_connection()
@@ -1038,6 +1510,105 @@ class SubmissionsDB:
             )
         return df
     
+    @staticmethod
+    def _allocation_filters(bank_key: Optional[str] = None, habitat: Optional[str] = None,
+                            tier: Optional[str] = None, start_date: Optional[str] = None,
+                            end_date: Optional[str] = None, promoter_name: Optional[str] = None,
+                            submission_id: Optional[int] = None) -> Tuple[str, Dict[str, Any]]:
+        """WHERE clause (over allocation_details a JOIN submissions s) and parameters"""
+        clauses = ["1=1"]
+        params: Dict[str, Any] = {}
+        for column, op, name, value in (("a.bank_key", "=", "bank_key", bank_key),
+                                        ("a.supply_habitat", "=", "habitat", habitat),
+                                        ("a.tier", "=", "tier", tier),
+                                        ("s.submission_date", ">=", "start_date", start_date),
+                                        ("s.submission_date", "<=", "end_date", end_date),
+                                        ("s.promoter_name", "=", "promoter_name", promoter_name),
+                                        ("a.submission_id", "=", "submission_id", submission_id)):
+            if value is not None and value != "":
+                clauses.append(f"{column} {op} :{name}")
+                params[name] = value
+        return " AND ".join(clauses), params
+    
+    def query_allocations(self, bank_key: Optional[str] = None, habitat: Optional[str] = None,
+                          tier: Optional[str] = None, start_date: Optional[str] = None,
+                          end_date: Optional[str] = None, promoter_name: Optional[str] = None,
+                          submission_id: Optional[int] = None, limit: int = 1000) -> pd.DataFrame:
+        """
+        Allocation lines from allocation_details with their submission's date,
+        reference, client and promoter (newest first).
+        
+        Args:
+            bank_key/habitat/tier: Exact filters (habitat is the supply habitat)
+            start_date/end_date: Bounds on submission_date (>= / <=)
+            promoter_name/submission_id: Optional exact filters
+            limit: Maximum rows returned
+        """
+        where, params = self._allocation_filters(bank_key, habitat, tier, start_date, end_date,
+                                                 promoter_name, submission_id)
+        params["limit"] = int(limit)
+        query = f"""
+            SELECT a.submission_id, s.submission_date, s.reference_number, s.client_name, s.promoter_name,
+                   a.bank_key, a.bank_name, a.demand_habitat, a.supply_habitat, a.allocation_type, a.tier,
+                   a.units_supplied, a.unit_price, a.cost
+            FROM allocation_details a
+            JOIN submissions s ON s.id = a.submission_id
+            WHERE {where}
+            ORDER BY s.submission_date DESC, a.submission_id DESC, a.id
+            LIMIT :limit
+        """
+        engine = self._get_connection()
+        with engine.connect() as conn:
+            return pd.read_sql_query(text(query), conn, params=params)
+    
+    def get_allocation_summary(self, period: Optional[str] = "month",
+                               group_by: Tuple[str, ...] = ("bank", "habitat"),
+                               bank_key: Optional[str] = None, habitat: Optional[str] = None,
+                               tier: Optional[str] = None, start_date: Optional[str] = None,
+                               end_date: Optional[str] = None,
+                               promoter_name: Optional[str] = None) -> pd.DataFrame:
+        """
+        Units sold and realised price from allocation_details, aggregated in SQL.
+        
+        Args:
+            period: "day", "week", "month" or None for totals over the whole range
+            group_by: Any of ALLOCATION_SUMMARY_GROUPS ("bank", "habitat", "tier")
+            Other arguments filter as in query_allocations
+        
+        Returns:
+            DataFrame with columns [period], the grouped columns, quotes, units,
+            revenue and avg_unit_price (revenue / units), oldest period first
+            then by units descending
+        """
+        if period not in (None, "day", "week", "month"):
+            raise ValueError(f"Unknown period: {period}")
+        unknown = [g for g in group_by if g not in ALLOCATION_SUMMARY_GROUPS]
+        if unknown:
+            raise ValueError(f"Unknown allocation grouping: {', '.join(unknown)}")
+        
+        keys = [f"a.{ALLOCATION_SUMMARY_GROUPS[g]}" for g in group_by]
+        if period:
+            keys.insert(0, f"DATE_TRUNC('{period}', s.submission_date)::date AS period")
+        where, params = self._allocation_filters(bank_key, habitat, tier, start_date, end_date, promoter_name)
+        # Group by position (the period expression is aliased)
+        group_sql = f"GROUP BY {', '.join(str(i) for i in range(1, len(keys) + 1))}" if keys else ""
+        order = ["period"] if period else []
+        query = f"""
+            SELECT {''.join(key + ', ' for key in keys)}
+                   COUNT(DISTINCT a.submission_id) AS quotes,
+                   COALESCE(SUM(a.units_supplied), 0) AS units,
+                   COALESCE(SUM(a.cost), 0) AS revenue,
+                   SUM(a.cost) / NULLIF(SUM(a.units_supplied), 0) AS avg_unit_price
+            FROM allocation_details a
+            JOIN submissions s ON s.id = a.submission_id
+            WHERE {where}
+            {group_sql}
+            ORDER BY {', '.join(order + ['units DESC'])}
+        """
+        engine = self._get_connection()
+        with engine.connect() as conn:
+            return pd.read_sql_query(text(query), conn, params=params)
+    
     def filter_submissions(self,
                           start_date: Optional[str] = None,
                           end_date: Optional[str] = None,
@@ -1081,55 +1652,104 @@ class SubmissionsDB:
         return df
     
     def export_to_csv(self, df: pd.DataFrame, filename: str = "submissions_export.csv") -> bytes:
-        """Export DataFrame to CSV bytes for download with float values formatted to 2 decimal places."""
-        # Format float columns to 2 decimal places
-        df_formatted = df.copy()
-        float_cols = df_formatted.select_dtypes(include=['float64', 'float32']).columns
-        for col in float_cols:
-            df_formatted[col] = df_formatted[col].apply(lambda x: f"{x:.2f}" if pd.notna(x) else x)
-        
-        return df_formatted.to_csv(index=False).encode('utf-8')
+        """
+        Export DataFrame to CSV bytes for download with float values formatted to 2 decimal places.
+        For the full history use submissions_export (streams from the database in chunks).
+        """
+        # float_format is applied by the CSV writer (no per-cell Python formatting or copy)
+        return df.to_csv(index=False, float_format="%.2f").encode('utf-8')
     
     def get_summary_stats(self) -> Dict[str, Any]:
-        """Get summary statistics about submissions."""
+        """
+        Get summary statistics about submissions.
+        Read from the trigger-maintained rollups, so the cost grows with the
+        number of days/LPAs/clients, not submissions.
+        """
         engine = self._get_connection()
         with engine.connect() as conn:
-            # Total submissions
-            result = conn.execute(text("SELECT COUNT(*) FROM submissions"))
-            total_submissions = result.fetchone()[0]
-            
-            # Total revenue
-            result = conn.execute(text("SELECT SUM(total_with_admin) FROM submissions"))
-            total_revenue = result.fetchone()[0] or 0.0
-            
-            # Most common LPAs
-            result = conn.execute(text("""
-                SELECT target_lpa, COUNT(*) as count 
-                FROM submissions 
-                WHERE target_lpa IS NOT NULL AND target_lpa != ''
-                GROUP BY target_lpa 
-                ORDER BY count DESC 
-                LIMIT 5
-            """))
-            top_lpas = result.fetchall()
-            
-            # Most common clients
-            result = conn.execute(text("""
-                SELECT client_name, COUNT(*) as count 
-                FROM submissions 
-                WHERE client_name IS NOT NULL AND client_name != ''
-                GROUP BY client_name 
-                ORDER BY count DESC 
-                LIMIT 5
-            """))
-            top_clients = result.fetchall()
-            
-            return {
-                "total_submissions": total_submissions,
-                "total_revenue": total_revenue,
-                "top_lpas": top_lpas,
-                "top_clients": top_clients
-            }
+            total_submissions, total_revenue = conn.execute(text("""
+                SELECT COALESCE(SUM(submissions), 0), COALESCE(SUM(revenue), 0)
+                FROM submission_daily_stats
+            """)).fetchone()
+        
+        return {
+            "total_submissions": int(total_submissions),
+            "total_revenue": float(total_revenue or 0.0),
+            "top_lpas": self.get_top_lpas(limit=5),
+            "top_clients": self.get_top_clients(limit=5)
+        }
+    
+    def get_top_lpas(self, limit: int = 5, start_date: Optional[str] = None,
+                     end_date: Optional[str] = None) -> List[Tuple[str, int]]:
+        """Most common LPAs as (target_lpa, count), optionally within a date range."""
+        query = """
+            SELECT target_lpa, SUM(submissions) AS count
+            FROM submission_daily_stats
+            WHERE target_lpa != ''
+        """
+        params: Dict[str, Any] = {"limit": int(limit)}
+        if start_date:
+            query += " AND day >= :start_date"
+            params["start_date"] = start_date
+        if end_date:
+            query += " AND day <= :end_date"
+            params["end_date"] = end_date
+        query += " GROUP BY target_lpa HAVING SUM(submissions) > 0 ORDER BY count DESC, target_lpa LIMIT :limit"
+        
+        engine = self._get_connection()
+        with engine.connect() as conn:
+            return [(row[0], int(row[1])) for row in conn.execute(text(query), params).fetchall()]
+    
+    def get_top_clients(self, limit: int = 5) -> List[Tuple[str, int]]:
+        """Most common clients as (client_name, count)."""
+        engine = self._get_connection()
+        with engine.connect() as conn:
+            rows = conn.execute(text("""
+                SELECT client_name, submissions AS count
+                FROM submission_client_stats
+                WHERE client_name != '' AND submissions > 0
+                ORDER BY count DESC, client_name
+                LIMIT :limit
+            """), {"limit": int(limit)}).fetchall()
+        return [(row[0], int(row[1])) for row in rows]
+    
+    def get_submission_timeseries(self, period: str = "month",
+                                  start_date: Optional[str] = None,
+                                  end_date: Optional[str] = None,
+                                  promoter_name: Optional[str] = None,
+                                  contract_size: Optional[str] = None) -> pd.DataFrame:
+        """
+        Submissions and revenue per period from the daily rollup.
+        
+        Args:
+            period: "day", "week" or "month"
+            start_date/end_date: Inclusive day bounds
+            promoter_name/contract_size: Optional exact filters
+        
+        Returns:
+            DataFrame with columns period, submissions, revenue (oldest first)
+        """
+        if period not in ("day", "week", "month"):
+            raise ValueError(f"Unknown period: {period}")
+        query = f"""
+            SELECT DATE_TRUNC('{period}', day)::date AS period,
+                   SUM(submissions) AS submissions, SUM(revenue) AS revenue
+            FROM submission_daily_stats
+            WHERE submissions > 0
+        """
+        params: Dict[str, Any] = {}
+        for column, op, value in (("day", ">=", start_date), ("day", "<=", end_date),
+                                  ("promoter_name", "=", promoter_name),
+                                  ("contract_size", "=", contract_size)):
+            if value:
+                name = f"{column}_{'min' if op == '>=' else 'max' if op == '<=' else 'eq'}"
+                query += f" AND {column} {op} :{name}"
+                params[name] = value
+        query += " GROUP BY 1 ORDER BY 1"
+        
+        engine = self._get_connection()
+        with engine.connect() as conn:
+            return pd.read_sql_query(text(query), conn, params=params)
     
     # ================= Introducers/Promoters CRUD =================
     
@@ -1592,125 +2212,93 @@ class SubmissionsDB:
         """
         Populate customers table from existing submissions.
         Creates a customer record for each unique client_name in submissions
-        that doesn't already have a customer record.
+        that doesn't already have a customer record, and links submissions
+        without a customer_id to the (oldest) customer of that name.
         Returns tuple of (number of customers created, list of error messages).
+        
+        Runs as two set-based statements in one transaction, so the cost
+        doesn't grow with round trips per client. client_name isn't unique in
+        customers (ON CONFLICT has nothing to key on), so the table is locked
+        against concurrent inserts while the missing names are added.
         """
         engine = self._get_connection()
-        errors = []
         
-        # Get distinct client names from all submissions
-        with engine.connect() as conn:
-            result = conn.execute(text("""
-                SELECT DISTINCT client_name 
-                FROM submissions 
-                WHERE client_name IS NOT NULL 
-                  AND client_name != ''
-                ORDER BY client_name
-            """))
-            client_names = [row[0] for row in result.fetchall()]
-        
-        created_count = 0
-        for client_name in client_names:
-            try:
-                # Use a fresh connection with transaction for each customer
-                with engine.connect() as conn:
-                    with conn.begin():
-                        # Check if customer already exists with this name
-                        check_result = conn.execute(text("""
-                            SELECT id FROM customers WHERE client_name = :client_name LIMIT 1
-                        """), {"client_name": client_name})
-                        
-                        existing_customer = check_result.fetchone()
-                        
-                        if existing_customer:
-                            # Customer already exists, but update submissions that don't have customer_id set
-                            customer_id = existing_customer[0]
-                            conn.execute(text("""
-                                UPDATE submissions 
-                                SET customer_id = :customer_id 
-                                WHERE client_name = :client_name AND customer_id IS NULL
-                            """), {
-                                "customer_id": customer_id,
-                                "client_name": client_name
-                            })
-                        else:
-                            # Create customer record
-                            now = datetime.now()
-                            insert_result = conn.execute(text("""
-                                INSERT INTO customers (client_name, created_date, updated_date)
-                                VALUES (:client_name, :created_date, :updated_date)
-                                RETURNING id
-                            """), {
-                                "client_name": client_name,
-                                "created_date": now,
-                                "updated_date": now
-                            })
-                            
-                            customer_id = insert_result.fetchone()[0]
-                            
-                            # Update submissions with this client_name to link to the new customer
-                            conn.execute(text("""
-                                UPDATE submissions 
-                                SET customer_id = :customer_id 
-                                WHERE client_name = :client_name AND customer_id IS NULL
-                            """), {
-                                "customer_id": customer_id,
-                                "client_name": client_name
-                            })
-                            
-                            created_count += 1
-                    # Transaction auto-commits on successful exit from 'with conn.begin()'
-                    
-            except Exception as e:
-                errors.append(f"Error processing '{client_name}': {str(e)}")
+        try:
+            with engine.begin() as conn:
+                conn.execute(text("LOCK TABLE customers IN SHARE ROW EXCLUSIVE MODE"))
+                created = conn.execute(text("""
+                    INSERT INTO customers (client_name, created_date, updated_date)
+                    SELECT names.client_name, NOW(), NOW()
+                    FROM (
+                        SELECT DISTINCT client_name FROM submissions
+                        WHERE client_name IS NOT NULL AND client_name != ''
+                    ) names
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM customers c WHERE c.client_name = names.client_name
+                    )
+                    ORDER BY names.client_name
+                """))
+                created_count = created.rowcount
+                conn.execute(text("""
+                    UPDATE submissions s
+                    SET customer_id = c.id
+                    FROM (
+                        SELECT DISTINCT ON (client_name) id, client_name
+                        FROM customers
+                        ORDER BY client_name, id
+                    ) c
+                    WHERE s.client_name = c.client_name AND s.customer_id IS NULL
+                """))
+        except Exception as e:
+            return 0, [f"Error importing customers from submissions: {str(e)}"]
         
-        return created_count, errors
+        return created_count, []
     
     # ================= Quote/Requote Methods =================
     
-    def get_next_revision_number(self, base_reference: str) -> str:
+    def get_next_revision_number(self, base_reference: str, reserve: bool = True) -> str:
         """
         Get the next revision number for a reference.
         E.g., for BNG01234, returns BNG01234.1 if no revisions exist,
         or BNG01234.2 if BNG01234.1 exists, etc.
+        
+        The revision is allocated with one upsert on reference_revisions, so
+        concurrent requotes never get the same number. reserve=False only
+        previews the next revision without taking it.
         """
         engine = self._get_connection()
         
         # Strip any existing revision suffix
         base_ref = base_reference.split('.')[0]
         
-        with engine.connect() as conn:
-            result = conn.execute(text("""
-                SELECT reference_number FROM submissions
-                WHERE reference_number LIKE :pattern
-                ORDER BY reference_number DESC
-            """), {"pattern": f"{base_ref}%"})
-            
-            rows = result.fetchall()
-            
-            if not rows:
-                # No existing references, return base.1
-                return f"{base_ref}.1"
-            
-            # Find the highest revision number
-            max_revision = 0
-            for row in rows:
-                ref = row[0]
-                if '.' in ref:
-                    try:
-                        revision = int(ref.split('.')[-1])
-                        max_revision = max(max_revision, revision)
-                    except ValueError:
-                        pass
-            
-            return f"{base_ref}.{max_revision + 1}"
+        if not reserve:
+            with engine.connect() as conn:
+                last = conn.execute(text(
+                    "SELECT last_revision FROM reference_revisions WHERE base_ref = :base_ref"
+                ), {"base_ref": base_ref}).scalar()
+            return f"{base_ref}.{(last or 0) + 1}"
+        
+        with engine.begin() as conn:
+            return self._reserve_revision(conn, base_ref)
     
-    def get_next_bng_reference(self, prefix: str = "BNG-A-") -> str:
+    @staticmethod
+    def _reserve_revision(conn, base_ref: str) -> str:
+        """Take the next revision of base_ref on conn (commits or rolls back with its transaction)"""
+        revision = conn.execute(text("""
+            INSERT INTO reference_revisions AS r (base_ref, last_revision)
+            VALUES (:base_ref, 1)
+            ON CONFLICT (base_ref) DO UPDATE SET last_revision = r.last_revision + 1
+            RETURNING last_revision
+        """), {"base_ref": base_ref}).scalar()
+        return f"{base_ref}.{revision}"
+    
+    def get_next_bng_reference(self, prefix: str = "BNG-A-", reserve: bool = True) -> str:
         """
         Generate the next sequential BNG reference number.
         
         Args:
             prefix: Reference number prefix (default: "BNG-A-")
+            reserve: Take the number (default); False only previews it
         
         Returns:
             Next reference number in format "BNG-A-XXXXX" (e.g., "BNG-A-02025")
@@ -1718,34 +2306,28 @@ class SubmissionsDB:
         Example:
             If latest reference is "BNG-A-02025", returns "BNG-A-02026"
             If no references exist, returns "BNG-A-02025" (starting number)
+        
+        Allocation is one upsert on the prefix's reference_counters row, so
+        concurrent submissions never share a number.
         """
         engine = self._get_connection()
         
-        with engine.connect() as conn:
-            result = conn.execute(text("""
-                SELECT reference_number FROM submissions
-                WHERE reference_number LIKE :pattern
-                ORDER BY reference_number DESC
-                LIMIT 1
-            """), {"pattern": f"{prefix}%"})
-            
-            row = result.fetchone()
-            
-            if not row:
-                # No existing references with this prefix, start at 02025
-                return f"{prefix}02025"
-            
-            # Extract the numeric part from the latest reference
-            latest_ref = row[0]
-            try:
-                # Remove prefix to get numeric part (e.g., "BNG-A-02025" -> "02025")
-                numeric_part = latest_ref.replace(prefix, "").split('.')[0]  # Remove any revision suffix
-                next_number = int(numeric_part) + 1
-                # Format with same number of digits (5 digits with leading zeros)
-                return f"{prefix}{next_number:05d}"
-            except (ValueError, IndexError):
-                # If parsing fails, start at 02025
-                return f"{prefix}02025"
+        if not reserve:
+            with engine.connect() as conn:
+                last = conn.execute(text(
+                    "SELECT last_value FROM reference_counters WHERE prefix = :prefix"
+                ), {"prefix": prefix}).scalar()
+            return f"{prefix}{(last + 1) if last is not None else FIRST_REFERENCE_NUMBER:05d}"
+        
+        with engine.begin() as conn:
+            number = conn.execute(text("""
+                INSERT INTO reference_counters AS c (prefix, last_value)
+                VALUES (:prefix, :first)
+                ON CONFLICT (prefix) DO UPDATE SET last_value = c.last_value + 1
+                RETURNING last_value
+            """), {"prefix": prefix, "first": FIRST_REFERENCE_NUMBER}).scalar()
+        # 5 digits with leading zeros
+        return f"{prefix}{number:05d}"
     
     def get_quotes_by_reference_base(self, base_reference: str) -> pd.DataFrame:
         """Get all quotes with a given base reference (including revisions)."""
@@ -1782,8 +2364,8 @@ class SubmissionsDB:
             
             original_dict = dict(original._mapping)
             
-            # Get next revision number
-            new_reference = self.get_next_revision_number(original_dict["reference_number"])
+            # Reserve the revision in this transaction so a failed insert doesn't burn it
+            new_reference = self._reserve_revision(conn, original_dict["reference_number"].split('.')[0])
             
             # Prepare data for new submission
             submission_date = datetime.now()
@@ -7,55 +7,82 @@ from sqlalchemy import create_engine, text, event
 from sqlalchemy.engine import Engine
 from sqlalchemy.pool import NullPool
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
-import streamlit as st
 from typing import Optional
 import logging
+import os
+import threading
 
 logger = logging.getLogger(__name__)
 
+# Connection pool sizing (shared with callers that fan out queries)
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+
+def get_database_url() -> str:
+    """
+    Resolve the database URL.
+
+    The DATABASE_URL environment variable wins, so workers, the API backend
+    and CLI scripts need no Streamlit. Otherwise falls back to
+    [database] url in .streamlit/secrets.toml.
+    """
+    db_url = os.getenv("DATABASE_URL", "").strip()
+    if db_url:
+        return db_url
+    try:
+        import streamlit as st
+        db_url = st.secrets.get("database", {}).get("url")
+    except Exception as e:
+        raise ValueError(
+            f"DATABASE_URL is not set and secrets could not be read: {e}. "
+            "Set DATABASE_URL or configure [database] url in .streamlit/secrets.toml"
+        )
+    if not db_url:
+        raise ValueError(
+            "Database URL not found. Set DATABASE_URL or add "
+            "[database] url = 'postgresql://...' to secrets.toml"
+        )
+    return db_url
+
 
 class DatabaseConnection:
     """Manages PostgreSQL database connections using SQLAlchemy."""
     
     _engine: Optional[Engine] = None
+    _lock = threading.Lock()
     
     @classmethod
     def get_engine(cls) -> Engine:
         """
-        Get or create the SQLAlchemy engine.
-        Reads connection string from Streamlit secrets.
+        Get or create the process-wide SQLAlchemy engine.
+        Connection string from DATABASE_URL or Streamlit secrets (see get_database_url).
+        Pool size via DB_POOL_SIZE / DB_MAX_OVERFLOW.
         """
-        if cls._engine is None:
-            # Get database URL from Streamlit secrets
-            try:
-                db_url = st.secrets.get("database", {}).get("url")
-                if not db_url:
-                    raise ValueError(
-                        "Database URL not found in Streamlit secrets. "
-                        "Please add [database] url = 'postgresql://...' to secrets.toml"
-                    )
-            except Exception as e:
-                raise ValueError(
-                    f"Failed to read database URL from secrets: {e}. "
-                    "Please configure [database] url in .streamlit/secrets.toml"
-                )
+        if cls._engine is not None:
+            return cls._engine
+        with cls._lock:
+            if cls._engine is not None:
+                return cls._engine
+            db_url = get_database_url()
             
             # Create engine with connection pooling
-            cls._engine = create_engine(
+            engine = create_engine(
                 db_url,
                 pool_pre_ping=True,  # Verify connections before using them
-                pool_size=5,
-                max_overflow=10,
+                pool_size=POOL_SIZE,
+                max_overflow=MAX_OVERFLOW,
                 pool_recycle=3600,  # Recycle connections after 1 hour
                 echo=False,  # Set to True for SQL debugging
             )
             
             # Add event listener to set search_path if needed
-            @event.listens_for(cls._engine, "connect")
+            @event.listens_for(engine, "connect")
             def receive_connect(dbapi_conn, connection_record):
                 """Set session parameters on new connections."""
                 pass  # Can add custom session setup here if needed
             
+            cls._engine = engine
         return cls._engine
     
     @classmethod
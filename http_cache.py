@@ -0,0 +1,225 @@
+"""
+http_cache.py - Persistent response cache for static ArcGIS queries (NO Streamlit)
+
+LPA/NCA name lists and boundary polygons change at most yearly, but were
+re-downloaded every session. Responses are stored on local disk, keyed by a
+hash of the URL and canonicalised parameters, with a long TTL and ETag /
+Last-Modified revalidation once stale. Polygon rings are stored as
+quantised, delta-encoded int32 arrays and the whole entry is zlib
+compressed, so multi-megabyte JSON boundaries shrink to a fraction.
+
+Configuration (environment variables):
+    BNG_HTTP_CACHE_DIR          cache directory (default ~/.cache/bng-optimiser/http)
+    BNG_HTTP_CACHE_TTL_SECONDS  freshness lifetime (default 30 days)
+    BNG_HTTP_CACHE_DISABLED     set to 1 to bypass the cache entirely
+"""
+
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "bng-optimiser", "http")
+
+# Coordinates are stored as integer micro-degrees (~0.1 m)
+COORD_SCALE = 1_000_000
+
+_MAGIC = b"BNGC1"
+_RINGS_MARKER = "__rings__"
+
+
+# ================= Compact geometry encoding =================
+def _ring_arrays(rings: Any) -> Optional[List[np.ndarray]]:
+    """(n, 2) float arrays for 2D rings, or None if they can't be packed (e.g. has Z)"""
+    if not isinstance(rings, list):
+        return None
+    arrays = []
+    for ring in rings:
+        try:
+            arr = np.asarray(ring, dtype=float) if ring else np.empty((0, 2))
+        except (TypeError, ValueError):
+            return None
+        if arr.ndim != 2 or arr.shape[1] != 2:
+            return None
+        arrays.append(arr)
+    return arrays
+
+
+def pack_payload(payload: Dict[str, Any]) -> bytes:
+    """
+    Serialise a JSON payload, moving every ArcGIS "rings" array into one
+    delta-encoded int32 coordinate buffer, then zlib-compress the result.
+    """
+    coords: List[np.ndarray] = []
+
+    def strip(obj):
+        if isinstance(obj, dict):
+            out = {}
+            for k, v in obj.items():
+                arrays = _ring_arrays(v) if k == "rings" else None
+                if arrays is not None:
+                    coords.extend(arrays)
+                    out[k] = {_RINGS_MARKER: [len(a) for a in arrays]}
+                else:
+                    out[k] = strip(v)
+            return out
+        if isinstance(obj, list):
+            return [strip(v) for v in obj]
+        return obj
+
+    skeleton = json.dumps(strip(payload), separators=(",", ":")).encode("utf-8")
+    if coords:
+        q = np.rint(np.vstack(coords) * COORD_SCALE).astype(np.int64)
+        deltas = np.diff(q, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).astype(np.int32)
+        coord_bytes = deltas.tobytes()
+    else:
+        coord_bytes = b""
+    return zlib.compress(struct.pack("<I", len(skeleton)) + skeleton + coord_bytes, 6)
+
+
+def unpack_payload(blob: bytes) -> Dict[str, Any]:
+    """Inverse of pack_payload."""
+    raw = zlib.decompress(blob)
+    (n,) = struct.unpack("<I", raw[:4])
+    skeleton = json.loads(raw[4:4 + n].decode("utf-8"))
+    deltas = np.frombuffer(raw[4 + n:], dtype=np.int32).reshape(-1, 2)
+    flat = (np.cumsum(deltas, axis=0, dtype=np.int64) / COORD_SCALE).tolist()
+    pos = 0
+
+    def restore(obj):
+        nonlocal pos
+        if isinstance(obj, dict):
+            if set(obj) == {_RINGS_MARKER}:
+                rings = []
+                for length in obj[_RINGS_MARKER]:
+                    rings.append(flat[pos:pos + length])
+                    pos += length
+                return rings
+            return {k: restore(v) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [restore(v) for v in obj]
+        return obj
+
+    return restore(skeleton)
+
+
+# ================= Cache store =================
+@dataclass
+class CacheEntry:
+    url: str
+    stored_at: float
+    etag: str
+    last_modified: str
+    blob: bytes
+
+    def is_fresh(self, ttl: float) -> bool:
+        return (time.time() - self.stored_at) < ttl
+
+    @property
+    def payload(self) -> Dict[str, Any]:
+        return unpack_payload(self.blob)
+
+
+class ResponseCache:
+    """Content-addressed on-disk cache with a small in-process layer"""
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, ttl: float = DEFAULT_TTL_SECONDS):
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+        self._memory: Dict[str, CacheEntry] = {}
+
+    @staticmethod
+    def key(url: str, params: Optional[Dict[str, Any]] = None, method: str = "GET") -> str:
+        """sha256 of method + URL + parameters with sorted keys and stringified values"""
+        canonical = {str(k): str(v) for k, v in (params or {}).items()}
+        material = json.dumps([method.upper(), url.rstrip("/"), sorted(canonical.items())],
+                              separators=(",", ":"))
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.bin"
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            return entry
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return None
+        try:
+            if not data.startswith(_MAGIC):
+                return None
+            (hlen,) = struct.unpack("<I", data[len(_MAGIC):len(_MAGIC) + 4])
+            start = len(_MAGIC) + 4
+            header = json.loads(data[start:start + hlen].decode("utf-8"))
+            entry = CacheEntry(url=header["url"], stored_at=float(header["stored_at"]),
+                               etag=header.get("etag", ""), last_modified=header.get("last_modified", ""),
+                               blob=data[start + hlen:])
+        except Exception:
+            return None
+        self._memory[key] = entry
+        return entry
+
+    def put(self, key: str, url: str, payload: Dict[str, Any],
+            etag: str = "", last_modified: str = "") -> CacheEntry:
+        entry = CacheEntry(url=url, stored_at=time.time(), etag=etag or "",
+                           last_modified=last_modified or "", blob=pack_payload(payload))
+        self._write(key, entry)
+        return entry
+
+    def touch(self, key: str, entry: CacheEntry):
+        """Mark an entry fresh again after a 304 Not Modified"""
+        entry.stored_at = time.time()
+        self._write(key, entry)
+
+    def _write(self, key: str, entry: CacheEntry):
+        self._memory[key] = entry
+        header = json.dumps({"url": entry.url, "stored_at": entry.stored_at,
+                             "etag": entry.etag, "last_modified": entry.last_modified}).encode("utf-8")
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write-then-rename so concurrent readers never see a partial file
+            fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(_MAGIC + struct.pack("<I", len(header)) + header + entry.blob)
+            os.replace(tmp, path)
+        except OSError:
+            # Read-only or full disk: keep the in-process copy only
+            pass
+
+    def clear(self):
+        self._memory.clear()
+        if self.cache_dir.exists():
+            for path in self.cache_dir.glob("*/*.bin"):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+
+_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Process-wide cache configured from the environment (None if disabled)"""
+    global _cache
+    if os.getenv("BNG_HTTP_CACHE_DISABLED", "").strip() in ("1", "true", "yes"):
+        return None
+    if _cache is None:
+        _cache = ResponseCache(
+            cache_dir=os.getenv("BNG_HTTP_CACHE_DIR") or DEFAULT_CACHE_DIR,
+            ttl=float(os.getenv("BNG_HTTP_CACHE_TTL_SECONDS") or DEFAULT_TTL_SECONDS),
+        )
+    return _cache
@@ -5,8 +5,21 @@ Excel to Supabase Migration Script
 This script imports data from an Excel workbook into Supabase Postgres tables.
 It preserves the exact schema and column names from Excel.
 
+By default sheets are streamed with COPY into staging tables and swapped
+into the existing tables in one transaction (see reference_import.py):
+tables, indexes and triggers are kept and the running app never sees a
+missing or half-loaded table. --replace-tables uses the old behaviour
+(drop and re-create each table from the sheet), for databases where
+supabase_schema.sql has not been applied.
+
+--sync applies only the differences: rows are matched on their keys
+(bank_id, habitat_name, contract_size and tier for Pricing; stock_id for
+Stock) and only inserts, updates and deletes are written, so unchanged
+tables keep their cached copies in the app. Add --dry-run to print the
+diff without writing.
+
 Usage:
-    python import_excel_to_supabase.py <excel_file_path>
+    python import_excel_to_supabase.py <excel_file_path> [--replace-tables | --sync [--dry-run]]
 
 Example:
     python import_excel_to_supabase.py data/HabitatBackend_WITH_STOCK.xlsx
@@ -15,22 +28,19 @@ Example:
 import sys
 import pandas as pd
 from sqlalchemy import create_engine, text
-import streamlit as st
 from pathlib import Path
 
+from db import get_database_url
+from reference_import import (ImportValidationError, import_reference_tables, read_workbook,
+                              sync_reference_tables)
+
 
 def get_db_url():
-    """Get database URL from Streamlit secrets."""
+    """Get database URL from DATABASE_URL or Streamlit secrets."""
     try:
-        db_url = st.secrets.get("database", {}).get("url")
-        if not db_url:
-            print("❌ Database URL not found in Streamlit secrets.")
-            print("Please configure [database] url in .streamlit/secrets.toml")
-            sys.exit(1)
-        return db_url
-    except Exception as e:
-        print(f"❌ Error reading secrets: {e}")
-        print("Make sure .streamlit/secrets.toml exists and contains [database] url")
+        return get_database_url()
+    except ValueError as e:
+        print(f"❌ {e}")
         sys.exit(1)
 
 
@@ -80,13 +90,18 @@ def verify_import(engine):
 
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python import_excel_to_supabase.py <excel_file_path>")
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    replace_tables = "--replace-tables" in sys.argv[1:]
+    sync = "--sync" in sys.argv[1:]
+    dry_run = "--dry-run" in sys.argv[1:]
+    if not args or (replace_tables and sync) or (dry_run and not sync):
+        print("Usage: python import_excel_to_supabase.py <excel_file_path> "
+              "[--replace-tables | --sync [--dry-run]]")
         print("\nExample:")
         print("  python import_excel_to_supabase.py data/HabitatBackend_WITH_STOCK.xlsx")
         sys.exit(1)
     
-    excel_file = sys.argv[1]
+    excel_file = args[0]
     
     # Check if file exists
     if not Path(excel_file).exists():
@@ -127,19 +142,71 @@ def main():
         "TradingRules"
     ]
     
-    total_rows = 0
-    for sheet_name in sheets:
-        rows = import_sheet(excel_file, sheet_name, engine)
-        total_rows += rows
+    if replace_tables:
+        total_rows = 0
+        for sheet_name in sheets:
+            rows = import_sheet(excel_file, sheet_name, engine)
+            total_rows += rows
+    elif sync:
+        tables = read_workbook(excel_file, sheets)
+        for sheet_name in sheets:
+            if sheet_name not in tables:
+                print(f"⚠️  {sheet_name}: Sheet is missing or empty, skipping")
+        try:
+            report = sync_reference_tables(engine, tables, dry_run=dry_run)
+        except ImportValidationError as e:
+            print(f"❌ {e}")
+            print("Nothing was changed.")
+            sys.exit(1)
+        except Exception as e:
+            print(f"❌ Sync failed and was rolled back: {e}")
+            sys.exit(1)
+        for diff in report.diffs.values():
+            print(f"{'✓' if not diff.changed else '~'} {diff.summary()}")
+        for warning in report.warnings:
+            print(f"⚠️  {warning}")
+        if dry_run:
+            print(f"Dry run: {len(report.changed_tables)} table(s) would change, nothing written")
+            return
+        print(f"Synced {len(report.changed_tables)} changed table(s) in one transaction "
+              f"({report.seconds:.1f}s)")
+        total_rows = sum(len(d.inserts) + len(d.updates) + len(d.deletes) + len(d.replace or [])
+                         for d in report.diffs.values())
+    else:
+        tables = read_workbook(excel_file, sheets)
+        for sheet_name in sheets:
+            if sheet_name not in tables:
+                print(f"⚠️  {sheet_name}: Sheet is missing or empty, skipping")
+        try:
+            report = import_reference_tables(engine, tables)
+        except ImportValidationError as e:
+            print(f"❌ {e}")
+            print("Nothing was changed.")
+            sys.exit(1)
+        except Exception as e:
+            print(f"❌ Import failed and was rolled back: {e}")
+            sys.exit(1)
+        for sheet_name, rows in report.rows.items():
+            print(f"✓ {sheet_name}: Imported {rows} rows")
+        for warning in report.warnings:
+            print(f"⚠️  {warning}")
+        print(f"Swapped {len(report.rows)} tables in one transaction ({report.seconds:.1f}s)")
+        total_rows = report.total_rows
     
     # Verify import
     verify_import(engine)
     
+    if replace_tables:
+        # Tell running app processes to drop their cached copies
+        # (to_sql replace drops the tables' version triggers, so bump explicitly)
+        import repo
+        repo.mark_reference_tables_changed(sheets)
+    
     # Summary
     print("\n" + "="*60)
     print("Import Complete!")
     print("="*60)
-    print(f"Total rows imported: {total_rows}")
+    print(f"Total rows {'changed' if sync else 'imported'}: {total_rows}")
     print("\nNext steps:")
     print("1. Run: streamlit run app.py")
     print("2. Check Admin Dashboard for reference table status")
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Water Catchments Import Script
+
+Loads WFD river waterbody and operational catchment polygons from GeoJSON
+(EPSG:4326, e.g. exported from the Environment Agency Catchment Data Explorer)
+into the WaterCatchments table, then precomputes the BankCatchments table from
+bank lat/lon. Re-run whenever the catchment data or the bank list changes.
+
+Usage:
+    python import_water_catchments.py <waterbody_catchments.geojson> <operational_catchments.geojson>
+
+Example:
+    python import_water_catchments.py data/wfd_river_waterbody_catchments.geojson \
+        data/wfd_river_operational_catchments.geojson
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from catchments import (CATCHMENT_TYPE_OPERATIONAL, CATCHMENT_TYPE_WATERBODY,
+                        CatchmentIndex, build_bank_catchments, feature_row)
+from import_excel_to_supabase import get_db_url
+from optimizer_core import operational_name_from_feature, sstr, waterbody_name_from_feature
+
+
+def load_geojson_rows(path: str, catchment_type: str) -> list:
+    """Read a GeoJSON FeatureCollection into WaterCatchments rows."""
+    with open(path, "r", encoding="utf-8") as f:
+        fc = json.load(f)
+    rows = []
+    for feat in fc.get("features", []):
+        if catchment_type == CATCHMENT_TYPE_WATERBODY:
+            name = waterbody_name_from_feature(feat)
+            props = feat.get("properties") or {}
+            parent = sstr(props.get("oc_name") or props.get("OC_NAME") or
+                          props.get("operational_catchment_name") or "")
+        else:
+            name = operational_name_from_feature(feat)
+            parent = ""
+        if not name or not feat.get("geometry"):
+            continue
+        rows.append(feature_row(catchment_type, name, feat["geometry"], parent))
+    return rows
+
+
+def replace_water_catchments(engine, rows: list):
+    """Replace WaterCatchments contents in a single transaction."""
+    with engine.begin() as conn:
+        conn.execute(text('DELETE FROM "WaterCatchments"'))
+        conn.execute(text('''
+            INSERT INTO "WaterCatchments"
+                (catchment_type, catchment_name, operational_catchment,
+                 min_lon, min_lat, max_lon, max_lat, geometry)
+            VALUES
+                (:catchment_type, :catchment_name, :operational_catchment,
+                 :min_lon, :min_lat, :max_lon, :max_lat, CAST(:geometry AS JSONB))
+        '''), rows)
+
+
+def replace_bank_catchments(engine, bank_catchments: pd.DataFrame):
+    """Replace BankCatchments contents in a single transaction."""
+    with engine.begin() as conn:
+        conn.execute(text('DELETE FROM "BankCatchments"'))
+        if not bank_catchments.empty:
+            conn.execute(text('''
+                INSERT INTO "BankCatchments" (bank_id, waterbody, operational_catchment)
+                VALUES (:bank_id, :waterbody, :operational_catchment)
+            '''), bank_catchments.to_dict("records"))
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: python import_water_catchments.py <waterbody.geojson> <operational.geojson>")
+        sys.exit(1)
+
+    waterbody_file, operational_file = sys.argv[1], sys.argv[2]
+    for path in (waterbody_file, operational_file):
+        if not Path(path).exists():
+            print(f"❌ File not found: {path}")
+            sys.exit(1)
+
+    print("=" * 60)
+    print("Water Catchments Import")
+    print("=" * 60)
+
+    rows = load_geojson_rows(waterbody_file, CATCHMENT_TYPE_WATERBODY)
+    print(f"✓ Waterbody catchments: {len(rows)} features")
+    op_rows = load_geojson_rows(operational_file, CATCHMENT_TYPE_OPERATIONAL)
+    print(f"✓ Operational catchments: {len(op_rows)} features")
+    rows.extend(op_rows)
+
+    engine = create_engine(get_db_url())
+    replace_water_catchments(engine, rows)
+    print(f"✓ WaterCatchments: Imported {len(rows)} rows")
+
+    with engine.connect() as conn:
+        banks = pd.read_sql_query('SELECT bank_id, lat, lon FROM "Banks"', conn)
+    bank_catchments = build_bank_catchments(banks, CatchmentIndex(rows))
+    replace_bank_catchments(engine, bank_catchments)
+    matched = int((bank_catchments["waterbody"] != "").sum()) if not bank_catchments.empty else 0
+    print(f"✓ BankCatchments: {len(bank_catchments)} banks ({matched} inside a waterbody catchment)")
+
+    print("\nImport Complete! Reference caches pick up the new data within 10 minutes.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+map_geometry.py - Boundary simplification for map rendering (NO Streamlit)
+
+LPA, NCA and catchment boundaries come back from ArcGIS at survey resolution
+(tens of thousands of vertices each). Drawn at a regional zoom almost all of
+those vertices fall inside the same screen pixel, yet folium embeds every one
+in the page on each rerun. This module simplifies polygons with
+Douglas-Peucker at a zoom-appropriate tolerance, quantises coordinates to the
+matching number of decimals and caches the result per (feature, tolerance).
+
+Usage:
+    from map_geometry import simplify_for_map
+
+    folium.GeoJson(simplify_for_map(lpa_geojson, zoom=10)).add_to(fmap)
+"""
+
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Tolerance as a fraction of a screen pixel at the detail zoom
+PIXEL_TOLERANCE = 0.5
+
+# Simplify for a couple of zoom levels beyond the initial view so zooming in
+# on the site does not immediately show coarse edges
+DETAIL_ZOOM_OFFSET = 2
+
+# Rings with fewer vertices than this are left untouched
+MIN_RING_POINTS = 16
+
+_CACHE_SIZE = 128
+_cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+# Guards _cache: Streamlit serves each session on its own thread
+_cache_lock = threading.Lock()
+
+
+def tolerance_for_zoom(zoom: float, pixel_tolerance: float = PIXEL_TOLERANCE) -> float:
+    """Simplification tolerance in degrees for a Web Mercator zoom level"""
+    degrees_per_pixel = 360.0 / (256.0 * (2.0 ** zoom))
+    return degrees_per_pixel * pixel_tolerance
+
+
+def decimals_for_tolerance(tolerance: float) -> int:
+    """Coordinate decimals that keep rounding error well below the tolerance"""
+    if tolerance <= 0:
+        return 7
+    return int(min(7, max(0, math.ceil(-math.log10(tolerance)) + 1)))
+
+
+def _douglas_peucker(pts: np.ndarray, tolerance: float) -> np.ndarray:
+    """Boolean keep-mask for an open polyline (iterative, no recursion limit)"""
+    n = len(pts)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a, b = pts[start], pts[end]
+        seg = pts[start + 1:end]
+        ab = b - a
+        length = math.hypot(ab[0], ab[1])
+        if length == 0:
+            dist = np.hypot(seg[:, 0] - a[0], seg[:, 1] - a[1])
+        else:
+            dist = np.abs(ab[0] * (seg[:, 1] - a[1]) - ab[1] * (seg[:, 0] - a[0])) / length
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            mid = start + 1 + i
+            keep[mid] = True
+            stack.append((start, mid))
+            stack.append((mid, end))
+    return keep
+
+
+def simplify_ring(ring: List[List[float]], tolerance: float, decimals: Optional[int] = None) -> List[List[float]]:
+    """
+    Simplify one closed ring of [lon, lat] points.
+
+    Longitudes are scaled by cos(latitude) so the tolerance is applied
+    isotropically. Returns [] if the ring collapses below a triangle.
+    """
+    pts = np.asarray(ring, dtype=float)
+    if pts.ndim != 2 or pts.shape[0] < 4:
+        return []
+    pts = pts[:, :2]
+    if decimals is None:
+        decimals = decimals_for_tolerance(tolerance)
+
+    if len(pts) >= MIN_RING_POINTS:
+        scaled = pts.copy()
+        scaled[:, 0] *= math.cos(math.radians(float(np.mean(pts[:, 1]))))
+        # A closed ring has first == last, so split at the vertex farthest
+        # from the start and simplify the two halves as open polylines.
+        far = int(np.argmax(np.hypot(scaled[:, 0] - scaled[0, 0], scaled[:, 1] - scaled[0, 1])))
+        if far in (0, len(pts) - 1):
+            far = len(pts) // 2
+        keep = np.zeros(len(pts), dtype=bool)
+        keep[:far + 1] |= _douglas_peucker(scaled[:far + 1], tolerance)
+        keep[far:] |= _douglas_peucker(scaled[far:], tolerance)
+        pts = pts[keep]
+
+    pts = np.round(pts, decimals)
+    # Quantisation can make neighbours coincide
+    if len(pts) > 1:
+        moved = np.any(pts[1:] != pts[:-1], axis=1)
+        pts = pts[np.concatenate(([True], moved))]
+    if len(pts) < 4:
+        return []
+    if not np.array_equal(pts[0], pts[-1]):
+        pts = np.vstack([pts, pts[:1]])
+    return pts.tolist()
+
+
+def simplify_geojson(geojson: Optional[Dict[str, Any]], tolerance: float) -> Optional[Dict[str, Any]]:
+    """Simplify a GeoJSON Polygon/MultiPolygon geometry (other types pass through)"""
+    if not geojson:
+        return geojson
+    gtype = geojson.get("type")
+    decimals = decimals_for_tolerance(tolerance)
+
+    def polygon(rings):
+        out = []
+        for i, ring in enumerate(rings or []):
+            simplified = simplify_ring(ring, tolerance, decimals)
+            if not simplified:
+                if i == 0:
+                    return []  # Exterior collapsed - drop the whole polygon
+                continue
+            out.append(simplified)
+        return out
+
+    if gtype == "Polygon":
+        rings = polygon(geojson.get("coordinates"))
+        return {"type": "Polygon", "coordinates": rings} if rings else None
+    if gtype == "MultiPolygon":
+        polys = [p for p in (polygon(rings) for rings in geojson.get("coordinates") or []) if p]
+        if not polys:
+            return None
+        return {"type": "MultiPolygon", "coordinates": polys}
+    return geojson
+
+
+def _fingerprint(geojson: Dict[str, Any]) -> str:
+    """Content hash of a geometry, cheap enough to compute on every rerun"""
+    h = hashlib.sha1(str(geojson.get("type")).encode("utf-8"))
+
+    def feed(coords):
+        if coords and isinstance(coords[0], (int, float)):
+            return
+        if coords and isinstance(coords[0], list) and coords[0] and isinstance(coords[0][0], (int, float)):
+            arr = np.asarray(coords, dtype=float)
+            h.update(arr.shape[0].to_bytes(8, "little"))
+            h.update(arr.tobytes())
+            return
+        for c in coords or []:
+            h.update(b"[")
+            feed(c)
+            h.update(b"]")
+
+    feed(geojson.get("coordinates") or [])
+    return h.hexdigest()
+
+
+def simplify_for_map(geojson: Optional[Dict[str, Any]], zoom: float = 10,
+                     tolerance: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    Map-ready copy of a boundary, cached per (feature, tolerance).
+
+    Args:
+        geojson: GeoJSON Polygon/MultiPolygon geometry
+        zoom: Initial map zoom; the tolerance targets DETAIL_ZOOM_OFFSET levels deeper
+        tolerance: Explicit tolerance in degrees (overrides zoom)
+
+    Returns:
+        Simplified geometry, or the input unchanged if it can't be simplified.
+    """
+    if not geojson or geojson.get("type") not in ("Polygon", "MultiPolygon"):
+        return geojson
+    if tolerance is None:
+        tolerance = tolerance_for_zoom(zoom + DETAIL_ZOOM_OFFSET)
+    try:
+        key = (_fingerprint(geojson), round(tolerance, 12))
+    except (TypeError, ValueError):
+        return geojson
+
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            _cache.move_to_end(key)
+            return cached
+
+    # Simplify outside the lock; a concurrent miss on the same key just repeats the work
+    try:
+        simplified = simplify_geojson(geojson, tolerance) or geojson
+    except (TypeError, ValueError):
+        simplified = geojson
+    with _cache_lock:
+        _cache[key] = simplified
+        _cache.move_to_end(key)
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return simplified
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
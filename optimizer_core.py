@@ -19,6 +19,11 @@ import requests
 # Repository layer for reference/config tables
 import repo
 
+# Persistent cache for static ArcGIS responses
+import http_cache
+from bank_shortlist import (BankLocator, far_bank_k_from_env, prove_shortlist_from_env,
+                            shortlist_is_proven, shortlist_options)
+
 # Constants
 ADMIN_FEE_GBP = 500.0  # Standard admin fee
 ADMIN_FEE_FRACTIONAL_GBP = 300.0  # Admin fee for fractional quotes
@@ -113,6 +118,67 @@ def safe_json(r: requests.Response) -> Dict[str, Any]:
         raise RuntimeError(f"Invalid JSON from {r.url} (status {r.status_code}). Starts: {preview}")
 
 
+def cached_get_json(url: str, params: Optional[Dict[str, Any]] = None,
+                    ttl: Optional[float] = None) -> Dict[str, Any]:
+    """
+    GET + JSON through the persistent response cache (http_cache).
+    
+    Fresh entries are served without a request. Stale entries are revalidated
+    with If-None-Match / If-Modified-Since and reused on 304, or served as-is
+    if the service is unreachable. Only for responses that rarely change
+    (boundary names and polygons).
+    """
+    cache = http_cache.get_response_cache()
+    if cache is None:
+        return safe_json(http_get(url, params=params))
+    key = cache.key(url, params)
+    entry = cache.get(key)
+    if entry is not None and entry.is_fresh(cache.ttl if ttl is None else ttl):
+        return entry.payload
+    
+    headers = dict(UA)
+    if entry is not None and entry.etag:
+        headers["If-None-Match"] = entry.etag
+    if entry is not None and entry.last_modified:
+        headers["If-Modified-Since"] = entry.last_modified
+    try:
+        r = http_get(url, params=params, headers=headers)
+    except RuntimeError:
+        if entry is not None:
+            return entry.payload
+        raise
+    if entry is not None and r.status_code == 304:
+        cache.touch(key, entry)
+        return entry.payload
+    js = safe_json(r)
+    # Only cache real, successful responses (ArcGIS reports errors with HTTP 200)
+    if isinstance(r, requests.Response) and isinstance(js, dict) and "error" not in js:
+        cache.put(key, url, js, r.headers.get("ETag", ""), r.headers.get("Last-Modified", ""))
+    return js
+
+
+def cached_post_json(url: str, data: Optional[Dict[str, Any]] = None,
+                     ttl: Optional[float] = None) -> Dict[str, Any]:
+    """POST + JSON through the response cache (TTL only; POST has no revalidation)"""
+    cache = http_cache.get_response_cache()
+    if cache is None:
+        return safe_json(http_post(url, data=data))
+    key = cache.key(url, data, method="POST")
+    entry = cache.get(key)
+    if entry is not None and entry.is_fresh(cache.ttl if ttl is None else ttl):
+        return entry.payload
+    try:
+        r = http_post(url, data=data)
+    except RuntimeError:
+        if entry is not None:
+            return entry.payload
+        raise
+    js = safe_json(r)
+    if isinstance(r, requests.Response) and isinstance(js, dict) and "error" not in js:
+        cache.put(key, url, js)
+    return js
+
+
 # ================= Geocoding / lookups =================
 def get_postcode_info(pc: str) -> Tuple[float, float, str]:
     """Geocode postcode to lat/lon using postcodes.io"""
@@ -167,8 +233,7 @@ def layer_intersect_names(layer_url: str, polygon_geom: Dict[str, Any], name_fie
         "outFields": name_field, "returnGeometry": "false", "outSR": 4326,
         "geometryPrecision": 5,
     }
-    r = http_post(f"{layer_url}/query", data=data)
-    js = safe_json(r)
+    js = cached_post_json(f"{layer_url}/query", data=data)
     names = [sstr((f.get("attributes") or {}).get(name_field)) for f in js.get("features", [])]
     return sorted({n for n in names if n})
 
@@ -194,8 +259,7 @@ def arcgis_name_query(layer_url: str, name_field: str, name_value: str) -> Dict[
         "returnGeometry": "true",
         "outSR": 4326
     }
-    r = http_get(f"{layer_url}/query", params=params)
-    js = safe_json(r)
+    js = cached_get_json(f"{layer_url}/query", params=params)
     feats = js.get("features") or []
     return feats[0] if feats else {}
 
@@ -207,6 +271,130 @@ def get_lpa_nca_for_point(lat: float, lon: float) -> Tuple[str, str]:
     return lpa, nca
 
 
+def esri_polygon_to_geojson(geom: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Convert an ArcGIS JSON polygon (rings) to a GeoJSON geometry"""
+    if not geom or "rings" not in geom:
+        return None
+    rings = geom.get("rings") or []
+    if not rings:
+        return None
+    if len(rings) == 1:
+        return {"type": "Polygon", "coordinates": [rings[0]]}
+    return {"type": "MultiPolygon", "coordinates": [[ring] for ring in rings]}
+
+
+# ================= Watercourse Catchments =================
+def wfs_point_query(wfs_url: str, lat: float, lon: float, timeout: float = 10) -> Dict[str, Any]:
+    """
+    Query WFS service for features containing a point.
+    Returns the first matching feature or empty dict.
+    """
+    try:
+        params = {
+            "service": "WFS",
+            "version": "2.0.0",
+            "request": "GetFeature",
+            "typeName": "ms:Water_Framework_Directive_River_Waterbody_Catchments_Cycle_2",
+            "outputFormat": "application/json",
+            "srsName": "EPSG:4326",
+            "CQL_FILTER": f"INTERSECTS(geom, POINT({lon} {lat}))"
+        }
+        r = http_get(wfs_url, params=params, timeout=timeout)
+        if r.status_code != 200:
+            return {}
+        js = safe_json(r)
+        features = js.get("features", [])
+        return features[0] if features else {}
+    except Exception:
+        return {}
+
+
+def waterbody_name_from_feature(feat: Dict[str, Any]) -> str:
+    """Extract the waterbody catchment name from a WFS feature"""
+    props = (feat or {}).get("properties") or {}
+    return sstr(
+        props.get("name") or
+        props.get("NAME") or
+        props.get("wb_name") or
+        props.get("WB_NAME") or
+        props.get("waterbody_name") or
+        ""
+    )
+
+
+def operational_name_from_feature(feat: Dict[str, Any]) -> str:
+    """Extract the operational catchment name from a WFS feature"""
+    props = (feat or {}).get("properties") or {}
+    return sstr(
+        props.get("name") or
+        props.get("NAME") or
+        props.get("oc_name") or
+        props.get("OC_NAME") or
+        props.get("operational_catchment_name") or
+        ""
+    )
+
+
+def get_watercourse_catchments_for_point(lat: float, lon: float) -> Tuple[str, str]:
+    """
+    Get waterbody and operational catchment names for a point.
+    Returns (waterbody_name, operational_catchment_name)
+    """
+    waterbody_name = waterbody_name_from_feature(wfs_point_query(WATERBODY_CATCHMENT_URL, lat, lon))
+    operational_name = operational_name_from_feature(wfs_point_query(OPERATIONAL_CATCHMENT_URL, lat, lon))
+    return waterbody_name, operational_name
+
+
+def calculate_watercourse_srm(site_waterbody: str, site_operational: str,
+                              bank_waterbody: str, bank_operational: str) -> float:
+    """
+    Calculate Spatial Risk Multiplier (SRM) for watercourse habitats based on catchment proximity.
+    
+    SRM Rules:
+    - Same waterbody catchment: SRM = 1.0 (no uplift)
+    - Same operational catchment (different waterbody): SRM = 0.75 (buyer needs 4/3x units)
+    - Outside operational catchment: SRM = 0.5 (buyer needs 2x units)
+    
+    Returns SRM multiplier (1.0, 0.75, or 0.5)
+    """
+    site_wb = norm_name(site_waterbody)
+    site_op = norm_name(site_operational)
+    bank_wb = norm_name(bank_waterbody)
+    bank_op = norm_name(bank_operational)
+    
+    # If catchment data is missing, default to far (0.5)
+    if not site_wb and not site_op:
+        return 0.5
+    if not bank_wb and not bank_op:
+        return 0.5
+    
+    if site_wb and bank_wb and site_wb == bank_wb:
+        return 1.0
+    if site_op and bank_op and site_op == bank_op:
+        return 0.75
+    return 0.5
+
+
+def watercourse_tier_for_srm(srm: float) -> str:
+    """Map catchment SRM to the pricing tier (1.0 → local, 0.75 → adjacent, 0.5 → far)"""
+    if srm >= 0.95:
+        return "local"
+    if srm >= 0.70:
+        return "adjacent"
+    return "far"
+
+
+def build_bank_catchment_map(backend: Dict[str, pd.DataFrame]) -> Dict[str, Tuple[str, str]]:
+    """bank_id → (waterbody, operational_catchment) from the optional BankCatchments table"""
+    bc = backend.get("BankCatchments")
+    if bc is None or bc.empty or "bank_id" not in bc.columns:
+        return {}
+    return {
+        sstr(r.get("bank_id")): (sstr(r.get("waterbody")), sstr(r.get("operational_catchment")))
+        for r in bc.to_dict("records")
+    }
+
+
 def get_lpa_nca_overlap_point(lpa_name: str, nca_name: str) -> Tuple[Optional[float], Optional[float], List[str], List[str]]:
     """
     Find a representative point in the overlap between an LPA and NCA.
@@ -530,6 +718,34 @@ def make_bank_key_col(df: pd.DataFrame, banks_df: pd.DataFrame) -> pd.DataFrame:
     return out
 
 
+PRICE_COLUMNS = ("price", "unit price", "unit_price", "unitprice")
+
+
+def normalise_pricing(pr_df: pd.DataFrame, banks_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Pricing with a float "price" column, BANK_KEY and optional text columns.
+    Join keys typed by reference_schema (already stripped/lower-cased) keep
+    their shared categorical dtypes; untyped keys are normalised as strings.
+    
+    Raises:
+        ValueError: if there is no price column
+    """
+    df = pr_df.copy()
+    price_cols = [c for c in df.columns if c.strip().lower() in PRICE_COLUMNS]
+    if not price_cols:
+        raise ValueError("Pricing sheet must contain a 'Price' column (or 'Unit Price').")
+    df["price"] = pd.to_numeric(df[price_cols[0]], errors="coerce")
+    for col, lower in (("tier", True), ("contract_size", True), ("bank_id", False), ("habitat_name", False)):
+        if not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(str).str.strip()
+            if lower:
+                df[col] = df[col].str.lower()
+    df = make_bank_key_col(df, banks_df)
+    if "broader_type" not in df.columns: df["broader_type"] = ""
+    if "distinctiveness_name" not in df.columns: df["distinctiveness_name"] = ""
+    return df
+
+
 # ================= Trading Rules =================
 def enforce_catalog_rules_official(demand_row, supply_row, dist_levels_map_local, explicit_rule: bool) -> bool:
     """Enforce catalog-based trading rules for area habitats"""
@@ -695,10 +911,22 @@ def enforce_watercourse_rules(demand_row, supply_row, dist_levels_map_local) ->
 
 
 # ================= Load Backend =================
-def load_backend() -> Dict[str, pd.DataFrame]:
-    """Load all reference/config tables from database"""
+# Quotes policies for stock availability (see repo.fetch_available_stock)
+QUOTES_HOLD_POLICIES = list(repo.QUOTES_HOLD_POLICIES)
+DEFAULT_QUOTES_HOLD_POLICY = repo.DEFAULT_QUOTES_HOLD_POLICY
+
+
+def load_backend(quotes_hold_policy: str = DEFAULT_QUOTES_HOLD_POLICY) -> Dict[str, pd.DataFrame]:
+    """
+    Load all reference/config tables from database.
+    "Stock" holds only positive availability under quotes_hold_policy,
+    computed in the database (repo.fetch_available_stock).
+    Also subscribes this process to reference change notifications, so edits
+    made elsewhere drop the affected cached tables here.
+    """
     try:
-        return repo.fetch_all_reference_tables()
+        repo.start_change_listener()
+        return repo.fetch_all_reference_tables(quotes_hold_policy=quotes_hold_policy)
     except Exception as e:
         raise RuntimeError(f"Failed to load reference tables from database: {e}")
 
@@ -725,8 +953,15 @@ def prepare_watercourse_options(demand_df: pd.DataFrame,
                                 lpa_neigh_norm: List[str], nca_neigh_norm: List[str],
                                 backend: Dict[str, pd.DataFrame],
                                 promoter_discount_type: str = None,
-                                promoter_discount_value: float = None) -> Tuple[List[dict], Dict[str, float], Dict[str, str]]:
-    """Build candidate options for watercourse ledger using UmbrellaType='watercourse'."""
+                                promoter_discount_value: float = None,
+                                site_waterbody: str = "",
+                                site_operational: str = "") -> Tuple[List[dict], Dict[str, float], Dict[str, str]]:
+    """Build candidate options for watercourse ledger using UmbrellaType='watercourse'.
+    
+    When the site's WFD catchments are known and the bank has a BankCatchments
+    entry, SRM comes from true catchment proximity; otherwise it is approximated
+    from LPA/NCA tiering.
+    """
     Banks = backend["Banks"].copy()
     Pricing = backend["Pricing"].copy()
     Catalog = backend["HabitatCatalog"].copy()
@@ -779,6 +1014,10 @@ def prepare_watercourse_options(demand_df: pd.DataFrame,
     # Additional safety: exclude hedgerows from watercourse ledger pricing
     pricing_enriched = pricing_enriched[~pricing_enriched["habitat_name"].map(is_hedgerow)].copy()
 
+    # Catchment data for true watercourse SRM (falls back to LPA/NCA tiering)
+    bank_catchment_map = build_bank_catchment_map(backend)
+    has_site_catchments = bool(sstr(site_waterbody) or sstr(site_operational))
+
     options: List[dict] = []
     stock_caps: Dict[str, float] = {}
     stock_bankkey: Dict[str, str] = {}
@@ -855,16 +1094,23 @@ def prepare_watercourse_options(demand_df: pd.DataFrame,
             if qty_avail <= 0:
                 continue
 
-            # For watercourses: Use LPA/NCA based tiering to estimate SRM
-            # Without catchment data, we map geographic tier to SRM tier
-            # local tier → SRM 1.0 (local catchment)
-            # adjacent tier → SRM 4/3 (adjacent catchment) 
-            # far tier → SRM 2.0 (national)
-            geographic_tier = tier_for_bank(
-                sstr(supply_row.get("lpa_name")), sstr(supply_row.get("nca_name")),
-                target_lpa, target_nca,
-                lpa_neigh, nca_neigh, lpa_neigh_norm, nca_neigh_norm
-            )
+            bank_catchments = bank_catchment_map.get(sstr(supply_row.get("bank_id")))
+            if has_site_catchments and bank_catchments:
+                # True catchment SRM (1.0 / 0.75 / 0.5) from WFD catchments
+                geographic_tier = watercourse_tier_for_srm(calculate_watercourse_srm(
+                    site_waterbody, site_operational, bank_catchments[0], bank_catchments[1]
+                ))
+            else:
+                # For watercourses: Use LPA/NCA based tiering to estimate SRM
+                # Without catchment data, we map geographic tier to SRM tier
+                # local tier → SRM 1.0 (local catchment)
+                # adjacent tier → SRM 4/3 (adjacent catchment) 
+                # far tier → SRM 2.0 (national)
+                geographic_tier = tier_for_bank(
+                    sstr(supply_row.get("lpa_name")), sstr(supply_row.get("nca_name")),
+                    target_lpa, target_nca,
+                    lpa_neigh, nca_neigh, lpa_neigh_norm, nca_neigh_norm
+                )
             
             # Map geographic tier to SRM and unit multiplier
             if geographic_tier == "local":
@@ -2544,8 +2790,27 @@ def optimise(demand_df: pd.DataFrame,
              backend: Dict[str, pd.DataFrame] = None,
              promoter_discount_type: str = None,
              promoter_discount_value: float = None,
-             return_debug_info: bool = False
+             return_debug_info: bool = False,
+             site_waterbody: str = "",
+             site_operational: str = "",
+             site_lat: Optional[float] = None,
+             site_lon: Optional[float] = None,
+             far_bank_k: Optional[int] = None,
+             prove_shortlist: Optional[bool] = None
              ) -> Tuple[pd.DataFrame, float, str, Optional[str]]:
+    """
+    Allocate demand to bank stock at minimum cost.
+
+    Far-tier options are shortlisted per demand to the far_bank_k nearest and
+    cheapest far banks (default BNG_FAR_BANK_SHORTLIST_K; 0 disables). With
+    prove_shortlist (default on), a shortlist that cannot be proven optimal
+    after the cost solve is discarded and the full option set is solved.
+    """
+    if far_bank_k is None:
+        far_bank_k = far_bank_k_from_env()
+    if prove_shortlist is None:
+        prove_shortlist = prove_shortlist_from_env()
+
     # Load backend if not provided
     if backend is None:
         backend = load_backend()
@@ -2599,7 +2864,8 @@ def optimise(demand_df: pd.DataFrame,
     options_water, caps_water, bk_water = prepare_watercourse_options(
         demand_df, chosen_size, target_lpa, target_nca,
         lpa_neigh, nca_neigh, lpa_neigh_norm, nca_neigh_norm,
-        backend, promoter_discount_type, promoter_discount_value
+        backend, promoter_discount_type, promoter_discount_value,
+        site_waterbody=site_waterbody, site_operational=site_operational
     )
 
     # ---- Combine ledgers into one joint solve ----
@@ -2617,6 +2883,14 @@ def optimise(demand_df: pd.DataFrame,
     stock_bankkey.update(bk_area)
     stock_bankkey.update(bk_hedge)
     stock_bankkey.update(bk_water)
+
+    # ---- Shortlist far-tier banks (nearest + cheapest per demand) ----
+    shortlist = shortlist_options(options, far_bank_k, BankLocator.from_banks(backend["Banks"]),
+                                  site_lat, site_lon)
+    options = shortlist.options
+    if shortlist.is_pruned:
+        debug_lines.append("")
+        debug_lines.append(f"📍 {shortlist.summary()} (K={far_bank_k})")
     
     # Collect debug info from prepare functions and add to diagnostics
     if hasattr(prepare_options, '_debug_info') and prepare_options._debug_info:
@@ -2824,9 +3098,29 @@ def optimise(demand_df: pd.DataFrame,
         probA.solve(pulp.PULP_CBC_CMD(msg=False))
         statusA = pulp.LpStatus[probA.status]
         if statusA not in ("Optimal", "Feasible"):
+            if shortlist.is_pruned:
+                # Shortlisted banks lack the capacity - retry with every bank
+                return optimise(demand_df, target_lpa, target_nca, lpa_neigh, nca_neigh,
+                                lpa_neigh_norm, nca_neigh_norm, backend,
+                                promoter_discount_type, promoter_discount_value, return_debug_info,
+                                site_waterbody, site_operational, site_lat, site_lon,
+                                far_bank_k=0, prove_shortlist=False)
             raise RuntimeError("Optimiser infeasible.")
         best_cost = pulp.value(pulp.lpSum([options[i]["unit_price"] * xA[i] for i in range(len(options))])) or 0.0
 
+        # Stage B accepts solutions up to best_cost + tight_threshold (see below)
+        tight_threshold = min(10.0, best_cost * 0.0001)  # £10 or 0.01% of cost
+
+        # Prove against that band: an excluded bank inside it could still win stage B on bank count
+        if prove_shortlist and shortlist.is_pruned and \
+                not shortlist_is_proven(shortlist, dem_need, best_cost, tol=tight_threshold + 1e-6):
+            # An excluded far bank might beat this - solve the full option set instead
+            return optimise(demand_df, target_lpa, target_nca, lpa_neigh, nca_neigh,
+                            lpa_neigh_norm, nca_neigh_norm, backend,
+                            promoter_discount_type, promoter_discount_value, return_debug_info,
+                            site_waterbody, site_operational, site_lat, site_lon,
+                            far_bank_k=0, prove_shortlist=False)
+
         def enforce_minimum_delivery(alloc_df):
             """
             Ensure total units_supplied >= 0.01 by padding the cheapest habitat.
@@ -2886,7 +3180,6 @@ def optimise(demand_df: pd.DataFrame,
         # Stage B: minimise #banks, but only if cost stays within numerical precision of Stage A
         # Use a very tight threshold (£10 or 0.01%, whichever is smaller) to ensure we prioritize
         # "always select cheapest" over bank minimization
-        tight_threshold = min(10.0, best_cost * 0.0001)  # £10 or 0.01% of cost
         probB, xB, zB, yB = build_problem(minimise_banks=True, cost_cap=best_cost + tight_threshold)
         probB.solve(pulp.PULP_CBC_CMD(msg=False))
         statusB = pulp.LpStatus[probB.status]
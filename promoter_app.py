@@ -16,11 +16,16 @@ from optimizer_core import (
     get_postcode_info, get_lpa_nca_for_point, get_lpa_nca_overlap_point,
     arcgis_point_query, arcgis_name_query, layer_intersect_names, norm_name,
     optimise, generate_client_report_table_fixed, load_backend,
-    http_get, safe_json, sstr
+    http_get, safe_json, sstr, get_watercourse_catchments_for_point
 )
+from repo import get_catchment_index
 from pdf_generator_promoter import generate_quote_pdf
 from email_notification import send_email_notification
 from database import SubmissionsDB
+import submission_queue
+
+# Finish any queued submission saves left by a previous run (write-behind)
+submission_queue.resume_pending(SubmissionsDB)
 
 # Constants
 LPA_URL = ("https://services1.arcgis.com/ESMARspQHYMw9BZ9/arcgis/rest/services/"
@@ -318,28 +323,14 @@ if st.session_state.show_my_quotes:
     if search_btn:
         try:
             db = SubmissionsDB()
-            engine = db._get_connection()
-            
-            query = "SELECT * FROM submissions WHERE promoter_name = %(promoter_name)s"
-            params = {"promoter_name": promoter_name}
-            
-            if search_client:
-                query += " AND client_name ILIKE %(client_name)s"
-                params["client_name"] = f"%{search_client}%"
-            if search_ref:
-                query += " AND reference_number ILIKE %(reference_number)s"
-                params["reference_number"] = f"%{search_ref}%"
-            if search_location:
-                query += " AND site_location ILIKE %(location)s"
-                params["location"] = f"%{search_location}%"
-            if search_lpa:
-                query += " AND target_lpa ILIKE %(lpa)s"
-                params["lpa"] = f"%{search_lpa}%"
-            
-            query += " ORDER BY submission_date DESC LIMIT 50"
-            
-            with engine.connect() as conn:
-                results_df = pd.read_sql_query(query, conn, params=params)
+            results_df, _ = db.list_submissions(
+                limit=50,
+                promoter_name=promoter_name,
+                client_name=search_client or None,
+                reference_number=search_ref or None,
+                site_location=search_location or None,
+                lpa=search_lpa or None
+            )
             
             st.session_state.quote_search_results = results_df
             
@@ -350,13 +341,7 @@ if st.session_state.show_my_quotes:
     if st.session_state.quote_search_results is None:
         try:
             db = SubmissionsDB()
-            engine = db._get_connection()
-            
-            query = "SELECT * FROM submissions WHERE promoter_name = %(promoter_name)s ORDER BY submission_date DESC LIMIT 20"
-            params = {"promoter_name": promoter_name}
-            
-            with engine.connect() as conn:
-                results_df = pd.read_sql_query(query, conn, params=params)
+            results_df, _ = db.list_submissions(limit=20, promoter_name=promoter_name)
             
             st.session_state.quote_search_results = results_df
         except Exception as e:
@@ -413,6 +398,21 @@ if st.session_state.show_my_quotes:
     elif results_df is not None:
         st.info("No quotes found. Submit a new quote or try different search criteria.")
     
+    # Units quoted per habitat across this promoter's quotes (aggregated in SQL)
+    with st.expander("📊 Units Quoted by Habitat", expanded=False):
+        try:
+            habitat_summary = SubmissionsDB().get_allocation_summary(
+                period=None, group_by=("habitat",), promoter_name=promoter_name
+            )
+            if habitat_summary.empty:
+                st.info("No allocated quotes yet.")
+            else:
+                st.dataframe(habitat_summary[["supply_habitat", "quotes", "units"]].rename(columns={
+                    "supply_habitat": "Habitat", "quotes": "Quotes", "units": "Units"
+                }).round(2), use_container_width=True, hide_index=True)
+        except Exception as e:
+            st.warning(f"Could not load habitat summary: {e}")
+    
     # Show selected quote details
     if st.session_state.selected_quote_id is not None:
         st.markdown("---")
@@ -1096,6 +1096,18 @@ if submitted:
             except Exception as e:
                 pass
         
+        # Watercourse catchments for SRM: offline index when populated, WFS otherwise
+        site_waterbody, site_operational = "", ""
+        if lat and lon:
+            try:
+                catchment_index = get_catchment_index()
+                if not catchment_index.is_empty:
+                    site_waterbody, site_operational = catchment_index.catchments_for_point(lat, lon)
+                else:
+                    site_waterbody, site_operational = get_watercourse_catchments_for_point(lat, lon)
+            except Exception as e:
+                pass
+        
         # ===== STEP 6: Run Optimizer =====
         show_loading_message(LOADING_MESSAGES[message_index % len(LOADING_MESSAGES)])
         message_index += 1
@@ -1116,7 +1128,11 @@ if submitted:
             backend=backend,
             promoter_discount_type=discount_type,
             promoter_discount_value=discount_value,
-            return_debug_info=True
+            return_debug_info=True,
+            site_waterbody=site_waterbody,
+            site_operational=site_operational,
+            site_lat=lat,
+            site_lon=lon
         )
         
         progress_bar.progress(70)
@@ -1357,8 +1373,9 @@ if submitted:
         # ===== STEP 8: Save to Database =====
         show_loading_message("Saving to database...")
         try:
-            db = SubmissionsDB()
-            submission_id = db.store_submission(
+            # Written in the background when write-behind is enabled
+            submission_receipt = submission_queue.save_submission(
+                SubmissionsDB,
                 client_name=client_name,
                 reference_number=reference_number,
                 site_location=location,  # Use combined location
@@ -18,9 +18,15 @@ from optimizer_core import (
     optimise, generate_client_report_table_fixed, load_backend,
     http_get, safe_json, sstr
 )
+from site_resolver import resolve_site_sync
+from repo import get_catchment_index
 from pdf_generator_promoter import generate_quote_pdf
 from email_notification import send_email_notification
 from database import SubmissionsDB
+import submission_queue
+
+# Finish any queued submission saves left by a previous run (write-behind)
+submission_queue.resume_pending(SubmissionsDB)
 
 # Constants
 LPA_URL = ("https://services1.arcgis.com/ESMARspQHYMw9BZ9/arcgis/rest/services/"
@@ -455,12 +461,25 @@ if submitted:
         message_index += 1
         progress_bar.progress(30)
         lat, lon = None, None
+        lpa_neighbors, nca_neighbors = [], []
+        site_waterbody, site_operational = "", ""
         
-        # Only geocode if we don't have manual LPA/NCA
+        # Only geocode if we don't have manual LPA/NCA. Geocoding, LPA/NCA point
+        # queries and neighbour lookups are resolved concurrently in one call.
         if not target_lpa or not target_nca:
             if postcode:
                 try:
-                    lat, lon, _ = get_postcode_info(postcode)
+                    site = resolve_site_sync(postcode, catchment_index=get_catchment_index())
+                    lat, lon = site.lat, site.lon
+                    if not target_lpa:
+                        target_lpa = site.lpa_name
+                    if not target_nca:
+                        target_nca = site.nca_name
+                    # Keep the target in the lists, as promoter_app does
+                    lpa_neighbors = site.lpa_intersecting
+                    nca_neighbors = site.nca_intersecting
+                    site_waterbody = site.waterbody
+                    site_operational = site.operational_catchment
                 except Exception as e:
                     pass
         
@@ -469,18 +488,6 @@ if submitted:
         message_index += 1
         progress_bar.progress(40)
         
-        # Only query if we don't have manual LPA/NCA
-        if not target_lpa or not target_nca:
-            if lat and lon:
-                try:
-                    queried_lpa, queried_nca = get_lpa_nca_for_point(lat, lon)
-                    if not target_lpa:
-                        target_lpa = queried_lpa
-                    if not target_nca:
-                        target_nca = queried_nca
-                except Exception as e:
-                    pass
-        
         # Ensure we have LPA/NCA values
         if not target_lpa:
             target_lpa = ""
@@ -491,20 +498,6 @@ if submitted:
         show_loading_message(LOADING_MESSAGES[message_index % len(LOADING_MESSAGES)])
         message_index += 1
         progress_bar.progress(50)
-        lpa_neighbors, nca_neighbors = [], []
-        
-        # If we have lat/lon from postcode, use point query
-        if lat and lon:
-            try:
-                lpa_feat = arcgis_point_query(LPA_URL, lat, lon, "LAD24NM")
-                nca_feat = arcgis_point_query(NCA_URL, lat, lon, "NCA_Name")
-                
-                if lpa_feat and lpa_feat.get("geometry"):
-                    lpa_neighbors = layer_intersect_names(LPA_URL, lpa_feat.get("geometry"), "LAD24NM")
-                if nca_feat and nca_feat.get("geometry"):
-                    nca_neighbors = layer_intersect_names(NCA_URL, nca_feat.get("geometry"), "NCA_Name")
-            except Exception as e:
-                pass
         
         # If we don't have neighbors yet and we have manual LPA/NCA, use name-based lookup
         # This also populates lat/lon from the LPA centroid
@@ -545,7 +538,11 @@ if submitted:
             backend=backend,
             promoter_discount_type=discount_type,
             promoter_discount_value=discount_value,
-            return_debug_info=True
+            return_debug_info=True,
+            site_waterbody=site_waterbody,
+            site_operational=site_operational,
+            site_lat=lat,
+            site_lon=lon
         )
         
         progress_bar.progress(70)
@@ -755,8 +752,9 @@ if submitted:
         # ===== STEP 8: Save to Database =====
         show_loading_message("Saving to database...")
         try:
-            db = SubmissionsDB()
-            submission_id = db.store_submission(
+            # Written in the background when write-behind is enabled
+            submission_receipt = submission_queue.save_submission(
+                SubmissionsDB,
                 client_name=client_name,
                 reference_number=reference_number,
                 site_location=location,  # Use combined location
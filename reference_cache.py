@@ -0,0 +1,126 @@
+"""
+reference_cache.py - Process-level TTL cache for reference data (NO Streamlit)
+
+Holds one copy of each reference table per process, shared by every
+Streamlit session, API request or RQ job running in it. Entries expire after
+a TTL and can be invalidated explicitly (e.g. after an import). Loads are
+serialised per key so concurrent callers after expiry trigger a single
+database read.
+
+Entries may carry a version token. Once stale, an entry whose token still
+matches the current one (from a cheap probe) is renewed without reloading,
+which is what lets the TTL be seconds rather than minutes.
+
+Configuration (environment variables):
+    BNG_REFERENCE_CACHE_TTL_SECONDS   how long before an entry is re-checked (default 60)
+"""
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+DEFAULT_TTL_SECONDS = 60.0
+
+
+def ttl_from_env() -> float:
+    try:
+        return float(os.getenv("BNG_REFERENCE_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS))
+    except ValueError:
+        return DEFAULT_TTL_SECONDS
+
+
+@dataclass
+class _Entry:
+    value: Any
+    loaded_at: float
+    ttl: float
+    version: Optional[str] = None
+    checked_at: Optional[float] = None
+
+    def is_fresh(self, now: float) -> bool:
+        checked = self.loaded_at if self.checked_at is None else self.checked_at
+        return (now - checked) < self.ttl
+
+
+class TTLCache:
+    """Thread-safe key -> value cache with per-entry TTL and per-key load locks"""
+
+    def __init__(self, ttl: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl_from_env() if ttl is None else float(ttl)
+        self._clock = clock
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self.loads = 0
+        self.hits = 0
+        self.revalidations = 0
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def get_or_load(self, key: str, loader: Callable[[], Any], ttl: Optional[float] = None,
+                    version: Optional[Callable[[], Optional[str]]] = None) -> Any:
+        """
+        Cached value for key, calling loader() if missing or expired.
+
+        If version is given it is called once the entry is stale; a token equal
+        to the one recorded at load time renews the entry without reloading.
+        A None token means "unknown" and always reloads.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry.is_fresh(self._clock()):
+            self.hits += 1
+            return entry.value
+        with self._key_lock(key):
+            # Another thread may have loaded it while we waited
+            entry = self._entries.get(key)
+            if entry is not None and entry.is_fresh(self._clock()):
+                self.hits += 1
+                return entry.value
+            # Probe before loading: a change that lands mid-load then shows
+            # up as a new token on the next check instead of being missed
+            token = version() if version is not None else None
+            if entry is not None and token is not None and token == entry.version:
+                entry.checked_at = self._clock()
+                self.revalidations += 1
+                return entry.value
+            value = loader()
+            self._entries[key] = _Entry(value, self._clock(), self.ttl if ttl is None else float(ttl),
+                                        version=token)
+            self.loads += 1
+            return value
+
+    def put(self, key: str, value: Any, version: Optional[str] = None,
+            fresh: bool = True, ttl: Optional[float] = None):
+        """
+        Seed an entry (e.g. from an on-disk snapshot). With fresh=False the
+        entry is served only after its version has been checked once.
+        """
+        now = self._clock()
+        entry = _Entry(value, now, self.ttl if ttl is None else float(ttl), version=version)
+        if not fresh:
+            entry.checked_at = now - entry.ttl
+        with self._lock:
+            self._entries[key] = entry
+
+    def invalidate(self, key: Optional[str] = None):
+        """Drop one key, or everything when key is None"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def age_seconds(self, key: str) -> Optional[float]:
+        entry = self._entries.get(key)
+        return None if entry is None else self._clock() - entry.loaded_at
+
+    def __contains__(self, key: str) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry.is_fresh(self._clock())
@@ -0,0 +1,594 @@
+"""
+reference_import.py - Bulk, transactional import of reference tables (NO Streamlit)
+
+Loads workbook sheets into the existing reference tables from
+supabase_schema.sql without dropping them:
+
+1. Validate the frames (key columns present and unique, Pricing/Stock rows
+   pointing at known banks and habitats) before touching the database
+2. In ONE transaction, stream each sheet with COPY into a temporary staging
+   table shaped like its target, and check the staged row counts
+3. Swap contents: Banks are upserted on bank_id (deleting them would cascade
+   to Pricing/Stock/BankCatchments), every other table is emptied with DELETE
+   and refilled from its staging table; banks missing from the workbook are
+   deleted last
+4. Bump ReferenceVersions, so every app process drops just these tables
+   (NOTIFY is delivered on commit, see reference_notify.py)
+
+Tables, indexes, triggers and RLS policies stay in place, and readers keep
+seeing the previous contents (MVCC) until the commit, so live quoting never
+sees a missing or half-loaded table. Any failure rolls back everything.
+
+sync_reference_tables() is the incremental alternative: it diffs each sheet
+against the database on its TableSpec key and applies only the
+inserts, updates and deletes, in one transaction. Unchanged tables are not
+written at all, so their version (and every cache keyed to it) stays put.
+
+Usage:
+    report = import_reference_tables(engine, read_workbook("Backend.xlsx"))
+    report = sync_reference_tables(engine, read_workbook("Backend.xlsx"), dry_run=True)
+"""
+
+import io
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import text
+
+
+class ImportValidationError(ValueError):
+    """Workbook data failed checks; nothing was written"""
+
+    def __init__(self, problems: List[str]):
+        self.problems = problems
+        super().__init__("Reference import rejected:\n" + "\n".join(f"  - {p}" for p in problems))
+
+
+@dataclass
+class TableSpec:
+    name: str
+    key: Tuple[str, ...] = ()
+    # key must be unique (the table has a unique constraint on it)
+    unique: bool = False
+    # upsert on key instead of DELETE + INSERT
+    upsert: bool = False
+    # column -> (table, column) it must refer to
+    references: Dict[str, Tuple[str, str]] = field(default_factory=dict)
+    # unknown references are errors (FK in the schema) rather than warnings
+    strict_references: Tuple[str, ...] = ()
+
+
+# Dependency order: parents first
+TABLE_SPECS = [
+    TableSpec("Banks", key=("bank_id",), unique=True, upsert=True),
+    TableSpec("HabitatCatalog", key=("habitat_name",), unique=True),
+    TableSpec("DistinctivenessLevels", key=("distinctiveness_name",), unique=True),
+    TableSpec("SRM", key=("tier",), unique=True),
+    TableSpec("Pricing", key=("bank_id", "habitat_name", "contract_size", "tier"),
+              references={"bank_id": ("Banks", "bank_id"), "habitat_name": ("HabitatCatalog", "habitat_name")},
+              strict_references=("bank_id",)),
+    TableSpec("Stock", key=("stock_id",),
+              references={"bank_id": ("Banks", "bank_id"), "habitat_name": ("HabitatCatalog", "habitat_name")},
+              strict_references=("bank_id",)),
+    TableSpec("TradingRules"),
+]
+SPECS_BY_NAME = {spec.name: spec for spec in TABLE_SPECS}
+
+# Columns the database fills in itself
+SERVER_COLUMNS = {"id", "created_at", "updated_at"}
+
+TEXT_TYPES = ("text", "character varying", "character")
+
+
+@dataclass
+class ImportReport:
+    rows: Dict[str, int] = field(default_factory=dict)
+    warnings: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def total_rows(self) -> int:
+        return sum(self.rows.values())
+
+
+@dataclass
+class TableDiff:
+    table: str
+    key: Tuple[str, ...]
+    inserts: List[dict] = field(default_factory=list)
+    updates: List[dict] = field(default_factory=list)
+    # key values (as stored) of rows to delete
+    deletes: List[tuple] = field(default_factory=list)
+    # keyless table whose contents differ: replaced whole
+    replace: Optional[List[dict]] = None
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.inserts or self.updates or self.deletes or self.replace is not None)
+
+    def summary(self) -> str:
+        if self.replace is not None:
+            return f"{self.table}: replaced ({len(self.replace)} rows)"
+        return f"{self.table}: +{len(self.inserts)} ~{len(self.updates)} -{len(self.deletes)}"
+
+
+@dataclass
+class SyncReport:
+    diffs: Dict[str, TableDiff] = field(default_factory=dict)
+    warnings: List[str] = field(default_factory=list)
+    applied: bool = False
+    seconds: float = 0.0
+
+    @property
+    def changed_tables(self) -> List[str]:
+        return [name for name, diff in self.diffs.items() if diff.changed]
+
+
+def read_workbook(excel_file: str, sheets: Optional[List[str]] = None) -> Dict[str, pd.DataFrame]:
+    """
+    Read reference sheets from a workbook (parsed once). Column names are
+    stripped; missing or empty sheets are left out.
+    """
+    wanted = sheets or [spec.name for spec in TABLE_SPECS]
+    with pd.ExcelFile(excel_file) as book:
+        tables = {}
+        for name in wanted:
+            if name not in book.sheet_names:
+                continue
+            df = book.parse(name)
+            if df.empty:
+                continue
+            df.columns = df.columns.astype(str).str.strip()
+            tables[name] = df
+    return tables
+
+
+def _key_strings(series: pd.Series) -> pd.Series:
+    return series.map(lambda v: "" if v is None or (isinstance(v, float) and math.isnan(v)) else str(v).strip())
+
+
+def validate_tables(tables: Dict[str, pd.DataFrame],
+                    existing_keys: Optional[Callable[[str, str], set]] = None) -> List[str]:
+    """
+    Check frames before import.
+
+    Args:
+        tables: Sheet name -> DataFrame
+        existing_keys: (table, column) -> set of values already in the database,
+            used for references to tables not being imported
+
+    Returns:
+        Warnings (unknown habitat references, duplicate non-constraint keys)
+
+    Raises:
+        ImportValidationError: missing/blank/duplicate keys, unknown banks
+    """
+    problems, warnings = [], []
+    for name, df in tables.items():
+        spec = SPECS_BY_NAME.get(name)
+        if spec is None:
+            problems.append(f"{name}: not a reference table")
+            continue
+        missing = [c for c in spec.key if c not in df.columns]
+        if missing:
+            problems.append(f"{name}: missing key column(s) {missing}")
+            continue
+        if not spec.key:
+            continue
+        keys = pd.DataFrame({c: _key_strings(df[c]) for c in spec.key})
+        blank = (keys == "").any(axis=1)
+        if blank.any():
+            problems.append(f"{name}: {int(blank.sum())} row(s) with blank {'/'.join(spec.key)} "
+                            f"(sheet rows {', '.join(str(i + 2) for i in keys.index[blank][:5])})")
+        dupes = keys[keys.duplicated(keep=False) & ~blank]
+        if not dupes.empty:
+            sample = ", ".join("/".join(r) for r in dupes.drop_duplicates().head(3).itertuples(index=False))
+            message = f"{name}: {len(dupes)} rows share a {'/'.join(spec.key)} (e.g. {sample})"
+            (problems if spec.unique else warnings).append(message)
+
+    for name, df in tables.items():
+        spec = SPECS_BY_NAME.get(name)
+        if spec is None:
+            continue
+        for col, (ref_table, ref_col) in spec.references.items():
+            if col not in df.columns:
+                continue
+            if ref_table in tables and ref_col in tables[ref_table].columns:
+                known = set(_key_strings(tables[ref_table][ref_col]))
+            elif existing_keys is not None:
+                known = {str(v).strip() for v in existing_keys(ref_table, ref_col)}
+            else:
+                continue
+            values = _key_strings(df[col])
+            unknown = sorted(set(values[(values != "") & ~values.isin(known)]))
+            if unknown:
+                message = (f"{name}: {col} not in {ref_table}: {', '.join(unknown[:5])}"
+                           f"{' …' if len(unknown) > 5 else ''}")
+                (problems if col in spec.strict_references else warnings).append(message)
+
+    if problems:
+        raise ImportValidationError(problems)
+    return warnings
+
+
+def _csv_field(value, is_text: bool) -> str:
+    """One field for COPY ... (FORMAT csv): unquoted empty is NULL, quoted "" is ''"""
+    if value is None or value is pd.NaT:
+        return ""
+    if hasattr(value, "item"):  # numpy scalar
+        value = value.item()
+    if isinstance(value, float):
+        if math.isnan(value) or math.isinf(value):
+            return ""
+        if is_text and value.is_integer():
+            value = int(value)
+        return f'"{value}"' if is_text else repr(value)
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return f'"{value}"' if is_text else str(value)
+    if isinstance(value, (pd.Timestamp,)):
+        value = value.isoformat()
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def csv_buffer(df: pd.DataFrame, columns: List[str], text_columns: set) -> io.StringIO:
+    """DataFrame columns as CSV text for COPY FROM STDIN"""
+    buf = io.StringIO()
+    flags = [c in text_columns for c in columns]
+    for row in df[columns].itertuples(index=False, name=None):
+        buf.write(",".join(_csv_field(v, t) for v, t in zip(row, flags)))
+        buf.write("\n")
+    buf.seek(0)
+    return buf
+
+
+def _copy_from(dbapi_conn, table: str, columns: List[str], buf: io.StringIO):
+    """COPY rows into table with whichever psycopg the engine uses"""
+    cols = ", ".join(f'"{c}"' for c in columns)
+    sql = f'COPY "{table}" ({cols}) FROM STDIN WITH (FORMAT csv)'
+    cur = dbapi_conn.cursor()
+    try:
+        if hasattr(cur, "copy"):  # psycopg 3
+            with cur.copy(sql) as copy:
+                while True:
+                    chunk = buf.read(1 << 20)
+                    if not chunk:
+                        break
+                    copy.write(chunk)
+        else:  # psycopg2
+            cur.copy_expert(sql, buf)
+    finally:
+        cur.close()
+
+
+def _param_value(value, is_text: bool):
+    """Python value for a bound parameter (NaN -> None, Excel integral floats in text columns -> "1")"""
+    if value is None or value is pd.NaT:
+        return None
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float):
+        if math.isnan(value) or math.isinf(value):
+            return None
+        if is_text and value.is_integer():
+            return str(int(value))
+    if is_text and not isinstance(value, str):
+        return str(value)
+    return value
+
+
+def _same(a, b) -> bool:
+    """Workbook vs database value equality, tolerant of int/float/str representation"""
+    a_null = a is None or (isinstance(a, float) and math.isnan(a))
+    b_null = b is None or (isinstance(b, float) and math.isnan(b))
+    if a_null or b_null:
+        return a_null and b_null
+    try:
+        return math.isclose(float(a), float(b), rel_tol=1e-12, abs_tol=1e-12)
+    except (TypeError, ValueError):
+        return str(a).strip() == str(b).strip()
+
+
+def diff_table(name: str, workbook: pd.DataFrame, current: pd.DataFrame,
+               columns: List[str], text_columns: set) -> TableDiff:
+    """
+    Keyed diff of a sheet against the table's current rows.
+
+    Args:
+        name: Table name (keyless tables are compared whole)
+        workbook: Sheet rows
+        current: Database rows (same columns)
+        columns: Columns to compare and write
+        text_columns: Columns stored as text
+
+    Raises:
+        ImportValidationError: duplicate keys on either side (diff would be ambiguous)
+    """
+    key = SPECS_BY_NAME[name].key
+    rows = [{c: _param_value(v, c in text_columns) for c, v in zip(columns, r)}
+            for r in workbook[columns].itertuples(index=False, name=None)]
+    if not key:
+        db_rows = [dict(zip(columns, r)) for r in current[columns].itertuples(index=False, name=None)]
+        canon = lambda rs: sorted(tuple("" if v is None else str(v) for v in (r[c] for c in columns)) for r in rs)
+        same = len(rows) == len(db_rows) and all(
+            all(_same(a, b) for a, b in zip(x, y)) for x, y in zip(canon(rows), canon(db_rows)))
+        return TableDiff(name, key, replace=None if same else rows)
+
+    def index(records, side):
+        out = {}
+        for r in records:
+            k = tuple("" if r[c] is None else str(r[c]).strip() for c in key)
+            if k in out:
+                raise ImportValidationError([f"{name}: {side} has more than one row for "
+                                             f"{'/'.join(key)} = {'/'.join(k)}; use a full import"])
+            out[k] = r
+        return out
+
+    wanted = index(rows, "workbook")
+    existing = index([dict(zip(columns, r)) for r in current[columns].itertuples(index=False, name=None)],
+                     "database")
+    diff = TableDiff(name, key)
+    for k, row in wanted.items():
+        old = existing.get(k)
+        if old is None:
+            diff.inserts.append(row)
+        elif not all(_same(row[c], old[c]) for c in columns):
+            diff.updates.append(row)
+    diff.deletes = [tuple(row[c] for c in key) for k, row in existing.items() if k not in wanted]
+    return diff
+
+
+def _table_columns(conn, table: str) -> Dict[str, str]:
+    rows = conn.execute(text("""
+        SELECT column_name, data_type FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = :table
+        ORDER BY ordinal_position
+    """), {"table": table}).fetchall()
+    return {name: data_type for name, data_type in rows}
+
+
+def _load_columns(spec: TableSpec, df: pd.DataFrame, target_columns: Dict[str, str]) -> List[str]:
+    """Sheet columns to write (those the table has, minus server-filled ones)"""
+    columns = [c for c in df.columns if c in target_columns and c not in SERVER_COLUMNS]
+    if not columns:
+        raise ImportValidationError([
+            f"{spec.name}: none of the sheet's columns {list(df.columns)} are in the table "
+            f"({sorted(set(target_columns) - SERVER_COLUMNS)})"])
+    return columns
+
+
+def _has_unique_constraint(conn, table: str, key: Tuple[str, ...]) -> bool:
+    """Whether a unique constraint/index covers exactly key (needed for ON CONFLICT)"""
+    rows = conn.execute(text("""
+        SELECT array_agg(a.attname::text)
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+        WHERE i.indrelid = to_regclass(:table) AND i.indisunique AND i.indpred IS NULL
+        GROUP BY i.indexrelid
+    """), {"table": f'"{table}"'}).fetchall()
+    return any(set(columns) == set(key) for (columns,) in rows)
+
+
+def _quoted(columns) -> str:
+    return ", ".join(f'"{c}"' for c in columns)
+
+
+def swap_statements(spec: TableSpec, columns: List[str], stage: str,
+                    unique_key: bool = True) -> Tuple[List[str], List[str]]:
+    """
+    SQL replacing spec.name's contents with the staging table's.
+
+    unique_key=False (no unique constraint on spec.key, so ON CONFLICT can't
+    be used) upserts with UPDATE ... FROM plus INSERT ... WHERE NOT EXISTS.
+
+    Returns:
+        (statements to run in dependency order, statements to run after
+        every table has been loaded)
+    """
+    target, cols = f'"{spec.name}"', _quoted(columns)
+    if not spec.upsert:
+        return [f"DELETE FROM {target}",
+                f"INSERT INTO {target} ({cols}) SELECT {cols} FROM {stage}"], []
+    key = _quoted(spec.key)
+    updates = [c for c in columns if c not in spec.key]
+    match = " AND ".join(f't."{c}" = s."{c}"' for c in spec.key)
+    delete = f"DELETE FROM {target} t WHERE NOT EXISTS (SELECT 1 FROM {stage} s WHERE {match})"
+    if not unique_key:
+        now = []
+        if updates:
+            set_clause = ", ".join(f'"{c}" = s."{c}"' for c in updates)
+            now.append(f"UPDATE {target} t SET {set_clause} FROM {stage} s WHERE {match}")
+        select = ", ".join(f's."{c}"' for c in columns)
+        now.append(f"INSERT INTO {target} ({cols}) SELECT {select} FROM {stage} s "
+                   f"WHERE NOT EXISTS (SELECT 1 FROM {target} t WHERE {match})")
+        return now, [delete]
+    if updates:
+        set_clause = ", ".join(f'"{c}" = EXCLUDED."{c}"' for c in updates)
+        conflict = f"ON CONFLICT ({key}) DO UPDATE SET {set_clause}"
+    else:
+        conflict = f"ON CONFLICT ({key}) DO NOTHING"
+    return [f"INSERT INTO {target} ({cols}) SELECT {cols} FROM {stage} {conflict}"], [delete]
+
+
+def import_reference_tables(engine, tables: Dict[str, pd.DataFrame],
+                            lock_timeout: str = "10s") -> ImportReport:
+    """
+    Replace reference table contents in one transaction (see module docstring).
+
+    Args:
+        engine: SQLAlchemy engine (psycopg or psycopg2 driver)
+        tables: Sheet name -> DataFrame, e.g. from read_workbook()
+        lock_timeout: Give up rather than queue behind long-held locks
+
+    Returns:
+        ImportReport with rows per table and validation warnings
+
+    Raises:
+        ImportValidationError: bad workbook data (nothing written)
+        Exception: database errors (transaction rolled back)
+    """
+    started = time.perf_counter()
+    ordered = [spec for spec in TABLE_SPECS if spec.name in tables]
+
+    def existing_keys(table: str, column: str) -> set:
+        with engine.connect() as conn:
+            return {r[0] for r in conn.execute(text(f'SELECT DISTINCT "{column}" FROM "{table}"'))}
+
+    report = ImportReport(warnings=validate_tables(tables, existing_keys))
+
+    with engine.begin() as conn:
+        conn.execute(text(f"SET LOCAL lock_timeout = '{lock_timeout}'"))
+        dbapi_conn = conn.connection.dbapi_connection
+        deferred = []
+        for spec in ordered:
+            df = tables[spec.name]
+            target_columns = _table_columns(conn, spec.name)
+            if not target_columns:
+                raise RuntimeError(f'Table "{spec.name}" does not exist - apply supabase_schema.sql first')
+            columns = _load_columns(spec, df, target_columns)
+            ignored = [c for c in df.columns if c not in target_columns]
+            if ignored:
+                report.warnings.append(f"{spec.name}: columns not in the table ignored: {ignored}")
+
+            stage = f'"_stage_{spec.name}"'
+            conn.execute(text(f'CREATE TEMP TABLE {stage} (LIKE "{spec.name}" INCLUDING DEFAULTS) ON COMMIT DROP'))
+            text_columns = {c for c, t in target_columns.items() if t in ("text", "character varying", "character")}
+            _copy_from(dbapi_conn, f"_stage_{spec.name}", columns, csv_buffer(df, columns, text_columns))
+            staged = conn.execute(text(f"SELECT COUNT(*) FROM {stage}")).scalar()
+            if staged != len(df):
+                raise RuntimeError(f"{spec.name}: staged {staged} rows but the sheet has {len(df)}")
+
+            unique_key = not spec.upsert or _has_unique_constraint(conn, spec.name, spec.key)
+            if not unique_key:
+                report.warnings.append(f"{spec.name}: no unique constraint on {list(spec.key)}; "
+                                       "upserting without ON CONFLICT")
+            now, later = swap_statements(spec, columns, stage, unique_key)
+            for statement in now:
+                conn.execute(text(statement))
+            deferred.extend(later)
+            report.rows[spec.name] = len(df)
+
+        for statement in deferred:
+            conn.execute(text(statement))
+
+        # Triggers bump versions too; this covers databases where they were lost
+        savepoint = conn.begin_nested()
+        try:
+            conn.execute(text(
+                'UPDATE "ReferenceVersions" SET version = version + 1, updated_at = NOW() '
+                'WHERE table_name = ANY(:names)'
+            ), {"names": [spec.name for spec in ordered]})
+            savepoint.commit()
+        except Exception:
+            savepoint.rollback()
+
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def _apply_diff(conn, diff: TableDiff, columns: List[str]):
+    target = f'"{diff.table}"'
+    insert = text(f"INSERT INTO {target} ({_quoted(columns)}) "
+                  f"VALUES ({', '.join(':' + _bind_name(c) for c in columns)})")
+    if diff.replace is not None:
+        conn.execute(text(f"DELETE FROM {target}"))
+        if diff.replace:
+            conn.execute(insert, _bind(diff.replace, columns))
+        return
+    if diff.inserts:
+        conn.execute(insert, _bind(diff.inserts, columns))
+    updates = [c for c in columns if c not in diff.key]
+    if diff.updates and updates:
+        where = " AND ".join(f'"{c}" = :{_bind_name(c)}' for c in diff.key)
+        sets = ", ".join(f'"{c}" = :{_bind_name(c)}' for c in updates)
+        conn.execute(text(f"UPDATE {target} SET {sets} WHERE {where}"), _bind(diff.updates, columns))
+
+
+def _delete_diff(conn, diff: TableDiff):
+    if diff.replace is None and diff.deletes:
+        where = " AND ".join(f'"{c}" = :{_bind_name(c)}' for c in diff.key)
+        conn.execute(text(f'DELETE FROM "{diff.table}" WHERE {where}'),
+                     [{_bind_name(c): v for c, v in zip(diff.key, k)} for k in diff.deletes])
+
+
+def _bind_name(column: str) -> str:
+    return "p_" + "".join(ch if ch.isalnum() else "_" for ch in column)
+
+
+def _bind(rows: List[dict], columns: List[str]) -> List[dict]:
+    return [{_bind_name(c): r[c] for c in columns} for r in rows]
+
+
+def sync_reference_tables(engine, tables: Dict[str, pd.DataFrame], dry_run: bool = False,
+                          lock_timeout: str = "10s") -> SyncReport:
+    """
+    Apply only what changed between the workbook and the database.
+
+    Diffs every sheet on its TableSpec key and, unless dry_run, applies the
+    inserts and updates (parents first) and deletes (children first) in one
+    transaction. Only tables that actually changed are written, so only their
+    versions are bumped and only they are refetched by the app.
+
+    Args:
+        engine: SQLAlchemy engine
+        tables: Sheet name -> DataFrame, e.g. from read_workbook()
+        dry_run: Report the diff without writing
+        lock_timeout: Give up rather than queue behind long-held locks
+
+    Returns:
+        SyncReport (report.diffs[table].summary() for "+inserts ~updates -deletes")
+
+    Raises:
+        ImportValidationError: bad workbook data or ambiguous keys (nothing written)
+    """
+    started = time.perf_counter()
+    ordered = [spec for spec in TABLE_SPECS if spec.name in tables]
+
+    def existing_keys(table: str, column: str) -> set:
+        with engine.connect() as conn:
+            return {r[0] for r in conn.execute(text(f'SELECT DISTINCT "{column}" FROM "{table}"'))}
+
+    report = SyncReport(warnings=validate_tables(tables, existing_keys))
+
+    with engine.begin() as conn:
+        conn.execute(text(f"SET LOCAL lock_timeout = '{lock_timeout}'"))
+        plan = []
+        for spec in ordered:
+            df = tables[spec.name]
+            target_columns = _table_columns(conn, spec.name)
+            if not target_columns:
+                raise RuntimeError(f'Table "{spec.name}" does not exist - apply supabase_schema.sql first')
+            columns = _load_columns(spec, df, target_columns)
+            missing_key = [c for c in spec.key if c not in columns]
+            if missing_key:
+                raise ImportValidationError([f"{spec.name}: sync key column(s) {missing_key} missing"])
+            current = pd.read_sql_query(text(f'SELECT {_quoted(columns)} FROM "{spec.name}"'), conn)
+            text_columns = {c for c, t in target_columns.items() if t in TEXT_TYPES}
+            diff = diff_table(spec.name, df, current, columns, text_columns)
+            report.diffs[spec.name] = diff
+            plan.append((diff, columns))
+
+        # a dry run (or a workbook with no changes) commits only its reads
+        if not dry_run and report.changed_tables:
+            for diff, columns in plan:
+                if diff.changed:
+                    _apply_diff(conn, diff, columns)
+            for diff, _ in reversed(plan):
+                _delete_diff(conn, diff)
+            savepoint = conn.begin_nested()
+            try:
+                conn.execute(text(
+                    'UPDATE "ReferenceVersions" SET version = version + 1, updated_at = NOW() '
+                    'WHERE table_name = ANY(:names)'
+                ), {"names": report.changed_tables})
+                savepoint.commit()
+            except Exception:
+                savepoint.rollback()
+            report.applied = True
+
+    report.seconds = time.perf_counter() - started
+    return report
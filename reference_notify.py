@@ -0,0 +1,184 @@
+"""
+reference_notify.py - Cross-process reference data change notifications (NO Streamlit)
+
+Every ReferenceVersions bump (statement triggers on the reference tables, or
+repo.mark_reference_tables_changed) sends a Postgres NOTIFY on CHANNEL with
+the table name as payload. A ReferenceChangeListener runs a daemon thread per
+process holding one dedicated LISTEN connection and calls on_change(table)
+as notifications arrive, so each replica and worker drops just the affected
+tables within moments of the commit.
+
+Where LISTEN is unavailable (no psycopg, transaction-mode poolers such as
+Supabase's port 6543, or a dropped connection) the listener falls back to
+polling the version probe every poll interval and reports tables whose
+token moved. After every (re)connect it polls once to catch anything missed
+while disconnected.
+
+Configuration (environment variables):
+    BNG_REFERENCE_LISTEN              0 = never LISTEN, poll only (default 1)
+    BNG_REFERENCE_LISTEN_URL          direct (session-mode) URL for LISTEN (default DATABASE_URL)
+    BNG_REFERENCE_POLL_SECONDS        poll interval / LISTEN keepalive (default 15)
+"""
+
+import logging
+import os
+import threading
+from typing import Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "bng_reference_changed"
+DEFAULT_POLL_SECONDS = 15.0
+# Wait before retrying LISTEN after it failed (polling meanwhile)
+RECONNECT_SECONDS = 60.0
+
+
+def poll_seconds_from_env() -> float:
+    try:
+        return max(1.0, float(os.getenv("BNG_REFERENCE_POLL_SECONDS", DEFAULT_POLL_SECONDS)))
+    except ValueError:
+        return DEFAULT_POLL_SECONDS
+
+
+def listen_enabled_from_env() -> bool:
+    return os.getenv("BNG_REFERENCE_LISTEN", "1").strip().lower() not in ("0", "false", "no")
+
+
+def listen_url(database_url: str) -> str:
+    """libpq connection string for psycopg from a SQLAlchemy URL"""
+    url = os.getenv("BNG_REFERENCE_LISTEN_URL", "").strip() or database_url
+    from sqlalchemy.engine import make_url
+    return make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+def psycopg_connector(database_url: str) -> Callable:
+    """connect() for ReferenceChangeListener using a dedicated autocommit psycopg connection"""
+    def connect():
+        import psycopg
+        return psycopg.connect(listen_url(database_url), autocommit=True, connect_timeout=10)
+    return connect
+
+
+def changed_tables(before: Dict[str, str], after: Dict[str, str]) -> list:
+    """Tables whose version token differs between two probes"""
+    return sorted(name for name in set(before) | set(after) if before.get(name) != after.get(name))
+
+
+class ReferenceChangeListener:
+    """
+    Background thread turning database change notifications into on_change(table) calls.
+
+    Args:
+        on_change: Called with each changed table name (from the listener thread)
+        poll_versions: Version probe, table name -> token ({} if unavailable)
+        connect: Returns a connection supporting execute() and notifies(timeout=),
+            or None to poll only
+        tables: Table names to report; other payloads are ignored
+        poll_interval: Seconds between polls, and the LISTEN keepalive timeout
+    """
+
+    def __init__(self, on_change: Callable[[str], None], poll_versions: Callable[[], Dict[str, str]],
+                 connect: Optional[Callable] = None, tables: Optional[Iterable[str]] = None,
+                 poll_interval: Optional[float] = None, channel: str = CHANNEL):
+        self.on_change = on_change
+        self.poll_versions = poll_versions
+        self.connect = connect
+        self.tables = set(tables) if tables is not None else None
+        self.poll_interval = poll_seconds_from_env() if poll_interval is None else float(poll_interval)
+        self.channel = channel
+        self.mode = "stopped"
+        self.notifications = 0
+        self.polls = 0
+        self._versions: Optional[Dict[str, str]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._conn = None
+
+    def start(self) -> "ReferenceChangeListener":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="reference-listener", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        conn = self._conn
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.mode = "stopped"
+
+    def _emit(self, table: str):
+        if self.tables is not None and table not in self.tables:
+            return
+        try:
+            self.on_change(table)
+        except Exception as e:
+            logger.warning(f"Reference change handler failed for {table}: {e}")
+
+    def poll_once(self) -> list:
+        """Probe versions and report tables changed since the previous probe"""
+        self.polls += 1
+        try:
+            versions = self.poll_versions() or {}
+        except Exception as e:
+            logger.debug(f"Reference version poll failed: {e}")
+            return []
+        if not versions:
+            return []
+        changed = [] if self._versions is None else changed_tables(self._versions, versions)
+        self._versions = versions
+        for table in changed:
+            self._emit(table)
+        return changed
+
+    def _listen(self):
+        """Serve notifications until stopped, LISTEN fails or the connection drops"""
+        try:
+            conn = self.connect()
+            conn.execute(f'LISTEN "{self.channel}"')
+        except Exception as e:
+            logger.info(f"Reference LISTEN unavailable, polling every {self.poll_interval:.0f}s: {e}")
+            return
+        self._conn = conn
+        self.mode = "listen"
+        try:
+            # Anything committed while we were not listening
+            self.poll_once()
+            while not self._stop.is_set():
+                for notify in conn.notifies(timeout=self.poll_interval):
+                    self.notifications += 1
+                    self._emit(notify.payload)
+                    if self._stop.is_set():
+                        break
+        except Exception as e:
+            if not self._stop.is_set():
+                logger.warning(f"Reference LISTEN connection lost, polling until it is back: {e}")
+        finally:
+            self._conn = None
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _poll_for(self, seconds: float):
+        self.mode = "poll"
+        waited = 0.0
+        while waited < seconds and not self._stop.is_set():
+            self.poll_once()
+            self._stop.wait(self.poll_interval)
+            waited += self.poll_interval
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self.connect is None:
+                self._poll_for(float("inf"))
+                break
+            self._listen()
+            if not self._stop.is_set():
+                self._poll_for(RECONNECT_SECONDS)
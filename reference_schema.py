@@ -0,0 +1,141 @@
+"""
+reference_schema.py - Column types for reference data frames (NO Streamlit)
+
+Casts the reference tables once, as they are loaded, instead of every
+preparer re-converting object columns with .map(sstr):
+
+- Join keys (habitat_name, bank_id, tier, contract_size) become categoricals.
+  Each key has one category dictionary shared by every table that carries
+  it, so merges between Pricing, Stock, HabitatCatalog and Banks compare
+  integer codes, and frame copies per session are a fraction of the size.
+  Key values are stripped and missing keys become "" (what sstr gives the
+  preparers), so sstr-mapping a key column keeps its categorical dtype.
+  tier and contract_size are also lower-cased, as the app compares them.
+- Numeric columns become float64. Unparseable values raise
+  ReferenceSchemaError instead of turning silently into NaN/0 downstream.
+- Free-text columns keep pandas' default string handling.
+
+Usage:
+    tables = apply_reference_schema(tables)
+"""
+
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+
+class ReferenceSchemaError(ValueError):
+    """Reference data does not match the expected schema"""
+
+    def __init__(self, problems: List[str]):
+        self.problems = problems
+        super().__init__("Reference data failed schema checks:\n" + "\n".join(f"  - {p}" for p in problems))
+
+
+# Key -> tables whose column of that name shares one category dictionary
+CATEGORY_KEYS = {
+    "habitat_name": ("HabitatCatalog", "Pricing", "Stock"),
+    "bank_id": ("Banks", "Pricing", "Stock", "BankCatchments"),
+    "tier": ("Pricing", "SRM"),
+    "contract_size": ("Pricing",),
+}
+
+# Keys whose values are compared lower-case
+LOWERCASE_KEYS = ("tier", "contract_size")
+
+NUMERIC_COLUMNS = {
+    "Banks": ("lat", "lon"),
+    "Pricing": ("price", "Price", "unit_price", "Unit Price", "UnitPrice"),
+    "Stock": ("quantity_available", "available_excl_quotes", "quoted"),
+    "DistinctivenessLevels": ("level_value",),
+    "SRM": ("multiplier",),
+}
+
+REQUIRED_COLUMNS = {
+    "Banks": ("bank_id", "bank_name"),
+    "Pricing": ("bank_id", "habitat_name", "contract_size", "tier"),
+    "HabitatCatalog": ("habitat_name", "broader_type", "distinctiveness_name"),
+    "Stock": ("bank_id", "habitat_name", "stock_id", "quantity_available"),
+    "DistinctivenessLevels": ("distinctiveness_name", "level_value"),
+    "SRM": ("tier", "multiplier"),
+}
+
+
+def _key_values(series: pd.Series, key: str = "") -> pd.Series:
+    """Stripped key strings (lower-cased for LOWERCASE_KEYS); missing -> "" """
+    values = series.astype(object)
+    values = values.where(values.notna(), "").map(lambda v: str(v).strip())
+    return values.map(str.lower) if key in LOWERCASE_KEYS else values
+
+
+def _to_float(series: pd.Series, label: str, problems: List[str]) -> pd.Series:
+    numbers = pd.to_numeric(series, errors="coerce").astype("float64")
+    raw = series.astype(object)
+    blank = raw.isna() | raw.map(lambda v: isinstance(v, str) and not v.strip())
+    bad = numbers.isna() & ~blank
+    if bad.any():
+        examples = ", ".join(repr(v) for v in raw[bad].unique()[:3])
+        problems.append(f"{label}: {int(bad.sum())} non-numeric value(s) (e.g. {examples})")
+    return numbers
+
+
+def category_dtypes(tables: Dict[str, pd.DataFrame]) -> Dict[str, pd.CategoricalDtype]:
+    """One CategoricalDtype per key, covering its values in every table"""
+    dtypes = {}
+    for key, names in CATEGORY_KEYS.items():
+        values = {""}
+        for name in names:
+            df = tables.get(name)
+            if df is not None and key in df.columns:
+                values.update(_key_values(df[key], key).unique())
+        dtypes[key] = pd.CategoricalDtype(sorted(values))
+    return dtypes
+
+
+def validate_reference_schema(tables: Dict[str, pd.DataFrame]) -> List[str]:
+    """Problems with required columns (empty optional tables are fine)"""
+    problems = []
+    for name, columns in REQUIRED_COLUMNS.items():
+        df = tables.get(name)
+        if df is None:
+            continue
+        missing = [c for c in columns if c not in df.columns]
+        if missing:
+            problems.append(f"{name}: missing column(s) {missing}")
+    return problems
+
+
+def apply_reference_schema(tables: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+    """
+    Typed copies of the reference tables (see module docstring).
+
+    Args:
+        tables: Table name -> DataFrame, as returned by repo.fetch_all_reference_tables
+
+    Returns:
+        New dict; tables without schema entries are passed through unchanged
+
+    Raises:
+        ReferenceSchemaError: listing every missing column and non-numeric value
+    """
+    problems = validate_reference_schema(tables)
+    dtypes = category_dtypes(tables)
+    typed = dict(tables)
+    for name, df in tables.items():
+        if df is None:
+            continue
+        out = None
+        for key, names in CATEGORY_KEYS.items():
+            if name in names and key in df.columns:
+                out = df.copy() if out is None else out
+                out[key] = _key_values(df[key], key).astype(dtypes[key])
+        for col in NUMERIC_COLUMNS.get(name, ()):
+            if col in df.columns and df[col].dtype != np.float64:
+                out = df.copy() if out is None else out
+                out[col] = _to_float(df[col], f"{name}.{col}", problems)
+        if out is not None:
+            typed[name] = out
+    if problems:
+        raise ReferenceSchemaError(problems)
+    return typed
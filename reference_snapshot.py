@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+reference_snapshot.py - Columnar on-disk snapshot of reference data (NO Streamlit)
+
+Writes every reference table (plus the WaterCatchments rows behind the
+catchment index, and the parsed catchment index itself) to Parquet files
+with a manifest holding per-file SHA-256 hashes, an overall content hash and
+the database version tokens captured at export time. The catchment index
+carries the WaterCatchments token it was built from, so seeding skips the
+GeoJSON parsing and the index is rebuilt only if WaterCatchments changed.
+The far-bank KD-tree is not stored: it is rebuilt from the snapshot's Banks
+rows per optimisation, which is cheap next to a polygon parse. A process can seed its reference cache from a snapshot at
+startup (memory-mapped reads, no Postgres round trips); the version tokens
+are checked against the database on first use, so only tables that changed
+since the export are refetched.
+
+Also gives reproducible offline fixtures for benchmarks and tests:
+set BNG_REFERENCE_SNAPSHOT_OFFLINE=1 to serve the snapshot without any
+database checks.
+
+Usage:
+    python reference_snapshot.py export <directory>
+    python reference_snapshot.py verify <directory>
+
+Configuration (environment variables):
+    BNG_REFERENCE_SNAPSHOT_DIR       seed repo's cache from this snapshot
+    BNG_REFERENCE_SNAPSHOT_OFFLINE   1 = trust the snapshot, never contact the database
+"""
+
+import hashlib
+import json
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+
+from catchments import CatchmentIndex
+
+MANIFEST_NAME = "manifest.json"
+SNAPSHOT_FORMAT_VERSION = 2
+# Format 1 snapshots have no derived tables and are still readable
+READABLE_FORMATS = (1, 2)
+
+# Raw table backing repo.get_catchment_index()
+WATER_CATCHMENTS = "WaterCatchments"
+# Derived: CatchmentIndex.to_index_frame() of WATER_CATCHMENTS
+CATCHMENT_INDEX = "CatchmentIndex"
+# Derived table -> the table whose version token it carries
+DERIVED_FROM = {CATCHMENT_INDEX: WATER_CATCHMENTS}
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise RuntimeError("Reference snapshots need pyarrow (pip install pyarrow)")
+
+
+def _to_arrow(df: pd.DataFrame):
+    """Arrow table from a DataFrame; mixed-type object columns are stored as text"""
+    import pyarrow as pa
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        fixed = df.copy()
+        for col in fixed.columns:
+            if fixed[col].dtype == object:
+                fixed[col] = fixed[col].map(lambda v: None if v is None or (isinstance(v, float) and pd.isna(v)) else str(v))
+        return pa.Table.from_pandas(fixed, preserve_index=False)
+
+
+def _file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _content_hash(file_hashes: Dict[str, str]) -> str:
+    material = json.dumps(sorted(file_hashes.items()), separators=(",", ":"))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def write_snapshot(directory: str, tables: Dict[str, pd.DataFrame],
+                   versions: Optional[Dict[str, str]] = None) -> Dict:
+    """
+    Write tables as Parquet plus manifest.json into directory.
+
+    Args:
+        directory: Target directory (created if needed; existing files replaced)
+        tables: Table name -> DataFrame
+        versions: Table name -> database version token at export time
+            (derived tables get their source table's token)
+
+    Returns:
+        The manifest dict
+    """
+    _require_pyarrow()
+    import pyarrow.parquet as pq
+
+    out = Path(directory)
+    out.mkdir(parents=True, exist_ok=True)
+    entries = {}
+    for name, df in tables.items():
+        path = out / f"{name}.parquet"
+        pq.write_table(_to_arrow(df), path, compression="zstd")
+        entries[name] = {
+            "file": path.name,
+            "rows": int(len(df)),
+            "columns": [str(c) for c in df.columns],
+            "sha256": _file_sha256(path),
+            "version": (versions or {}).get(DERIVED_FROM.get(name, name)),
+        }
+        if name in DERIVED_FROM:
+            entries[name]["derived_from"] = DERIVED_FROM[name]
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "content_hash": _content_hash({n: e["sha256"] for n, e in entries.items()}),
+        "tables": entries,
+    }
+    tmp = out / (MANIFEST_NAME + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    tmp.replace(out / MANIFEST_NAME)
+    return manifest
+
+
+def read_manifest(directory: str) -> Dict:
+    path = Path(directory) / MANIFEST_NAME
+    manifest = json.loads(path.read_text(encoding="utf-8"))
+    if manifest.get("format") not in READABLE_FORMATS:
+        raise ValueError(f"Unsupported snapshot format {manifest.get('format')} in {path}")
+    return manifest
+
+
+def verify_snapshot(directory: str) -> Tuple[bool, list]:
+    """Check every file against its manifest hash. Returns (ok, errors)."""
+    errors = []
+    try:
+        manifest = read_manifest(directory)
+    except Exception as e:
+        return False, [f"manifest: {e}"]
+    file_hashes = {}
+    for name, entry in manifest["tables"].items():
+        path = Path(directory) / entry["file"]
+        if not path.exists():
+            errors.append(f"{name}: missing {entry['file']}")
+            continue
+        file_hashes[name] = _file_sha256(path)
+        if file_hashes[name] != entry["sha256"]:
+            errors.append(f"{name}: content hash mismatch")
+    if not errors and _content_hash(file_hashes) != manifest["content_hash"]:
+        errors.append("snapshot content hash mismatch")
+    return not errors, errors
+
+
+def load_snapshot(directory: str, verify: bool = True) -> Tuple[Dict[str, pd.DataFrame], Dict]:
+    """
+    Read a snapshot with memory-mapped Parquet reads.
+
+    Args:
+        directory: Snapshot directory
+        verify: Check file hashes first (raises ValueError on mismatch)
+
+    Returns:
+        (tables, manifest)
+    """
+    _require_pyarrow()
+    import pyarrow.parquet as pq
+
+    if verify:
+        ok, errors = verify_snapshot(directory)
+        if not ok:
+            raise ValueError(f"Reference snapshot {directory} failed verification: {'; '.join(errors)}")
+    manifest = read_manifest(directory)
+    tables = {}
+    for name, entry in manifest["tables"].items():
+        tables[name] = pq.read_table(Path(directory) / entry["file"], memory_map=True).to_pandas()
+    return tables, manifest
+
+
+def export_reference_snapshot(directory: str) -> Dict:
+    """Export the current database reference data (via repo) to directory"""
+    import repo
+
+    # Tokens first: a change that lands mid-export then shows as a newer
+    # version on first use instead of being silently baked in
+    versions = repo.current_versions()
+    tables = repo.fetch_all_reference_tables(typed=False)
+    tables[WATER_CATCHMENTS] = repo.fetch_water_catchments()
+    tables[CATCHMENT_INDEX] = CatchmentIndex.from_frame(tables[WATER_CATCHMENTS]).to_index_frame()
+    return write_snapshot(directory, tables, versions)
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ("export", "verify"):
+        print("Usage: python reference_snapshot.py export|verify <directory>")
+        sys.exit(1)
+    command, directory = sys.argv[1], sys.argv[2]
+
+    if command == "export":
+        manifest = export_reference_snapshot(directory)
+        for name, entry in manifest["tables"].items():
+            print(f"✓ {name}: {entry['rows']} rows")
+        print(f"\nSnapshot {manifest['content_hash'][:12]} written to {directory}")
+    else:
+        ok, errors = verify_snapshot(directory)
+        if not ok:
+            for error in errors:
+                print(f"❌ {error}")
+            sys.exit(1)
+        print(f"✓ Snapshot {read_manifest(directory)['content_hash'][:12]} verified")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,24 +2,147 @@
 Repository layer for BNG Optimiser reference/config tables.
 Reads all reference data from Supabase Postgres tables via SQLAlchemy Core.
 All table names and column names match the Excel tab names exactly.
+
+Framework-agnostic (NO Streamlit): tables are cached once per process in a
+TTL cache shared by the Streamlit apps, the API backend, RQ workers and CLI
+scripts. Every fetch returns a copy, so callers may modify what they get.
+
+Once a cached table is older than the TTL, one small query probes whether
+anything changed: the trigger-maintained ReferenceVersions table plus
+pg_stat_user_tables change counters. Only tables whose version moved are
+refetched. Without a usable probe, tables are refetched every MAX_AGE.
+Call invalidate() / mark_reference_tables_changed() after admin edits.
+
+start_change_listener() subscribes the process to change notifications
+(Postgres LISTEN/NOTIFY from the ReferenceVersions trigger, or polling the
+version probe where LISTEN is unavailable) so an admin edit drops just the
+affected tables in every replica and worker within moments, not at the
+next TTL check. See reference_notify.py.
+
+validate_reference_data() checks the required tables once per version:
+EXISTS probes for emptiness and anti-join counts for Pricing/Stock rows
+pointing at unknown banks or habitats, without reading any table.
+
+A process can start from an on-disk Parquet snapshot (reference_snapshot.py)
+instead of querying every table: snapshot entries carry the version tokens
+from export time and are refetched only if the database has moved on.
+
+Configuration (environment variables):
+    DATABASE_URL                         connection string (else Streamlit secrets)
+    BNG_REFERENCE_CACHE_TTL_SECONDS      how often to probe for changes (default 60)
+    BNG_REFERENCE_CACHE_MAX_AGE_SECONDS  refetch interval without a probe (default 600)
+    BNG_REFERENCE_SNAPSHOT_DIR           seed the cache from this snapshot on first use
+    BNG_REFERENCE_SNAPSHOT_OFFLINE       1 = serve the snapshot without database checks
+    BNG_REFERENCE_LISTEN                 0 = poll for changes instead of LISTEN (default 1)
+    BNG_REFERENCE_LISTEN_URL             session-mode URL for LISTEN (default DATABASE_URL)
+    BNG_REFERENCE_POLL_SECONDS           poll interval without LISTEN (default 15)
 """
 
-import streamlit as st
 import pandas as pd
 from sqlalchemy import text, MetaData, Table
-from typing import Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional
 import logging
+import os
+import threading
+import time
 
-from db import DatabaseConnection
+from db import DatabaseConnection, POOL_SIZE, get_database_url
+from catchments import CatchmentIndex
+from reference_cache import TTLCache
+from reference_notify import ReferenceChangeListener, listen_enabled_from_env, psycopg_connector
+from reference_schema import apply_reference_schema
 
 logger = logging.getLogger(__name__)
 
+# One copy of each reference table per process
+_cache = TTLCache()
+
+CATCHMENT_INDEX_KEY = "CatchmentIndex"
+VERSIONS_KEY = "__versions__"
+VALIDATION_KEY = "__validation__"
+# Prefix of the cached typed table sets (one per Stock variant)
+TYPED_TABLES_KEY = "__typed__"
+
+# Tables tracked by the version probe
+REFERENCE_TABLE_NAMES = (
+    "Banks", "Pricing", "HabitatCatalog", "Stock", "DistinctivenessLevels",
+    "SRM", "TradingRules", "WaterCatchments", "BankCatchments",
+)
+
+# Tables the optimiser cannot run without
+REQUIRED_REFERENCE_TABLES = (
+    "Banks", "Pricing", "HabitatCatalog", "Stock", "DistinctivenessLevels", "SRM",
+)
+
+# (table, column, parent table) whose column values must exist in the parent
+KEY_INTEGRITY_CHECKS = (
+    ("Pricing", "bank_id", "Banks"),
+    ("Pricing", "habitat_name", "HabitatCatalog"),
+    ("Stock", "bank_id", "Banks"),
+    ("Stock", "habitat_name", "HabitatCatalog"),
+)
+INTEGRITY_EXAMPLES = 5
+
+# Quotes policy -> share of quoted units held back from availability
+QUOTES_HOLD_POLICIES = {
+    "Ignore quotes (default)": 0.0,
+    "Quotes hold 100%": 1.0,
+    "Quotes hold 50%": 0.5,
+}
+DEFAULT_QUOTES_HOLD_POLICY = "Ignore quotes (default)"
+
+# Stock columns the optimiser uses
+AVAILABLE_STOCK_COLUMNS = ["bank_id", "habitat_name", "stock_id", "quantity_available"]
+
+# Full refetch interval when the database can't tell us what changed
+MAX_AGE_SECONDS = float(os.getenv("BNG_REFERENCE_CACHE_MAX_AGE_SECONDS", "600"))
+
+_VERSION_PROBE_SQL = text("""
+    SELECT t.relname, t.relid::bigint, t.n_tup_ins + t.n_tup_upd + t.n_tup_del, v.version
+    FROM pg_stat_user_tables t
+    LEFT JOIN "ReferenceVersions" v ON v.table_name = t.relname
+    WHERE t.schemaname = current_schema() AND t.relname = ANY(:names)
+""")
+
+# Same probe for databases without the ReferenceVersions table
+_STATS_PROBE_SQL = text("""
+    SELECT t.relname, t.relid::bigint, t.n_tup_ins + t.n_tup_upd + t.n_tup_del, NULL
+    FROM pg_stat_user_tables t
+    WHERE t.schemaname = current_schema() AND t.relname = ANY(:names)
+""")
+
+
+_EXISTING_TABLES_SQL = text("""
+    SELECT n FROM unnest(CAST(:names AS text[])) AS n
+    WHERE to_regclass(quote_ident(n)) IS NOT NULL
+""")
+
+
+_AVAILABLE_STOCK_SQL = text("""
+    SELECT bank_id, habitat_name, stock_id, quantity_available
+    FROM (
+        SELECT bank_id, habitat_name, stock_id,
+               GREATEST(COALESCE(available_excl_quotes, 0) - :hold * COALESCE(quoted, 0), 0)
+                   AS quantity_available
+        FROM "Stock"
+    ) s
+    WHERE quantity_available > 0
+""")
+
+# Same for Stock tables without the quote columns (used as-is, like the app did)
+_AVAILABLE_STOCK_PLAIN_SQL = text("""
+    SELECT bank_id, habitat_name, stock_id, quantity_available
+    FROM "Stock"
+    WHERE quantity_available > 0
+""")
+
 
-@st.cache_resource
 def get_db_engine():
     """
     Get the SQLAlchemy engine for database connections.
-    Cached as a resource to reuse across app reruns.
+    One pooled engine per process (see DatabaseConnection).
     
     Returns:
         SQLAlchemy Engine instance
@@ -27,7 +150,215 @@ def get_db_engine():
     return DatabaseConnection.get_engine()
 
 
-@st.cache_data(ttl=600)
+def _read_table(query, params: Optional[dict] = None) -> pd.DataFrame:
+    engine = get_db_engine()
+    with engine.connect() as conn:
+        return pd.read_sql_query(query, conn, params=params)
+
+
+def _load_versions() -> Dict[str, str]:
+    """
+    One round trip returning a change token per reference table.
+    
+    Tables with a ReferenceVersions row use the trigger-maintained version
+    alone, so statistics resets or a different replica's counters never
+    invalidate them. Tables without one fall back to
+    the table OID (changes when a table is dropped and re-created), the
+    insert/update/delete counters and the MAX_AGE time bucket as a safety
+    net. Returns {} if the probe is unavailable.
+    """
+    names = list(REFERENCE_TABLE_NAMES)
+    try:
+        with get_db_engine().connect() as conn:
+            try:
+                rows = conn.execute(_VERSION_PROBE_SQL, {"names": names}).fetchall()
+            except Exception:
+                conn.rollback()
+                rows = conn.execute(_STATS_PROBE_SQL, {"names": names}).fetchall()
+    except Exception as e:
+        logger.debug(f"Reference version probe unavailable: {e}")
+        return {}
+    
+    bucket = int(time.time() // MAX_AGE_SECONDS)
+    versions = {}
+    for relname, relid, changes, version in rows:
+        if version is not None:
+            versions[relname] = f"v{version}"
+        else:
+            versions[relname] = f"s{relid}:{changes}:{bucket}"
+    return versions
+
+
+def current_versions() -> Dict[str, str]:
+    """Change token per reference table, straight from the database ({} if unavailable)"""
+    return _load_versions()
+
+
+def _table_version(table_name: str) -> str:
+    """Current change token for a table (probe shared by all tables for one TTL)"""
+    versions = _cache.get_or_load(VERSIONS_KEY, _load_versions)
+    return versions.get(table_name) or f"age:{int(time.time() // MAX_AGE_SECONDS)}"
+
+
+def _snapshot_offline() -> bool:
+    return os.getenv("BNG_REFERENCE_SNAPSHOT_OFFLINE", "").strip().lower() in ("1", "true", "yes")
+
+
+_snapshot_lock = threading.Lock()
+_snapshot_checked = False
+
+
+def seed_from_snapshot(directory: str, offline: bool = False) -> Dict:
+    """
+    Load a reference snapshot into this process's cache.
+    
+    Args:
+        directory: Snapshot written by reference_snapshot.py
+        offline: Serve the snapshot as-is and never check the database.
+            Otherwise each table is validated against the database version
+            on first use and refetched only if it changed since export.
+    
+    Returns:
+        The snapshot manifest
+    """
+    from reference_snapshot import CATCHMENT_INDEX, WATER_CATCHMENTS, load_snapshot
+    
+    tables, manifest = load_snapshot(directory)
+    for name, df in tables.items():
+        version = manifest["tables"][name].get("version")
+        if name == CATCHMENT_INDEX:
+            # Prebuilt index, valid for the WaterCatchments version it carries
+            entries = {CATCHMENT_INDEX_KEY: CatchmentIndex.from_index_frame(df)}
+        elif name == WATER_CATCHMENTS:
+            if CATCHMENT_INDEX in tables:
+                continue
+            entries = {CATCHMENT_INDEX_KEY: CatchmentIndex.from_frame(df)}
+        elif name == "Stock":
+            entries = {"Stock": df}
+            entries.update({_available_stock_key(policy): apply_quotes_policy(df, policy)
+                            for policy in QUOTES_HOLD_POLICIES})
+        else:
+            entries = {name: df}
+        for key, value in entries.items():
+            if offline:
+                _cache.put(key, value, version, ttl=float("inf"))
+            else:
+                _cache.put(key, value, version, fresh=False)
+    logger.info(f"Reference cache seeded from snapshot {manifest['content_hash'][:12]} ({directory})")
+    return manifest
+
+
+def _seed_from_env_snapshot():
+    """Seed once per process from BNG_REFERENCE_SNAPSHOT_DIR, if set"""
+    global _snapshot_checked
+    if _snapshot_checked:
+        return
+    with _snapshot_lock:
+        if _snapshot_checked:
+            return
+        directory = os.getenv("BNG_REFERENCE_SNAPSHOT_DIR", "").strip()
+        if directory:
+            try:
+                seed_from_snapshot(directory, offline=_snapshot_offline())
+            except Exception as e:
+                logger.warning(f"Reference snapshot {directory} not used: {e}")
+        _snapshot_checked = True
+
+
+def _cached_table(table_name: str, loader: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+    """Cached copy of a table; load failures are raised and not cached"""
+    _seed_from_env_snapshot()
+    return _cache.get_or_load(table_name, loader, version=lambda: _table_version(table_name)).copy()
+
+
+def invalidate(table_name: Optional[str] = None):
+    """
+    Drop cached reference data in this process so the next fetch reads the database.
+    
+    Args:
+        table_name: Table to drop (e.g. "Stock"), or None for everything
+    """
+    _cache.invalidate(table_name)
+    _cache.invalidate(VERSIONS_KEY)
+    _cache.invalidate(VALIDATION_KEY)
+    # Typed sets span every table
+    for stock_key in ["Stock"] + [_available_stock_key(policy) for policy in QUOTES_HOLD_POLICIES]:
+        _cache.invalidate(_typed_tables_key(stock_key))
+    if table_name == "WaterCatchments":
+        _cache.invalidate(CATCHMENT_INDEX_KEY)
+    elif table_name == "Stock":
+        for policy in QUOTES_HOLD_POLICIES:
+            _cache.invalidate(_available_stock_key(policy))
+
+
+def mark_reference_tables_changed(table_names: Optional[Iterable[str]] = None):
+    """
+    "Invalidate now" hook for admin edits.
+    
+    Bumps the tables' versions in ReferenceVersions, so every process
+    refetches them at its next check (within the TTL), and drops this
+    process's copies immediately.
+    
+    Args:
+        table_names: Tables that changed, or None for all reference tables
+    """
+    names = list(table_names) if table_names is not None else list(REFERENCE_TABLE_NAMES)
+    try:
+        with get_db_engine().begin() as conn:
+            conn.execute(text(
+                'UPDATE "ReferenceVersions" SET version = version + 1, updated_at = NOW() '
+                'WHERE table_name = ANY(:names)'
+            ), {"names": names})
+    except Exception as e:
+        logger.warning(f"Could not bump reference versions (other processes refresh on their own schedule): {e}")
+    if table_names is None:
+        invalidate()
+    else:
+        for name in names:
+            invalidate(name)
+
+
+_listener: Optional[ReferenceChangeListener] = None
+_listener_lock = threading.Lock()
+
+
+def _on_reference_change(table_name: str):
+    logger.info(f"Reference table {table_name} changed, dropping cached copy")
+    invalidate(table_name)
+
+
+def start_change_listener() -> Optional[ReferenceChangeListener]:
+    """
+    Invalidate this process's cached tables as soon as they change in the database.
+    Idempotent: one listener thread per process. Not started in offline snapshot mode.
+    
+    Returns:
+        The running listener (listener.mode is "listen" or "poll"), or None
+    """
+    global _listener
+    if _snapshot_offline():
+        return None
+    with _listener_lock:
+        if _listener is None:
+            connect = None
+            if listen_enabled_from_env():
+                try:
+                    connect = psycopg_connector(get_database_url())
+                except Exception as e:
+                    logger.info(f"Reference LISTEN not configured, polling instead: {e}")
+            _listener = ReferenceChangeListener(_on_reference_change, _load_versions, connect=connect,
+                                                tables=REFERENCE_TABLE_NAMES).start()
+        return _listener
+
+
+def stop_change_listener():
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
 def fetch_banks() -> pd.DataFrame:
     """
     Fetch Banks reference table from Supabase.
@@ -45,19 +376,18 @@ def fetch_banks() -> pd.DataFrame:
     Returns:
         DataFrame with Banks data
     """
-    engine = get_db_engine()
-    query = "SELECT * FROM \"Banks\""
-    
-    try:
-        with engine.connect() as conn:
-            df = pd.read_sql_query(query, conn)
-        return df
-    except Exception as e:
-        logger.error(f"Error fetching Banks table: {e}")
-        raise RuntimeError(f"Failed to fetch Banks table from database: {e}")
+    def load() -> pd.DataFrame:
+        query = "SELECT * FROM \"Banks\""
+        
+        try:
+            return _read_table(query)
+        except Exception as e:
+            logger.error(f"Error fetching Banks table: {e}")
+            raise RuntimeError(f"Failed to fetch Banks table from database: {e}")
+
+    return _cached_table("Banks", load)
 
 
-@st.cache_data(ttl=600)
 def fetch_pricing() -> pd.DataFrame:
     """
     Fetch Pricing reference table from Supabase.
@@ -74,19 +404,18 @@ def fetch_pricing() -> pd.DataFrame:
     Returns:
         DataFrame with Pricing data
     """
-    engine = get_db_engine()
-    query = "SELECT * FROM \"Pricing\""
-    
-    try:
-        with engine.connect() as conn:
-            df = pd.read_sql_query(query, conn)
-        return df
-    except Exception as e:
-        logger.error(f"Error fetching Pricing table: {e}")
-        raise RuntimeError(f"Failed to fetch Pricing table from database: {e}")
+    def load() -> pd.DataFrame:
+        query = "SELECT * FROM \"Pricing\""
+        
+        try:
+            return _read_table(query)
+        except Exception as e:
+            logger.error(f"Error fetching Pricing table: {e}")
+            raise RuntimeError(f"Failed to fetch Pricing table from database: {e}")
+
+    return _cached_table("Pricing", load)
 
 
-@st.cache_data(ttl=600)
 def fetch_habitat_catalog() -> pd.DataFrame:
     """
     Fetch HabitatCatalog reference table from Supabase.
@@ -100,19 +429,18 @@ def fetch_habitat_catalog() -> pd.DataFrame:
     Returns:
         DataFrame with HabitatCatalog data
     """
-    engine = get_db_engine()
-    query = "SELECT * FROM \"HabitatCatalog\""
-    
-    try:
-        with engine.connect() as conn:
-            df = pd.read_sql_query(query, conn)
-        return df
-    except Exception as e:
-        logger.error(f"Error fetching HabitatCatalog table: {e}")
-        raise RuntimeError(f"Failed to fetch HabitatCatalog table from database: {e}")
+    def load() -> pd.DataFrame:
+        query = "SELECT * FROM \"HabitatCatalog\""
+        
+        try:
+            return _read_table(query)
+        except Exception as e:
+            logger.error(f"Error fetching HabitatCatalog table: {e}")
+            raise RuntimeError(f"Failed to fetch HabitatCatalog table from database: {e}")
+
+    return _cached_table("HabitatCatalog", load)
 
 
-@st.cache_data(ttl=600)
 def fetch_stock() -> pd.DataFrame:
     """
     Fetch Stock reference table from Supabase.
@@ -126,19 +454,114 @@ def fetch_stock() -> pd.DataFrame:
     Returns:
         DataFrame with Stock data
     """
-    engine = get_db_engine()
-    query = "SELECT * FROM \"Stock\""
-    
+    def load() -> pd.DataFrame:
+        query = "SELECT * FROM \"Stock\""
+        
+        try:
+            return _read_table(query)
+        except Exception as e:
+            logger.error(f"Error fetching Stock table: {e}")
+            raise RuntimeError(f"Failed to fetch Stock table from database: {e}")
+
+    return _cached_table("Stock", load)
+
+
+def quotes_hold_fraction(quotes_hold_policy: str) -> float:
+    """Share of quoted units held back under a quotes policy (see QUOTES_HOLD_POLICIES)"""
     try:
-        with engine.connect() as conn:
-            df = pd.read_sql_query(query, conn)
-        return df
-    except Exception as e:
-        logger.error(f"Error fetching Stock table: {e}")
-        raise RuntimeError(f"Failed to fetch Stock table from database: {e}")
+        return QUOTES_HOLD_POLICIES[quotes_hold_policy]
+    except KeyError:
+        raise ValueError(f"Unknown quotes policy {quotes_hold_policy!r}; "
+                         f"expected one of {list(QUOTES_HOLD_POLICIES)}")
+
+
+def _available_stock_key(quotes_hold_policy: str) -> str:
+    return f"AvailableStock:{quotes_hold_fraction(quotes_hold_policy)}"
+
+
+# Why quotes policies could not be applied at the last available-stock load
+# (Stock without available_excl_quotes/quoted), or None
+_quotes_policy_fallback: Optional[str] = None
+
+
+def _record_quotes_policy_fallback(reason: Optional[str]):
+    global _quotes_policy_fallback
+    if reason and reason != _quotes_policy_fallback:
+        logger.warning(f"Quotes policy not applied - optimiser stock is quantity_available as stored: {reason}")
+    _quotes_policy_fallback = reason
+
+
+def quotes_policy_fallback() -> Optional[str]:
+    """
+    Why the quotes policy is being ignored (the Stock table has no
+    available_excl_quotes/quoted columns), or None when it is applied.
+    Loads available stock (cached) if it hasn't been loaded yet.
+    """
+    fetch_available_stock()
+    return _quotes_policy_fallback
+
+
+def apply_quotes_policy(stock: pd.DataFrame, quotes_hold_policy: str = DEFAULT_QUOTES_HOLD_POLICY) -> pd.DataFrame:
+    """
+    In-memory equivalent of fetch_available_stock() for an already-loaded
+    Stock table (e.g. from a snapshot).
+    """
+    hold = quotes_hold_fraction(quotes_hold_policy)
+    s = stock.copy()
+    if {"available_excl_quotes", "quoted"}.issubset(s.columns):
+        excl = pd.to_numeric(s["available_excl_quotes"], errors="coerce").fillna(0)
+        quoted = pd.to_numeric(s["quoted"], errors="coerce").fillna(0)
+        s["quantity_available"] = (excl - hold * quoted).clip(lower=0)
+        _record_quotes_policy_fallback(None)
+    else:
+        _record_quotes_policy_fallback("Stock has no available_excl_quotes/quoted columns")
+        s["quantity_available"] = pd.to_numeric(s["quantity_available"], errors="coerce").fillna(0)
+    s = s[s["quantity_available"] > 0]
+    return s[AVAILABLE_STOCK_COLUMNS].reset_index(drop=True)
+
+
+def fetch_available_stock(quotes_hold_policy: str = DEFAULT_QUOTES_HOLD_POLICY) -> pd.DataFrame:
+    """
+    Fetch the stock the optimiser can allocate under a quotes policy.
+    
+    The policy is applied in SQL and only rows with positive availability
+    are returned, with just the columns the optimiser needs:
+        quantity_available = max(available_excl_quotes - hold * quoted, 0)
+    where hold is 0, 1 or 0.5 (QUOTES_HOLD_POLICIES). Stock tables without
+    the quote columns use quantity_available as stored; that is logged as a
+    warning and reported by quotes_policy_fallback().
+    
+    Cached per policy and refreshed whenever the Stock table changes.
+    
+    Args:
+        quotes_hold_policy: Key of QUOTES_HOLD_POLICIES
+    
+    Returns:
+        DataFrame with AVAILABLE_STOCK_COLUMNS
+    """
+    hold = quotes_hold_fraction(quotes_hold_policy)
+
+    def load() -> pd.DataFrame:
+        try:
+            stock = _read_table(_AVAILABLE_STOCK_SQL, {"hold": hold})
+        except Exception as e:
+            reason = f"Stock quote columns unavailable ({e})"
+        else:
+            _record_quotes_policy_fallback(None)
+            return stock
+        try:
+            stock = _read_table(_AVAILABLE_STOCK_PLAIN_SQL)
+        except Exception as e:
+            logger.error(f"Error fetching available stock: {e}")
+            raise RuntimeError(f"Failed to fetch available stock from database: {e}")
+        _record_quotes_policy_fallback(reason)
+        return stock
+
+    _seed_from_env_snapshot()
+    return _cache.get_or_load(_available_stock_key(quotes_hold_policy), load,
+                              version=lambda: _table_version("Stock")).copy()
 
 
-@st.cache_data(ttl=600)
 def fetch_distinctiveness_levels() -> pd.DataFrame:
     """
     Fetch DistinctivenessLevels reference table from Supabase.
@@ -150,19 +573,18 @@ def fetch_distinctiveness_levels() -> pd.DataFrame:
     Returns:
         DataFrame with DistinctivenessLevels data
     """
-    engine = get_db_engine()
-    query = "SELECT * FROM \"DistinctivenessLevels\""
-    
-    try:
-        with engine.connect() as conn:
-            df = pd.read_sql_query(query, conn)
-        return df
-    except Exception as e:
-        logger.error(f"Error fetching DistinctivenessLevels table: {e}")
-        raise RuntimeError(f"Failed to fetch DistinctivenessLevels table from database: {e}")
+    def load() -> pd.DataFrame:
+        query = "SELECT * FROM \"DistinctivenessLevels\""
+        
+        try:
+            return _read_table(query)
+        except Exception as e:
+            logger.error(f"Error fetching DistinctivenessLevels table: {e}")
+            raise RuntimeError(f"Failed to fetch DistinctivenessLevels table from database: {e}")
+
+    return _cached_table("DistinctivenessLevels", load)
 
 
-@st.cache_data(ttl=600)
 def fetch_srm() -> pd.DataFrame:
     """
     Fetch SRM (Strategic Resource Multipliers) reference table from Supabase.
@@ -174,19 +596,18 @@ def fetch_srm() -> pd.DataFrame:
     Returns:
         DataFrame with SRM data
     """
-    engine = get_db_engine()
-    query = "SELECT * FROM \"SRM\""
-    
-    try:
-        with engine.connect() as conn:
-            df = pd.read_sql_query(query, conn)
-        return df
-    except Exception as e:
-        logger.error(f"Error fetching SRM table: {e}")
-        raise RuntimeError(f"Failed to fetch SRM table from database: {e}")
+    def load() -> pd.DataFrame:
+        query = "SELECT * FROM \"SRM\""
+        
+        try:
+            return _read_table(query)
+        except Exception as e:
+            logger.error(f"Error fetching SRM table: {e}")
+            raise RuntimeError(f"Failed to fetch SRM table from database: {e}")
+
+    return _cached_table("SRM", load)
 
 
-@st.cache_data(ttl=600)
 def fetch_trading_rules() -> pd.DataFrame:
     """
     Fetch TradingRules reference table from Supabase (optional).
@@ -194,23 +615,97 @@ def fetch_trading_rules() -> pd.DataFrame:
     Returns:
         DataFrame with TradingRules data, or empty DataFrame if table doesn't exist
     """
-    engine = get_db_engine()
-    query = "SELECT * FROM \"TradingRules\""
+    def load() -> pd.DataFrame:
+        query = "SELECT * FROM \"TradingRules\""
+        
+        try:
+            return _read_table(query)
+        except Exception as e:
+            logger.warning(f"TradingRules table not found or error: {e}")
+            # Return empty DataFrame if table doesn't exist (optional table)
+            return pd.DataFrame()
+
+    return _cached_table("TradingRules", load)
+
+
+def fetch_bank_catchments() -> pd.DataFrame:
+    """
+    Fetch BankCatchments table from Supabase (optional).
+    Precomputed WFD catchments for each bank, used for watercourse SRM.
+    
+    Expected columns:
+        - bank_id: str
+        - waterbody: str
+        - operational_catchment: str
+    
+    Returns:
+        DataFrame with BankCatchments data, or empty DataFrame if table doesn't exist
+    """
+    def load() -> pd.DataFrame:
+        query = "SELECT bank_id, waterbody, operational_catchment FROM \"BankCatchments\""
+        
+        try:
+            return _read_table(query)
+        except Exception as e:
+            logger.warning(f"BankCatchments table not found or error: {e}")
+            return pd.DataFrame(columns=["bank_id", "waterbody", "operational_catchment"])
+
+    return _cached_table("BankCatchments", load)
+
+
+def fetch_water_catchments() -> pd.DataFrame:
+    """
+    Fetch WaterCatchments polygon table from Supabase (optional).
+    Not cached itself - only read through get_catchment_index().
+    
+    Expected columns:
+        - catchment_type: str ("waterbody" or "operational")
+        - catchment_name: str
+        - operational_catchment: str (parent catchment for waterbody rows)
+        - min_lon, min_lat, max_lon, max_lat: float (bounding box)
+        - geometry: str (GeoJSON geometry)
+    
+    Returns:
+        DataFrame with WaterCatchments data, or empty DataFrame if table doesn't exist
+    """
+    query = ("SELECT catchment_type, catchment_name, operational_catchment, "
+             "min_lon, min_lat, max_lon, max_lat, geometry::text AS geometry "
+             "FROM \"WaterCatchments\"")
     
     try:
-        with engine.connect() as conn:
-            df = pd.read_sql_query(query, conn)
-        return df
+        return _read_table(query)
     except Exception as e:
-        logger.warning(f"TradingRules table not found or error: {e}")
-        # Return empty DataFrame if table doesn't exist (optional table)
+        logger.warning(f"WaterCatchments table not found or error: {e}")
         return pd.DataFrame()
 
 
-def fetch_all_reference_tables() -> Dict[str, pd.DataFrame]:
+def get_catchment_index() -> CatchmentIndex:
+    """
+    Get the offline WFD catchment index built from the WaterCatchments table.
+    Cached per process so the polygons are parsed once, not per session or job.
+    
+    Returns:
+        CatchmentIndex (empty if the table is missing or unpopulated)
+    """
+    _seed_from_env_snapshot()
+    return _cache.get_or_load(CATCHMENT_INDEX_KEY, lambda: CatchmentIndex.from_frame(fetch_water_catchments()),
+                              version=lambda: _table_version("WaterCatchments"))
+
+
+def fetch_all_reference_tables(quotes_hold_policy: Optional[str] = None,
+                               typed: bool = True) -> Dict[str, pd.DataFrame]:
     """
     Fetch all reference/config tables from Supabase.
     
+    Args:
+        quotes_hold_policy: If given, "Stock" is the optimiser's available
+            stock under this policy (fetch_available_stock) instead of the
+            full table
+        typed: Cast with reference_schema (shared categorical join keys,
+            float64 numerics); raises ReferenceSchemaError on bad data.
+            The typed set is cached under the tables' version tokens, so it
+            is cast once per change, not per call
+    
     Returns:
         Dictionary with table names as keys and DataFrames as values.
         Matches the structure previously loaded from Excel:
@@ -221,18 +716,176 @@ def fetch_all_reference_tables() -> Dict[str, pd.DataFrame]:
             "Stock": DataFrame,
             "DistinctivenessLevels": DataFrame,
             "SRM": DataFrame,
-            "TradingRules": DataFrame (optional)
+            "TradingRules": DataFrame (optional),
+            "BankCatchments": DataFrame (optional)
         }
     """
-    return {
-        "Banks": fetch_banks(),
-        "Pricing": fetch_pricing(),
-        "HabitatCatalog": fetch_habitat_catalog(),
-        "Stock": fetch_stock(),
-        "DistinctivenessLevels": fetch_distinctiveness_levels(),
-        "SRM": fetch_srm(),
-        "TradingRules": fetch_trading_rules()
+    fetchers = {
+        "Banks": fetch_banks,
+        "Pricing": fetch_pricing,
+        "HabitatCatalog": fetch_habitat_catalog,
+        "Stock": fetch_stock,
+        "DistinctivenessLevels": fetch_distinctiveness_levels,
+        "SRM": fetch_srm,
+        "TradingRules": fetch_trading_rules,
+        "BankCatchments": fetch_bank_catchments
     }
+    cache_keys = {}
+    if quotes_hold_policy is not None:
+        fetchers["Stock"] = lambda: fetch_available_stock(quotes_hold_policy)
+        cache_keys["Stock"] = _available_stock_key(quotes_hold_policy)
+    _seed_from_env_snapshot()
+    if typed:
+        # Cast once per version of the tables, not on every call
+        typed_tables = _cache.get_or_load(
+            _typed_tables_key(cache_keys.get("Stock", "Stock")),
+            lambda: apply_reference_schema(_fetch_tables(fetchers, cache_keys)),
+            version=lambda: "|".join(_table_version(name) for name in fetchers))
+        return {name: df.copy() for name, df in typed_tables.items()}
+    return _fetch_tables(fetchers, cache_keys)
+
+
+def _typed_tables_key(stock_key: str) -> str:
+    return f"{TYPED_TABLES_KEY}:{stock_key}"
+
+
+def _fetch_tables(fetchers: Dict[str, Callable[[], pd.DataFrame]],
+                  cache_keys: Dict[str, str]) -> Dict[str, pd.DataFrame]:
+    """Run the table fetchers, concurrently when more than one is a cache miss"""
+    missing = [name for name in fetchers if cache_keys.get(name, name) not in _cache]
+    if len(missing) <= 1:
+        tables = {name: fetch() for name, fetch in fetchers.items()}
+    else:
+        # Cache miss: run the queries concurrently over the pooled engine
+        # (one round trip of latency instead of one per table)
+        with ThreadPoolExecutor(max_workers=min(len(missing), max(1, POOL_SIZE)),
+                                thread_name_prefix="repo-fetch") as pool:
+            futures = {name: pool.submit(fetchers[name]) for name in missing}
+            # Results in the usual order; the first failing required table raises
+            tables = {name: futures[name].result() if name in futures else fetch()
+                      for name, fetch in fetchers.items()}
+    return tables
+
+
+@dataclass
+class ReferenceValidation:
+    """Result of validate_reference_data(): table status plus key-integrity warnings"""
+    # required table -> exists and has rows
+    status: Dict[str, bool] = field(default_factory=dict)
+    errors: List[str] = field(default_factory=list)
+    # rows whose keys point at unknown banks/habitats (filtered out at solve time)
+    warnings: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+def _existing_tables(conn, names: List[str]) -> set:
+    rows = conn.execute(_EXISTING_TABLES_SQL, {"names": names}).fetchall()
+    return {r[0] for r in rows}
+
+
+def _integrity_warning(table: str, column: str, parent: str, count: int, examples) -> str:
+    sample = ", ".join(sorted(str(e) for e in (examples or [])))
+    return f"{table}: {count} row(s) with {column} not in {parent} (e.g. {sample})"
+
+
+def _validate_in_database() -> ReferenceValidation:
+    """Existence, EXISTS-based emptiness and key integrity in three small queries (key integrity best effort)"""
+    result = ReferenceValidation()
+    with get_db_engine().connect() as conn:
+        present = _existing_tables(conn, list(REQUIRED_REFERENCE_TABLES))
+        if present:
+            nonempty = " UNION ALL ".join(
+                f"SELECT '{name}', EXISTS (SELECT 1 FROM \"{name}\")" for name in REQUIRED_REFERENCE_TABLES
+                if name in present)
+            has_rows = dict(conn.execute(text(nonempty)).fetchall())
+        else:
+            has_rows = {}
+        checks = [check for check in KEY_INTEGRITY_CHECKS if check[0] in present and check[2] in present]
+        if checks:
+            integrity = " UNION ALL ".join(
+                f"SELECT '{table}', '{column}', '{parent}', COUNT(*), "
+                f"(ARRAY_AGG(DISTINCT btrim(c.\"{column}\"::text)))[1:{INTEGRITY_EXAMPLES}] "
+                f"FROM \"{table}\" c WHERE c.\"{column}\" IS NOT NULL AND NOT EXISTS "
+                f"(SELECT 1 FROM \"{parent}\" p WHERE btrim(p.\"{column}\"::text) = btrim(c.\"{column}\"::text))"
+                for table, column, parent in checks)
+            try:
+                rows = conn.execute(text(integrity)).fetchall()
+            except Exception as e:
+                conn.rollback()
+                logger.warning(f"Reference key integrity not checked: {e}")
+                rows = []
+            for table, column, parent, count, examples in rows:
+                if count:
+                    result.warnings.append(_integrity_warning(table, column, parent, count, examples))
+    for warning in result.warnings:
+        logger.warning(f"Reference data: {warning}")
+    for name in REQUIRED_REFERENCE_TABLES:
+        result.status[name] = bool(has_rows.get(name))
+        if not result.status[name]:
+            result.errors.append(f"{name} table is empty or missing")
+    return result
+
+
+def _validate_frames(tables: Dict[str, pd.DataFrame]) -> ReferenceValidation:
+    """Same checks on loaded frames (offline snapshot mode has no database)"""
+    result = ReferenceValidation()
+    for name in REQUIRED_REFERENCE_TABLES:
+        df = tables.get(name)
+        result.status[name] = df is not None and not df.empty
+        if not result.status[name]:
+            result.errors.append(f"{name} table is empty or missing")
+    for table, column, parent in KEY_INTEGRITY_CHECKS:
+        child, known = tables.get(table), tables.get(parent)
+        if child is None or known is None or column not in child.columns or column not in known.columns:
+            continue
+        values = child[column].dropna().astype(str).str.strip()
+        unknown = values[~values.isin(set(known[column].dropna().astype(str).str.strip()))]
+        if len(unknown):
+            examples = sorted(unknown.unique())[:INTEGRITY_EXAMPLES]
+            result.warnings.append(_integrity_warning(table, column, parent, len(unknown), examples))
+    return result
+
+
+def _validate_offline() -> ReferenceValidation:
+    fetchers = {
+        "Banks": fetch_banks,
+        "Pricing": fetch_pricing,
+        "HabitatCatalog": fetch_habitat_catalog,
+        "Stock": fetch_stock,
+        "DistinctivenessLevels": fetch_distinctiveness_levels,
+        "SRM": fetch_srm,
+    }
+    tables = {}
+    for name in REQUIRED_REFERENCE_TABLES:
+        try:
+            tables[name] = fetchers[name]()
+        except Exception as e:
+            logger.error(f"Error checking table {name}: {e}")
+    return _validate_frames(tables)
+
+
+def _validation_version() -> str:
+    return "|".join(_table_version(name) for name in REQUIRED_REFERENCE_TABLES)
+
+
+def validate_reference_data() -> ReferenceValidation:
+    """
+    Check the required reference tables once per reference-data version.
+    
+    Emptiness is tested with EXISTS (no table is read), and key integrity
+    (Pricing/Stock rows pointing at unknown banks or habitats) with
+    anti-join counts. The result is cached like a table and recomputed
+    only when one of the required tables changes.
+    
+    Raises:
+        Database errors (not cached, so the next call retries)
+    """
+    _seed_from_env_snapshot()
+    loader = _validate_offline if _snapshot_offline() else _validate_in_database
+    return _cache.get_or_load(VALIDATION_KEY, loader, version=_validation_version)
 
 
 def check_required_tables_not_empty() -> Dict[str, bool]:
@@ -243,60 +896,23 @@ def check_required_tables_not_empty() -> Dict[str, bool]:
     Returns:
         Dictionary with table names as keys and boolean values indicating if table is non-empty
     """
-    required_tables = [
-        "Banks",
-        "Pricing",
-        "HabitatCatalog",
-        "Stock",
-        "DistinctivenessLevels",
-        "SRM"
-    ]
-    
-    status = {}
-    
-    for table_name in required_tables:
-        try:
-            if table_name == "Banks":
-                df = fetch_banks()
-            elif table_name == "Pricing":
-                df = fetch_pricing()
-            elif table_name == "HabitatCatalog":
-                df = fetch_habitat_catalog()
-            elif table_name == "Stock":
-                df = fetch_stock()
-            elif table_name == "DistinctivenessLevels":
-                df = fetch_distinctiveness_levels()
-            elif table_name == "SRM":
-                df = fetch_srm()
-            else:
-                df = pd.DataFrame()
-            
-            status[table_name] = not df.empty
-        except Exception as e:
-            logger.error(f"Error checking table {table_name}: {e}")
-            status[table_name] = False
-    
-    return status
+    try:
+        return dict(validate_reference_data().status)
+    except Exception as e:
+        logger.error(f"Error checking reference tables: {e}")
+        return {name: False for name in REQUIRED_REFERENCE_TABLES}
 
 
 def validate_reference_tables() -> tuple[bool, list[str]]:
     """
     Validate that all required reference tables exist and have data.
+    Cheap on every rerun: see validate_reference_data().
     
     Returns:
         Tuple of (all_valid: bool, errors: list[str])
     """
-    errors = []
-    
     try:
-        status = check_required_tables_not_empty()
-        
-        for table_name, is_valid in status.items():
-            if not is_valid:
-                errors.append(f"{table_name} table is empty or missing")
-        
-        return (len(errors) == 0, errors)
-    
+        result = validate_reference_data()
+        return (result.ok, list(result.errors))
     except Exception as e:
-        errors.append(f"Failed to validate reference tables: {e}")
-        return (False, errors)
+        return (False, [f"Failed to validate reference tables: {e}"])
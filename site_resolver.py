@@ -0,0 +1,190 @@
+"""
+site_resolver.py - Concurrent site resolution (NO Streamlit)
+
+Resolving a site means geocoding the postcode and then running the LPA/NCA
+point queries, the two neighbour intersections and the two catchment lookups
+(offline index when populated, WFS otherwise). Only geocoding has to happen
+first; everything else is independent, so this module fans those calls out
+concurrently under a single deadline and returns one SiteContext.
+
+Usage:
+    from site_resolver import resolve_site_sync
+
+    site = resolve_site_sync("SO23 9LJ")
+    print(site.lpa_name, site.nca_name, site.lpa_neighbors)
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import optimizer_core as oc
+from catchments import CatchmentIndex
+
+# Whole-site budget in seconds (geocoding + all lookups)
+DEFAULT_SITE_DEADLINE_SECONDS = 20.0
+
+# Dedicated pool so a slow request left behind after the deadline never
+# blocks interpreter/event-loop shutdown the way the default executor does.
+_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="site-resolver")
+
+# Runs resolve_site_sync's own event loop when the caller's thread already has
+# one; kept apart from _EXECUTOR so it can't starve the lookups it waits on.
+_LOOP_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="site-resolver-loop")
+
+
+@dataclass
+class SiteContext:
+    """Everything the optimiser and map need to know about a target site"""
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    lpa_name: str = ""
+    nca_name: str = ""
+    lpa_neighbors: List[str] = field(default_factory=list)
+    nca_neighbors: List[str] = field(default_factory=list)
+    # Every polygon touching the target's, target included, as layer_intersect_names returns them
+    lpa_intersecting: List[str] = field(default_factory=list)
+    nca_intersecting: List[str] = field(default_factory=list)
+    lpa_geometry_esri: Optional[Dict[str, Any]] = None
+    nca_geometry_esri: Optional[Dict[str, Any]] = None
+    waterbody: str = ""
+    operational_catchment: str = ""
+    errors: List[str] = field(default_factory=list)
+    elapsed_seconds: float = 0.0
+
+    @property
+    def lpa_neighbors_norm(self) -> List[str]:
+        return [oc.norm_name(n) for n in self.lpa_neighbors]
+
+    @property
+    def nca_neighbors_norm(self) -> List[str]:
+        return [oc.norm_name(n) for n in self.nca_neighbors]
+
+    @property
+    def lpa_geojson(self) -> Optional[Dict[str, Any]]:
+        return oc.esri_polygon_to_geojson(self.lpa_geometry_esri)
+
+    @property
+    def nca_geojson(self) -> Optional[Dict[str, Any]]:
+        return oc.esri_polygon_to_geojson(self.nca_geometry_esri)
+
+    @property
+    def complete(self) -> bool:
+        """True if every lookup finished without error inside the deadline"""
+        return not self.errors
+
+
+async def _run(fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_EXECUTOR, fn, *args)
+
+
+async def _resolve_layer(layer_url: str, name_field: str, lat: float, lon: float
+                         ) -> Tuple[str, Optional[Dict[str, Any]], List[str]]:
+    """Point query then neighbour intersection for one layer (LPA or NCA)"""
+    feat = await _run(oc.arcgis_point_query, layer_url, lat, lon, name_field)
+    name = oc.sstr((feat.get("attributes") or {}).get(name_field))
+    geom = feat.get("geometry")
+    intersecting = await _run(oc.layer_intersect_names, layer_url, geom, name_field)
+    return name, geom, intersecting
+
+
+async def _resolve_catchment(wfs_url: str, name_fn, lat: float, lon: float) -> str:
+    feat = await _run(oc.wfs_point_query, wfs_url, lat, lon)
+    return name_fn(feat)
+
+
+async def resolve_site(postcode_or_latlon: Union[str, Tuple[float, float]],
+                       deadline: float = DEFAULT_SITE_DEADLINE_SECONDS,
+                       include_catchments: bool = True,
+                       catchment_index: Optional[CatchmentIndex] = None) -> SiteContext:
+    """
+    Resolve a site to LPA/NCA, neighbours, catchments and geometries.
+
+    Args:
+        postcode_or_latlon: UK postcode string, or a (lat, lon) tuple
+        deadline: Total time budget in seconds. Lookups still running when it
+            expires are abandoned and reported in SiteContext.errors.
+        include_catchments: Also resolve WFD waterbody/operational catchments
+        catchment_index: Offline catchment index (repo.get_catchment_index()).
+            When populated, catchments are looked up locally instead of via WFS.
+
+    Returns:
+        SiteContext. Geocoding failure raises RuntimeError; failures of the
+        individual lookups leave their fields empty and add to errors.
+    """
+    started = time.monotonic()
+    ctx = SiteContext()
+
+    if isinstance(postcode_or_latlon, (tuple, list)):
+        ctx.lat, ctx.lon = float(postcode_or_latlon[0]), float(postcode_or_latlon[1])
+    else:
+        if not oc.sstr(postcode_or_latlon):
+            raise RuntimeError("Enter a postcode or an address.")
+        try:
+            lat, lon, _ = await asyncio.wait_for(
+                _run(oc.get_postcode_info, postcode_or_latlon), timeout=deadline)
+        except asyncio.TimeoutError:
+            raise RuntimeError(f"Postcode lookup timed out for '{postcode_or_latlon}'.")
+        ctx.lat, ctx.lon = lat, lon
+
+    tasks = {
+        "lpa": asyncio.ensure_future(_resolve_layer(oc.LPA_URL, "LAD24NM", ctx.lat, ctx.lon)),
+        "nca": asyncio.ensure_future(_resolve_layer(oc.NCA_URL, "NCA_Name", ctx.lat, ctx.lon)),
+    }
+    use_local_catchments = (include_catchments and catchment_index is not None
+                            and not catchment_index.is_empty)
+    if use_local_catchments:
+        ctx.waterbody, ctx.operational_catchment = catchment_index.catchments_for_point(ctx.lat, ctx.lon)
+    elif include_catchments:
+        tasks["waterbody"] = asyncio.ensure_future(_resolve_catchment(
+            oc.WATERBODY_CATCHMENT_URL, oc.waterbody_name_from_feature, ctx.lat, ctx.lon))
+        tasks["operational"] = asyncio.ensure_future(_resolve_catchment(
+            oc.OPERATIONAL_CATCHMENT_URL, oc.operational_name_from_feature, ctx.lat, ctx.lon))
+
+    remaining = max(0.0, deadline - (time.monotonic() - started))
+    _, pending = await asyncio.wait(tasks.values(), timeout=remaining)
+    for task in pending:
+        task.cancel()
+
+    for key, task in tasks.items():
+        if task in pending:
+            ctx.errors.append(f"{key}: timed out after {deadline:.0f}s")
+            continue
+        exc = task.exception()
+        if exc is not None:
+            ctx.errors.append(f"{key}: {exc}")
+            continue
+        result = task.result()
+        if key == "lpa":
+            ctx.lpa_name, ctx.lpa_geometry_esri, ctx.lpa_intersecting = result
+            ctx.lpa_neighbors = [n for n in ctx.lpa_intersecting if n != ctx.lpa_name]
+        elif key == "nca":
+            ctx.nca_name, ctx.nca_geometry_esri, ctx.nca_intersecting = result
+            ctx.nca_neighbors = [n for n in ctx.nca_intersecting if n != ctx.nca_name]
+        elif key == "waterbody":
+            ctx.waterbody = result
+        elif key == "operational":
+            ctx.operational_catchment = result
+
+    ctx.elapsed_seconds = time.monotonic() - started
+    return ctx
+
+
+def resolve_site_sync(postcode_or_latlon: Union[str, Tuple[float, float]],
+                      deadline: float = DEFAULT_SITE_DEADLINE_SECONDS,
+                      include_catchments: bool = True,
+                      catchment_index: Optional[CatchmentIndex] = None) -> SiteContext:
+    """
+    Blocking wrapper around resolve_site() for Streamlit scripts and workers.
+    asyncio.run() refuses to start inside a running event loop (notebooks,
+    async workers), so in that case the resolution runs on a worker thread.
+    """
+    coro = resolve_site(postcode_or_latlon, deadline, include_catchments, catchment_index)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    return _LOOP_EXECUTOR.submit(asyncio.run, coro).result()
@@ -0,0 +1,333 @@
+"""
+submission_queue.py - Write-behind persistence of quote submissions (NO Streamlit)
+
+With write-behind enabled, save_submission() appends the submission to a
+local SQLite journal (committed to disk before it returns) and a background
+thread writes it to Supabase with store_submission, so the user sees their
+quote confirmation without waiting on the database. Failed writes stay in
+the journal and are retried with backoff; entries left by a crash are picked
+up when the app next starts (resume_pending).
+
+Each entry carries an idempotency key that store_submission records on the
+submission row (unique), so a write that committed just before a crash, or
+one drained by two processes sharing the journal, is stored only once.
+
+Configuration (environment variables):
+    BNG_SUBMISSION_WRITE_BEHIND         1 = queue submissions and save them in the background (default 0)
+    BNG_SUBMISSION_QUEUE_PATH           journal file (default ~/.cache/bng-optimiser/submission_queue.sqlite3)
+    BNG_SUBMISSION_QUEUE_POLL_SECONDS   retry interval for failed writes (default 5)
+
+The journal must live on storage that survives a restart (e.g. a Fly volume
+mount): queued submissions not yet written are lost with it. Container
+filesystems such as the Fly/Cloud Run frontends' are ephemeral, so set
+BNG_SUBMISSION_QUEUE_PATH to a mounted volume or leave write-behind off; a
+warning is logged when write-behind runs on the default path.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "bng-optimiser", "submission_queue.sqlite3")
+DEFAULT_POLL_SECONDS = 5.0
+# Backoff between attempts doubles up to this cap; entries are never dropped
+MAX_BACKOFF_SECONDS = 300.0
+
+_DATAFRAME_MARKER = "__dataframe__"
+
+
+def write_behind_enabled() -> bool:
+    return os.getenv("BNG_SUBMISSION_WRITE_BEHIND", "").strip().lower() in ("1", "true", "yes")
+
+
+def queue_path_from_env() -> str:
+    return os.getenv("BNG_SUBMISSION_QUEUE_PATH", "").strip() or DEFAULT_QUEUE_PATH
+
+
+def queue_path_is_explicit() -> bool:
+    """True if BNG_SUBMISSION_QUEUE_PATH names the journal (rather than the ~/.cache default)"""
+    return bool(os.getenv("BNG_SUBMISSION_QUEUE_PATH", "").strip())
+
+
+def poll_seconds_from_env() -> float:
+    try:
+        return max(0.5, float(os.getenv("BNG_SUBMISSION_QUEUE_POLL_SECONDS", DEFAULT_POLL_SECONDS)))
+    except ValueError:
+        return DEFAULT_POLL_SECONDS
+
+
+# ================= Payload encoding =================
+def _json_default(value: Any) -> Any:
+    if isinstance(value, pd.DataFrame):
+        return {_DATAFRAME_MARKER: value.to_json(orient="split", date_format="iso")}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot queue value of type {type(value).__name__}")
+
+
+def _restore(value: Any) -> Any:
+    if isinstance(value, dict):
+        if set(value) == {_DATAFRAME_MARKER}:
+            from io import StringIO
+            return pd.read_json(StringIO(value[_DATAFRAME_MARKER]), orient="split", dtype=False)
+        return {k: _restore(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_restore(v) for v in value]
+    return value
+
+
+def encode_submission(kwargs: Dict[str, Any]) -> str:
+    """store_submission keyword arguments as JSON (DataFrames in split orientation)"""
+    return json.dumps(kwargs, default=_json_default)
+
+
+def decode_submission(payload: str) -> Dict[str, Any]:
+    """Inverse of encode_submission"""
+    kwargs = _restore(json.loads(payload))
+    if isinstance(kwargs.get("submission_date"), str):
+        kwargs["submission_date"] = datetime.fromisoformat(kwargs["submission_date"])
+    return kwargs
+
+
+# ================= Journal =================
+class SubmissionQueue:
+    """Durable FIFO of pending submissions in a local SQLite file"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or queue_path_from_env()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS pending_submissions (
+                    idempotency_key TEXT PRIMARY KEY,
+                    reference_number TEXT,
+                    payload TEXT NOT NULL,
+                    enqueued_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    last_error TEXT
+                )
+            """)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # A connection per call (the queue is shared by sessions and the writer
+        # thread), committed on success and always closed
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA synchronous=FULL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, kwargs: Dict[str, Any], idempotency_key: Optional[str] = None) -> str:
+        """
+        Journal a submission (durable once this returns); returns its idempotency key.
+        The enqueue time is recorded as its submission_date unless one is given.
+        Raises TypeError/ValueError if the arguments can't be encoded.
+        """
+        key = idempotency_key or uuid.uuid4().hex
+        now = time.time()
+        kwargs = {**kwargs, "submission_date": kwargs.get("submission_date") or datetime.fromtimestamp(now)}
+        payload = encode_submission(kwargs)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO pending_submissions "
+                "(idempotency_key, reference_number, payload, enqueued_at, next_attempt_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, kwargs.get("reference_number"), payload, now, now))
+        return key
+
+    def due(self, limit: int = 50) -> List[Tuple[str, str]]:
+        """(idempotency key, payload) of entries ready for an attempt, oldest first"""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT idempotency_key, payload FROM pending_submissions "
+                "WHERE next_attempt_at <= ? ORDER BY enqueued_at LIMIT ?",
+                (time.time(), limit)).fetchall()
+
+    def mark_stored(self, key: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM pending_submissions WHERE idempotency_key = ?", (key,))
+
+    def mark_failed(self, key: str, error: str):
+        with self._connect() as conn:
+            attempts = conn.execute(
+                "SELECT attempts FROM pending_submissions WHERE idempotency_key = ?", (key,)).fetchone()
+            attempts = (attempts[0] if attempts else 0) + 1
+            delay = min(MAX_BACKOFF_SECONDS, 2.0 ** attempts)
+            conn.execute(
+                "UPDATE pending_submissions SET attempts = ?, next_attempt_at = ?, last_error = ? "
+                "WHERE idempotency_key = ?",
+                (attempts, time.time() + delay, error[:1000], key))
+
+    def pending(self) -> List[Dict[str, Any]]:
+        """Entries not yet stored (without payloads), oldest first"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT idempotency_key, reference_number, enqueued_at, attempts, last_error "
+                "FROM pending_submissions ORDER BY enqueued_at").fetchall()
+        return [{"idempotency_key": r[0], "reference_number": r[1], "enqueued_at": r[2],
+                 "attempts": r[3], "last_error": r[4]} for r in rows]
+
+    def pending_count(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM pending_submissions").fetchone()[0]
+
+    def drain(self, store: Callable[..., int], limit: Optional[int] = None) -> Tuple[int, int]:
+        """
+        Write due entries with store(**kwargs, idempotency_key=key).
+
+        Returns:
+            (stored, failed) counts
+        """
+        stored = failed = 0
+        for key, payload in self.due(limit or 50):
+            try:
+                store(**decode_submission(payload), idempotency_key=key)
+            except Exception as e:
+                failed += 1
+                self.mark_failed(key, str(e))
+                logger.warning(f"Queued submission {key} not stored yet: {e}")
+                continue
+            self.mark_stored(key)
+            stored += 1
+        return stored, failed
+
+
+# ================= Background writer =================
+class SubmissionWriter:
+    """Daemon thread draining a SubmissionQueue; wake() after enqueueing"""
+
+    def __init__(self, queue: SubmissionQueue, store: Callable[..., int],
+                 poll_interval: Optional[float] = None):
+        self.queue = queue
+        self.store = store
+        self.poll_interval = poll_seconds_from_env() if poll_interval is None else float(poll_interval)
+        self.stored = 0
+        self.failed = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "SubmissionWriter":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="submission-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                while not self._stop.is_set():
+                    stored, failed = self.queue.drain(self.store)
+                    self.stored += stored
+                    self.failed += failed
+                    if not stored:
+                        break
+            except Exception as e:
+                logger.warning(f"Submission queue drain failed: {e}")
+            self._wake.wait(self.poll_interval)
+
+
+@dataclass
+class SubmissionReceipt:
+    """Outcome of save_submission: an id if written now, else the queued entry's key"""
+    reference_number: str
+    submission_id: Optional[int] = None
+    idempotency_key: Optional[str] = None
+
+    @property
+    def queued(self) -> bool:
+        return self.submission_id is None
+
+
+_queue: Optional[SubmissionQueue] = None
+_writer: Optional[SubmissionWriter] = None
+_lock = threading.Lock()
+
+
+def _store_with(db_factory: Callable) -> Callable[..., int]:
+    def store(**kwargs) -> int:
+        return db_factory().store_submission(**kwargs)
+    return store
+
+
+def get_writer(db_factory: Callable) -> SubmissionWriter:
+    """Process-wide queue and running writer (db_factory() returns a SubmissionsDB)"""
+    global _queue, _writer
+    with _lock:
+        if _writer is None:
+            if write_behind_enabled() and not queue_path_is_explicit():
+                logger.warning(f"Write-behind is journalling to the default {DEFAULT_QUEUE_PATH}; "
+                               "set BNG_SUBMISSION_QUEUE_PATH to a persistent volume or queued "
+                               "submissions are lost when the container restarts")
+            _queue = SubmissionQueue()
+            _writer = SubmissionWriter(_queue, _store_with(db_factory))
+        return _writer.start()
+
+
+def save_submission(db_factory: Callable, **kwargs) -> SubmissionReceipt:
+    """
+    Persist a submission: straight through store_submission, or with
+    write-behind enabled, journalled locally and written in the background.
+    """
+    reference_number = kwargs.get("reference_number", "")
+    if not write_behind_enabled():
+        return SubmissionReceipt(reference_number, submission_id=db_factory().store_submission(**kwargs))
+    try:
+        writer = get_writer(db_factory)
+        key = writer.queue.enqueue(kwargs)
+    except (OSError, sqlite3.Error) as e:
+        # No usable journal (e.g. read-only disk): write synchronously instead
+        logger.warning(f"Submission queue unavailable, storing directly: {e}")
+        return SubmissionReceipt(reference_number, submission_id=db_factory().store_submission(**kwargs))
+    except (TypeError, ValueError) as e:
+        # Arguments the journal can't encode: never lose the quote, write it now
+        logger.error(f"Submission {reference_number} can't be queued ({e}); storing synchronously")
+        return SubmissionReceipt(reference_number, submission_id=db_factory().store_submission(**kwargs))
+    writer.wake()
+    return SubmissionReceipt(reference_number, idempotency_key=key)
+
+
+def resume_pending(db_factory: Callable) -> Optional[SubmissionWriter]:
+    """Start the writer at app start if write-behind is on or the journal has leftovers"""
+    if _writer is None and not write_behind_enabled() and not os.path.exists(queue_path_from_env()):
+        return None
+    try:
+        writer = get_writer(db_factory)
+    except Exception as e:
+        logger.warning(f"Submission queue unavailable: {e}")
+        return None
+    writer.wake()
+    return writer
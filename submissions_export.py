@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+submissions_export.py - Streaming export of submissions to CSV or Parquet (NO Streamlit)
+
+Reads submissions through a server-side cursor in chunks, normalises each
+chunk column-wise to a fixed schema (JSONB/array columns as JSON text,
+floats written with two decimals) and streams it out: CSV as a generator of
+encoded chunks, Parquet as one row group per chunk. Memory stays at one
+chunk however long the history is.
+
+Usage:
+    python submissions_export.py <output.csv|output.parquet> [--since YYYY-MM-DD]
+        [--until YYYY-MM-DD] [--promoter NAME] [--chunk-size N]
+
+From Streamlit:
+    with export_csv_file(engine) as f:
+        st.download_button(..., data=f)
+
+Memory is bounded for the CLI and Parquet paths and while building the CSV
+file. st.download_button still reads the finished file into Streamlit's
+media store, so very large histories are better exported with the CLI.
+"""
+
+import io
+import json
+import os
+import sys
+import tempfile
+from typing import Any, Dict, Iterator, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+DEFAULT_CHUNK_SIZE = 5000
+
+# Exported columns (in order) and how each is normalised
+SUBMISSION_EXPORT_COLUMNS: Dict[str, str] = {
+    "id": "int",
+    "submission_date": "timestamp",
+    "client_name": "text",
+    "reference_number": "text",
+    "site_location": "text",
+    "target_lpa": "text",
+    "target_nca": "text",
+    "target_lat": "float",
+    "target_lon": "float",
+    "lpa_neighbors": "json",
+    "nca_neighbors": "json",
+    "demand_habitats": "json",
+    "contract_size": "text",
+    "total_cost": "float",
+    "admin_fee": "float",
+    "total_with_admin": "float",
+    "num_banks_selected": "int",
+    "banks_used": "json",
+    "manual_hedgerow_entries": "json",
+    "manual_watercourse_entries": "json",
+    "manual_area_habitat_entries": "json",
+    "allocation_results": "json",
+    "username": "text",
+    "promoter_name": "text",
+    "promoter_discount_type": "text",
+    "promoter_discount_value": "float",
+    "customer_id": "int",
+    "suo_enabled": "bool",
+    "suo_discount_fraction": "float",
+    "suo_eligible_surplus": "float",
+    "suo_usable_surplus": "float",
+    "suo_total_units": "float",
+    "submitted_by_username": "text",
+    "contact_email": "text",
+    "contact_number": "text",
+}
+
+
+def _get_engine(engine=None):
+    if engine is not None:
+        return engine
+    from db import DatabaseConnection
+    return DatabaseConnection.get_engine()
+
+
+def _json_text(value: Any) -> Any:
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, default=str)
+
+
+def normalise_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    """Cast a chunk to the export schema (missing columns become nulls)"""
+    out = {}
+    for column, kind in SUBMISSION_EXPORT_COLUMNS.items():
+        values = chunk[column] if column in chunk.columns else pd.Series([None] * len(chunk), index=chunk.index)
+        if kind == "float":
+            out[column] = pd.to_numeric(values, errors="coerce").astype("float64")
+        elif kind == "int":
+            out[column] = pd.to_numeric(values, errors="coerce").astype("Int64")
+        elif kind == "bool":
+            out[column] = values.astype("boolean")
+        elif kind == "timestamp":
+            out[column] = pd.to_datetime(values)
+        elif kind == "json":
+            out[column] = pd.Series([_json_text(v) for v in values], index=chunk.index, dtype=object)
+        else:
+            out[column] = values.astype(object).where(values.notna(), None)
+    return pd.DataFrame(out, index=chunk.index)
+
+
+def iter_submission_chunks(engine=None, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                           promoter_name: Optional[str] = None, ids: Optional[Sequence[int]] = None,
+                           chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Submissions in id order, chunk_size rows at a time, via a server-side cursor.
+    ids limits the export to those submissions (e.g. the rows on screen).
+
+    Yields:
+        DataFrames normalised to SUBMISSION_EXPORT_COLUMNS
+    """
+    query = "SELECT * FROM submissions WHERE 1=1"
+    params = {}
+    if start_date:
+        query += " AND submission_date >= :start_date"
+        params["start_date"] = start_date
+    if end_date:
+        query += " AND submission_date <= :end_date"
+        params["end_date"] = end_date
+    if promoter_name:
+        query += " AND promoter_name = :promoter_name"
+        params["promoter_name"] = promoter_name
+    if ids is not None:
+        query += " AND id = ANY(:ids)"
+        params["ids"] = [int(i) for i in ids]
+    query += " ORDER BY id"
+
+    with _get_engine(engine).connect() as conn:
+        conn = conn.execution_options(stream_results=True, max_row_buffer=chunk_size)
+        for chunk in pd.read_sql_query(text(query), conn, params=params, chunksize=chunk_size):
+            yield normalise_chunk(chunk)
+
+
+def iter_csv(chunks: Iterator[pd.DataFrame]) -> Iterator[bytes]:
+    """Encoded CSV per chunk (header with the first); floats to 2 decimal places"""
+    header = True
+    for chunk in chunks:
+        yield chunk.to_csv(index=False, header=header, float_format="%.2f").encode("utf-8")
+        header = False
+    if header:
+        yield pd.DataFrame(columns=list(SUBMISSION_EXPORT_COLUMNS)).to_csv(index=False).encode("utf-8")
+
+
+def _arrow_schema():
+    import pyarrow as pa
+    types = {"int": pa.int64(), "float": pa.float64(), "bool": pa.bool_(),
+             "timestamp": pa.timestamp("us"), "json": pa.string(), "text": pa.string()}
+    return pa.schema([(column, types[kind]) for column, kind in SUBMISSION_EXPORT_COLUMNS.items()])
+
+
+def write_parquet(chunks: Iterator[pd.DataFrame], path: str) -> int:
+    """Write chunks as Parquet row groups; returns the row count"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+
+    schema = _arrow_schema()
+    rows = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            rows += len(chunk)
+    return rows
+
+
+def export_csv_file(engine=None, **filters) -> io.BufferedReader:
+    """
+    CSV export written to a temporary file and opened for reading (a
+    BufferedReader, which st.download_button accepts as is). The file is
+    unlinked straight away, so closing it (or leaving the with block) is
+    all the cleanup needed.
+    """
+    fd, path = tempfile.mkstemp(prefix="submissions_", suffix=".csv")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for block in iter_csv(iter_submission_chunks(engine, **filters)):
+                out.write(block)
+        return open(path, "rb")
+    finally:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass  # open files can't be unlinked on Windows
+
+
+USAGE = ("Usage: python submissions_export.py <output.csv|output.parquet> "
+         "[--since YYYY-MM-DD] [--until YYYY-MM-DD] [--promoter NAME] [--chunk-size N]")
+
+
+def _parse_args(argv):
+    """(output path, options) from argv; options take one value each"""
+    output, options = None, {}
+    i = 0
+    while i < len(argv):
+        if argv[i] in ("--since", "--until", "--promoter", "--chunk-size") and i + 1 < len(argv):
+            options[argv[i]] = argv[i + 1]
+            i += 2
+        elif output is None and not argv[i].startswith("--"):
+            output = argv[i]
+            i += 1
+        else:
+            return None, {}
+    return output, options
+
+
+def main():
+    output, options = _parse_args(sys.argv[1:])
+    if not output or not output.endswith((".csv", ".parquet")):
+        print(USAGE)
+        sys.exit(1)
+
+    counted = [0]
+
+    def counting(chunks):
+        for chunk in chunks:
+            counted[0] += len(chunk)
+            yield chunk
+
+    chunks = counting(iter_submission_chunks(
+        start_date=options.get("--since"),
+        end_date=options.get("--until"),
+        promoter_name=options.get("--promoter"),
+        chunk_size=int(options.get("--chunk-size", DEFAULT_CHUNK_SIZE)),
+    ))
+    if output.endswith(".parquet"):
+        write_parquet(chunks, output)
+    else:
+        with open(output, "wb") as f:
+            for block in iter_csv(chunks):
+                f.write(block)
+    print(f"✓ Exported {counted[0]} submissions to {output}")
+
+
+if __name__ == "__main__":
+    main()
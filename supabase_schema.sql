@@ -109,16 +109,80 @@ CREATE TABLE IF NOT EXISTS "SRM" (
 CREATE INDEX IF NOT EXISTS idx_srm_tier ON "SRM"(tier);
 
 -- Table: TradingRules (Optional)
--- Defines trading rules for habitat types
+-- Defines trading rules for habitat types: which supply habitats may
+-- offset a demand habitat (columns as in the workbook's TradingRules sheet)
 CREATE TABLE IF NOT EXISTS "TradingRules" (
     id SERIAL PRIMARY KEY,
-    rule_name TEXT NOT NULL,
-    rule_value TEXT,
-    description TEXT,
+    demand_habitat TEXT NOT NULL,
+    allowed_supply_habitat TEXT NOT NULL,
+    min_distinctiveness_name TEXT,
+    companion_habitat TEXT,
     created_at TIMESTAMP DEFAULT NOW(),
     updated_at TIMESTAMP DEFAULT NOW()
 );
 
+-- Databases created with the earlier rule_name/rule_value layout
+ALTER TABLE "TradingRules" ADD COLUMN IF NOT EXISTS demand_habitat TEXT;
+ALTER TABLE "TradingRules" ADD COLUMN IF NOT EXISTS allowed_supply_habitat TEXT;
+ALTER TABLE "TradingRules" ADD COLUMN IF NOT EXISTS min_distinctiveness_name TEXT;
+ALTER TABLE "TradingRules" ADD COLUMN IF NOT EXISTS companion_habitat TEXT;
+DO $$
+BEGIN
+    -- The legacy columns stay (no data is dropped) but no longer block imports
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_name = 'TradingRules' AND column_name = 'rule_name') THEN
+        ALTER TABLE "TradingRules" ALTER COLUMN rule_name DROP NOT NULL;
+    END IF;
+END $$;
+
+-- Index for faster lookups
+CREATE INDEX IF NOT EXISTS idx_trading_rules_demand ON "TradingRules"(demand_habitat);
+
+-- Table: WaterCatchments (Optional)
+-- Offline WFD river waterbody / operational catchment polygons
+-- used for watercourse SRM instead of per-point WFS queries
+CREATE TABLE IF NOT EXISTS "WaterCatchments" (
+    id SERIAL PRIMARY KEY,
+    catchment_type TEXT NOT NULL,          -- "waterbody" or "operational"
+    catchment_name TEXT NOT NULL,
+    operational_catchment TEXT,            -- parent catchment for waterbody rows
+    min_lon FLOAT,
+    min_lat FLOAT,
+    max_lon FLOAT,
+    max_lat FLOAT,
+    geometry JSONB NOT NULL,               -- GeoJSON Polygon/MultiPolygon (EPSG:4326)
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_water_catchments_type ON "WaterCatchments"(catchment_type);
+
+-- Table: BankCatchments (Optional)
+-- Precomputed WFD catchments for each bank
+CREATE TABLE IF NOT EXISTS "BankCatchments" (
+    bank_id TEXT PRIMARY KEY,
+    waterbody TEXT,
+    operational_catchment TEXT,
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW(),
+    FOREIGN KEY (bank_id) REFERENCES "Banks"(bank_id) ON DELETE CASCADE
+);
+
+-- Table: ReferenceVersions
+-- Per-table change counter bumped by statement-level triggers (see below).
+-- The app probes this one small table to decide which cached reference
+-- tables to refetch, instead of re-downloading everything on a timer.
+CREATE TABLE IF NOT EXISTS "ReferenceVersions" (
+    table_name TEXT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+INSERT INTO "ReferenceVersions" (table_name) VALUES
+    ('Banks'), ('Pricing'), ('HabitatCatalog'), ('Stock'), ('DistinctivenessLevels'),
+    ('SRM'), ('TradingRules'), ('WaterCatchments'), ('BankCatchments')
+ON CONFLICT (table_name) DO NOTHING;
+
 -- =====================================================
 -- Sample Data Inserts (for testing)
 -- =====================================================
@@ -155,6 +219,9 @@ ALTER TABLE "Stock" ENABLE ROW LEVEL SECURITY;
 ALTER TABLE "DistinctivenessLevels" ENABLE ROW LEVEL SECURITY;
 ALTER TABLE "SRM" ENABLE ROW LEVEL SECURITY;
 ALTER TABLE "TradingRules" ENABLE ROW LEVEL SECURITY;
+ALTER TABLE "WaterCatchments" ENABLE ROW LEVEL SECURITY;
+ALTER TABLE "BankCatchments" ENABLE ROW LEVEL SECURITY;
+ALTER TABLE "ReferenceVersions" ENABLE ROW LEVEL SECURITY;
 
 -- Create policies to allow authenticated users to read all reference data
 CREATE POLICY "Allow authenticated read on Banks" 
@@ -185,6 +252,18 @@ CREATE POLICY "Allow authenticated read on TradingRules"
     ON "TradingRules" FOR SELECT 
     USING (true);
 
+CREATE POLICY "Allow authenticated read on WaterCatchments" 
+    ON "WaterCatchments" FOR SELECT 
+    USING (true);
+
+CREATE POLICY "Allow authenticated read on BankCatchments" 
+    ON "BankCatchments" FOR SELECT 
+    USING (true);
+
+CREATE POLICY "Allow authenticated read on ReferenceVersions" 
+    ON "ReferenceVersions" FOR SELECT 
+    USING (true);
+
 -- Create policies for admin users to manage reference data
 -- Replace 'admin_role_id' with your actual admin role UUID
 CREATE POLICY "Allow admin insert on Banks" 
@@ -237,6 +316,58 @@ CREATE TRIGGER update_srm_updated_at BEFORE UPDATE ON "SRM"
 CREATE TRIGGER update_trading_rules_updated_at BEFORE UPDATE ON "TradingRules"
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- Function to bump a reference table's version on any change
+CREATE OR REPLACE FUNCTION bump_reference_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO "ReferenceVersions" (table_name, version, updated_at)
+    VALUES (TG_TABLE_NAME, 1, NOW())
+    ON CONFLICT (table_name)
+    DO UPDATE SET version = "ReferenceVersions".version + 1, updated_at = NOW();
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER bump_banks_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "Banks"
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_reference_version();
+
+CREATE TRIGGER bump_pricing_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "Pricing"
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_reference_version();
+
+CREATE TRIGGER bump_habitat_catalog_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "HabitatCatalog"
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_reference_version();
+
+CREATE TRIGGER bump_stock_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "Stock"
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_reference_version();
+
+CREATE TRIGGER bump_distinctiveness_levels_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "DistinctivenessLevels"
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_reference_version();
+
+CREATE TRIGGER bump_srm_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "SRM"
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_reference_version();
+
+CREATE TRIGGER bump_trading_rules_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "TradingRules"
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_reference_version();
+
+CREATE TRIGGER bump_water_catchments_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "WaterCatchments"
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_reference_version();
+
+CREATE TRIGGER bump_bank_catchments_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "BankCatchments"
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_reference_version();
+
+-- Function to notify listening app processes of a version bump.
+-- Payload is the table name; delivered on commit (see reference_notify.py).
+CREATE OR REPLACE FUNCTION notify_reference_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('bng_reference_changed', NEW.table_name);
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER notify_reference_change AFTER INSERT OR UPDATE ON "ReferenceVersions"
+    FOR EACH ROW EXECUTE FUNCTION notify_reference_change();
+
 -- =====================================================
 -- Views for easy data access
 -- =====================================================
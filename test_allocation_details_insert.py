@@ -0,0 +1,82 @@
+"""
+Test the bulk allocation_details insert in SubmissionsDB.store_submission
+No database required - the engine is mocked and statements are counted.
+"""
+
+import sys
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pandas as pd
+
+# Mock streamlit
+sys.modules['streamlit'] = MagicMock()
+
+
+def allocation_df(n=20):
+    return pd.DataFrame({
+        "BANK_KEY": [f"Bank {i % 3}" for i in range(n)],
+        "bank_name": [f"Bank {i % 3}" for i in range(n)],
+        "demand_habitat": ["Grassland"] * n,
+        "supply_habitat": ["Grassland"] * n,
+        "allocation_type": ["normal"] * n,
+        "proximity": ["local"] * n,
+        "units_supplied": np.linspace(0.5, 10, n),
+        "unit_price": [20000.0] * n,
+        "cost": np.linspace(0.5, 10, n) * 20000.0,
+    })
+
+
+def test_detail_rows_conversion():
+    from database import allocation_detail_rows
+
+    df = allocation_df(2).drop(columns=["bank_name"])
+    df.loc[1, "cost"] = np.nan
+    df.loc[0, "unit_price"] = np.inf
+    rows = allocation_detail_rows(df, 7)
+    assert rows[0] == {"submission_id": 7, "bank_key": "Bank 0", "bank_name": "", "demand_habitat": "Grassland",
+                       "supply_habitat": "Grassland", "allocation_type": "normal", "tier": "local",
+                       "units_supplied": 0.5, "unit_price": 0.0, "cost": 10000.0}
+    assert rows[1]["cost"] == 0.0 and rows[1]["unit_price"] == 20000.0
+    assert all(type(v) in (int, str, float) for row in rows for v in row.values())
+    assert allocation_detail_rows(pd.DataFrame(), 7) == []
+    print("✓ Allocation rows are converted column-wise to plain Python values")
+
+
+def test_store_submission_round_trips():
+    from database import SubmissionsDB, allocation_detail_inserts, allocation_detail_rows
+
+    with patch('database.DatabaseConnection.get_engine') as mock_engine:
+        mock_conn = MagicMock()
+        mock_conn.__enter__ = MagicMock(return_value=mock_conn)
+        mock_conn.__exit__ = MagicMock(return_value=False)
+        mock_conn.execute.return_value.fetchone.return_value = (42,)
+        mock_engine.return_value.connect.return_value = mock_conn
+
+        db = SubmissionsDB()
+        mock_conn.execute.reset_mock()
+        submission_id = db.store_submission(
+            client_name="Client", reference_number="BNG-A-02025", site_location="Site",
+            target_lpa="LPA", target_nca="NCA", target_lat=51.5, target_lon=-0.1,
+            lpa_neighbors=[], nca_neighbors=[], demand_df=pd.DataFrame([{"habitat_name": "Grassland"}]),
+            allocation_df=allocation_df(20), contract_size="small", total_cost=1000.0, admin_fee=500.0,
+            manual_hedgerow_rows=[], manual_watercourse_rows=[])
+
+        assert submission_id == 42
+        statements = [str(c.args[0]) for c in mock_conn.execute.call_args_list]
+        assert len(statements) == 2, f"expected 2 round trips, got {len(statements)}"
+        assert statements[1].count("), (") == 19
+        params = mock_conn.execute.call_args_list[1].args[1]
+        assert params["submission_id_19"] == 42 and params["tier_0"] == "local"
+        assert db.last_store_timing["allocation_rows"] == 20
+        assert db.last_store_timing["total_ms"] >= db.last_store_timing["allocation_ms"]
+
+    chunks = allocation_detail_inserts(allocation_detail_rows(allocation_df(5), 1), chunk_size=2)
+    assert [len(params) for _, params in chunks] == [20, 20, 10]
+    print("✓ A 20-line quote is saved in two statements; large ones are chunked")
+
+
+if __name__ == "__main__":
+    test_detail_rows_conversion()
+    test_store_submission_round_trips()
+    print("\n✓ All allocation details insert tests passed")
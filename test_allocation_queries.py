@@ -0,0 +1,79 @@
+"""
+Test the allocation_details query APIs (SubmissionsDB.query_allocations /
+get_allocation_summary)
+No database required - the engine and query are mocked.
+"""
+
+import sys
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+
+# Mock streamlit
+sys.modules['streamlit'] = MagicMock()
+
+
+def capture_queries():
+    calls = []
+
+    def fake_read(query, conn, params=None):
+        calls.append((" ".join(str(query).split()), params))
+        return pd.DataFrame()
+
+    return calls, fake_read
+
+
+def test_query_allocations_filters():
+    from database import SubmissionsDB
+
+    calls, fake_read = capture_queries()
+    with patch('database.DatabaseConnection.get_engine'), \
+         patch('database.pd.read_sql_query', side_effect=fake_read):
+        db = SubmissionsDB()
+        db.query_allocations(bank_key="WC1P2", habitat="Grassland", tier="local",
+                             start_date="2025-01-01", promoter_name="Promoter A", limit=10)
+
+    sql, params = calls[0]
+    assert "FROM allocation_details a JOIN submissions s ON s.id = a.submission_id" in sql
+    for clause in ("a.bank_key = :bank_key", "a.supply_habitat = :habitat", "a.tier = :tier",
+                   "s.submission_date >= :start_date", "s.promoter_name = :promoter_name"):
+        assert clause in sql, clause
+    assert "end_date" not in sql and "allocation_results" not in sql
+    assert params == {"bank_key": "WC1P2", "habitat": "Grassland", "tier": "local",
+                      "start_date": "2025-01-01", "promoter_name": "Promoter A", "limit": 10}
+    print("✓ Allocation lines are filtered by bank, habitat, tier and date in SQL")
+
+
+def test_allocation_summary():
+    from database import SubmissionsDB
+
+    calls, fake_read = capture_queries()
+    with patch('database.DatabaseConnection.get_engine'), \
+         patch('database.pd.read_sql_query', side_effect=fake_read):
+        db = SubmissionsDB()
+        db.get_allocation_summary(period="month", group_by=("bank", "habitat"), end_date="2025-12-31")
+        sql, params = calls[-1]
+        assert "SELECT DATE_TRUNC('month', s.submission_date)::date AS period, a.bank_key, a.supply_habitat," in sql
+        assert "SUM(a.cost) / NULLIF(SUM(a.units_supplied), 0) AS avg_unit_price" in sql
+        assert "GROUP BY 1, 2, 3 ORDER BY period, units DESC" in sql
+        assert params == {"end_date": "2025-12-31"}
+
+        db.get_allocation_summary(period=None, group_by=("habitat",), promoter_name="Promoter A")
+        sql, params = calls[-1]
+        assert "DATE_TRUNC" not in sql and "GROUP BY 1 ORDER BY units DESC" in sql
+        assert params == {"promoter_name": "Promoter A"}
+
+        for bad in ({"period": "year"}, {"group_by": ("client",)}):
+            try:
+                db.get_allocation_summary(**bad)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError(f"expected ValueError for {bad}")
+    print("✓ Units and realised price per bank/habitat/month are aggregated in SQL")
+
+
+if __name__ == "__main__":
+    test_query_allocations_filters()
+    test_allocation_summary()
+    print("\n✓ All allocation query tests passed")
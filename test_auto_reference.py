@@ -9,50 +9,126 @@ from unittest.mock import MagicMock, patch
 sys.modules['streamlit'] = MagicMock()
 
 def test_reference_number_generation():
-    """Test that reference numbers are generated correctly"""
+    """Test that reference numbers are allocated from the per-prefix counter"""
     from database import SubmissionsDB
     
-    # Mock the database connection and query results
+    # Mock the database connection and the counter upsert
     with patch('database.DatabaseConnection.get_engine') as mock_engine:
         mock_conn = MagicMock()
         mock_result = MagicMock()
         
-        # Test case 1: No existing references - should start at BNG-A-02025
-        mock_result.fetchone.return_value = None
+        # Test case 1: No counter row yet - the upsert starts at 2025
+        mock_result.scalar.return_value = 2025
         mock_conn.execute.return_value = mock_result
         mock_conn.__enter__ = MagicMock(return_value=mock_conn)
         mock_conn.__exit__ = MagicMock(return_value=False)
         mock_engine.return_value.connect.return_value = mock_conn
+        mock_engine.return_value.begin.return_value = mock_conn
         
         db = SubmissionsDB()
+        mock_conn.execute.reset_mock()
         next_ref = db.get_next_bng_reference("BNG-A-")
         
         assert next_ref == "BNG-A-02025", f"Expected BNG-A-02025, got {next_ref}"
+        statement, params = mock_conn.execute.call_args.args
+        assert "INSERT INTO reference_counters" in str(statement) and "RETURNING last_value" in str(statement)
+        assert params == {"prefix": "BNG-A-", "first": 2025}
+        assert mock_conn.execute.call_count == 1, "allocation is a single statement"
         print("✓ Test passed: No existing references returns BNG-A-02025")
         
-        # Test case 2: Latest reference is BNG-A-02025 - should return BNG-A-02026
-        mock_result.fetchone.return_value = ("BNG-A-02025",)
+        # Test case 2: Counter at 2025 - should return BNG-A-02026
+        mock_result.scalar.return_value = 2026
         
         next_ref = db.get_next_bng_reference("BNG-A-")
         
         assert next_ref == "BNG-A-02026", f"Expected BNG-A-02026, got {next_ref}"
         print("✓ Test passed: BNG-A-02025 increments to BNG-A-02026")
         
-        # Test case 3: Latest reference is BNG-A-02999 - should return BNG-A-03000
-        mock_result.fetchone.return_value = ("BNG-A-02999",)
+        # Test case 3: Counter at 2999 - should return BNG-A-03000
+        mock_result.scalar.return_value = 3000
         
         next_ref = db.get_next_bng_reference("BNG-A-")
         
         assert next_ref == "BNG-A-03000", f"Expected BNG-A-03000, got {next_ref}"
         print("✓ Test passed: BNG-A-02999 increments to BNG-A-03000")
         
-        # Test case 4: Reference with revision suffix - should ignore .1 and increment base
-        mock_result.fetchone.return_value = ("BNG-A-02050.1",)
+        # Test case 4: Previewing doesn't take a number
+        mock_result.scalar.return_value = 3000
+        mock_conn.execute.reset_mock()
         
-        next_ref = db.get_next_bng_reference("BNG-A-")
+        next_ref = db.get_next_bng_reference("BNG-A-", reserve=False)
+        
+        assert next_ref == "BNG-A-03001", f"Expected BNG-A-03001, got {next_ref}"
+        assert "SELECT last_value FROM reference_counters" in str(mock_conn.execute.call_args.args[0])
+        print("✓ Test passed: Preview reads the counter without incrementing it")
+        
+        # Test case 5: Revisions come from the base reference's counter
+        mock_result.scalar.return_value = 2
         
-        assert next_ref == "BNG-A-02051", f"Expected BNG-A-02051, got {next_ref}"
-        print("✓ Test passed: BNG-A-02050.1 increments to BNG-A-02051 (ignoring revision)")
+        next_ref = db.get_next_revision_number("BNG-A-02050.1")
+        
+        assert next_ref == "BNG-A-02050.2", f"Expected BNG-A-02050.2, got {next_ref}"
+        assert mock_conn.execute.call_args.args[1] == {"base_ref": "BNG-A-02050"}
+        print("✓ Test passed: BNG-A-02050.1 requotes as BNG-A-02050.2")
+
+
+def test_requote_reserves_revision_in_insert_transaction():
+    """The requote's revision is taken on the same connection as its INSERT"""
+    from database import SubmissionsDB
+    
+    original = MagicMock()
+    original._mapping = {"reference_number": "BNG-A-02050.1", "client_name": "Client",
+                         "site_location": "", "target_lpa": "", "target_nca": "",
+                         "target_lat": None, "target_lon": None, "lpa_neighbors": [],
+                         "nca_neighbors": [], "demand_habitats": [], "contract_size": "small",
+                         "total_cost": 1.0, "admin_fee": 0.0, "total_with_admin": 1.0,
+                         "num_banks_selected": 1, "banks_used": [], "manual_hedgerow_entries": [],
+                         "manual_watercourse_entries": [], "allocation_results": [], "username": "u"}
+    
+    def execute(statement, params=None):
+        result = MagicMock()
+        sql = str(statement)
+        if "SELECT * FROM submissions" in sql:
+            result.fetchone.return_value = original
+        elif "INSERT INTO reference_revisions" in sql:
+            result.scalar.return_value = 2
+        elif "INSERT INTO submissions" in sql:
+            result.fetchone.return_value = (99,)
+        return result
+    
+    with patch('database.DatabaseConnection.get_engine') as mock_engine:
+        mock_conn = MagicMock()
+        mock_conn.__enter__ = MagicMock(return_value=mock_conn)
+        mock_conn.__exit__ = MagicMock(return_value=False)
+        mock_engine.return_value.begin.return_value = mock_conn
+        mock_engine.return_value.connect.return_value = mock_conn
+        
+        db = SubmissionsDB()
+        mock_conn.execute.reset_mock()
+        mock_engine.return_value.begin.reset_mock()
+        mock_conn.execute.side_effect = execute
+        
+        assert db.create_requote_from_submission(7) == 99
+    
+    assert mock_engine.return_value.begin.call_count == 1, "one transaction for revision and insert"
+    statements = [str(c.args[0]) for c in mock_conn.execute.call_args_list]
+    upsert = next(i for i, sql in enumerate(statements) if "INSERT INTO reference_revisions" in sql)
+    insert = next(i for i, sql in enumerate(statements) if "INSERT INTO submissions" in sql)
+    assert upsert < insert
+    assert mock_conn.execute.call_args_list[upsert].args[1] == {"base_ref": "BNG-A-02050"}
+    assert mock_conn.execute.call_args_list[insert].args[1]["reference_number"] == "BNG-A-02050.2"
+    print("✓ Test passed: Requote revision is reserved inside the INSERT transaction")
+
+def test_reference_pattern():
+    """Test the pattern used to seed and track the counters"""
+    import re
+    from database import REFERENCE_PATTERN
+    
+    assert re.match(REFERENCE_PATTERN, "BNG-A-02025").groups() == ("BNG-A-", "02025", None)
+    # Revision suffix is split from the number so it doesn't bump the prefix counter
+    assert re.match(REFERENCE_PATTERN, "BNG-A-02050.1").groups() == ("BNG-A-", "02050", "1")
+    assert re.match(REFERENCE_PATTERN, "Quote for Smith") is None
+    print("✓ Test passed: Reference pattern splits prefix, number and revision")
 
 
 def test_excel_formula_row_numbers():
@@ -124,6 +200,10 @@ if __name__ == '__main__':
     
     test_reference_number_generation()
     print()
+    test_requote_reserves_revision_in_insert_transaction()
+    print()
+    test_reference_pattern()
+    print()
     test_excel_formula_row_numbers()
     
     print()
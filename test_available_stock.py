@@ -0,0 +1,117 @@
+"""
+Tests for stock availability under the quotes policy (repo.fetch_available_stock).
+No database required - table reads are patched.
+"""
+
+from unittest.mock import patch
+
+import pandas as pd
+
+import repo
+from reference_cache import TTLCache
+
+
+def raw_stock():
+    return pd.DataFrame([
+        {"id": 1, "bank_id": "B1", "habitat_name": "Grassland", "stock_id": "S1",
+         "quantity_available": 99.0, "available_excl_quotes": 10.0, "quoted": 4.0},
+        {"id": 2, "bank_id": "B1", "habitat_name": "Woodland", "stock_id": "S2",
+         "quantity_available": 99.0, "available_excl_quotes": 3.0, "quoted": 6.0},
+        {"id": 3, "bank_id": "B2", "habitat_name": "Grassland", "stock_id": "S3",
+         "quantity_available": 99.0, "available_excl_quotes": None, "quoted": None},
+        {"id": 4, "bank_id": "B2", "habitat_name": "Scrub", "stock_id": "S4",
+         "quantity_available": 0.0, "available_excl_quotes": 0.0, "quoted": 0.0},
+    ])
+
+
+def test_apply_quotes_policy():
+    ignore = repo.apply_quotes_policy(raw_stock(), "Ignore quotes (default)")
+    assert list(ignore.columns) == repo.AVAILABLE_STOCK_COLUMNS
+    assert dict(zip(ignore["stock_id"], ignore["quantity_available"])) == {"S1": 10.0, "S2": 3.0}
+
+    hold_all = repo.apply_quotes_policy(raw_stock(), "Quotes hold 100%")
+    assert dict(zip(hold_all["stock_id"], hold_all["quantity_available"])) == {"S1": 6.0}
+
+    hold_half = repo.apply_quotes_policy(raw_stock(), "Quotes hold 50%")
+    assert dict(zip(hold_half["stock_id"], hold_half["quantity_available"])) == {"S1": 8.0}
+
+    plain = repo.apply_quotes_policy(raw_stock().drop(columns=["available_excl_quotes", "quoted"]))
+    assert list(plain["stock_id"]) == ["S1", "S2", "S3"]
+
+    try:
+        repo.apply_quotes_policy(raw_stock(), "Quotes hold 75%")
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+    print("✓ Quotes policies hold back quoted units and drop empty rows")
+
+
+def test_fetch_available_stock_cached_per_policy():
+    reads = []
+
+    def fake_read(query, params=None):
+        reads.append(params)
+        return repo.apply_quotes_policy(raw_stock(), "Quotes hold 100%" if params == {"hold": 1.0}
+                                        else "Ignore quotes (default)")
+
+    with patch("repo._cache", TTLCache(ttl=60)), \
+         patch("repo._read_table", side_effect=fake_read), \
+         patch("repo._load_versions", return_value={"Stock": "v1:1:1"}):
+        assert list(repo.fetch_available_stock("Quotes hold 100%")["stock_id"]) == ["S1"]
+        assert len(repo.fetch_available_stock()) == 2
+        repo.fetch_available_stock("Quotes hold 100%")
+        assert reads == [{"hold": 1.0}, {"hold": 0.0}]
+
+        repo.invalidate("Stock")
+        repo.fetch_available_stock("Quotes hold 100%")
+        assert len(reads) == 3
+    print("✓ Available stock is read in SQL once per policy and dropped with Stock")
+
+
+def test_plain_stock_fallback():
+    def fake_read(query, params=None):
+        if params is not None:
+            raise RuntimeError('column "available_excl_quotes" does not exist')
+        return pd.DataFrame([{"bank_id": "B1", "habitat_name": "Grassland", "stock_id": "S1",
+                              "quantity_available": 5.0}])
+
+    with patch("repo._cache", TTLCache(ttl=60)), \
+         patch("repo._read_table", side_effect=fake_read), \
+         patch("repo._load_versions", return_value={}), \
+         patch("repo.logger") as logger:
+        assert list(repo.fetch_available_stock()["quantity_available"]) == [5.0]
+        assert "available_excl_quotes" in repo.quotes_policy_fallback()
+        assert "Quotes policy not applied" in logger.warning.call_args.args[0]
+        assert repo._quotes_policy_fallback
+
+    with patch("repo._cache", TTLCache(ttl=60)), \
+         patch("repo._read_table", return_value=pd.DataFrame(columns=repo.AVAILABLE_STOCK_COLUMNS)), \
+         patch("repo._load_versions", return_value={}):
+        assert repo.quotes_policy_fallback() is None
+    print("✓ Stock tables without quote columns fall back to quantity_available, with a warning")
+
+
+def test_load_with_policy_skips_full_stock():
+    queries = []
+
+    def fake_read(query, params=None):
+        queries.append(str(query))
+        if params is not None:
+            return repo.apply_quotes_policy(raw_stock(), "Quotes hold 50%")
+        return pd.DataFrame([{"x": 1}])
+
+    with patch("repo._cache", TTLCache(ttl=60)), \
+         patch("repo._read_table", side_effect=fake_read), \
+         patch("repo._load_versions", return_value={}):
+        tables = repo.fetch_all_reference_tables(quotes_hold_policy="Quotes hold 50%", typed=False)
+    assert list(tables["Stock"]["quantity_available"]) == [8.0]
+    assert not any(q.strip() == 'SELECT * FROM "Stock"' for q in queries)
+    print("✓ Loading with a quotes policy never pulls the full Stock table")
+
+
+if __name__ == "__main__":
+    test_apply_quotes_policy()
+    test_fetch_available_stock_cached_per_policy()
+    test_plain_stock_fallback()
+    test_load_with_policy_skips_full_stock()
+    print("\n✓ All available stock tests passed")
@@ -0,0 +1,56 @@
+"""
+Smoke test for the backend/worker images: backend.tasks and the modules
+load_backend_data imports resolve using only the files the Dockerfiles COPY.
+"""
+
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def copied_paths(dockerfile):
+    """Source paths of the COPY lines in a Dockerfile (excluding requirements)"""
+    paths = []
+    with open(os.path.join(ROOT, "docker", dockerfile)) as f:
+        for line in f:
+            match = re.match(r"COPY\s+(\S+)\s+\S+", line.strip())
+            if match and not match.group(1).endswith("requirements.txt"):
+                paths.append(match.group(1).rstrip("/"))
+    return paths
+
+
+def check_image_imports(dockerfile):
+    with tempfile.TemporaryDirectory() as tmp:
+        for path in copied_paths(dockerfile):
+            source = os.path.join(ROOT, path)
+            if os.path.isdir(source):
+                shutil.copytree(source, os.path.join(tmp, path),
+                                ignore=shutil.ignore_patterns("__pycache__"))
+            else:
+                shutil.copy(source, tmp)
+        code = ("import backend.tasks, repo, database\n"
+                "from optimizer_core import load_backend\n")
+        result = subprocess.run([sys.executable, "-c", code], cwd=tmp, capture_output=True, text=True,
+                                env={**os.environ, "PYTHONPATH": tmp})
+        assert result.returncode == 0, f"{dockerfile} is missing modules:\n{result.stderr}"
+
+
+def test_worker_image_imports():
+    check_image_imports("Dockerfile.worker")
+    print("✓ Worker image has every module load_backend_data needs")
+
+
+def test_backend_image_imports():
+    check_image_imports("Dockerfile.backend")
+    print("✓ Backend image has every module load_backend_data needs")
+
+
+if __name__ == "__main__":
+    test_worker_image_imports()
+    test_backend_image_imports()
+    print("\n✓ All backend image import tests passed")
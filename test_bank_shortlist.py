@@ -0,0 +1,190 @@
+"""
+Tests for the far-tier bank shortlist (KD-tree nearest banks + optimality bound).
+No database or ArcGIS access required.
+"""
+
+import math
+import random
+
+import pandas as pd
+
+from bank_shortlist import (BankLocator, haversine_km, lower_bound_with_excluded,
+                            shortlist_is_proven, shortlist_options)
+from optimizer_core import optimise
+
+
+def test_kdtree_matches_brute_force():
+    rng = random.Random(7)
+    keys = [f"B{i}" for i in range(200)]
+    lats = [rng.uniform(49.9, 55.8) for _ in keys]
+    lons = [rng.uniform(-5.7, 1.7) for _ in keys]
+    locator = BankLocator(keys, lats, lons)
+    for _ in range(25):
+        lat, lon = rng.uniform(50, 55), rng.uniform(-5, 1)
+        brute = sorted((haversine_km(lat, lon, la, lo), k) for k, la, lo in zip(keys, lats, lons))[:5]
+        got = locator.nearest(lat, lon, 5)
+        assert [k for k, _ in got] == [k for _, k in brute]
+        for (_, d_got), (d_brute, _) in zip(got, brute):
+            assert abs(d_got - d_brute) < 1e-6
+    assert BankLocator([], [], []).nearest(51, -1, 3) == []
+    print("✓ KD-tree nearest banks match brute-force haversine")
+
+
+def test_from_banks_skips_missing_coordinates():
+    banks = pd.DataFrame([
+        {"bank_id": "1", "bank_name": "A", "lat": 51.0, "lon": -1.0},
+        {"bank_id": "2", "bank_name": "B", "lat": None, "lon": None},
+        {"bank_id": "3", "bank_name": "C", "lat": "x", "lon": 0.1},
+    ])
+    locator = BankLocator.from_banks(banks)
+    assert locator.keys == ["A"]
+    assert abs(haversine_km(51.0, -1.0, 52.0, -1.0) - 111.2) < 0.1
+    print("✓ Banks without coordinates are left out of the tree")
+
+
+def make_options():
+    opts = [{"demand_idx": 0, "BANK_KEY": "Local", "tier": "local", "unit_price": 150.0}]
+    for i, price in enumerate([120.0, 130.0, 140.0, 160.0, 170.0]):
+        opts.append({"demand_idx": 0, "BANK_KEY": f"Far{i}", "tier": "far", "unit_price": price})
+    return opts
+
+
+def test_shortlist_keeps_nearest_and_cheapest():
+    # Far4 is the most expensive but the nearest to the site
+    locator = BankLocator(["Far0", "Far1", "Far2", "Far3", "Far4"],
+                          [55.0, 54.0, 53.0, 52.0, 51.01], [-2.0] * 5)
+    sl = shortlist_options(make_options(), 1, locator, 51.0, -2.0)
+    assert sorted(o["BANK_KEY"] for o in sl.options) == ["Far0", "Far4", "Local"]
+    assert len(sl.excluded) == 3
+    # No site location: price only
+    sl = shortlist_options(make_options(), 2)
+    assert sorted(o["BANK_KEY"] for o in sl.options) == ["Far0", "Far1", "Local"]
+    assert not shortlist_options(make_options(), 0).is_pruned
+    print("✓ Shortlist keeps local/adjacent plus K nearest and K cheapest far banks")
+
+
+def test_lower_bound():
+    opts = make_options() + [
+        {"demand_idx": 1, "BANK_KEY": "Local", "tier": "local", "unit_price": 10.0},
+        {"demand_idx": 1, "BANK_KEY": "Far0", "tier": "far", "unit_price": 50.0},
+        {"demand_idx": 1, "BANK_KEY": "Far1", "tier": "far", "unit_price": 60.0},
+    ]
+    sl = shortlist_options(opts, 1)
+    need = {0: 2.0, 1: 1.0}
+    # Best with an excluded option: Far1 on row 0 (130*2) + Local on row 1 (10)
+    assert lower_bound_with_excluded(sl, need) == 270.0
+    assert shortlist_is_proven(sl, need, 250.0)
+    assert not shortlist_is_proven(sl, need, 280.0)
+    assert not shortlist_is_proven(sl, need, 270.0), "a tie could still win stage B"
+    assert lower_bound_with_excluded(shortlist_options(opts, 0), need) == math.inf
+    print("✓ Lower bound proves when no excluded bank can beat the incumbent")
+
+
+def make_backend(n_far=8):
+    banks = [{"bank_id": "L", "bank_name": "Local Bank", "lpa_name": "Target LPA", "nca_name": "Target NCA",
+              "lat": 51.0, "lon": -1.0}]
+    prices = {"L": 300.0}
+    rng = random.Random(3)
+    for i in range(n_far):
+        bid = f"F{i}"
+        banks.append({"bank_id": bid, "bank_name": f"Far Bank {i}", "lpa_name": f"LPA {i}",
+                      "nca_name": f"NCA {i}", "lat": 51.0 + 0.3 * (i + 1), "lon": -1.0})
+        prices[bid] = rng.uniform(100.0, 400.0)
+    banks = pd.DataFrame(banks)
+    stock = pd.DataFrame([{"stock_id": f"S_{b}", "bank_id": b, "habitat_name": "Ditch",
+                           "quantity_available": 3.0} for b in banks["bank_id"]])
+    pricing = pd.DataFrame([
+        {"bank_id": b, "habitat_name": "Ditch", "contract_size": "small", "tier": tier, "price": p,
+         "broader_type": "", "distinctiveness_name": ""}
+        for b, p in prices.items() for tier in ("local", "adjacent", "far")
+    ])
+    pricing = pricing.merge(banks[["bank_id", "bank_name"]], on="bank_id")
+    pricing["BANK_KEY"] = pricing["bank_name"]
+    return {
+        "HabitatCatalog": pd.DataFrame([{"habitat_name": "Ditch", "broader_type": "Rivers and streams",
+                                         "distinctiveness_name": "Low", "UmbrellaType": "watercourse"}]),
+        "Banks": banks,
+        "Stock": stock,
+        "Pricing": pricing,
+        "DistinctivenessLevels": pd.DataFrame([{"distinctiveness_name": "Low", "level_value": 1}]),
+    }
+
+
+def run(k, prove=True):
+    demand = pd.DataFrame([{"habitat_name": "Ditch", "units_required": 1.0}])
+    alloc, cost, _, debug = optimise(demand, "Target LPA", "Target NCA", [], [], [], [],
+                                     backend=make_backend(), return_debug_info=True,
+                                     site_lat=51.0, site_lon=-1.0, far_bank_k=k, prove_shortlist=prove)
+    return alloc, cost, debug
+
+
+def test_optimise_with_shortlist_matches_full_solve():
+    alloc_full, cost_full, _ = run(0)
+    alloc_k, cost_k, debug = run(1)
+    assert abs(cost_full - cost_k) < 1e-6
+    assert list(alloc_full["BANK_KEY"]) == list(alloc_k["BANK_KEY"])
+    assert "Bank shortlist" in debug
+    print(f"✓ Shortlisted optimise matches full solve (£{cost_k:,.2f})")
+
+
+def make_tie_backend(x_price=100.0):
+    # A (row 0) and B (row 1) are kept; far-away X ties both prices with one bank
+    banks = pd.DataFrame([
+        {"bank_id": b, "bank_name": b, "lpa_name": lpa, "nca_name": nca, "lat": lat, "lon": -1.0}
+        for b, lpa, nca, lat in [("L", "Target LPA", "Target NCA", 51.0), ("A", "LPA A", "NCA A", 51.3),
+                                 ("B", "LPA B", "NCA B", 51.4), ("X", "LPA X", "NCA X", 54.0)]
+    ])
+    prices = {("L", "Ditch"): 1000.0, ("L", "Culvert"): 1000.0, ("A", "Ditch"): 100.0,
+              ("X", "Ditch"): x_price, ("B", "Culvert"): 100.0, ("X", "Culvert"): x_price}
+    stock = pd.DataFrame([{"stock_id": f"S_{b}_{h}", "bank_id": b, "habitat_name": h,
+                           "quantity_available": 3.0} for b, h in prices])
+    pricing = pd.DataFrame([
+        {"bank_id": b, "habitat_name": h, "contract_size": "small", "tier": tier, "price": p,
+         "broader_type": "", "distinctiveness_name": ""}
+        for (b, h), p in prices.items() for tier in ("local", "adjacent", "far")
+    ])
+    pricing = pricing.merge(banks[["bank_id", "bank_name"]], on="bank_id")
+    pricing["BANK_KEY"] = pricing["bank_name"]
+    return {
+        "HabitatCatalog": pd.DataFrame([{"habitat_name": h, "broader_type": "Rivers and streams",
+                                         "distinctiveness_name": "Low", "UmbrellaType": "watercourse"}
+                                        for h in ("Ditch", "Culvert")]),
+        "Banks": banks,
+        "Stock": stock,
+        "Pricing": pricing,
+        "DistinctivenessLevels": pd.DataFrame([{"distinctiveness_name": "Low", "level_value": 1}]),
+    }
+
+
+def solve_tie(k, x_price=100.0):
+    demand = pd.DataFrame([{"habitat_name": "Ditch", "units_required": 1.0},
+                           {"habitat_name": "Culvert", "units_required": 1.0}])
+    alloc, cost, _, _ = optimise(demand, "Target LPA", "Target NCA", [], [], [], [],
+                                 backend=make_tie_backend(x_price), site_lat=51.0, site_lon=-1.0,
+                                 far_bank_k=k, prove_shortlist=True)
+    return round(cost, 6), sorted(set(alloc["BANK_KEY"]))
+
+
+def test_tied_excluded_bank_is_rechecked():
+    assert solve_tie(0) == solve_tie(1) == (200.0, ["X"])
+    print("✓ An excluded bank tying the incumbent is re-checked (stage B picks one bank)")
+
+
+def test_near_tie_within_stage_b_band_is_rechecked():
+    # X costs 200.01 in total: above stage A's 200.00 but inside stage B's
+    # min(£10, 0.01%) band, where one bank beats two
+    full, shortlisted = solve_tie(0, 100.005), solve_tie(1, 100.005)
+    assert full == (200.01, ["X"]), full
+    assert shortlisted == full, shortlisted
+    print("✓ An excluded bank inside stage B's cost band is re-checked")
+
+
+if __name__ == "__main__":
+    test_kdtree_matches_brute_force()
+    test_from_banks_skips_missing_coordinates()
+    test_shortlist_keeps_nearest_and_cheapest()
+    test_lower_bound()
+    test_optimise_with_shortlist_matches_full_solve()
+    test_tied_excluded_bank_is_rechecked()
+    test_near_tie_within_stage_b_band_is_rechecked()
+    print("\n✓ All bank shortlist tests passed")
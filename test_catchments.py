@@ -0,0 +1,146 @@
+"""
+Tests for the offline WFD catchment index and catchment-based watercourse SRM.
+No database or WFS access required.
+"""
+
+import pandas as pd
+
+from catchments import (CATCHMENT_TYPE_OPERATIONAL, CATCHMENT_TYPE_WATERBODY,
+                        CatchmentIndex, build_bank_catchments, feature_row)
+from optimizer_core import calculate_watercourse_srm, prepare_watercourse_options
+
+
+def square(x0, y0, x1, y1):
+    return [[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]
+
+
+def make_index():
+    rows = [
+        # Two waterbodies inside operational catchment "Test and Itchen"
+        feature_row(CATCHMENT_TYPE_WATERBODY, "Itchen",
+                    {"type": "Polygon", "coordinates": [square(-1.4, 51.0, -1.2, 51.2),
+                                                        square(-1.35, 51.05, -1.3, 51.1)]},
+                    operational_catchment="Test and Itchen"),
+        feature_row(CATCHMENT_TYPE_WATERBODY, "Test",
+                    {"type": "MultiPolygon", "coordinates": [[square(-1.6, 51.0, -1.4, 51.2)],
+                                                             [square(-1.35, 51.05, -1.3, 51.1)]]},
+                    operational_catchment="Test and Itchen"),
+        feature_row(CATCHMENT_TYPE_OPERATIONAL, "Test and Itchen",
+                    {"type": "Polygon", "coordinates": [square(-1.6, 50.9, -1.2, 51.3)]}),
+        feature_row(CATCHMENT_TYPE_OPERATIONAL, "Arun and Western Streams",
+                    {"type": "Polygon", "coordinates": [square(-0.8, 50.7, -0.4, 51.1)]}),
+    ]
+    return CatchmentIndex.from_frame(pd.DataFrame(rows))
+
+
+def test_point_lookup():
+    index = make_index()
+    assert len(index) == 4
+    assert index.catchments_for_point(51.15, -1.25) == ("Itchen", "Test and Itchen")
+    assert index.catchments_for_point(51.1, -1.5) == ("Test", "Test and Itchen")
+    # Inside the hole of Itchen, covered by the second part of Test's multipolygon
+    assert index.catchments_for_point(51.07, -1.32) == ("Test", "Test and Itchen")
+    # Operational only (no waterbody polygon there)
+    assert index.catchments_for_point(50.95, -1.3) == ("", "Test and Itchen")
+    assert index.catchments_for_point(50.9, -0.6) == ("", "Arun and Western Streams")
+    # Outside everything
+    assert index.catchments_for_point(53.0, -2.0) == ("", "")
+    print("✓ Point lookups resolve waterbody and operational catchments")
+
+
+def test_empty_index():
+    index = CatchmentIndex.from_frame(pd.DataFrame())
+    assert index.is_empty
+    assert index.catchments_for_point(51.0, -1.0) == ("", "")
+    print("✓ Empty index returns empty names")
+
+
+def test_build_bank_catchments():
+    banks = pd.DataFrame([
+        {"bank_id": "B1", "lat": 51.15, "lon": -1.25},
+        {"bank_id": "B2", "lat": 50.9, "lon": -0.6},
+        {"bank_id": "B3", "lat": None, "lon": None},
+    ])
+    bc = build_bank_catchments(banks, make_index())
+    assert list(bc["bank_id"]) == ["B1", "B2"]
+    assert bc.iloc[0]["waterbody"] == "Itchen"
+    assert bc.iloc[1]["operational_catchment"] == "Arun and Western Streams"
+    print("✓ BankCatchments precomputed from bank lat/lon")
+
+
+def test_calculate_watercourse_srm():
+    assert calculate_watercourse_srm("Itchen", "Test and Itchen", "Itchen", "Test and Itchen") == 1.0
+    assert calculate_watercourse_srm("Itchen", "Test and Itchen", "Test", "Test and Itchen") == 0.75
+    assert calculate_watercourse_srm("Itchen", "Test and Itchen", "", "Arun") == 0.5
+    assert calculate_watercourse_srm("", "", "Itchen", "Test and Itchen") == 0.5
+    print("✓ Catchment SRM rules")
+
+
+def make_backend():
+    catalog = pd.DataFrame([
+        {"habitat_name": "Ditch", "broader_type": "Rivers and streams",
+         "distinctiveness_name": "Low", "UmbrellaType": "watercourse"},
+    ])
+    banks = pd.DataFrame([
+        {"bank_id": "B1", "bank_name": "Same Waterbody Bank", "lpa_name": "Far LPA", "nca_name": "Far NCA"},
+        {"bank_id": "B2", "bank_name": "Same Operational Bank", "lpa_name": "Far LPA", "nca_name": "Far NCA"},
+        {"bank_id": "B3", "bank_name": "No Catchment Bank", "lpa_name": "Target LPA", "nca_name": "Far NCA"},
+    ])
+    stock = pd.DataFrame([
+        {"stock_id": f"S{i}", "bank_id": f"B{i}", "habitat_name": "Ditch", "quantity_available": 10.0}
+        for i in (1, 2, 3)
+    ])
+    pricing = pd.DataFrame([
+        {"bank_id": f"B{i}", "habitat_name": "Ditch", "contract_size": "small", "tier": tier, "price": price}
+        for i in (1, 2, 3)
+        for tier, price in (("local", 100.0), ("adjacent", 110.0), ("far", 120.0))
+    ])
+    pricing = pricing.merge(banks[["bank_id", "bank_name"]], on="bank_id")
+    pricing["BANK_KEY"] = pricing["bank_name"]
+    bank_catchments = pd.DataFrame([
+        {"bank_id": "B1", "waterbody": "Itchen", "operational_catchment": "Test and Itchen"},
+        {"bank_id": "B2", "waterbody": "Test", "operational_catchment": "Test and Itchen"},
+    ])
+    return {
+        "HabitatCatalog": catalog,
+        "Banks": banks,
+        "Stock": stock,
+        "Pricing": pricing,
+        "DistinctivenessLevels": pd.DataFrame([{"distinctiveness_name": "Low", "level_value": 1}]),
+        "BankCatchments": bank_catchments,
+    }
+
+
+def test_watercourse_options_use_catchment_srm():
+    demand = pd.DataFrame([{"habitat_name": "Ditch", "units_required": 1.0}])
+    options, _, _ = prepare_watercourse_options(
+        demand, "small", "Target LPA", "Target NCA", [], [], [], [],
+        make_backend(), site_waterbody="Itchen", site_operational="Test and Itchen"
+    )
+    by_bank = {o["bank_id"]: o for o in options}
+    assert by_bank["B1"]["tier"] == "local" and by_bank["B1"]["stock_use"]["S1"] == 1.0
+    assert by_bank["B2"]["tier"] == "adjacent" and abs(by_bank["B2"]["stock_use"]["S2"] - 4 / 3) < 1e-9
+    # No BankCatchments entry: falls back to LPA/NCA tiering (same LPA → local)
+    assert by_bank["B3"]["tier"] == "local"
+    print("✓ Watercourse options priced from catchment SRM")
+
+
+def test_watercourse_options_without_site_catchments_use_lpa_nca():
+    demand = pd.DataFrame([{"habitat_name": "Ditch", "units_required": 1.0}])
+    options, _, _ = prepare_watercourse_options(
+        demand, "small", "Target LPA", "Target NCA", [], [], [], [], make_backend()
+    )
+    by_bank = {o["bank_id"]: o for o in options}
+    assert by_bank["B1"]["tier"] == "far"
+    assert by_bank["B3"]["tier"] == "local"
+    print("✓ Without site catchments the LPA/NCA approximation is unchanged")
+
+
+if __name__ == "__main__":
+    test_point_lookup()
+    test_empty_index()
+    test_build_bank_catchments()
+    test_calculate_watercourse_srm()
+    test_watercourse_options_use_catchment_srm()
+    test_watercourse_options_without_site_catchments_use_lpa_nca()
+    print("\n✓ All catchment tests passed")
@@ -0,0 +1,61 @@
+"""
+Test the set-based customer backfill (SubmissionsDB.populate_customers_from_submissions)
+No database required - the engine is mocked and statements are counted.
+"""
+
+import sys
+from unittest.mock import MagicMock, patch
+
+# Mock streamlit
+sys.modules['streamlit'] = MagicMock()
+
+
+def mock_transaction(engine):
+    conn = MagicMock()
+    conn.__enter__ = MagicMock(return_value=conn)
+    conn.__exit__ = MagicMock(return_value=False)
+    engine.begin.return_value = conn
+    return conn
+
+
+def test_backfill_is_set_based():
+    from database import SubmissionsDB
+
+    with patch('database.DatabaseConnection.get_engine') as mock_engine:
+        db = SubmissionsDB()
+        mock_engine.return_value.begin.reset_mock()
+        conn = mock_transaction(mock_engine.return_value)
+        conn.execute.return_value.rowcount = 1234
+
+        created_count, errors = db.populate_customers_from_submissions()
+
+        assert created_count == 1234 and errors == []
+        statements = [str(c.args[0]) for c in conn.execute.call_args_list]
+        assert len(statements) == 3, f"expected 3 statements whatever the history size, got {len(statements)}"
+        assert statements[0].startswith("LOCK TABLE customers")
+        assert "INSERT INTO customers" in statements[1] and "SELECT DISTINCT client_name" in statements[1]
+        assert "NOT EXISTS" in statements[1]
+        assert "UPDATE submissions s" in statements[2] and "DISTINCT ON (client_name)" in statements[2]
+        assert mock_engine.return_value.begin.call_count == 1, "one transaction"
+    print("✓ Customers are backfilled with set-based statements in one transaction")
+
+
+def test_backfill_reports_errors():
+    from database import SubmissionsDB
+
+    with patch('database.DatabaseConnection.get_engine') as mock_engine:
+        db = SubmissionsDB()
+        conn = mock_transaction(mock_engine.return_value)
+        conn.execute.side_effect = RuntimeError("permission denied for table customers")
+
+        created_count, errors = db.populate_customers_from_submissions()
+
+        assert created_count == 0
+        assert len(errors) == 1 and "permission denied" in errors[0]
+    print("✓ A failed backfill rolls back and returns the error")
+
+
+if __name__ == "__main__":
+    test_backfill_is_set_based()
+    test_backfill_reports_errors()
+    print("\n✓ All customer backfill tests passed")
@@ -0,0 +1,116 @@
+"""
+Tests for the persistent ArcGIS response cache (http_cache + optimizer_core.cached_get_json).
+No network access required - responses are built locally.
+"""
+
+import json
+import tempfile
+import time
+from unittest.mock import patch
+
+import requests
+
+import http_cache
+import optimizer_core
+
+
+def make_response(payload, status=200, headers=None):
+    r = requests.Response()
+    r.status_code = status
+    r._content = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    r.headers.update(headers or {})
+    r.url = "https://example.test/query"
+    return r
+
+
+BOUNDARY = {
+    "features": [
+        {"attributes": {"LAD24NM": "Winchester"},
+         "geometry": {"rings": [[[-1.4123456, 51.0], [-1.2, 51.0000001], [-1.2, 51.1], [-1.4123456, 51.0]],
+                                [[-1.3, 51.05], [-1.25, 51.05], [-1.25, 51.06], [-1.3, 51.05]]]}},
+        {"attributes": {"LAD24NM": "Test Valley"}, "geometry": {"rings": []}},
+    ]
+}
+
+
+def test_pack_roundtrip_quantises_rings():
+    blob = http_cache.pack_payload(BOUNDARY)
+    out = http_cache.unpack_payload(blob)
+    assert out["features"][0]["attributes"] == {"LAD24NM": "Winchester"}
+    rings = out["features"][0]["geometry"]["rings"]
+    assert len(rings) == 2 and len(rings[0]) == 4
+    assert abs(rings[0][0][0] - -1.412346) < 1e-9
+    assert out["features"][1]["geometry"]["rings"] == []
+    print("✓ Geometry rings survive pack/unpack at micro-degree precision")
+
+
+def test_pack_is_compact():
+    ring = [[-1.0 + i * 1e-4, 51.0 + (i % 7) * 1e-4] for i in range(20000)]
+    payload = {"features": [{"attributes": {"n": 1}, "geometry": {"rings": [ring]}}]}
+    raw = len(json.dumps(payload).encode("utf-8"))
+    packed = len(http_cache.pack_payload(payload))
+    assert packed * 5 < raw, (packed, raw)
+    print(f"✓ {raw:,} bytes of JSON packed to {packed:,} bytes")
+
+
+def test_key_canonicalises_params():
+    k1 = http_cache.ResponseCache.key("https://x/query", {"f": "json", "outSR": 4326})
+    k2 = http_cache.ResponseCache.key("https://x/query/", {"outSR": "4326", "f": "json"})
+    k3 = http_cache.ResponseCache.key("https://x/query", {"f": "json", "outSR": 4326}, method="POST")
+    assert k1 == k2
+    assert k1 != k3
+    print("✓ Cache key ignores parameter order and value types")
+
+
+def test_cached_get_json_hit_revalidate_and_stale_if_error():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = http_cache.ResponseCache(tmp, ttl=3600)
+        with patch("http_cache.get_response_cache", return_value=cache), \
+             patch("optimizer_core.http_get") as mock_get:
+            mock_get.return_value = make_response(BOUNDARY, headers={"ETag": '"v1"'})
+            first = optimizer_core.cached_get_json("https://x/query", {"where": "1=1"})
+            assert mock_get.call_count == 1
+
+            # Fresh hit from a new process-level cache over the same directory
+            cache2 = http_cache.ResponseCache(tmp, ttl=3600)
+            with patch("http_cache.get_response_cache", return_value=cache2):
+                second = optimizer_core.cached_get_json("https://x/query", {"where": "1=1"})
+            assert mock_get.call_count == 1
+            assert second["features"][0]["attributes"] == first["features"][0]["attributes"]
+
+            # Stale: conditional request, 304 keeps the body
+            key = cache.key("https://x/query", {"where": "1=1"})
+            cache.get(key).stored_at = time.time() - 7200
+            mock_get.return_value = make_response(None, status=304)
+            third = optimizer_core.cached_get_json("https://x/query", {"where": "1=1"})
+            assert mock_get.call_args[1]["headers"]["If-None-Match"] == '"v1"'
+            assert third["features"][0]["attributes"]["LAD24NM"] == "Winchester"
+            assert cache.get(key).is_fresh(3600)
+
+            # Stale and service down: serve the stale copy
+            cache.get(key).stored_at = time.time() - 7200
+            mock_get.side_effect = RuntimeError("Connection error")
+            fourth = optimizer_core.cached_get_json("https://x/query", {"where": "1=1"})
+            assert fourth["features"][0]["attributes"]["LAD24NM"] == "Winchester"
+    print("✓ Fresh hits, 304 revalidation and stale-if-error all served from cache")
+
+
+def test_arcgis_errors_are_not_cached():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = http_cache.ResponseCache(tmp, ttl=3600)
+        with patch("http_cache.get_response_cache", return_value=cache), \
+             patch("optimizer_core.http_get") as mock_get:
+            mock_get.return_value = make_response({"error": {"code": 400}})
+            optimizer_core.cached_get_json("https://x/query", {"where": "bad"})
+            optimizer_core.cached_get_json("https://x/query", {"where": "bad"})
+            assert mock_get.call_count == 2
+    print("✓ ArcGIS error payloads are not cached")
+
+
+if __name__ == "__main__":
+    test_pack_roundtrip_quantises_rings()
+    test_pack_is_compact()
+    test_key_canonicalises_params()
+    test_cached_get_json_hit_revalidate_and_stale_if_error()
+    test_arcgis_errors_are_not_cached()
+    print("\n✓ All HTTP cache tests passed")
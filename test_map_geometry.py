@@ -0,0 +1,110 @@
+"""
+Tests for boundary simplification used by the maps.
+"""
+
+import json
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import map_geometry
+from map_geometry import (decimals_for_tolerance, simplify_for_map, simplify_geojson,
+                          simplify_ring, tolerance_for_zoom)
+
+
+def dense_ring(n=40000, cx=-1.3, cy=51.05, r=0.15):
+    """Wobbly circle with survey-style density (~n vertices)"""
+    t = np.linspace(0, 2 * math.pi, n, endpoint=False)
+    rad = r * (1 + 0.05 * np.sin(12 * t) + 0.0002 * np.sin(997 * t))
+    ring = np.column_stack([cx + rad * np.cos(t), cy + rad * np.sin(t)]).tolist()
+    ring.append(ring[0])
+    return ring
+
+
+def max_deviation(original, simplified):
+    """Largest distance from an original vertex to the nearest simplified vertex (degrees)"""
+    a = np.asarray(original)[::50]
+    b = np.asarray(simplified)
+    d = np.hypot(a[:, None, 0] - b[None, :, 0], a[:, None, 1] - b[None, :, 1])
+    return float(d.min(axis=1).max())
+
+
+def test_tolerance_for_zoom():
+    assert tolerance_for_zoom(12) < tolerance_for_zoom(10)
+    assert abs(tolerance_for_zoom(11) * 2 - tolerance_for_zoom(10)) < 1e-15
+    assert decimals_for_tolerance(1e-4) == 5
+    assert decimals_for_tolerance(0.01) == 3
+    print("✓ Zoom-based tolerance and quantisation")
+
+
+def test_simplify_ring_keeps_shape():
+    ring = dense_ring()
+    tol = tolerance_for_zoom(12)
+    out = simplify_ring(ring, tol)
+    assert 4 <= len(out) < len(ring) / 10
+    assert out[0] == out[-1]
+    # Chord error bounded by tolerance (after lon scaling) plus vertex spacing slack
+    assert max_deviation(ring, out) < 0.02
+    print(f"✓ Ring simplified from {len(ring):,} to {len(out):,} vertices")
+
+
+def test_tiny_and_collapsed_rings():
+    tri = [[0, 0], [1, 0], [0, 1], [0, 0]]
+    assert simplify_ring(tri, 0.001) == [[0.0, 0.0], [1.0, 0.0], [0.0, 1.0], [0.0, 0.0]]
+    speck = [[0, 0], [1e-7, 0], [0, 1e-7], [0, 0]]
+    assert simplify_ring(speck, 0.01) == []
+    gj = {"type": "MultiPolygon", "coordinates": [[speck], [tri]]}
+    assert simplify_geojson(gj, 0.01) == {"type": "MultiPolygon", "coordinates": [[[[0.0, 0.0], [1.0, 0.0], [0.0, 1.0], [0.0, 0.0]]]]}
+    assert simplify_geojson({"type": "Polygon", "coordinates": [speck]}, 0.01) is None
+    print("✓ Collapsed rings dropped, small rings untouched")
+
+
+def test_payload_shrinks_to_tens_of_kb():
+    gj = {"type": "MultiPolygon", "coordinates": [[dense_ring()], [dense_ring(cx=-1.0, r=0.05)]]}
+    full = len(json.dumps(gj))
+    small = len(json.dumps(simplify_for_map(gj, zoom=10)))
+    assert full > 1_000_000
+    assert small < 50_000, small
+    print(f"✓ Map payload {full / 1e6:.1f} MB -> {small / 1e3:.1f} kB")
+
+
+def test_results_cached_per_feature_and_tolerance():
+    map_geometry.clear_cache()
+    gj = {"type": "Polygon", "coordinates": [dense_ring(n=2000)]}
+    a = simplify_for_map(gj, zoom=10)
+    b = simplify_for_map({"type": "Polygon", "coordinates": [dense_ring(n=2000)]}, zoom=10)
+    c = simplify_for_map(gj, zoom=14)
+    assert a is b
+    assert c is not a and len(c["coordinates"][0]) >= len(a["coordinates"][0])
+    assert simplify_for_map(None) is None
+    point = {"type": "Point", "coordinates": [0, 0]}
+    assert simplify_for_map(point) is point
+    print("✓ Simplified geometries cached per (feature, tolerance)")
+
+
+def test_cache_safe_across_threads():
+    map_geometry.clear_cache()
+    features = [{"type": "Polygon", "coordinates": [dense_ring(n=300, cx=i * 0.01)]}
+                for i in range(map_geometry._CACHE_SIZE + 40)]
+
+    def render(i):
+        return simplify_for_map(features[i % len(features)], zoom=10 + i % 3)
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(render, range(2000)))
+    assert all(r and r["type"] == "Polygon" for r in results)
+    assert len(map_geometry._cache) <= map_geometry._CACHE_SIZE
+    map_geometry.clear_cache()
+    assert len(map_geometry._cache) == 0
+    print("✓ Geometry cache stays bounded under concurrent sessions")
+
+
+if __name__ == "__main__":
+    test_tolerance_for_zoom()
+    test_simplify_ring_keeps_shape()
+    test_tiny_and_collapsed_rings()
+    test_payload_shrinks_to_tens_of_kb()
+    test_results_cached_per_feature_and_tolerance()
+    test_cache_safe_across_threads()
+    print("\n✓ All map geometry tests passed")
@@ -0,0 +1,210 @@
+"""
+Tests for the process-level reference data cache (reference_cache + repo).
+No database required - table reads are patched.
+"""
+
+import os
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+
+import db
+import repo
+from reference_cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_expiry_and_invalidation():
+    clock = FakeClock()
+    cache = TTLCache(ttl=10, clock=clock)
+    calls = []
+    loader = lambda: calls.append(1) or len(calls)
+
+    assert cache.get_or_load("k", loader) == 1
+    assert cache.get_or_load("k", loader) == 1
+    clock.now = 9.9
+    assert cache.get_or_load("k", loader) == 1
+    clock.now = 10.0
+    assert cache.get_or_load("k", loader) == 2
+    cache.invalidate("k")
+    assert "k" not in cache
+    assert cache.get_or_load("k", loader) == 3
+    cache.invalidate()
+    assert cache.get_or_load("k", loader) == 4
+    assert cache.loads == 4 and cache.hits == 2
+    print("✓ Entries expire after TTL and can be invalidated")
+
+
+def test_failed_load_is_not_cached():
+    cache = TTLCache(ttl=60)
+
+    def boom():
+        raise RuntimeError("db down")
+
+    try:
+        cache.get_or_load("k", boom)
+        assert False, "expected RuntimeError"
+    except RuntimeError:
+        pass
+    assert cache.get_or_load("k", lambda: "ok") == "ok"
+    print("✓ Failed loads propagate and are retried")
+
+
+def test_concurrent_callers_share_one_load():
+    cache = TTLCache(ttl=60)
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.05)
+        return "value"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("k", slow))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == ["value"] * 8
+    assert len(calls) == 1
+    print("✓ Concurrent callers after expiry trigger a single load")
+
+
+def test_repo_tables_loaded_once_per_process():
+    repo.invalidate()
+    reads = []
+
+    def fake_read(query):
+        reads.append(query)
+        return pd.DataFrame([{"bank_id": "B1", "bank_name": "Bank 1"}])
+
+    with patch("repo._read_table", side_effect=fake_read):
+        a = repo.fetch_banks()
+        a.loc[0, "bank_name"] = "mutated"
+        b = repo.fetch_banks()
+        assert len(reads) == 1
+        assert b.loc[0, "bank_name"] == "Bank 1"  # callers get copies
+
+        repo.invalidate("Banks")
+        repo.fetch_banks()
+        assert len(reads) == 2
+    repo.invalidate()
+    print("✓ Reference tables cached per process, copies returned, invalidation works")
+
+
+def test_optional_table_falls_back_to_empty():
+    repo.invalidate()
+    with patch("repo._read_table", side_effect=RuntimeError("relation does not exist")):
+        df = repo.fetch_bank_catchments()
+        assert df.empty
+        assert list(df.columns) == ["bank_id", "waterbody", "operational_catchment"]
+        try:
+            repo.fetch_stock()
+            assert False, "expected RuntimeError"
+        except RuntimeError as e:
+            assert "Stock" in str(e)
+    repo.invalidate()
+    print("✓ Optional tables fall back to empty, required tables raise")
+
+
+def test_fetch_all_reference_tables_runs_concurrently_on_miss():
+    repo.invalidate()
+
+    def slow_read(query):
+        time.sleep(0.1)
+        return pd.DataFrame([{"query": query}])
+
+    with patch("repo._read_table", side_effect=slow_read) as mock_read:
+        started = time.perf_counter()
+        tables = repo.fetch_all_reference_tables(typed=False)
+        cold = time.perf_counter() - started
+        assert list(tables) == ["Banks", "Pricing", "HabitatCatalog", "Stock", "DistinctivenessLevels",
+                                "SRM", "TradingRules", "BankCatchments"]
+        assert '"Stock"' in tables["Stock"].loc[0, "query"]
+        assert mock_read.call_count == 8
+        assert cold < 0.6, cold  # sequential would take 0.8s
+
+        repo.fetch_all_reference_tables(typed=False)
+        assert mock_read.call_count == 8
+    repo.invalidate()
+    print(f"✓ Cold fetch of 8 tables took {cold:.2f}s (concurrent)")
+
+
+def test_unchanged_tables_are_revalidated_not_refetched():
+    clock = FakeClock()
+    versions = {"Banks": "v1:100:5", "Stock": "v7:200:9"}
+    reads = []
+
+    def fake_read(query):
+        reads.append(query)
+        return pd.DataFrame([{"n": len(reads)}])
+
+    with patch("repo._cache", TTLCache(ttl=5, clock=clock)), \
+         patch("repo._load_versions", side_effect=lambda: dict(versions)) as probe, \
+         patch("repo._read_table", side_effect=fake_read):
+        repo.fetch_banks()
+        repo.fetch_stock()
+        assert len(reads) == 2 and probe.call_count == 1
+
+        # Stale but unchanged: one probe, no refetch
+        clock.now = 6
+        repo.fetch_banks()
+        repo.fetch_stock()
+        assert len(reads) == 2 and probe.call_count == 2
+
+        # Stock changed: only Stock is refetched
+        versions["Stock"] = "v8:200:10"
+        clock.now = 12
+        repo.fetch_banks()
+        assert repo.fetch_stock().loc[0, "n"] == 3
+        assert len(reads) == 3 and '"Stock"' in reads[-1]
+
+        # Admin hook drops local copies even when the database is unreachable
+        with patch("repo.get_db_engine", side_effect=RuntimeError("no db")):
+            repo.mark_reference_tables_changed(["Banks"])
+        repo.fetch_banks()
+        assert len(reads) == 4 and '"Banks"' in reads[-1]
+    print("✓ Version probe refetches only changed tables")
+
+
+def test_trigger_version_alone_is_the_token():
+    conn = MagicMock()
+    conn.__enter__ = MagicMock(return_value=conn)
+    conn.__exit__ = MagicMock(return_value=False)
+    rows = [("Banks", 100, 5, 3), ("Stock", 200, 9, None)]
+    conn.execute.return_value.fetchall.side_effect = lambda: rows
+    with patch("repo.get_db_engine") as engine, patch("repo.time.time", return_value=0):
+        engine.return_value.connect.return_value = conn
+        assert repo._load_versions() == {"Banks": "v3", "Stock": "s200:9:0"}
+        # Counters move (stats reset, another replica) without a trigger bump
+        rows = [("Banks", 100, 0, 3), ("Stock", 200, 10, None)]
+        assert repo._load_versions() == {"Banks": "v3", "Stock": "s200:10:0"}
+    print("✓ Tables with a ReferenceVersions row are keyed on the trigger version alone")
+
+
+def test_database_url_from_environment():
+    with patch.dict(os.environ, {"DATABASE_URL": "postgresql://u:p@host:5432/db"}):
+        assert db.get_database_url() == "postgresql://u:p@host:5432/db"
+    print("✓ DATABASE_URL takes precedence over Streamlit secrets")
+
+
+if __name__ == "__main__":
+    test_ttl_expiry_and_invalidation()
+    test_failed_load_is_not_cached()
+    test_concurrent_callers_share_one_load()
+    test_repo_tables_loaded_once_per_process()
+    test_optional_table_falls_back_to_empty()
+    test_fetch_all_reference_tables_runs_concurrently_on_miss()
+    test_unchanged_tables_are_revalidated_not_refetched()
+    test_trigger_version_alone_is_the_token()
+    test_database_url_from_environment()
+    print("\n✓ All reference cache tests passed")
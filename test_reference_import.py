@@ -0,0 +1,199 @@
+"""
+Tests for the transactional reference importer (reference_import).
+No database required - validation, COPY encoding and swap SQL are checked directly.
+"""
+
+import csv
+
+import numpy as np
+import pandas as pd
+
+from reference_import import (ImportValidationError, SPECS_BY_NAME, _apply_diff, _delete_diff, _load_columns,
+                              csv_buffer, diff_table, swap_statements, validate_tables)
+
+
+def workbook():
+    return {
+        "Banks": pd.DataFrame([{"bank_id": "B1", "bank_name": "Bank 1"}, {"bank_id": "B2", "bank_name": "Bank 2"}]),
+        "HabitatCatalog": pd.DataFrame([{"habitat_name": "Grassland", "broader_type": "Grassland",
+                                         "distinctiveness_name": "Low"}]),
+        "Pricing": pd.DataFrame([
+            {"bank_id": "B1", "habitat_name": "Grassland", "contract_size": "small", "tier": "local", "price": 1.0},
+            {"bank_id": "B2", "habitat_name": "Woodland", "contract_size": "small", "tier": "local", "price": 2.0},
+        ]),
+        "Stock": pd.DataFrame([{"stock_id": "S1", "bank_id": "B1", "habitat_name": "Grassland",
+                                "quantity_available": 3.0}]),
+    }
+
+
+def test_validation_passes_with_warnings():
+    warnings = validate_tables(workbook())
+    assert warnings == ["Pricing: habitat_name not in HabitatCatalog: Woodland"]
+    print("✓ Unknown habitats are warned about, not rejected")
+
+
+def test_validation_rejects_bad_keys():
+    tables = workbook()
+    tables["Banks"] = pd.concat([tables["Banks"], pd.DataFrame([{"bank_id": "B1", "bank_name": "Dup"},
+                                                                {"bank_id": None, "bank_name": "Blank"}])],
+                                ignore_index=True)
+    tables["Stock"].loc[0, "bank_id"] = "B9"
+    try:
+        validate_tables(tables)
+        assert False, "expected ImportValidationError"
+    except ImportValidationError as e:
+        assert "Banks: 1 row(s) with blank bank_id (sheet rows 5)" in e.problems
+        assert "Banks: 2 rows share a bank_id (e.g. B1)" in e.problems
+        assert "Stock: bank_id not in Banks: B9" in e.problems
+    print("✓ Blank, duplicate and unknown bank keys reject the import")
+
+
+def test_references_fall_back_to_database():
+    tables = {"Stock": workbook()["Stock"]}
+    seen = []
+
+    def existing(table, column):
+        seen.append((table, column))
+        return {"B1"} if table == "Banks" else {"Grassland"}
+
+    assert validate_tables(tables, existing) == []
+    assert ("Banks", "bank_id") in seen
+    print("✓ References to tables not in the workbook are checked against the database")
+
+
+def test_csv_encoding_for_copy():
+    df = pd.DataFrame({"bank_id": [1.0, np.nan, 3.0], "note": ['say "hi"', "", None], "price": [1.5, np.nan, 2.0]})
+    buf = csv_buffer(df, ["bank_id", "note", "price"], text_columns={"bank_id", "note"})
+    lines = buf.getvalue().splitlines()
+    assert lines == ['"1","say ""hi""",1.5', ',"",', '"3",,2.0']
+    assert next(csv.reader([lines[0]])) == ["1", 'say "hi"', "1.5"]
+    print("✓ COPY CSV keeps NULL and empty strings apart and quotes text")
+
+
+def test_swap_statements():
+    now, later = swap_statements(SPECS_BY_NAME["Pricing"], ["bank_id", "price"], '"_stage_Pricing"')
+    assert now == ['DELETE FROM "Pricing"',
+                   'INSERT INTO "Pricing" ("bank_id", "price") SELECT "bank_id", "price" FROM "_stage_Pricing"']
+    assert later == []
+
+    now, later = swap_statements(SPECS_BY_NAME["Banks"], ["bank_id", "bank_name"], '"_stage_Banks"')
+    assert now == ['INSERT INTO "Banks" ("bank_id", "bank_name") SELECT "bank_id", "bank_name" FROM "_stage_Banks" '
+                   'ON CONFLICT ("bank_id") DO UPDATE SET "bank_name" = EXCLUDED."bank_name"']
+    assert later == ['DELETE FROM "Banks" t WHERE NOT EXISTS (SELECT 1 FROM "_stage_Banks" s '
+                     'WHERE t."bank_id" = s."bank_id")']
+    print("✓ Banks are upserted (no cascading delete); other tables are refilled")
+
+
+def test_upsert_without_unique_constraint():
+    now, later = swap_statements(SPECS_BY_NAME["Banks"], ["bank_id", "bank_name"], '"_stage_Banks"',
+                                 unique_key=False)
+    assert now == ['UPDATE "Banks" t SET "bank_name" = s."bank_name" FROM "_stage_Banks" s '
+                   'WHERE t."bank_id" = s."bank_id"',
+                   'INSERT INTO "Banks" ("bank_id", "bank_name") SELECT s."bank_id", s."bank_name" '
+                   'FROM "_stage_Banks" s WHERE NOT EXISTS (SELECT 1 FROM "Banks" t WHERE t."bank_id" = s."bank_id")']
+    assert not any("ON CONFLICT" in sql for sql in now)
+    assert later == ['DELETE FROM "Banks" t WHERE NOT EXISTS (SELECT 1 FROM "_stage_Banks" s '
+                     'WHERE t."bank_id" = s."bank_id")']
+    print("✓ Without a unique constraint Banks are upserted with UPDATE + INSERT")
+
+
+def test_sheet_without_table_columns_is_rejected():
+    table = {"id": "integer", "demand_habitat": "text", "allowed_supply_habitat": "text"}
+    assert _load_columns(SPECS_BY_NAME["TradingRules"],
+                         pd.DataFrame({"demand_habitat": ["a"], "notes": ["x"]}), table) == ["demand_habitat"]
+    try:
+        _load_columns(SPECS_BY_NAME["TradingRules"], pd.DataFrame({"rule_name": ["a"], "id": [1]}), table)
+        assert False, "expected ImportValidationError"
+    except ImportValidationError as e:
+        assert e.problems[0].startswith("TradingRules: none of the sheet's columns ['rule_name', 'id']")
+    print("✓ A sheet sharing no columns with its table is rejected, not sent as COPY ()")
+
+
+PRICING_COLUMNS = ["bank_id", "habitat_name", "contract_size", "tier", "price"]
+PRICING_TEXT = {"bank_id", "habitat_name", "contract_size", "tier"}
+
+
+def test_diff_on_natural_key():
+    sheet = pd.DataFrame([
+        {"bank_id": "B1", "habitat_name": "Grassland", "contract_size": "small", "tier": "local", "price": 1.0},
+        {"bank_id": "B1", "habitat_name": "Grassland", "contract_size": "small", "tier": "far", "price": 2.5},
+        {"bank_id": "B2", "habitat_name": "Grassland", "contract_size": "small", "tier": "local", "price": 3},
+    ])
+    current = pd.DataFrame([
+        {"bank_id": "B1", "habitat_name": "Grassland", "contract_size": "small", "tier": "local", "price": 1},
+        {"bank_id": "B1", "habitat_name": "Grassland", "contract_size": "small", "tier": "far", "price": 2.0},
+        {"bank_id": "B3", "habitat_name": "Grassland", "contract_size": "small", "tier": "local", "price": 9.0},
+    ])
+    diff = diff_table("Pricing", sheet, current, PRICING_COLUMNS, PRICING_TEXT)
+    assert [r["bank_id"] for r in diff.inserts] == ["B2"]
+    assert [(r["tier"], r["price"]) for r in diff.updates] == [("far", 2.5)]
+    assert diff.deletes == [("B3", "Grassland", "small", "local")]
+    assert diff.summary() == "Pricing: +1 ~1 -1"
+
+    unchanged = diff_table("Pricing", current, current, PRICING_COLUMNS, PRICING_TEXT)
+    assert not unchanged.changed
+
+    stock = pd.DataFrame({"stock_id": [101.0], "quantity_available": [np.nan]})
+    same = diff_table("Stock", stock, pd.DataFrame({"stock_id": ["101"], "quantity_available": [None]}),
+                      ["stock_id", "quantity_available"], {"stock_id"})
+    assert not same.changed, "Excel 101.0 matches text '101' and NaN matches NULL"
+    print("✓ Sync diff finds inserts, updates and deletes on the natural key")
+
+
+def test_diff_rejects_ambiguous_keys_and_replaces_keyless():
+    dup = pd.DataFrame([{"stock_id": "S1", "quantity_available": 1.0}, {"stock_id": "S1", "quantity_available": 2.0}])
+    try:
+        diff_table("Stock", dup.iloc[:1], dup, ["stock_id", "quantity_available"], {"stock_id"})
+        assert False, "expected ImportValidationError"
+    except ImportValidationError as e:
+        assert e.problems == ["Stock: database has more than one row for stock_id = S1; use a full import"]
+
+    rules = pd.DataFrame({"rule": ["a", "b"]})
+    assert not diff_table("TradingRules", rules, rules.iloc[::-1], ["rule"], {"rule"}).changed
+    diff = diff_table("TradingRules", rules, rules.iloc[:1], ["rule"], {"rule"})
+    assert diff.replace == [{"rule": "a"}, {"rule": "b"}]
+    print("✓ Duplicate keys stop the sync; keyless tables are replaced only when they differ")
+
+
+class RecordingConnection:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        self.statements.append((str(statement), params))
+
+
+def test_sync_statements():
+    sheet = pd.DataFrame([{"stock_id": "S1", "bank_id": "B1", "quantity_available": 5.0},
+                          {"stock_id": "S2", "bank_id": "B1", "quantity_available": 1.0}])
+    current = pd.DataFrame([{"stock_id": "S1", "bank_id": "B1", "quantity_available": 4.0},
+                            {"stock_id": "S9", "bank_id": "B1", "quantity_available": 1.0}])
+    columns = ["stock_id", "bank_id", "quantity_available"]
+    diff = diff_table("Stock", sheet, current, columns, {"stock_id", "bank_id"})
+    conn = RecordingConnection()
+    _apply_diff(conn, diff, columns)
+    _delete_diff(conn, diff)
+    assert [sql for sql, _ in conn.statements] == [
+        'INSERT INTO "Stock" ("stock_id", "bank_id", "quantity_available") '
+        'VALUES (:p_stock_id, :p_bank_id, :p_quantity_available)',
+        'UPDATE "Stock" SET "bank_id" = :p_bank_id, "quantity_available" = :p_quantity_available '
+        'WHERE "stock_id" = :p_stock_id',
+        'DELETE FROM "Stock" WHERE "stock_id" = :p_stock_id',
+    ]
+    assert conn.statements[1][1] == [{"p_stock_id": "S1", "p_bank_id": "B1", "p_quantity_available": 5.0}]
+    assert conn.statements[2][1] == [{"p_stock_id": "S9"}]
+    print("✓ Sync writes one batched statement per kind of change")
+
+
+if __name__ == "__main__":
+    test_validation_passes_with_warnings()
+    test_validation_rejects_bad_keys()
+    test_references_fall_back_to_database()
+    test_csv_encoding_for_copy()
+    test_swap_statements()
+    test_upsert_without_unique_constraint()
+    test_sheet_without_table_columns_is_rejected()
+    test_diff_on_natural_key()
+    test_diff_rejects_ambiguous_keys_and_replaces_keyless()
+    test_sync_statements()
+    print("\n✓ All reference import tests passed")
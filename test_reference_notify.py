@@ -0,0 +1,157 @@
+"""
+Tests for cross-process reference change notifications.
+Unit tests use a fake LISTEN connection; the last test runs against a real
+Postgres only when DATABASE_URL is set.
+"""
+
+import os
+import queue
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from reference_cache import TTLCache
+from reference_notify import ReferenceChangeListener, changed_tables
+
+
+class FakeListenConnection:
+    """Delivers whatever is put on .queue as notifications"""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.executed = []
+        self.closed = False
+
+    def execute(self, sql):
+        self.executed.append(sql)
+
+    def notifies(self, timeout=None):
+        try:
+            payload = self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return
+        if isinstance(payload, Exception):
+            raise payload
+        yield SimpleNamespace(payload=payload)
+
+    def close(self):
+        self.closed = True
+
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_changed_tables():
+    assert changed_tables({"Stock": "v1", "Banks": "v1"}, {"Stock": "v2", "Banks": "v1"}) == ["Stock"]
+    assert changed_tables({"Stock": "v1"}, {"Stock": "v1", "SRM": "v1"}) == ["SRM"]
+    print("✓ Version diff reports only moved tables")
+
+
+def test_listen_invalidates_only_notified_tables():
+    conn = FakeListenConnection()
+    changed = []
+    listener = ReferenceChangeListener(changed.append, lambda: {}, connect=lambda: conn,
+                                       tables={"Stock", "Pricing"}, poll_interval=0.05).start()
+    try:
+        assert wait_for(lambda: listener.mode == "listen")
+        assert conn.executed == ['LISTEN "bng_reference_changed"']
+        conn.queue.put("Stock")
+        conn.queue.put("SomeOtherTable")
+        conn.queue.put("Pricing")
+        assert wait_for(lambda: len(changed) == 2)
+        assert changed == ["Stock", "Pricing"]
+        assert listener.notifications == 3
+    finally:
+        listener.stop()
+    assert conn.closed
+    print("✓ Notifications invalidate just the named reference tables")
+
+
+def test_polling_fallback_when_listen_unavailable():
+    versions = {"Stock": "v1", "Banks": "v1"}
+    changed = []
+
+    def refuse():
+        raise ConnectionError("LISTEN not supported by pooler")
+
+    listener = ReferenceChangeListener(changed.append, lambda: dict(versions), connect=refuse,
+                                       poll_interval=0.02).start()
+    try:
+        assert wait_for(lambda: listener.mode == "poll" and listener.polls >= 2)
+        assert changed == []
+        versions["Banks"] = "v2"
+        assert wait_for(lambda: changed == ["Banks"])
+    finally:
+        listener.stop()
+    print("✓ Without LISTEN, polling the version probe finds the changed table")
+
+
+def test_reconnect_catches_up_missed_changes():
+    versions = {"Stock": "v1"}
+    changed = []
+    conns = [FakeListenConnection(), FakeListenConnection()]
+    conns[0].queue.put(ConnectionError("server closed the connection"))
+    connects = iter(conns)
+
+    listener = ReferenceChangeListener(changed.append, lambda: dict(versions), connect=lambda: next(connects),
+                                       poll_interval=0.02)
+    with patch("reference_notify.RECONNECT_SECONDS", 0.05):
+        listener.start()
+        try:
+            assert wait_for(lambda: conns[0].closed)
+            versions["Stock"] = "v2"  # committed while disconnected
+            assert wait_for(lambda: conns[1].executed and listener.mode == "listen")
+            assert wait_for(lambda: changed == ["Stock"])
+        finally:
+            listener.stop()
+    print("✓ A dropped LISTEN connection falls back to polling and reconnects")
+
+
+def test_repo_handler_drops_cached_table():
+    import repo
+    cache = TTLCache(ttl=60)
+    with patch("repo._cache", cache):
+        cache.put("Stock", "stock rows")
+        cache.put("Banks", "bank rows")
+        repo._on_reference_change("Stock")
+        assert "Stock" not in cache
+        assert "Banks" in cache
+    print("✓ repo drops only the changed table from its cache")
+
+
+def test_against_local_postgres():
+    """End-to-end NOTIFY through the schema trigger (needs DATABASE_URL with the schema applied)"""
+    if not os.getenv("DATABASE_URL"):
+        print("- Skipped Postgres LISTEN/NOTIFY test (DATABASE_URL not set)")
+        return
+    import repo
+    from db import get_database_url
+    from reference_notify import psycopg_connector
+
+    changed = []
+    listener = ReferenceChangeListener(changed.append, repo.current_versions,
+                                       connect=psycopg_connector(get_database_url()),
+                                       tables=repo.REFERENCE_TABLE_NAMES, poll_interval=0.5).start()
+    try:
+        assert wait_for(lambda: listener.mode == "listen", timeout=10)
+        repo.mark_reference_tables_changed(["SRM"])
+        assert wait_for(lambda: "SRM" in changed, timeout=10)
+    finally:
+        listener.stop()
+    print("✓ Postgres NOTIFY reaches the listener")
+
+
+if __name__ == "__main__":
+    test_changed_tables()
+    test_listen_invalidates_only_notified_tables()
+    test_polling_fallback_when_listen_unavailable()
+    test_reconnect_catches_up_missed_changes()
+    test_repo_handler_drops_cached_table()
+    test_against_local_postgres()
+    print("\n✓ All reference notification tests passed")
@@ -0,0 +1,164 @@
+"""
+Tests for typed reference frames (reference_schema).
+No database required.
+"""
+
+import re
+import warnings
+from unittest.mock import patch
+
+import pandas as pd
+
+import repo
+from optimizer_core import (normalise_pricing, optimise, prepare_hedgerow_options, prepare_options,
+                            prepare_watercourse_options)
+from reference_cache import TTLCache
+from reference_schema import ReferenceSchemaError, apply_reference_schema
+
+HABITATS = [
+    ("Modified grassland", "Grassland", "Low", "area", 1.0),
+    ("Mixed scrub", "Heathland and shrub", "Medium", "area", 8.0),
+    ("Hedgerow - Native species-poor", "Hedgerow", "Low", "hedgerow", 20.0),
+    ("Ditch", "Rivers and streams", "Low", "watercourse", 12.0),
+]
+
+
+def make_backend():
+    catalog = pd.DataFrame([{"habitat_name": h, "broader_type": b, "distinctiveness_name": d, "UmbrellaType": u}
+                            for h, b, d, u, _ in HABITATS])
+    banks = pd.DataFrame([
+        {"bank_id": " B001", "bank_name": "Local Bank", "lpa_name": "Test LPA", "nca_name": "Test NCA",
+         "lat": 51.5, "lon": -0.1},
+        {"bank_id": "B002", "bank_name": "Far Bank", "lpa_name": "Far LPA", "nca_name": "Far NCA",
+         "lat": "52.5", "lon": -1.1},
+    ])
+    stock = pd.DataFrame([{"stock_id": f"S{i}{j}", "bank_id": bid, "habitat_name": h, "quantity_available": q}
+                          for i, bid in enumerate(["B001", "B002"])
+                          for j, (h, _, _, _, q) in enumerate(HABITATS)])
+    pricing = pd.DataFrame([
+        {"habitat_name": h, "contract_size": size, "tier": tier, "bank_id": bid, "bank_name": name,
+         "BANK_KEY": name, "broader_type": "", "distinctiveness_name": "",
+         "price": 1000.0 * (1 + j) * (2 if bid == "B001" else 1) * {"local": 1, "adjacent": 1.2, "far": 1.5}[tier]}
+        for bid, name in [("B001", "Local Bank"), ("B002", "Far Bank")]
+        for j, (h, _, _, _, _) in enumerate(HABITATS)
+        for tier in ["local", "adjacent", "far"] for size in ["fractional", "small", "medium"]
+    ])
+    return {
+        "HabitatCatalog": catalog,
+        "Banks": banks,
+        "Stock": stock,
+        "Pricing": pricing,
+        "DistinctivenessLevels": pd.DataFrame([{"distinctiveness_name": "Low", "level_value": 1},
+                                               {"distinctiveness_name": "Medium", "level_value": "2"}]),
+        "SRM": pd.DataFrame([{"tier": "local", "multiplier": 1}, {"tier": "far", "multiplier": "2"}]),
+        "TradingRules": pd.DataFrame(),
+    }
+
+
+def test_dtypes_and_shared_categories():
+    typed = apply_reference_schema(make_backend())
+    for name in ("HabitatCatalog", "Pricing", "Stock"):
+        assert isinstance(typed[name]["habitat_name"].dtype, pd.CategoricalDtype)
+    assert typed["Pricing"]["habitat_name"].dtype == typed["Stock"]["habitat_name"].dtype
+    assert typed["Banks"]["bank_id"].dtype == typed["Stock"]["bank_id"].dtype
+    assert list(typed["Banks"]["bank_id"]) == ["B001", "B002"]  # stripped
+    assert typed["Banks"]["lat"].dtype == "float64"
+    assert typed["SRM"]["multiplier"].tolist() == [1.0, 2.0]
+    assert typed["TradingRules"].empty
+
+    merged = typed["Stock"].merge(typed["HabitatCatalog"], on="habitat_name")
+    assert isinstance(merged["habitat_name"].dtype, pd.CategoricalDtype)
+    assert typed["Pricing"]["bank_id"].map(lambda v: str(v).strip()).dtype == typed["Pricing"]["bank_id"].dtype
+    print("✓ Join keys share categorical dtypes and numerics are float64")
+
+
+def test_schema_errors_are_listed():
+    backend = make_backend()
+    backend["Stock"]["quantity_available"] = backend["Stock"]["quantity_available"].astype(object)
+    backend["Stock"].loc[0, "quantity_available"] = "lots"
+    backend["Stock"].loc[1, "quantity_available"] = " "
+    backend["SRM"] = backend["SRM"].drop(columns=["multiplier"])
+    try:
+        apply_reference_schema(backend)
+        assert False, "expected ReferenceSchemaError"
+    except ReferenceSchemaError as e:
+        assert len(e.problems) == 2
+        assert "SRM: missing column(s) ['multiplier']" in e.problems
+        assert "Stock.quantity_available: 1 non-numeric value(s) (e.g. 'lots')" in e.problems
+    print("✓ Schema problems are reported together")
+
+
+def test_preparers_and_optimise_unchanged():
+    demand = pd.DataFrame([{"habitat_name": h, "units_required": u} for h, u in
+                           [("Modified grassland", 2.0), ("Mixed scrub", 3.0),
+                            ("Hedgerow - Native species-poor", 1.0), ("Ditch", 0.5)]])
+    results = []
+    for backend in (make_backend(), apply_reference_schema(make_backend())):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            run = []
+            for target in ("Test LPA", "Elsewhere"):
+                for prepare in (prepare_options, prepare_hedgerow_options, prepare_watercourse_options):
+                    options, caps, keys = prepare(demand, "small", target, "Test NCA", [], [], [], [],
+                                                  backend=backend)
+                    run.append((sorted(map(str, options)), sorted(caps.items()), sorted(keys.items())))
+            alloc, cost = optimise(demand, "Test LPA", "Test NCA", [], [], [], [], backend=backend)[:2]
+            run.append((round(cost, 6), alloc[["supply_habitat", "tier", "units_supplied"]].values.tolist()))
+        results.append(run)
+    assert results[0][0][0], "fixture should produce options"
+    assert results[0] == results[1]
+    print(f"✓ Typed frames give identical options and allocation (£{results[1][-1][0]:,.2f})")
+
+
+def test_app_pricing_keeps_categoricals():
+    backend = make_backend()
+    backend["Pricing"]["tier"] = backend["Pricing"]["tier"].str.upper() + " "
+    typed = apply_reference_schema(backend)
+    assert list(typed["Pricing"]["tier"].cat.categories) == ["", "adjacent", "far", "local"]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        pricing = normalise_pricing(typed["Pricing"], typed["Banks"])
+    for key in ("tier", "contract_size", "bank_id", "habitat_name"):
+        assert pricing[key].dtype == typed["Pricing"][key].dtype, key
+    assert pricing["price"].dtype == "float64" and "BANK_KEY" in pricing.columns
+
+    # The app's Banks enrichment rebuilds rows; its dtype restore keeps the shared keys
+    rows = [row for _, row in typed["Banks"].iterrows()]
+    rebuilt = pd.DataFrame(rows, columns=typed["Banks"].columns).astype(typed["Banks"].dtypes.to_dict())
+    assert rebuilt["bank_id"].dtype == typed["Pricing"]["bank_id"].dtype
+    print("✓ The app's pricing normalisation keeps the shared categorical dtypes")
+
+
+def test_typed_tables_cast_once_per_version():
+    backend = make_backend()
+    versions = {name: "v1" for name in backend}
+
+    def fake_read(query, params=None):
+        name = re.search(r'FROM "(\w+)"', str(query)).group(1)
+        return backend.get(name, pd.DataFrame(columns=["bank_id", "waterbody", "operational_catchment"])).copy()
+
+    with patch("repo._cache", TTLCache(ttl=0)), \
+         patch("repo._load_versions", side_effect=lambda: dict(versions)), \
+         patch("repo._read_table", side_effect=fake_read), \
+         patch("repo.apply_reference_schema", side_effect=apply_reference_schema) as cast:
+        first = repo.fetch_all_reference_tables()
+        first["Pricing"].drop(first["Pricing"].index, inplace=True)  # callers get copies
+        second = repo.fetch_all_reference_tables()
+        assert cast.call_count == 1
+        assert len(second["Pricing"]) == len(backend["Pricing"])
+        assert isinstance(second["Stock"]["habitat_name"].dtype, pd.CategoricalDtype)
+
+        versions["Pricing"] = "v2"
+        repo.fetch_all_reference_tables()
+        assert cast.call_count == 2
+    print("✓ Typed tables are cast once per table version")
+
+
+if __name__ == "__main__":
+    test_dtypes_and_shared_categories()
+    test_schema_errors_are_listed()
+    test_preparers_and_optimise_unchanged()
+    test_app_pricing_keeps_categoricals()
+    test_typed_tables_cast_once_per_version()
+    print("\n✓ All reference schema tests passed")
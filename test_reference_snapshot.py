@@ -0,0 +1,142 @@
+"""
+Tests for Parquet reference snapshots and seeding repo's cache from them.
+No database required.
+"""
+
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+import pandas as pd
+
+import repo
+from catchments import CATCHMENT_TYPE_WATERBODY, CatchmentIndex, feature_row
+from reference_cache import TTLCache
+from reference_snapshot import (export_reference_snapshot, load_snapshot, read_manifest, verify_snapshot,
+                                write_snapshot)
+
+
+def sample_tables():
+    return {
+        "Banks": pd.DataFrame([{"bank_id": "B1", "bank_name": "Bank 1", "lat": 51.0, "lon": -1.0},
+                               {"bank_id": "B2", "bank_name": "Bank 2", "lat": None, "lon": None}]),
+        "Stock": pd.DataFrame([{"stock_id": "S1", "bank_id": "B1", "habitat_name": "Grassland",
+                                "quantity_available": 12.5}]),
+        "TradingRules": pd.DataFrame(),
+        "Mixed": pd.DataFrame([{"v": 1}, {"v": "two"}]),
+        "WaterCatchments": pd.DataFrame([feature_row(
+            CATCHMENT_TYPE_WATERBODY, "Itchen",
+            {"type": "Polygon", "coordinates": [[[-1.4, 51.0], [-1.2, 51.0], [-1.2, 51.2], [-1.4, 51.2], [-1.4, 51.0]]]},
+            operational_catchment="Test and Itchen")]),
+    }
+
+
+def test_roundtrip_and_hashes():
+    with tempfile.TemporaryDirectory() as tmp:
+        manifest = write_snapshot(tmp, sample_tables(), {"Banks": "v3:1:10"})
+        assert manifest["tables"]["Banks"]["version"] == "v3:1:10"
+        assert manifest["tables"]["Stock"]["version"] is None
+        tables, loaded = load_snapshot(tmp)
+        assert loaded["content_hash"] == manifest["content_hash"]
+        pd.testing.assert_frame_equal(tables["Banks"], sample_tables()["Banks"])
+        assert tables["Stock"].loc[0, "quantity_available"] == 12.5
+        assert tables["TradingRules"].empty
+        assert list(tables["Mixed"]["v"]) == ["1", "two"]
+
+        # Same content, same hash
+        with tempfile.TemporaryDirectory() as tmp2:
+            assert write_snapshot(tmp2, sample_tables())["content_hash"] == manifest["content_hash"]
+    print("✓ Snapshot round trip preserves tables and content hash is stable")
+
+
+def test_tampering_is_detected():
+    with tempfile.TemporaryDirectory() as tmp:
+        write_snapshot(tmp, sample_tables())
+        assert verify_snapshot(tmp) == (True, [])
+        stock = Path(tmp) / read_manifest(tmp)["tables"]["Stock"]["file"]
+        stock.write_bytes(stock.read_bytes()[:-10] + b"0123456789")
+        ok, errors = verify_snapshot(tmp)
+        assert not ok and "Stock: content hash mismatch" in errors
+        try:
+            load_snapshot(tmp)
+            assert False, "expected ValueError"
+        except ValueError:
+            pass
+    print("✓ Modified snapshot files fail verification")
+
+
+def test_offline_seed_serves_without_database():
+    with tempfile.TemporaryDirectory() as tmp:
+        write_snapshot(tmp, sample_tables())
+        with patch("repo._cache", TTLCache(ttl=60)), \
+             patch("repo._read_table", side_effect=AssertionError("database touched")), \
+             patch("repo._load_versions", side_effect=AssertionError("database touched")):
+            repo.seed_from_snapshot(tmp, offline=True)
+            assert list(repo.fetch_banks()["bank_id"]) == ["B1", "B2"]
+            assert repo.get_catchment_index().catchments_for_point(51.1, -1.3)[0] == "Itchen"
+    print("✓ Offline snapshot serves tables and catchment index with no database access")
+
+
+def test_seed_validates_against_database_version():
+    with tempfile.TemporaryDirectory() as tmp:
+        write_snapshot(tmp, sample_tables(), {"Banks": "v3:1:10", "Stock": "v5:2:20"})
+        reads = []
+
+        def fake_read(query):
+            reads.append(query)
+            return pd.DataFrame([{"fresh": True}])
+
+        with patch("repo._cache", TTLCache(ttl=60)), \
+             patch("repo._read_table", side_effect=fake_read), \
+             patch("repo._load_versions", return_value={"Banks": "v3:1:10", "Stock": "v6:2:21"}):
+            repo.seed_from_snapshot(tmp)
+            assert list(repo.fetch_banks()["bank_id"]) == ["B1", "B2"]  # unchanged: served from snapshot
+            assert "fresh" in repo.fetch_stock().columns  # changed since export: refetched
+            assert len(reads) == 1 and '"Stock"' in reads[0]
+    print("✓ Snapshot tables are refetched only when the database version moved")
+
+
+def test_export_stores_prebuilt_catchment_index():
+    tables = sample_tables()
+    water = tables.pop("WaterCatchments")
+    with tempfile.TemporaryDirectory() as tmp:
+        with patch("repo.current_versions", return_value={"Banks": "v3", "WaterCatchments": "v9"}), \
+             patch("repo.fetch_all_reference_tables", return_value=tables), \
+             patch("repo.fetch_water_catchments", return_value=water):
+            manifest = export_reference_snapshot(tmp)
+        entry = manifest["tables"]["CatchmentIndex"]
+        assert entry["version"] == "v9" and entry["derived_from"] == "WaterCatchments"
+
+        # Seeding uses the stored index: no GeoJSON is parsed
+        with patch("repo._cache", TTLCache(ttl=60)), \
+             patch("catchments.geometry_rings", side_effect=AssertionError("polygons parsed")), \
+             patch("repo._load_versions", return_value={"WaterCatchments": "v9"}):
+            repo.seed_from_snapshot(tmp)
+            assert repo.get_catchment_index().catchments_for_point(51.1, -1.3) == ("Itchen", "Test and Itchen")
+            assert repo.get_catchment_index().catchments_for_point(52.0, -1.3) == ("", "")
+    print("✓ Snapshots carry the parsed catchment index under the WaterCatchments version")
+
+
+def test_format_1_snapshots_still_load():
+    import json
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_snapshot(tmp, sample_tables())
+        path = Path(tmp) / "manifest.json"
+        manifest = json.loads(path.read_text())
+        manifest["format"] = 1
+        path.write_text(json.dumps(manifest))
+        with patch("repo._cache", TTLCache(ttl=60)):
+            repo.seed_from_snapshot(tmp, offline=True)
+            assert repo.get_catchment_index().catchments_for_point(51.1, -1.3)[0] == "Itchen"
+    print("✓ Snapshots without a stored index build it from WaterCatchments")
+
+
+if __name__ == "__main__":
+    test_roundtrip_and_hashes()
+    test_tampering_is_detected()
+    test_offline_seed_serves_without_database()
+    test_seed_validates_against_database_version()
+    test_export_stores_prebuilt_catchment_index()
+    test_format_1_snapshots_still_load()
+    print("\n✓ All reference snapshot tests passed")
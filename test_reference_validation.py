@@ -0,0 +1,132 @@
+"""
+Tests for cached reference-data validation (repo.validate_reference_data).
+No database required - the engine is faked.
+"""
+
+from unittest.mock import patch
+
+import pandas as pd
+
+import repo
+from reference_cache import TTLCache
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeConnection:
+    def __init__(self, log, empty=("SRM",), unknown=3):
+        self.log, self.empty, self.unknown = log, empty, unknown
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        self.log.append(sql)
+        if "to_regclass" in sql:
+            return FakeResult([(n,) for n in params["names"] if n != "DistinctivenessLevels"])
+        if "NOT EXISTS" in sql:
+            return FakeResult([("Pricing", "habitat_name", "HabitatCatalog", self.unknown, ["Fen", "Bog"]),
+                               ("Stock", "bank_id", "Banks", 0, None)])
+        return FakeResult([(name, name not in self.empty) for name in repo.REQUIRED_REFERENCE_TABLES
+                           if f'FROM "{name}"' in sql])
+
+    def rollback(self):
+        pass
+
+
+class FakeEngine:
+    def __init__(self):
+        self.log = []
+
+    def connect(self):
+        return FakeConnection(self.log)
+
+
+def test_validation_reads_no_tables():
+    engine = FakeEngine()
+    with patch("repo._cache", TTLCache(ttl=60)), \
+         patch("repo.get_db_engine", return_value=engine), \
+         patch("repo._load_versions", return_value={}):
+        result = repo.validate_reference_data()
+    assert result.status == {"Banks": True, "Pricing": True, "HabitatCatalog": True, "Stock": True,
+                             "DistinctivenessLevels": False, "SRM": False}
+    assert result.errors == ["DistinctivenessLevels table is empty or missing", "SRM table is empty or missing"]
+    assert result.warnings == ["Pricing: 3 row(s) with habitat_name not in HabitatCatalog (e.g. Bog, Fen)"]
+    assert len(engine.log) == 3
+    assert not any("SELECT *" in sql for sql in engine.log)
+    assert 'EXISTS (SELECT 1 FROM "Banks")' in engine.log[1]
+    print("✓ Validation uses EXISTS and anti-join counts, three queries in all")
+
+
+def test_validation_cached_per_version():
+    versions = {name: "v1" for name in repo.REFERENCE_TABLE_NAMES}
+    calls = []
+
+    def validate():
+        calls.append(1)
+        return repo.ReferenceValidation(status={"Banks": True})
+
+    clock = [0.0]
+    with patch("repo._cache", TTLCache(ttl=60, clock=lambda: clock[0])), \
+         patch("repo._validate_in_database", side_effect=validate), \
+         patch("repo._load_versions", side_effect=lambda: dict(versions)):
+        for _ in range(5):
+            assert repo.validate_reference_tables() == (True, [])
+        clock[0] = 120.0
+        repo.validate_reference_tables()
+        assert len(calls) == 1, "unchanged versions keep the cached result"
+
+        versions["Stock"] = "v2"
+        clock[0] = 240.0
+        repo.validate_reference_tables()
+        assert len(calls) == 2
+
+        repo.invalidate("Pricing")
+        assert repo.check_required_tables_not_empty() == {"Banks": True}
+        assert len(calls) == 3
+    print("✓ Validation runs once per reference-data version")
+
+
+def test_failures_not_cached():
+    with patch("repo._cache", TTLCache(ttl=60)), \
+         patch("repo._validate_in_database", side_effect=RuntimeError("connection refused")), \
+         patch("repo._load_versions", return_value={}):
+        ok, errors = repo.validate_reference_tables()
+        assert not ok and errors == ["Failed to validate reference tables: connection refused"]
+        assert set(repo.check_required_tables_not_empty().values()) == {False}
+        assert repo.VALIDATION_KEY not in repo._cache
+    print("✓ Validation failures are reported and retried next time")
+
+
+def test_frame_validation():
+    tables = {
+        "Banks": pd.DataFrame({"bank_id": ["B1", "B2"]}),
+        "HabitatCatalog": pd.DataFrame({"habitat_name": ["Grassland"]}),
+        "Pricing": pd.DataFrame({"bank_id": ["B1", "B9", " B2"], "habitat_name": ["Grassland", "Grassland", "Scrub"]}),
+        "Stock": pd.DataFrame({"bank_id": ["B1"], "habitat_name": ["Grassland "]}),
+        "DistinctivenessLevels": pd.DataFrame({"distinctiveness_name": ["Low"]}),
+        "SRM": pd.DataFrame(),
+    }
+    result = repo._validate_frames(tables)
+    assert result.errors == ["SRM table is empty or missing"]
+    assert result.warnings == ["Pricing: 1 row(s) with bank_id not in Banks (e.g. B9)",
+                               "Pricing: 1 row(s) with habitat_name not in HabitatCatalog (e.g. Scrub)"]
+    print("✓ Offline frames get the same checks")
+
+
+if __name__ == "__main__":
+    test_validation_reads_no_tables()
+    test_validation_cached_per_version()
+    test_failures_not_cached()
+    test_frame_validation()
+    print("\n✓ All reference validation tests passed")
@@ -0,0 +1,89 @@
+"""
+Test versioned schema initialisation in SubmissionsDB (schema_version + migrations)
+No database required - the engine is mocked.
+"""
+
+import sys
+from unittest.mock import MagicMock, patch
+
+# Mock streamlit
+sys.modules['streamlit'] = MagicMock()
+
+
+def mock_engine(current_version):
+    """Engine whose schema_version probe returns current_version (an Exception to raise)"""
+    engine = MagicMock()
+    probe = MagicMock()
+    probe.__enter__ = MagicMock(return_value=probe)
+    probe.__exit__ = MagicMock(return_value=False)
+    if isinstance(current_version, Exception):
+        probe.execute.side_effect = current_version
+    else:
+        probe.execute.return_value.scalar.return_value = current_version
+    engine.connect.return_value = probe
+
+    migrate = MagicMock()
+    migrate.__enter__ = MagicMock(return_value=migrate)
+    migrate.__exit__ = MagicMock(return_value=False)
+    migrate.execute.return_value = iter([])
+    engine.begin.return_value = migrate
+    return engine, probe, migrate
+
+
+def test_up_to_date_schema_is_one_query():
+    from database import SubmissionsDB
+
+    engine, probe, migrate = mock_engine(SubmissionsDB.MIGRATIONS[-1][0])
+    SubmissionsDB._schema_ready = False
+    with patch('database.DatabaseConnection.get_engine', return_value=engine):
+        SubmissionsDB()
+        assert probe.execute.call_count == 1
+        assert "SELECT MAX(version) FROM schema_version" in str(probe.execute.call_args.args[0])
+        assert not engine.begin.called
+
+        SubmissionsDB()
+        assert probe.execute.call_count == 1, "later instances skip the check"
+    print("✓ An up-to-date schema costs one query per process")
+
+
+def test_pending_migrations_run_under_lock():
+    from database import SubmissionsDB
+
+    engine, probe, migrate = mock_engine(RuntimeError('relation "schema_version" does not exist'))
+    SubmissionsDB._schema_ready = False
+    applied = []
+    patches = [patch.object(SubmissionsDB, method, lambda self, conn, v=version: applied.append((v, conn)))
+               for version, _, method in SubmissionsDB.MIGRATIONS]
+    with patch('database.DatabaseConnection.get_engine', return_value=engine):
+        for p in patches:
+            p.start()
+        try:
+            SubmissionsDB()
+        finally:
+            for p in patches:
+                p.stop()
+    assert applied == [(version, migrate) for version, _, _ in SubmissionsDB.MIGRATIONS]
+    statements = [str(c.args[0]) for c in migrate.execute.call_args_list]
+    assert "pg_advisory_xact_lock" in statements[0]
+    assert "CREATE TABLE IF NOT EXISTS schema_version" in statements[1]
+    recorded = [c.args[1] for c in migrate.execute.call_args_list if "INSERT INTO schema_version" in str(c.args[0])]
+    assert recorded[0] == {"version": 1, "description": "baseline schema"}
+    assert [r["version"] for r in recorded] == [version for version, _, _ in SubmissionsDB.MIGRATIONS]
+    assert SubmissionsDB._schema_ready
+    print("✓ Pending migrations are applied in order under an advisory lock and recorded")
+
+
+def test_migrations_are_ordered():
+    from database import SubmissionsDB
+
+    versions = [version for version, _, _ in SubmissionsDB.MIGRATIONS]
+    assert versions == list(range(1, len(versions) + 1))
+    assert all(hasattr(SubmissionsDB, method) for _, _, method in SubmissionsDB.MIGRATIONS)
+    print("✓ Migrations are numbered consecutively and all exist")
+
+
+if __name__ == "__main__":
+    test_up_to_date_schema_is_one_query()
+    test_pending_migrations_run_under_lock()
+    test_migrations_are_ordered()
+    print("\n✓ All schema migration tests passed")
@@ -0,0 +1,139 @@
+"""
+Unit tests for site_resolver.resolve_site without network dependency.
+
+All ArcGIS / WFS / postcodes.io calls are patched on optimizer_core.
+"""
+
+import asyncio
+import time
+from unittest.mock import patch
+
+import site_resolver
+
+
+LPA_GEOM = {"rings": [[[-1.4, 51.0], [-1.2, 51.0], [-1.2, 51.1], [-1.4, 51.0]]]}
+NCA_GEOM = {"rings": [[[-1.5, 50.9], [-1.1, 50.9], [-1.1, 51.2], [-1.5, 50.9]]]}
+
+
+def fake_point_query(layer_url, lat, lon, out_fields):
+    if out_fields == "LAD24NM":
+        return {"attributes": {"LAD24NM": "Winchester"}, "geometry": LPA_GEOM}
+    return {"attributes": {"NCA_Name": "South Downs"}, "geometry": NCA_GEOM}
+
+
+def fake_intersect(layer_url, geom, name_field):
+    if name_field == "LAD24NM":
+        return ["East Hampshire", "Test Valley", "Winchester"]
+    return ["Hampshire Downs", "South Downs"]
+
+
+def fake_wfs(wfs_url, lat, lon, timeout=10):
+    if "waterbody" in wfs_url:
+        return {"properties": {"name": "Itchen"}}
+    return {"properties": {"oc_name": "Test and Itchen"}}
+
+
+def test_resolve_site_from_postcode():
+    """All lookups are merged into one SiteContext; neighbours exclude the target, intersections keep it."""
+    with patch("optimizer_core.get_postcode_info", return_value=(51.06, -1.31, "Winchester")), \
+         patch("optimizer_core.arcgis_point_query", side_effect=fake_point_query), \
+         patch("optimizer_core.layer_intersect_names", side_effect=fake_intersect), \
+         patch("optimizer_core.wfs_point_query", side_effect=fake_wfs):
+        site = site_resolver.resolve_site_sync("SO23 9LJ")
+
+    assert site.complete, site.errors
+    assert (site.lat, site.lon) == (51.06, -1.31)
+    assert site.lpa_name == "Winchester"
+    assert site.nca_name == "South Downs"
+    assert site.lpa_neighbors == ["East Hampshire", "Test Valley"]
+    assert site.nca_neighbors == ["Hampshire Downs"]
+    assert site.lpa_neighbors_norm == ["easthampshire", "testvalley"]
+    assert site.lpa_intersecting == ["East Hampshire", "Test Valley", "Winchester"]
+    assert site.nca_intersecting == ["Hampshire Downs", "South Downs"]
+    assert site.waterbody == "Itchen"
+    assert site.operational_catchment == "Test and Itchen"
+    assert site.lpa_geojson == {"type": "Polygon", "coordinates": LPA_GEOM["rings"]}
+    print("✓ Postcode resolves to a complete SiteContext")
+
+
+def test_resolve_site_from_latlon_skips_geocoding():
+    with patch("optimizer_core.get_postcode_info") as mock_pc, \
+         patch("optimizer_core.arcgis_point_query", side_effect=fake_point_query), \
+         patch("optimizer_core.layer_intersect_names", side_effect=fake_intersect), \
+         patch("optimizer_core.wfs_point_query") as mock_wfs:
+        site = site_resolver.resolve_site_sync((51.06, -1.31), include_catchments=False)
+
+    assert not mock_pc.called
+    assert not mock_wfs.called
+    assert site.lpa_name == "Winchester"
+    assert site.waterbody == ""
+    print("✓ Lat/lon input skips geocoding and optional catchments")
+
+
+def test_lookups_run_concurrently():
+    """Four 0.3s lookups should finish well under their 1.2s sequential total."""
+    def slow_point_query(*args):
+        time.sleep(0.3)
+        return fake_point_query(*args)
+
+    def slow_wfs(*args, **kwargs):
+        time.sleep(0.3)
+        return fake_wfs(*args, **kwargs)
+
+    with patch("optimizer_core.arcgis_point_query", side_effect=slow_point_query), \
+         patch("optimizer_core.layer_intersect_names", side_effect=fake_intersect), \
+         patch("optimizer_core.wfs_point_query", side_effect=slow_wfs):
+        site = site_resolver.resolve_site_sync((51.06, -1.31))
+
+    assert site.complete
+    assert site.elapsed_seconds < 0.9, site.elapsed_seconds
+    print(f"✓ Concurrent resolution took {site.elapsed_seconds:.2f}s")
+
+
+def test_deadline_and_errors_are_reported():
+    """A hung lookup is abandoned at the deadline; failures don't sink the rest."""
+    def hung_wfs(wfs_url, lat, lon, timeout=10):
+        time.sleep(1.0)
+        return {}
+
+    def failing_intersect(layer_url, geom, name_field):
+        if name_field == "NCA_Name":
+            raise RuntimeError("Connection error")
+        return fake_intersect(layer_url, geom, name_field)
+
+    with patch("optimizer_core.arcgis_point_query", side_effect=fake_point_query), \
+         patch("optimizer_core.layer_intersect_names", side_effect=failing_intersect), \
+         patch("optimizer_core.wfs_point_query", side_effect=hung_wfs):
+        site = site_resolver.resolve_site_sync((51.06, -1.31), deadline=0.3)
+
+    assert site.elapsed_seconds < 0.9
+    assert site.lpa_name == "Winchester"
+    assert site.nca_name == ""
+    assert not site.complete
+    assert any(e.startswith("nca:") for e in site.errors)
+    assert any(e.startswith("waterbody:") and "timed out" in e for e in site.errors)
+    print("✓ Deadline abandons slow lookups and records errors")
+
+
+def test_sync_wrapper_inside_running_loop():
+    """resolve_site_sync works when the calling thread already runs an event loop."""
+    async def caller():
+        return site_resolver.resolve_site_sync((51.06, -1.31), include_catchments=False)
+
+    with patch("optimizer_core.arcgis_point_query", side_effect=fake_point_query), \
+         patch("optimizer_core.layer_intersect_names", side_effect=fake_intersect):
+        site = asyncio.run(caller())
+
+    assert site.complete, site.errors
+    assert site.lpa_name == "Winchester"
+    assert site.nca_neighbors == ["Hampshire Downs"]
+    print("✓ Sync wrapper resolves inside a running event loop")
+
+
+if __name__ == "__main__":
+    test_resolve_site_from_postcode()
+    test_resolve_site_from_latlon_skips_geocoding()
+    test_lookups_run_concurrently()
+    test_deadline_and_errors_are_reported()
+    test_sync_wrapper_inside_running_loop()
+    print("\n✓ All site resolver tests passed")
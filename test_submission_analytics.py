@@ -0,0 +1,93 @@
+"""
+Test rollup-based submission analytics (SubmissionsDB.get_summary_stats and friends)
+No database required - the engine is mocked and statements are inspected.
+"""
+
+import sys
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+
+# Mock streamlit
+sys.modules['streamlit'] = MagicMock()
+
+
+def test_summary_stats_read_rollups():
+    from database import SubmissionsDB
+
+    statements = []
+    conn = MagicMock()
+    conn.__enter__ = MagicMock(return_value=conn)
+    conn.__exit__ = MagicMock(return_value=False)
+
+    def execute(statement, params=None):
+        sql = str(statement)
+        statements.append(sql)
+        result = MagicMock()
+        if "submission_client_stats" in sql:
+            result.fetchall.return_value = [("Acme", 4)]
+        elif "GROUP BY target_lpa" in sql:
+            result.fetchall.return_value = [("Leeds", 7), ("York", 2)]
+        else:
+            result.fetchone.return_value = (9, 123456.5)
+        return result
+
+    conn.execute.side_effect = execute
+    with patch('database.DatabaseConnection.get_engine') as engine:
+        engine.return_value.connect.return_value = conn
+        db = SubmissionsDB()
+        statements.clear()
+        stats = db.get_summary_stats()
+
+    assert stats == {"total_submissions": 9, "total_revenue": 123456.5,
+                     "top_lpas": [("Leeds", 7), ("York", 2)], "top_clients": [("Acme", 4)]}
+    assert len(statements) == 3
+    assert not any("FROM submissions" in sql for sql in statements)
+    print("✓ Dashboard totals and top lists come from the rollups")
+
+
+def test_timeseries_query():
+    from database import SubmissionsDB
+
+    calls = []
+
+    def fake_read(query, conn, params=None):
+        calls.append((str(query), params))
+        return pd.DataFrame({"period": [], "submissions": [], "revenue": []})
+
+    with patch('database.DatabaseConnection.get_engine'), \
+         patch('database.pd.read_sql_query', side_effect=fake_read):
+        db = SubmissionsDB()
+        db.get_submission_timeseries(period="week", start_date="2025-01-01", promoter_name="Promoter A")
+        try:
+            db.get_submission_timeseries(period="hour")
+            assert False, "expected ValueError"
+        except ValueError:
+            pass
+
+    sql, params = calls[0]
+    assert "DATE_TRUNC('week', day)" in sql and "FROM submission_daily_stats" in sql
+    assert "day >= :day_min" in sql and "promoter_name = :promoter_name_eq" in sql
+    assert params == {"day_min": "2025-01-01", "promoter_name_eq": "Promoter A"}
+    print("✓ Time series are grouped from the daily rollup")
+
+
+def test_rollup_migration_statements():
+    from database import SubmissionsDB
+
+    conn = MagicMock()
+    SubmissionsDB._migrate_submission_rollups(MagicMock(), conn)
+    sql = "\n".join(str(c.args[0]) for c in conn.execute.call_args_list)
+    assert "CREATE TABLE IF NOT EXISTS submission_daily_stats" in sql
+    assert "PRIMARY KEY (day, target_lpa, promoter_name, contract_size)" in sql
+    assert "AFTER INSERT OR DELETE ON submissions" in sql
+    assert "AFTER UPDATE OF submission_date, target_lpa" in sql
+    assert sql.index("CREATE TRIGGER") < sql.index("INSERT INTO submission_daily_stats\n")
+    print("✓ Rollup migration installs triggers before backfilling")
+
+
+if __name__ == "__main__":
+    test_summary_stats_read_rollups()
+    test_timeseries_query()
+    test_rollup_migration_statements()
+    print("\n✓ All submission analytics tests passed")
@@ -0,0 +1,88 @@
+"""
+Test keyset-paginated submission listing and ranked search
+(SubmissionsDB.list_submissions / search_submissions)
+No database required - the engine and query are mocked.
+"""
+
+import sys
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+
+# Mock streamlit
+sys.modules['streamlit'] = MagicMock()
+
+
+def fake_rows(n, start_id=100):
+    base = datetime(2025, 6, 1, 12, 0)
+    return pd.DataFrame({"id": [start_id - i for i in range(n)],
+                         "submission_date": [base - timedelta(hours=i) for i in range(n)],
+                         "client_name": [f"Client {i}" for i in range(n)]})
+
+
+def test_list_submissions_pages():
+    from database import SUBMISSION_SUMMARY_COLUMNS, SubmissionsDB
+
+    calls = []
+
+    def fake_read(query, conn, params=None):
+        calls.append((str(query), params))
+        return fake_rows(min(params["limit"], 4 if len(calls) == 1 else 2))
+
+    with patch('database.DatabaseConnection.get_engine'), \
+         patch('database.pd.read_sql_query', side_effect=fake_read):
+        db = SubmissionsDB()
+        page, cursor = db.list_submissions(limit=3, client_name="acme", promoter_name="Promoter A")
+        assert len(page) == 3
+        assert cursor == (datetime(2025, 6, 1, 10, 0), 98)
+
+        sql, params = calls[0]
+        assert sql.startswith(f"SELECT {', '.join(SUBMISSION_SUMMARY_COLUMNS)} FROM submissions WHERE ")
+        assert "allocation_results" not in sql and "SELECT *" not in sql
+        assert "client_name ILIKE :client_name" in sql and "promoter_name = :promoter_name" in sql
+        assert sql.endswith("ORDER BY submission_date DESC, id DESC LIMIT :limit")
+        assert params == {"limit": 4, "client_name": "%acme%", "promoter_name": "Promoter A"}
+
+        page, cursor = db.list_submissions(limit=3, after=cursor)
+        assert len(page) == 2 and cursor is None
+        sql, params = calls[1]
+        assert "(submission_date, id) < (:after_date, :after_id)" in sql
+        assert params["after_id"] == 98
+    print("✓ Submissions are listed in keyset pages of summary columns")
+
+
+def test_search_with_and_without_trigrams():
+    from database import SubmissionsDB
+
+    calls = []
+
+    def fake_read(query, conn, params=None):
+        calls.append((str(query), params))
+        return fake_rows(1)
+
+    with patch('database.DatabaseConnection.get_engine'), \
+         patch('database.pd.read_sql_query', side_effect=fake_read):
+        db = SubmissionsDB()
+        assert db.search_submissions("  ").empty and calls == []
+
+        db._trgm_available = True
+        db.search_submissions(" Acme Ltd ", limit=10, promoter_name="Promoter A")
+        sql, params = calls[-1]
+        assert "client_name % :term" in sql and "similarity(target_nca, :term)" in sql
+        assert "promoter_name = :promoter_name" in sql
+        assert sql.endswith("ORDER BY score DESC, submission_date DESC, id DESC LIMIT :limit")
+        assert params["term"] == "Acme Ltd" and params["pattern"] == "%Acme Ltd%" and params["limit"] == 10
+
+        db._trgm_available = False
+        db.search_submissions("BNG-A-020")
+        sql, params = calls[-1]
+        assert "similarity" not in sql and " % " not in sql
+        assert "site_location ILIKE :pattern" in sql and "reference_number ILIKE :prefix" in sql
+    print("✓ Search ranks trigram matches and falls back to ILIKE without pg_trgm")
+
+
+if __name__ == "__main__":
+    test_list_submissions_pages()
+    test_search_with_and_without_trigrams()
+    print("\n✓ All submission listing tests passed")
@@ -0,0 +1,193 @@
+"""
+Test write-behind submission persistence (submission_queue.py) and
+idempotent SubmissionsDB.store_submission
+No database required - the journal is a temporary SQLite file and the engine is mocked.
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pandas as pd
+
+# Mock streamlit
+sys.modules['streamlit'] = MagicMock()
+
+
+def submission_kwargs(reference="BNG-A-02025"):
+    return {
+        "client_name": "Client",
+        "reference_number": reference,
+        "target_lat": np.float64(51.5),
+        "num": np.int64(3),
+        "demand_df": pd.DataFrame({"habitat_name": ["Grassland"], "units_required": [1.25]}),
+        "allocation_df": pd.DataFrame({"BANK_KEY": ["Bank A"], "units_supplied": [1.25], "cost": [25000.0]}),
+        "manual_hedgerow_rows": [],
+    }
+
+
+def test_payload_round_trip():
+    from submission_queue import decode_submission, encode_submission
+
+    kwargs = decode_submission(encode_submission(submission_kwargs()))
+    assert kwargs["target_lat"] == 51.5 and kwargs["num"] == 3
+    pd.testing.assert_frame_equal(kwargs["allocation_df"], submission_kwargs()["allocation_df"])
+    assert kwargs["demand_df"]["units_required"].tolist() == [1.25]
+    assert kwargs["manual_hedgerow_rows"] == []
+    print("✓ Submissions (with DataFrames and numpy values) survive the journal")
+
+
+def test_queue_retries_until_stored():
+    from submission_queue import SubmissionQueue
+
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = SubmissionQueue(os.path.join(tmp, "queue.sqlite3"))
+        key = queue.enqueue(submission_kwargs())
+        assert queue.pending_count() == 1
+        queued_at = datetime.fromtimestamp(queue.pending()[0]["enqueued_at"])
+
+        calls, dates = [], []
+
+        def flaky_store(**kwargs):
+            calls.append(kwargs["idempotency_key"])
+            dates.append(kwargs["submission_date"])
+            if len(calls) == 1:
+                raise RuntimeError("connection timed out")
+            return 42
+
+        assert queue.drain(flaky_store) == (0, 1)
+        entry = queue.pending()[0]
+        assert entry["attempts"] == 1 and "timed out" in entry["last_error"]
+        assert queue.drain(flaky_store) == (0, 0), "backing off"
+
+        # A restarted process sees the same journal
+        reopened = SubmissionQueue(queue.path)
+        with reopened._connect() as conn:
+            conn.execute("UPDATE pending_submissions SET next_attempt_at = 0")
+        assert reopened.drain(flaky_store) == (1, 0)
+        assert calls == [key, key], "retries reuse the idempotency key"
+        assert dates == [queued_at, queued_at], "the enqueue time is the submission date"
+        assert reopened.pending_count() == 0
+    print("✓ Failed writes stay journalled and are retried with the same key")
+
+
+def test_writer_and_save_submission():
+    import submission_queue
+    from submission_queue import SubmissionQueue, SubmissionWriter
+
+    stored = []
+    db = MagicMock()
+    db.store_submission.side_effect = lambda **kwargs: stored.append(kwargs) or 7
+
+    with patch.dict(os.environ, {"BNG_SUBMISSION_WRITE_BEHIND": ""}):
+        receipt = submission_queue.save_submission(lambda: db, **submission_kwargs())
+        assert receipt.submission_id == 7 and not receipt.queued
+
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = SubmissionQueue(os.path.join(tmp, "queue.sqlite3"))
+        writer = SubmissionWriter(queue, lambda **kwargs: db.store_submission(**kwargs), poll_interval=0.05)
+        with patch.dict(os.environ, {"BNG_SUBMISSION_WRITE_BEHIND": "1"}), \
+             patch.object(submission_queue, "get_writer", return_value=writer.start()):
+            receipt = submission_queue.save_submission(lambda: db, **submission_kwargs("BNG-A-02026"))
+        try:
+            assert receipt.queued and receipt.reference_number == "BNG-A-02026"
+            deadline = time.time() + 5
+            while queue.pending_count() and time.time() < deadline:
+                time.sleep(0.02)
+            assert queue.pending_count() == 0
+            assert stored[-1]["idempotency_key"] == receipt.idempotency_key
+            assert stored[-1]["reference_number"] == "BNG-A-02026"
+        finally:
+            writer.stop()
+    print("✓ Queued submissions return at once and are written by the background writer")
+
+
+def test_unencodable_submission_is_stored_synchronously():
+    import submission_queue
+    from submission_queue import SubmissionQueue
+
+    db = MagicMock()
+    db.store_submission.return_value = 9
+    writer = MagicMock()
+    with tempfile.TemporaryDirectory() as tmp:
+        writer.queue = SubmissionQueue(os.path.join(tmp, "queue.sqlite3"))
+        kwargs = {**submission_kwargs(), "manual_hedgerow_rows": [{"geometry": object()}]}
+        with patch.dict(os.environ, {"BNG_SUBMISSION_WRITE_BEHIND": "1"}), \
+             patch.object(submission_queue, "get_writer", return_value=writer):
+            receipt = submission_queue.save_submission(lambda: db, **kwargs)
+        assert receipt.submission_id == 9 and not receipt.queued
+        assert db.store_submission.call_args.kwargs["manual_hedgerow_rows"] == kwargs["manual_hedgerow_rows"]
+        assert writer.queue.pending_count() == 0
+        writer.wake.assert_not_called()
+    print("✓ A submission the journal can't encode is stored synchronously")
+
+
+def test_store_submission_is_idempotent():
+    from database import SubmissionsDB
+
+    with patch('database.DatabaseConnection.get_engine') as mock_engine:
+        mock_conn = MagicMock()
+        mock_conn.__enter__ = MagicMock(return_value=mock_conn)
+        mock_conn.__exit__ = MagicMock(return_value=False)
+        mock_engine.return_value.connect.return_value = mock_conn
+
+        db = SubmissionsDB()
+        mock_conn.execute.reset_mock()
+        # ON CONFLICT DO NOTHING returned no row; the lookup finds the earlier write
+        mock_conn.execute.return_value.fetchone.return_value = None
+        mock_conn.execute.return_value.scalar.return_value = 42
+        kwargs = submission_kwargs()
+        del kwargs["num"]
+        submission_id = db.store_submission(
+            **kwargs, site_location="Site", target_lpa="LPA", target_nca="NCA", target_lon=-0.1,
+            lpa_neighbors=[], nca_neighbors=[], contract_size="small", total_cost=1000.0, admin_fee=500.0,
+            manual_watercourse_rows=[], idempotency_key="abc")
+
+        assert submission_id == 42
+        statements = [str(c.args[0]) for c in mock_conn.execute.call_args_list]
+        assert "ON CONFLICT (idempotency_key)" in statements[0]
+        assert mock_conn.execute.call_args_list[0].args[1]["idempotency_key"] == "abc"
+        assert not any("allocation_details" in s for s in statements), "nothing written twice"
+
+        mock_conn.execute.reset_mock()
+        queued_at = datetime(2025, 6, 1, 9, 30)
+        db.store_submission(
+            **kwargs, site_location="Site", target_lpa="LPA", target_nca="NCA", target_lon=-0.1,
+            lpa_neighbors=[], nca_neighbors=[], contract_size="small", total_cost=1000.0, admin_fee=500.0,
+            manual_watercourse_rows=[], idempotency_key="def", submission_date=queued_at)
+        assert mock_conn.execute.call_args_list[0].args[1]["submission_date"] == queued_at
+    print("✓ A submission already stored under its idempotency key isn't written again")
+
+
+def test_default_queue_path_warns_when_write_behind_on():
+    """The ~/.cache default is ephemeral in containers; write-behind there is flagged."""
+    import submission_queue
+
+    def writer_warnings(env):
+        with patch.dict(os.environ, env), \
+             patch.object(submission_queue, "_writer", None), \
+             patch.object(submission_queue, "_queue", None), \
+             patch.object(submission_queue, "SubmissionQueue"), \
+             patch.object(submission_queue, "SubmissionWriter"), \
+             patch.object(submission_queue.logger, "warning") as warning:
+            submission_queue.get_writer(MagicMock())
+        return [c.args[0] for c in warning.call_args_list]
+
+    warnings = writer_warnings({"BNG_SUBMISSION_WRITE_BEHIND": "1", "BNG_SUBMISSION_QUEUE_PATH": ""})
+    assert len(warnings) == 1 and "BNG_SUBMISSION_QUEUE_PATH" in warnings[0]
+    assert writer_warnings({"BNG_SUBMISSION_WRITE_BEHIND": "1",
+                            "BNG_SUBMISSION_QUEUE_PATH": "/data/submission_queue.sqlite3"}) == []
+    print("✓ Write-behind on the default journal path logs a warning")
+
+if __name__ == "__main__":
+    test_payload_round_trip()
+    test_queue_retries_until_stored()
+    test_writer_and_save_submission()
+    test_unencodable_submission_is_stored_synchronously()
+    test_store_submission_is_idempotent()
+    test_default_queue_path_warns_when_write_behind_on()
+    print("\n✓ All submission queue tests passed")